@@ -46,15 +46,21 @@ if sys.platform == 'win32':
 # Добавляем текущую директорию в путь для поиска модулей
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from database import db, DB_PATH, BAMBOO_ROD, TEMP_ROD_RANGES
+from database import db, DB_PATH, BAMBOO_ROD, TEMP_ROD_RANGES, FishingContext
+from economy import calculate_sale_summary, format_level_progress, format_percent_value
+from bounded_store import BoundedLockMap, BoundedStore
+from fish_repository import AsyncFishRepository, SaleNotCommitted
+from update_routing import is_primary_shard, shard_count, shard_index
+from telegram_rate_limiter import LANE_BULK, get_message_coalescer, get_outbound_limiter, outbound_lane
 from image_file_id_cache import ImageFileIdCache, collect_catch_image_paths, normalize_cache_key, resolve_image_path
 
 # --- TelegramBotAPI for invoice link creation ---
 import httpx
-from typing import Any, Optional, Dict, List
+from typing import Any, Optional, Dict, List, Tuple
 
 HTTP_SESSION: Optional[aiohttp.ClientSession] = None
 ASYNC_PG_POOL: Optional[asyncpg.Pool] = None
+FISH_REPO: Optional[AsyncFishRepository] = None
 ASYNC_SQLITE_CONN: Optional[aiosqlite.Connection] = None
 ASYNC_REDIS: Optional[aioredis.Redis] = None
 _SEND_SEMAPHORE: Optional[asyncio.Semaphore] = None
@@ -121,7 +127,7 @@ async def get_http_session() -> aiohttp.ClientSession:
 
 
 async def close_global_clients() -> None:
-    global HTTP_SESSION, ASYNC_PG_POOL, ASYNC_SQLITE_CONN, ASYNC_REDIS
+    global HTTP_SESSION, ASYNC_PG_POOL, FISH_REPO, ASYNC_SQLITE_CONN, ASYNC_REDIS
     if HTTP_SESSION and not HTTP_SESSION.closed:
         await HTTP_SESSION.close()
     HTTP_SESSION = None
@@ -131,6 +137,7 @@ async def close_global_clients() -> None:
     if ASYNC_PG_POOL is not None:
         await ASYNC_PG_POOL.close()
     ASYNC_PG_POOL = None
+    FISH_REPO = None
     if ASYNC_SQLITE_CONN is not None:
         await ASYNC_SQLITE_CONN.close()
     ASYNC_SQLITE_CONN = None
@@ -138,7 +145,7 @@ async def close_global_clients() -> None:
 
 async def init_async_storage() -> None:
     """Optional async DB clients for new code paths: PostgreSQL, SQLite and Redis."""
-    global ASYNC_PG_POOL, ASYNC_SQLITE_CONN, ASYNC_REDIS
+    global ASYNC_PG_POOL, FISH_REPO, ASYNC_SQLITE_CONN, ASYNC_REDIS
     database_url = os.getenv("DATABASE_URL", "").strip()
     if database_url.startswith(("postgres://", "postgresql://")) and ASYNC_PG_POOL is None:
         ASYNC_PG_POOL = await asyncpg.create_pool(
@@ -147,6 +154,8 @@ async def init_async_storage() -> None:
             max_size=int(os.getenv("ASYNCPG_MAX_SIZE", "20")),
             command_timeout=float(os.getenv("ASYNCPG_COMMAND_TIMEOUT", "60")),
         )
+    if ASYNC_PG_POOL is not None and FISH_REPO is None:
+        FISH_REPO = AsyncFishRepository(ASYNC_PG_POOL)
     if os.getenv("ENABLE_ASYNC_SQLITE", "0") == "1" and ASYNC_SQLITE_CONN is None:
         ASYNC_SQLITE_CONN = await aiosqlite.connect(os.getenv("FISHBOT_DB_PATH", DB_PATH))
         ASYNC_SQLITE_CONN.row_factory = aiosqlite.Row
@@ -559,21 +568,16 @@ def strip_tg_emoji_tags(text: str) -> str:
     return TG_EMOJI_TAG_RE.sub(r'\1', text)
 
 
-def format_percent_value(value: float) -> str:
-    try:
-        normalized = float(value)
-    except Exception:
-        normalized = 0.0
-    formatted = f"{normalized:.2f}".rstrip('0').rstrip('.')
-    return formatted if formatted else "0"
-
-
 # Thread pool for blocking DB / game logic so the asyncio event loop stays responsive
 from concurrent.futures import ThreadPoolExecutor
 _DB_WORKERS = max(4, int(os.getenv('TG_DB_WORKERS', '300')))
 _db_executor = ThreadPoolExecutor(max_workers=_DB_WORKERS, thread_name_prefix="db_worker")
 
-_action_locks = collections.defaultdict(asyncio.Lock)
+_action_locks = BoundedLockMap(
+    "action_locks",
+    maxsize=int(os.getenv('ACTION_LOCKS_MAX', '100000')),
+    ttl=float(os.getenv('ACTION_LOCKS_IDLE_TTL_SEC', '3600')),
+)
 
 def require_action_lock(func):
     """Обеспечивает последовательное выполнение команд для одного пользователя."""
@@ -599,13 +603,72 @@ async def _run_sync(func, *args, **kwargs):
     return result
 
 
+async def _get_fishing_context(user_id: int, chat_id: int) -> FishingContext:
+    """Контекст заброса: через asyncpg-пул, если он есть, иначе синхронно через `_run_sync`."""
+    if FISH_REPO is not None:
+        return await FISH_REPO.get_fishing_context(user_id, chat_id)
+    return await _run_sync(db.get_fishing_context, user_id, chat_id)
+
+
+async def _check_can_fish(user_id: int, chat_id: int, ctx: Optional[FishingContext] = None) -> Tuple[bool, str]:
+    """Кулдаун и прочность удочки; сброс гарпуна и путь без пула — синхронным `game.can_fish`."""
+    if FISH_REPO is not None:
+        verdict = await FISH_REPO.can_fish(user_id, chat_id, ctx)
+        if verdict is not None:
+            return verdict
+    return await _run_sync(game.can_fish, user_id, chat_id, ctx if ctx is not None and ctx.player else None)
+
+
+async def _sell_caught_fish(user_id: int, chat_id: int, fish_ids: List[int], coins: int, xp: int) -> Dict[str, Any]:
+    """Продать улов и начислить монеты/опыт: {'balance': int, 'level_info': dict}.
+
+    При наличии asyncpg-пула всё идёт одной транзакцией прямо в event loop,
+    иначе — прежней цепочкой синхронных вызовов через `_run_sync`.
+    """
+    result = None
+    if FISH_REPO is not None:
+        try:
+            result = await FISH_REPO.sell_fish(user_id, chat_id, fish_ids, coins, xp)
+        except SaleNotCommitted:
+            # Только откат до COMMIT: иначе запасной путь начислил бы монеты второй раз
+            logger.exception("async sell rolled back user=%s chat=%s, falling back to sync path", user_id, chat_id)
+    if result is not None:
+        # Продажа уже закоммичена: ошибки достижений не должны уводить в запасной путь
+        level_info = result['level_info']
+        try:
+            if level_info.get('leveled_up'):
+                await _run_sync(
+                    db.evaluate_achievements, user_id, chat_id, {'level': float(level_info.get('level') or 0)}
+                )
+            # Как и mark_fish_as_sold: достижения за проданную рыбу по новому total_fish_sold
+            for owner_id, sold_total in (result.get('sold_totals') or {}).items():
+                await _run_sync(db.evaluate_achievements, owner_id, None, {'sold_fish_count': sold_total})
+        except Exception:
+            logger.exception("achievements after async sell failed user=%s", user_id)
+        return result
+
+    player = await _run_sync(db.get_player, user_id, chat_id)
+    balance = int((player or {}).get('coins', 0) or 0) + int(coins)
+    await _run_sync(db.mark_fish_as_sold, fish_ids)
+    await _run_sync(db.update_player, user_id, chat_id, coins=balance)
+    level_info = await _run_sync(db.add_player_xp, user_id, chat_id, xp)
+    return {'balance': balance, 'level_info': level_info}
+
+
 class EmojiBot(ExtBot):
     API_CALL_TIMEOUT = float(os.getenv('TG_API_CALL_TIMEOUT', '12'))
     API_CALL_RETRIES = int(os.getenv('TG_API_CALL_RETRIES', '3'))
     RETRY_BACKOFF_SEC = float(os.getenv('TG_API_RETRY_BACKOFF', '1.5'))
+    # Вызовы, которые Telegram считает в лимитах сообщений на чат
+    RATE_LIMITED_METHODS = frozenset(("send_message", "edit_message_text", "send_document", "send_invoice"))
 
-    async def _call_with_timeout(self, method_name: str, coro_factory):
+    async def _call_with_timeout(self, method_name: str, coro_factory, chat_id: Optional[int] = None):
         last_exc = None
+        limiter = get_outbound_limiter() if method_name in self.RATE_LIMITED_METHODS else None
+        try:
+            chat_id = int(chat_id) if chat_id is not None else None
+        except (TypeError, ValueError):
+            chat_id = None  # @username каналов — лимитируем только общим ведром
         if method_name == "send_document":
             send_sem = get_document_send_semaphore()
         elif method_name in ("send_message", "edit_message_text"):
@@ -614,14 +677,27 @@ class EmojiBot(ExtBot):
             send_sem = get_send_semaphore()
         for attempt in range(self.API_CALL_RETRIES + 1):
             try:
+                # Токен берём до семафора: ожидание лимита не занимает слот отправки
+                if limiter is not None:
+                    await limiter.acquire(chat_id)
                 async with send_sem:
                     coro = coro_factory()
                     return await asyncio.wait_for(coro, timeout=self.API_CALL_TIMEOUT)
             except RetryAfter as exc:
                 last_exc = exc
-                wait = float(getattr(exc, 'retry_after', 1) or 1)
+                wait = getattr(exc, 'retry_after', 1) or 1
+                wait = float(wait.total_seconds() if hasattr(wait, 'total_seconds') else wait)
                 logger.warning("EmojiBot.%s flood limit, waiting %.2fs (attempt %s/%s)", method_name, wait, attempt + 1, self.API_CALL_RETRIES + 1)
-                await asyncio.sleep(wait + 1)
+                if limiter is not None:
+                    # Закрываем чат в лимитере: остальные отправки туда подождут там же,
+                    # а не получат свой RetryAfter
+                    limiter.penalize(chat_id, wait + 1)
+                    if outbound_lane.get() == LANE_BULK:
+                        # Рассылка не ждёт внутри вызова: очередь уведомлений сама
+                        # перенесёт строку на retry_after и освободит отправителя
+                        raise
+                else:
+                    await asyncio.sleep(wait + 1)
             except (BadRequest, Forbidden) as exc:
                 # Ошибки Telegram API (например, Chat not found, Forbidden) не лечатся retry'ем
                 exc_str = str(exc)
@@ -679,8 +755,9 @@ class EmojiBot(ExtBot):
         if isinstance(original_text, str):
             converted_kwargs['text'] = replace_coin_emoji(original_text)
 
+        chat_id = converted_kwargs.get('chat_id')
         try:
-            return await self._call_with_timeout(method_name, lambda: sender(*args, **converted_kwargs))
+            return await self._call_with_timeout(method_name, lambda: sender(*args, **converted_kwargs), chat_id)
         except BadRequest as exc:
             converted_text = converted_kwargs.get('text')
             if not isinstance(converted_text, str) or not self._should_retry_without_custom_emoji(exc, converted_text):
@@ -693,7 +770,7 @@ class EmojiBot(ExtBot):
                 method_name,
                 exc,
             )
-            return await self._call_with_timeout(method_name, lambda: sender(*args, **fallback_kwargs))
+            return await self._call_with_timeout(method_name, lambda: sender(*args, **fallback_kwargs), chat_id)
 
     @staticmethod
     def _extract_migrated_chat_id(exc: Exception) -> Optional[int]:
@@ -711,6 +788,9 @@ class EmojiBot(ExtBot):
             return None
 
     async def send_message(self, *args, **kwargs):
+        # coalesce=True: текст можно склеить с соседними текстами в тот же чат
+        if kwargs.pop('coalesce', False) and not args and get_message_coalescer().can_coalesce(kwargs):
+            return await get_message_coalescer().submit(self.send_message, kwargs)
         try:
             return await self._send_with_custom_emoji_fallback(
                 "send_message",
@@ -756,47 +836,18 @@ class EmojiBot(ExtBot):
         )
 
     async def send_document(self, *args, **kwargs):
-        return await self._call_with_timeout("send_document", lambda: super(EmojiBot, self).send_document(*args, **kwargs))
+        return await self._call_with_timeout(
+            "send_document", lambda: super(EmojiBot, self).send_document(*args, **kwargs), kwargs.get('chat_id')
+        )
 
     async def send_invoice(self, *args, **kwargs):
-        return await self._call_with_timeout("send_invoice", lambda: super(EmojiBot, self).send_invoice(*args, **kwargs))
+        return await self._call_with_timeout(
+            "send_invoice", lambda: super(EmojiBot, self).send_invoice(*args, **kwargs), kwargs.get('chat_id')
+        )
 
     async def get_chat(self, *args, **kwargs):
         return await self._call_with_timeout("get_chat", lambda: super(EmojiBot, self).get_chat(*args, **kwargs))
 
-def format_level_progress(level_info):
-    if not level_info:
-        return ""
-
-    level = level_info.get('level', 0)
-    next_level_xp = level_info.get('next_level_xp')
-    if next_level_xp is None:
-        bar = "[" + ("=" * 10) + "]"
-        return f"Уровень {level}: {bar} MAX"
-
-    progress = level_info.get('progress', 0.0)
-    filled = int(progress * 10)
-    filled = max(0, min(10, filled))
-    bar = "[" + ("=" * filled) + ("-" * (10 - filled)) + "]"
-    xp_into = level_info.get('xp_into_level', 0)
-    xp_needed = level_info.get('xp_needed', 0)
-    return f"Уровень {level}: {bar} {xp_into}/{xp_needed}"
-
-def calculate_sale_summary(items):
-    total_xp = 0
-    total_weight_bonus = 0
-    total_rarity_bonus = 0
-    total_base = 0
-    total_weight = 0.0
-    for item in items:
-        details = db.calculate_item_xp_details(item)
-        total_xp += details['xp_total']
-        total_weight_bonus += details['weight_bonus']
-        total_rarity_bonus += details.get('rarity_bonus', 0)
-        total_base += details['xp_base']
-        total_weight += float(item.get('weight') or 0)
-    return total_xp, total_base, total_rarity_bonus, total_weight_bonus, total_weight
-
 def format_fish_name(name: str) -> str:
     if name == "Белуга":
         return f"{BELUGA_EMOJI_TAG} {name}"
@@ -1980,6 +2031,9 @@ class FishBot:
 
         user_row = None
         user_place = None
+        # Место игрока вне топа: по доске leaderboard.py (rank_kind) или поиском по all_rows
+        rank_kind = None
+        all_rows = []
         if target_location or target_locations:
             if target_locations:
                 # Мульти-локация: используем новые функции с параметром locations
@@ -1999,21 +2053,22 @@ class FishBot:
                         all_rows = await _run_sync(db.get_multi_location_fish_leaderboard_count, target_locations, target_fish, tour['starts_at'], tour['ends_at'], 1000)
                 elif t_type == 'total_length':
                     rows = await _run_sync(db.get_tour_leaderboard_length, tour['starts_at'], tour['ends_at'], top_limit, target_locations)
-                    all_rows = await _run_sync(db.get_tour_leaderboard_length, tour['starts_at'], tour['ends_at'], 1000, target_locations)
+                    rank_kind = 'total_length'
                 else:
                     rows = await _run_sync(db.get_tour_leaderboard_weight, tour['starts_at'], tour['ends_at'], top_limit, target_locations)
-                    all_rows = await _run_sync(db.get_tour_leaderboard_weight, tour['starts_at'], tour['ends_at'], 1000, target_locations)
+                    rank_kind = 'total_weight'
+                rank_locations = target_locations
             else:
                 # Одиночная локация: старая логика
                 if t_type == 'longest_fish':
                     rows = await _run_sync(db.get_location_leaderboard_length, target_location, tour['starts_at'], tour['ends_at'], top_limit)
-                    all_rows = await _run_sync(db.get_location_leaderboard_length, target_location, tour['starts_at'], tour['ends_at'], 1000)
+                    rank_kind = 'best_length'
                 elif t_type == 'biggest_weight':
                     rows = await _run_sync(db.get_location_leaderboard_weight, target_location, tour['starts_at'], tour['ends_at'], top_limit)
-                    all_rows = await _run_sync(db.get_location_leaderboard_weight, target_location, tour['starts_at'], tour['ends_at'], 1000)
+                    rank_kind = 'best_weight'
                 else:
                     rows = []
-                    all_rows = []
+                rank_locations = [target_location]
             if not rows:
                 lines.append("Пока никто не поймал рыбу на этой локации.")
             else:
@@ -2046,6 +2101,10 @@ class FishBot:
                             weight = round(float(r.get('best_weight') or 0), 2)
                             lines.append(f"{medal} {name} — {fish} — {weight} кг")
                 # Поиск пользователя вне топа
+                if rank_kind:
+                    user_place, user_row = await _run_sync(
+                        db.get_tour_leaderboard_rank, rank_kind, user_id, tour['starts_at'], tour['ends_at'], rank_locations
+                    )
                 for idx, r in enumerate(all_rows, 1):
                     if r.get('user_id') == user_id:
                         user_row = r
@@ -2081,12 +2140,11 @@ class FishBot:
                             lines.append(f"<i>Ваше место: {user_place}. {name} — {fish} — {weight} кг</i>")
         else:
             # Без локации или с мульти-локацией (total_weight/total_length)
+            rank_kind = 'total_length' if t_type == 'total_length' else 'total_weight'
             if t_type == 'total_length':
                 rows = await _run_sync(db.get_tour_leaderboard_length, tour['starts_at'], tour['ends_at'], top_limit, target_locations)
-                all_rows = await _run_sync(db.get_tour_leaderboard_length, tour['starts_at'], tour['ends_at'], 1000, target_locations)
             else:
                 rows = await _run_sync(db.get_tour_leaderboard_weight, tour['starts_at'], tour['ends_at'], top_limit, target_locations)
-                all_rows = await _run_sync(db.get_tour_leaderboard_weight, tour['starts_at'], tour['ends_at'], 1000, target_locations)
             if not rows:
                 lines.append("Пока никто не поймал рыбу.")
             else:
@@ -2100,11 +2158,9 @@ class FishBot:
                         weight = round(float(r['total_weight']), 2)
                         lines.append(f"{medal} {name} — {weight} кг")
                 # Поиск пользователя вне топа
-                for idx, r in enumerate(all_rows, 1):
-                    if r.get('user_id') == user_id:
-                        user_row = r
-                        user_place = idx
-                        break
+                user_place, user_row = await _run_sync(
+                    db.get_tour_leaderboard_rank, rank_kind, user_id, tour['starts_at'], tour['ends_at'], target_locations
+                )
                 if user_row and user_place > top_limit:
                     name = html.escape(user_row.get('username') or str(user_row['user_id']))
                     lines.append("")
@@ -2227,15 +2283,11 @@ class FishBot:
             return
         text = " ".join(context.args)
         chat_ids = await _run_sync(db.get_all_chat_ids)
-        sent = 0
-        failed = 0
-        for cid in chat_ids:
-            try:
-                await context.bot.send_message(chat_id=cid, text=text)
-                sent += 1
-            except Exception:
-                failed += 1
-        await update.message.reply_text(f"✅ Отправлено: {sent}, ❌ Ошибки: {failed}")
+        # Рассылка идёт через очередь уведомлений: фоновая полоса лимитов, повторы при RetryAfter
+        queued = await notifications.enqueue_notifications(
+            ('send_message', {'chat_id': int(cid), 'text': text}, 0) for cid in chat_ids
+        )
+        await update.message.reply_text(f"✅ Поставлено в очередь: {queued}")
 
     async def send_invoice_url_button(self, chat_id, invoice_url, text, user_id=None, invoice_id=None, timeout_sec=60, reply_to_message_id=None):
         """Отправить кнопку оплаты со ссылкой инвойса, с автоотключением."""
@@ -2548,6 +2600,10 @@ class FishBot:
         return msg
 
     def _cancel_duel_invite_timeout_job(self, duel_id: int) -> None:
+        # Джоб живёт в планировщике шарда пригласившего, а отменяет его апдейт цели —
+        # при нескольких шардах это другой процесс и remove_job ничего не найдёт.
+        # Это допустимо: обработчики таймаутов перечитывают дуэль под FOR UPDATE
+        # и ничего не делают, если статус уже сменился.
         if not self.scheduler:
             return
         try:
@@ -2815,7 +2871,8 @@ class FishBot:
         return f"{minutes}м {sec}с"
 
     async def _execute_harpoon_catch(self, user_id: int, group_chat_id: int, reply_to_message_id: Optional[int] = None) -> None:
-        player = await _run_sync(db.get_player, user_id, group_chat_id)
+        fishing_ctx = await _get_fishing_context(user_id, group_chat_id)
+        player = fishing_ctx.player
         if not player:
             await self._safe_send_message(
                 chat_id=group_chat_id,
@@ -2825,7 +2882,7 @@ class FishBot:
             return
 
         location = player.get('current_location') or "Городской пруд"
-        result = game.fish_with_harpoon(user_id, group_chat_id, location)
+        result = game.fish_with_harpoon(user_id, group_chat_id, location, fishing_ctx)
 
         await _run_sync(db.mark_harpoon_used, user_id, group_chat_id)
 
@@ -3030,9 +3087,7 @@ class FishBot:
                 reply_to_message_id=reply_to_message_id,
             )
             if sticker_message:
-                context.bot_data.setdefault("last_bot_stickers", {})[chat_id] = sticker_message.message_id
-                if fish_meta:
-                    context.bot_data.setdefault("sticker_fish_map", {})[sticker_message.message_id] = fish_meta
+                await self._remember_bot_sticker(context, chat_id, sticker_message.message_id, fish_meta)
                 # Отправляем текст с reply_to на стикер
                 await self._safe_send_message(
                     chat_id=chat_id,
@@ -3055,6 +3110,45 @@ class FishBot:
                 reply_to_message_id=reply_to_message_id,
             )
 
+    async def announce_achievement_unlocks(self, user_id: int, unlocks: List[Dict[str, Any]]) -> None:
+        """Объявить открытые достижения в чате последнего улова игрока (ответом на него)."""
+        try:
+            anchor = self.catch_anchors.get(int(user_id)) or {}
+            chat_id = next(
+                (u['chat_id'] for u in unlocks if u.get('chat_id') is not None), anchor.get('chat_id')
+            )
+            if chat_id is None:
+                return
+            reply_id = anchor.get('message_id') if anchor.get('chat_id') == chat_id else None
+            username = anchor.get('username')
+            if not username:
+                player = await _run_sync(db.get_player, user_id, chat_id)
+                username = (player or {}).get('username')
+            from achievements import format_unlock_message
+            best_by_ach: Dict[str, Dict[str, Any]] = {}
+            for unlock in unlocks:
+                aid = str(unlock.get('achievement_id') or '')
+                tier = int(unlock.get('tier') or 1)
+                prev = best_by_ach.get(aid)
+                if not prev or tier > int(prev.get('tier') or 0):
+                    best_by_ach[aid] = unlock
+            # Несколько достижений за один сброс уходят одним сообщением
+            await asyncio.gather(*(
+                self._safe_send_message(
+                    chat_id=chat_id,
+                    text=format_unlock_message(
+                        username,
+                        unlock.get('achievement_id', ''),
+                        int(unlock.get('tier') or 1),
+                    ),
+                    reply_to_message_id=reply_id,
+                    coalesce=True,
+                )
+                for unlock in best_by_ach.values()
+            ))
+        except Exception:
+            logger.exception("Failed achievement announce user=%s", user_id)
+
     def _schedule_fish_catch_followups(
         self,
         *,
@@ -3070,6 +3164,17 @@ class FishBot:
         catch_id: Optional[int] = None,
         resolve_latest_catch: bool = True,
     ) -> None:
+        # Достижения за улов объявит сброс статистики (announce_achievement_unlocks):
+        # запоминаем, куда и кому отвечать
+        self.catch_anchors[int(user_id)] = {
+            'chat_id': chat_id,
+            'message_id': getattr(getattr(update, 'message', None), 'message_id', None),
+            'username': (
+                player.get('username')
+                or getattr(getattr(update, 'effective_user', None), 'username', None)
+            ),
+        }
+
         async def _followups() -> None:
             try:
                 await self._maybe_process_duel_catch(
@@ -3084,36 +3189,6 @@ class FishBot:
             except Exception:
                 logger.exception("Failed duel followup user=%s chat=%s", user_id, chat_id)
 
-            try:
-                unlocks = await _run_sync(db.drain_achievement_notifications, user_id)
-                if unlocks:
-                    username = (
-                        player.get('username')
-                        or getattr(getattr(update, 'effective_user', None), 'username', None)
-                    )
-                    from achievements import format_unlock_message
-                    reply_id = getattr(getattr(update, 'message', None), 'message_id', None)
-                    best_by_ach: Dict[str, Dict[str, Any]] = {}
-                    for unlock in unlocks:
-                        aid = str(unlock.get('achievement_id') or '')
-                        tier = int(unlock.get('tier') or 1)
-                        prev = best_by_ach.get(aid)
-                        if not prev or tier > int(prev.get('tier') or 0):
-                            best_by_ach[aid] = unlock
-                    for unlock in best_by_ach.values():
-                        text = format_unlock_message(
-                            username,
-                            unlock.get('achievement_id', ''),
-                            int(unlock.get('tier') or 1),
-                        )
-                        await self._safe_send_message(
-                            chat_id=chat_id,
-                            text=text,
-                            reply_to_message_id=reply_id,
-                        )
-            except Exception:
-                logger.exception("Failed achievement announce user=%s chat=%s", user_id, chat_id)
-
             if result.get('temp_rod_broken'):
                 try:
                     await self._safe_send_message(
@@ -3248,9 +3323,9 @@ class FishBot:
     def __init__(self):
         self.is_global_stopped = False
         self.scheduler = None  # Будет создан в main() с asyncio loop
-        self.user_locations = {}  # Временное хранение локаций пользователей
-        self.active_timeouts = {}  # Отслеживание активных таймеров
-        self.active_invoices = {}  # Отслеживание активных инвойсов по пользователям
+        self.user_locations = BoundedStore("user_locations", maxsize=50000, ttl=24 * 3600)  # Временное хранение локаций пользователей
+        self.active_timeouts = BoundedStore("active_timeouts", maxsize=50000, ttl=24 * 3600)  # Отслеживание активных таймеров
+        self.active_invoices = BoundedStore("active_invoices", maxsize=50000, ttl=24 * 3600)  # Отслеживание активных инвойсов по пользователям
         self.application = None  # Будет установлено в main()
         self._tour_response_cache = {}
         self._tour_cache_ttl = float(os.getenv("TOUR_CACHE_TTL_SECONDS", "10"))
@@ -3328,8 +3403,13 @@ class FishBot:
             'total_length': 'Суммарная длина улова',
             'specific_fish': 'Улов определённой рыбы',
         }
-        self.fight_sessions: Dict[str, Dict[str, Any]] = {}
-        self.fight_timeout_tasks: Dict[str, asyncio.Task] = {}
+        self.fight_sessions: BoundedStore = BoundedStore("fight_sessions", maxsize=20000, ttl=3600)
+        # user_id -> чат, сообщение и ник последнего улова для объявления достижений
+        self.catch_anchors: BoundedStore = BoundedStore("catch_anchors", maxsize=50000, ttl=3600)
+        # Живой таймер не вытесняем; завершённые задачи, которые никто не забрал, уходят по TTL
+        self.fight_timeout_tasks: BoundedStore = BoundedStore(
+            "fight_timeout_tasks", maxsize=20000, ttl=3600, can_evict=lambda task: task.done()
+        )
 
     def _is_owner(self, user_id: int) -> bool:
         return int(user_id) == self.OWNER_ID
@@ -5327,8 +5407,8 @@ _«Прими этот дар — и помни, океан всегда смо
     async def _safe_send_message(self, **kwargs):
         for attempt in range(3):
             try:
-                async with get_text_send_semaphore():
-                    return await self.application.bot.send_message(**kwargs)
+                # Семафор и лимиты берёт сам EmojiBot; второй слот здесь только держал бы очередь
+                return await self.application.bot.send_message(**kwargs)
             except (BadRequest, Forbidden) as e:
                 exc_str = str(e)
                 exc_lower = exc_str.lower()
@@ -5348,8 +5428,7 @@ _«Прими этот дар — и помни, океан всегда смо
                         kwargs.get('chat_id'),
                     )
                     try:
-                        async with get_text_send_semaphore():
-                            return await self.application.bot.send_message(**retry_kwargs)
+                        return await self.application.bot.send_message(**retry_kwargs)
                     except Exception as retry_exc:
                         logger.warning(
                             "_safe_send_message: fallback without reply_to_message_id failed (chat_id=%s): %s",
@@ -5487,8 +5566,7 @@ _«Прими этот дар — и помни, океан всегда смо
     async def _safe_edit_message_text(self, **kwargs):
         for attempt in range(3):
             try:
-                async with get_text_send_semaphore():
-                    return await self.application.bot.edit_message_text(**kwargs)
+                return await self.application.bot.edit_message_text(**kwargs)
             except (BadRequest, Forbidden) as e:
                 if "Message is not modified" in str(e):
                     return None
@@ -5622,55 +5700,41 @@ _«Прими этот дар — и помни, океан всегда смо
         """Периодический heartbeat-лог для мониторинга жизнеспособности бота"""
         try:
             logger.info("[HEARTBEAT] Bot is alive")
+            stores = [
+                _action_locks, self.user_locations, self.active_timeouts, self.active_invoices,
+                self.fight_sessions, self.catch_anchors, db._achievement_notifications, db._achievement_tiers,
+            ]
+            if self.application is not None:
+                stores.extend(
+                    v for v in self.application.bot_data.values() if isinstance(v, BoundedStore)
+                )
+            for store in stores:
+                store.sweep()
+            logger.info("[HEARTBEAT] stores: %s", [store.stats() for store in stores])
+            logger.info("[HEARTBEAT] telegram limiter: %s", get_outbound_limiter().stats())
+            if is_primary_shard():
+                logger.info("[HEARTBEAT] notifications: %s", await notifications.queue_metrics())
         except Exception as e:
             logger.error(f"Error in heartbeat: {e}")
     
     async def auto_recover_rods(self):
         """Автоматически восстанавливает прочность удочек игроков каждые 10 минут"""
         try:
-            with await _run_sync(db._connect) as conn:
-                cursor = conn.cursor()
-                # Получаем все удочки, у которых начато восстановление
-                cursor.execute('''
-                    SELECT user_id, rod_name, current_durability, max_durability, recovery_start_time
-                    FROM player_rods
-                    WHERE rod_name = ?
-                      AND recovery_start_time IS NOT NULL
-                      AND current_durability < max_durability
-                      AND (chat_id IS NULL OR chat_id < 1)
-                ''', (BAMBOO_ROD,))
-
-                rods = cursor.fetchall()
-                
-                for user_id, rod_name, current_dur, max_dur, recovery_start in rods:
-                    # Каждые 10 минут восстанавливается: max_dur / 30 прочности
-                    # (т.е. полное восстановление за 5 часов = 300 минут = 30 интервалов по 10 минут)
-                    recovery_amount = max(1, max_dur // 30)
-                    
-                    # Обновляем прочность
-                    new_durability = min(max_dur, current_dur + recovery_amount)
-                    
-                    cursor.execute('''
-                        UPDATE player_rods
-                        SET current_durability = ?
-                        WHERE user_id = ? AND (chat_id IS NULL OR chat_id < 1) AND rod_name = ?
-                    ''', (new_durability, user_id, rod_name))
-                    
-                    # Если удочка полностью восстановилась
-                    if new_durability == max_dur:
-                        cursor.execute('''
-                            UPDATE player_rods
-                            SET recovery_start_time = NULL
-                            WHERE user_id = ? AND (chat_id IS NULL OR chat_id < 1) AND rod_name = ?
-                        ''', (user_id, rod_name))
-                        # Уведомления в ЛС отключены, чтобы избежать 403 Forbidden
-                        logger.info(f"Rod fully recovered for user {user_id}: {rod_name}")
-                
-                conn.commit()
-                logger.info(f"Rod recovery job completed for {len(rods)} rods")
+            # Один UPDATE на все удочки, в пуле потоков — event loop не ждёт БД
+            result = await _run_sync(db.recover_rods_tick, BAMBOO_ROD)
         except Exception as e:
             logger.error(f"Error in auto_recover_rods: {e}")
-        
+            return
+        # Уведомления в ЛС отключены, чтобы избежать 403 Forbidden
+        logger.info(
+            "Rod recovery job completed: updated=%s fully_recovered=%s in %.1fms",
+            result['updated'],
+            len(result['recovered_user_ids']),
+            result['elapsed_ms'],
+        )
+        if result['recovered_user_ids']:
+            logger.debug("Rods fully recovered for users: %s", result['recovered_user_ids'])
+
     async def check_global_stop(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Pre-handler: блокирует обработку событий во время паузы бота."""
         if not self.is_global_stopped:
@@ -5714,14 +5778,16 @@ _«Прими этот дар — и помни, океан всегда смо
         # Запускаем scheduler при первом запросе
         if self.scheduler and not self.scheduler.running:
             self.scheduler.start()
-            # Добавляем job для автоматического восстановления удочек каждые 10 минут
-            self.scheduler.add_job(
-                self.auto_recover_rods,
-                'interval',
-                minutes=10,
-                id='auto_recover_rods',
-                replace_existing=True
-            )
+            # Добавляем job для автоматического восстановления удочек каждые 10 минут.
+            # Джоба глобальная (все игроки разом), поэтому её держит только шард 0.
+            if is_primary_shard():
+                self.scheduler.add_job(
+                    self.auto_recover_rods,
+                    'interval',
+                    minutes=10,
+                    id='auto_recover_rods',
+                    replace_existing=True
+                )
             # Добавляем heartbeat-лог каждую минуту
             self.scheduler.add_job(
                 self.heartbeat,
@@ -5944,12 +6010,12 @@ _«Прими этот дар — и помни, океан всегда смо
         chat_id = update.effective_chat.id
         current_username = update.effective_user.username or update.effective_user.first_name or str(user_id)
         
-        # Получаем весь контекст за один запрос к БД
-        context_data = await _run_sync(db.get_fishing_context, user_id, chat_id)
-        player = context_data.get('player')
-        effects = context_data.get('effects', {})
-        active_boat = context_data.get('active_boat')
-        has_antibot_block = context_data.get('has_antibot_block')
+        # Получаем весь контекст за одно подключение к БД
+        fishing_ctx = await _get_fishing_context(user_id, chat_id)
+        player = fishing_ctx.player
+        effects = fishing_ctx.effects
+        active_boat = fishing_ctx.active_boat
+        has_antibot_block = fishing_ctx.has_antibot_block
 
         if not player:
             # Автоматически создаём профиль в этом чате при первом использовании /fish
@@ -5995,8 +6061,8 @@ _«Прими этот дар — и помни, океан всегда смо
                 await self._send_antibot_block_to_user(update, antibot_active_block)
                 return
 
-        # Проверяем кулдаун
-        can_fish, message = await _run_sync(game.can_fish, user_id, chat_id)
+        # Проверяем кулдаун (профиль мог быть только что создан — тогда контекст пуст)
+        can_fish, message = await _check_can_fish(user_id, chat_id, fishing_ctx)
         if not can_fish:
             # Если удочка сломалась — предлагаем ремонт за 20 ⭐ (НЕ платный заброс)
             if "сломалась" in message:
@@ -6059,7 +6125,8 @@ _«Прими этот дар — и помни, океан всегда смо
             location_changed, consecutive_casts, show_warning = await _run_sync(
                 db.update_population_state,
                 user_id,
-                player['current_location']
+                player['current_location'],
+                fishing_ctx,
             )
 
             # Если игрок достиг 30 отдельных забросов на одной локации - показываем предупреждение
@@ -6084,7 +6151,10 @@ _«Прими этот дар — и помни, океан всегда смо
                 except Exception as e:
                     logger.error(f"Error sending population warning: {e}")
 
-            result = await _run_sync(game.fish, user_id, chat_id, player['current_location'])
+            # Контекст уже прочитан выше; если профиль только что создан, fish() перечитает его сам
+            result = await _run_sync(
+                game.fish, user_id, chat_id, player['current_location'], ctx=fishing_ctx,
+            )
 
             storm_result = await self._maybe_trigger_boat_storm(user_id, result)
             if storm_result and storm_result.get('applied'):
@@ -10191,14 +10261,9 @@ _«Прими этот дар — и помни, океан всегда смо
 
         total_value = int(sum(int(item.get('price') or 0) for item in unsold_trash))
         fish_ids = [int(item['id']) for item in unsold_trash]
-        player = await _run_sync(db.get_player, user_id, chat_id)
-        old_balance = int((player or {}).get('coins', 0) or 0)
-
-        await _run_sync(db.mark_fish_as_sold, fish_ids)
-        await _run_sync(db.update_player, user_id, chat_id, coins=old_balance + total_value)
-
         xp_earned = len(unsold_trash)
-        level_info = await _run_sync(db.add_player_xp, user_id, chat_id, xp_earned)
+        sale = await _sell_caught_fish(user_id, chat_id, fish_ids, total_value, xp_earned)
+        level_info = sale['level_info']
 
         await query.edit_message_text(
             "✅ Мусор продан\n\n"
@@ -10206,7 +10271,7 @@ _«Прими этот дар — и помни, океан всегда смо
             f"Получено: {total_value} 🪙\n"
             f"Опыт: +{xp_earned}\n"
             f"{format_level_progress(level_info)}\n"
-            f"Новый баланс: {old_balance + total_value} 🪙",
+            f"Новый баланс: {sale['balance']} 🪙",
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("🗑️ К мусору", callback_data=f"inv_trash_{user_id}")],
                 [InlineKeyboardButton("◀️ В инвентарь", callback_data=f"inventory_{user_id}")],
@@ -10784,12 +10849,9 @@ _«Прими этот дар — и помни, океан всегда смо
         
         if len(species_fish) == 1:
             total_value = species_fish[0]['price']
-            player = await _run_sync(db.get_player, user_id, chat_id)
-            await _run_sync(db.mark_fish_as_sold, [species_fish[0]['id']])
-            await _run_sync(db.update_player, user_id, chat_id, coins=player['coins'] + total_value)
-
             xp_earned, base_xp, rarity_bonus, weight_bonus, total_weight = calculate_sale_summary([species_fish[0]])
-            level_info = await _run_sync(db.add_player_xp, user_id, chat_id, xp_earned)
+            sale = await _sell_caught_fish(user_id, chat_id, [species_fish[0]['id']], total_value, xp_earned)
+            level_info = sale['level_info']
             progress_line = format_level_progress(level_info)
             total_xp_now = level_info.get('xp_total', 0)
             
@@ -10802,7 +10864,7 @@ _«Прими этот дар — и помни, океан всегда смо
 ✨ Опыт итого: +{xp_earned}
 📈 Всего опыта: {total_xp_now}
 {progress_line}
-Новый баланс: {player['coins'] + total_value} 🪙"""
+Новый баланс: {sale['balance']} 🪙"""
             
             keyboard = [
                 [InlineKeyboardButton("🐟 Назад в лавку", callback_data=f"sell_fish_{user_id}")],
@@ -10910,13 +10972,10 @@ _«Прими этот дар — и помни, океан всегда смо
         total_value = sum(f['price'] for f in unsold_fish)
         fish_count = len(unsold_fish)
         
-        player = await _run_sync(db.get_player, user_id, chat_id)
         fish_ids = [f['id'] for f in unsold_fish]
-        await _run_sync(db.mark_fish_as_sold, fish_ids)
-        await _run_sync(db.update_player, user_id, chat_id, coins=player['coins'] + total_value)
-
         xp_earned, base_xp, rarity_bonus, weight_bonus, total_weight = calculate_sale_summary(unsold_fish)
-        level_info = await _run_sync(db.add_player_xp, user_id, chat_id, xp_earned)
+        sale = await _sell_caught_fish(user_id, chat_id, fish_ids, total_value, xp_earned)
+        level_info = sale['level_info']
         progress_line = format_level_progress(level_info)
         total_xp_now = level_info.get('xp_total', 0)
         
@@ -10929,7 +10988,7 @@ _«Прими этот дар — и помни, океан всегда смо
 ✨ Опыт итого: +{xp_earned}
 📈 Всего опыта: {total_xp_now}
     {progress_line}
-Новый баланс: {player['coins'] + total_value} 🪙"""
+Новый баланс: {sale['balance']} 🪙"""
         
         keyboard = [
             [InlineKeyboardButton("🔙 В меню", callback_data=f"back_to_menu_{user_id}")]
@@ -12899,12 +12958,9 @@ _«Прими этот дар — и помни, океан всегда смо
             selected = [items[idx - 1] for idx in indices]
             fish_ids = [f['id'] for f in selected]
             total_value = sum(f['price'] for f in selected)
-            player = await _run_sync(db.get_player, user_id, chat_id)
-            await _run_sync(db.mark_fish_as_sold, fish_ids)
-            await _run_sync(db.update_player, user_id, chat_id, coins=player['coins'] + total_value)
-
             xp_earned, base_xp, rarity_bonus, weight_bonus, total_weight = calculate_sale_summary(selected)
-            level_info = await _run_sync(db.add_player_xp, user_id, chat_id, xp_earned)
+            sale = await _sell_caught_fish(user_id, chat_id, fish_ids, total_value, xp_earned)
+            level_info = sale['level_info']
             progress_line = format_level_progress(level_info)
             total_xp_now = level_info.get('xp_total', 0)
 
@@ -12923,7 +12979,7 @@ _«Прими этот дар — и помни, океан всегда смо
                 f"✨ Опыт итого: +{xp_earned}\n"
                 f"📈 Всего опыта: {total_xp_now}\n"
                 f"{progress_line}\n"
-                f"Новый баланс: {player['coins'] + total_value} 🪙",
+                f"Новый баланс: {sale['balance']} 🪙",
                 reply_markup=reply_markup
             )
             return
@@ -13002,12 +13058,9 @@ _«Прими этот дар — и помни, океан всегда смо
 
             fish_ids = [f['id'] for f in species_fish[:qty]]
             total_value = sum(f['price'] for f in species_fish[:qty])
-            player = await _run_sync(db.get_player, user_id, chat_id)
-            await _run_sync(db.mark_fish_as_sold, fish_ids)
-            await _run_sync(db.update_player, user_id, chat_id, coins=player['coins'] + total_value)
-
             xp_earned, base_xp, rarity_bonus, weight_bonus, total_weight = calculate_sale_summary(species_fish[:qty])
-            level_info = await _run_sync(db.add_player_xp, user_id, chat_id, xp_earned)
+            sale = await _sell_caught_fish(user_id, chat_id, fish_ids, total_value, xp_earned)
+            level_info = sale['level_info']
             progress_line = format_level_progress(level_info)
             total_xp_now = level_info.get('xp_total', 0)
 
@@ -13028,7 +13081,7 @@ _«Прими этот дар — и помни, океан всегда смо
                 f"✨ Опыт итого: +{xp_earned}\n"
                 f"📈 Всего опыта: {total_xp_now}\n"
                 f"{progress_line}\n"
-                f"Новый баланс: {player['coins'] + total_value} 🪙",
+                f"Новый баланс: {sale['balance']} 🪙",
                 reply_markup=reply_markup
             )
             return
@@ -13338,7 +13391,7 @@ _«Прими этот дар — и помни, океан всегда смо
             return
         
         # Проверяем кулдаун
-        can_fish, message = game.can_fish(user_id, chat_id)
+        can_fish, message = await _check_can_fish(user_id, chat_id)
         if not can_fish:
             # Отправляем сообщение с причиной и кнопкой оплаты
             reply_markup = await self._build_guaranteed_invoice_markup(user_id, chat_id)
@@ -13467,7 +13520,7 @@ _«Прими этот дар — и помни, океан всегда смо
                                     reply_to_message_id=reply_to_id,
                                 )
                                 if sticker_message:
-                                    context.bot_data.setdefault("last_bot_stickers", {})[update.effective_chat.id] = sticker_message.message_id
+                                    await self._remember_bot_sticker(context, update.effective_chat.id, sticker_message.message_id)
                             except Exception as send_exc:
                                 logger.error(f"[TRASH SEND ERROR] Could not send trash image for '{trash_name}' (file: {image_path}): {send_exc}")
                         else:
@@ -13584,14 +13637,13 @@ _«Прими этот дар — и помни, океан всегда смо
                 reply_to_message_id=reply_anchor_id
             )
             if sticker_message:
-                context.bot_data.setdefault("last_bot_stickers", {})[update.effective_chat.id] = sticker_message.message_id
-                context.bot_data.setdefault("sticker_fish_map", {})[sticker_message.message_id] = {
+                await self._remember_bot_sticker(context, update.effective_chat.id, sticker_message.message_id, {
                     "fish_name": fish['name'],
                     "weight": weight,
                     "price": fish_price,
                     "location": result['location'],
                     "rarity": fish['rarity']
-                }
+                })
             
             await self._safe_send_message(
                 chat_id=update.effective_chat.id,
@@ -13711,7 +13763,7 @@ _«Прими этот дар — и помни, океан всегда смо
                     reply_to_message_id=reply_anchor_id
                 )
                 if sticker_message:
-                    context.bot_data.setdefault("last_bot_stickers", {})[update.effective_chat.id] = sticker_message.message_id
+                    await self._remember_bot_sticker(context, update.effective_chat.id, sticker_message.message_id)
 
                 await self._safe_send_message(
                     chat_id=update.effective_chat.id,
@@ -14974,6 +15026,41 @@ _«Прими этот дар — и помни, океан всегда смо
             if existing.get("refund_status") != "ref":
                 await _run_sync(db.update_star_refund_status, telegram_payment_charge_id, "need to ban")
     
+    async def _remember_bot_sticker(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        message_id: int,
+        fish_meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Запомнить последний стикер улова в чате для handle_sticker.
+
+        Ответить стикером может любой участник чата, и его апдейт придёт на его шард,
+        поэтому при нескольких шардах состояние живёт в БД, а не в bot_data.
+        """
+        if shard_count() > 1:
+            try:
+                await _run_sync(db.remember_bot_sticker, chat_id, message_id, fish_meta)
+            except Exception:
+                logger.exception("Failed to remember bot sticker chat=%s message=%s", chat_id, message_id)
+            return
+        context.bot_data.setdefault("last_bot_stickers", {})[chat_id] = message_id
+        if fish_meta:
+            context.bot_data.setdefault("sticker_fish_map", {})[message_id] = fish_meta
+
+    async def _lookup_bot_sticker_fish(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        message_id: int,
+    ) -> Optional[Dict[str, Any]]:
+        """Данные рыбы, если message_id — последний стикер улова бота в чате."""
+        if shard_count() > 1:
+            return await _run_sync(db.get_bot_sticker_fish, chat_id, message_id)
+        if context.bot_data.get("last_bot_stickers", {}).get(chat_id) != message_id:
+            return None
+        return context.bot_data.get("sticker_fish_map", {}).get(message_id)
+
     async def handle_sticker(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка полученного стикера - отправка информации о рыбе"""
         if not update.message.sticker:
@@ -14987,12 +15074,7 @@ _«Прими этот дар — и помни, океан всегда смо
         if not reply.from_user.is_bot:
             return
 
-        last_bot_stickers = context.bot_data.get("last_bot_stickers", {})
-        if last_bot_stickers.get(update.effective_chat.id) != reply.message_id:
-            return
-
-        fish_info_map = context.bot_data.get("sticker_fish_map", {})
-        fish_info = fish_info_map.get(reply.message_id)
+        fish_info = await self._lookup_bot_sticker_fish(context, update.effective_chat.id, reply.message_id)
         if not fish_info:
             return
 
@@ -15180,12 +15262,13 @@ def _acquire_single_instance_lock() -> bool:
         try:
             conn = db._connect()
             cursor = conn.cursor()
-            cursor.execute('SELECT pg_try_advisory_lock(%s)', (BOT_INSTANCE_LOCK_KEY,))
+            # Каждый шард держит свой advisory lock: ключ сдвигается на номер шарда
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', (BOT_INSTANCE_LOCK_KEY + shard_index(),))
             row = cursor.fetchone()
             got_lock = bool(row and row[0])
             if got_lock:
                 _bot_instance_lock_conn = conn
-                logger.info('Single-instance polling lock acquired via Postgres advisory lock')
+                logger.info('Single-instance polling lock acquired via Postgres advisory lock (shard %s/%s)', shard_index(), shard_count())
                 return True
 
             try:
@@ -15204,6 +15287,8 @@ def _acquire_single_instance_lock() -> bool:
         return True
 
     lock_path = os.getenv('BOT_SINGLE_INSTANCE_LOCK_FILE', '/tmp/fishbot_polling.lock')
+    if shard_index():
+        lock_path = f"{lock_path}.{shard_index()}"
     lock_file = None
     try:
         lock_file = open(lock_path, 'w')
@@ -15343,9 +15428,19 @@ def main():
         try:
             await get_http_session()
             await init_async_storage()
-            # Ensure DB table exists synchronously, then schedule the async worker
+            # Write-behind статистики улова — только в процессе бота, не у каждого импортёра database
+            loop = asyncio.get_running_loop()
+            db.start_stats_flusher(on_unlocks=lambda user_id, unlocks: asyncio.run_coroutine_threadsafe(
+                bot_instance.announce_achievement_unlocks(user_id, unlocks), loop
+            ))
+            # События на локациях: истечение и старты — фоновым тиком, заброс читает снимок
+            db.start_location_events_ticker()
+            # Ensure DB table exists synchronously, then schedule the async worker.
+            # Очередь уведомлений общая для всех шардов: на Postgres её разбирает каждый шард
+            # своей долей отправителей и своим ведром лимитов, на SQLite — только шард 0.
             notifications.init_notifications_table()
-            await notifications.start_worker(application)
+            if notifications.runs_on_this_shard():
+                await notifications.start_worker(application)
             asyncio.create_task(bot_instance.warm_up_image_file_id_cache(application.bot))
         except Exception as e:
             logger.exception("post_init: failed to start notifications worker: %s", e)
@@ -15355,6 +15450,10 @@ def main():
             await bot_instance._image_file_id_cache.save_if_dirty()
         except Exception:
             logger.exception("post_shutdown: failed to save image file_id cache")
+        try:
+            await _run_sync(db.flush_player_stats)
+        except Exception:
+            logger.exception("post_shutdown: failed to flush player stats")
         await close_global_clients()
 
     application = (
@@ -15368,6 +15467,9 @@ def main():
 
     # Устанавливаем приложение в экземпляр бота
     bot_instance.application = application
+    # Карты стикеров растут с каждым уловом — держим их ограниченными
+    application.bot_data["last_bot_stickers"] = BoundedStore("last_bot_stickers", maxsize=50000, ttl=24 * 3600)
+    application.bot_data["sticker_fish_map"] = BoundedStore("sticker_fish_map", maxsize=100000, ttl=48 * 3600)
     
     # --- PATCH BEGIN: BLOCK CONCURRENT UPDATES FOR SAME USER ---
     # Это исправляет рейс-кондишн (двойные нажатия, проскакивание КД),
@@ -15405,6 +15507,22 @@ def main():
         replace_existing=True,
         max_instances=1,
     )
+
+    async def prune_fish_sales_buckets():
+        try:
+            await _run_sync(db.prune_fish_sales_buckets)
+        except Exception:
+            logger.exception("prune_fish_sales_buckets failed")
+
+    if is_primary_shard():
+        bot_instance.scheduler.add_job(
+            prune_fish_sales_buckets,
+            "interval",
+            minutes=int(os.getenv('FISH_SALES_PRUNE_INTERVAL_MINUTES', '15')),
+            id="prune_fish_sales_buckets",
+            replace_existing=True,
+            max_instances=1,
+        )
     # Scheduler будет запущен после запуска приложения
     print("✅ Application создана успешно")
 
@@ -16159,13 +16277,28 @@ def main():
         port = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
         if not webhook_url:
             raise RuntimeError("WEBHOOK_URL is required for webhook mode")
-        logger.info("Starting PTB webhook server: listen=%s port=%s path=/%s public=%s/%s", listen, port, webhook_path, webhook_url, webhook_path)
+        logger.info(
+            "Starting PTB webhook server: shard=%s/%s listen=%s port=%s path=/%s public=%s/%s",
+            shard_index(), shard_count(), listen, port, webhook_path, webhook_url, webhook_path,
+        )
+        # Все шарды регистрируют один и тот же публичный URL (setWebhook идемпотентен),
+        # но сбрасывать накопившиеся апдейты должен только шард 0 — иначе поздно
+        # стартовавший шард выкинет апдейты, уже адресованные соседям.
+        # WEBHOOK_UNIX_SOCKET: webapp и бот в одном контейнере — слушаем Unix-сокет вместо TCP
+        unix_socket = os.getenv("WEBHOOK_UNIX_SOCKET") or None
+        if unix_socket:
+            try:
+                os.unlink(unix_socket)
+            except FileNotFoundError:
+                pass
+            logger.info("PTB webhook server listens on unix socket %s", unix_socket)
         application.run_webhook(
             listen=listen,
             port=port,
+            unix=unix_socket,
             url_path=webhook_path,
             webhook_url=f"{webhook_url}/{webhook_path}",
-            drop_pending_updates=True,
+            drop_pending_updates=is_primary_shard(),
             allowed_updates=[
                 "message",
                 "callback_query",
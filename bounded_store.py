@@ -0,0 +1,203 @@
+"""Ограниченные по размеру и времени жизни словари для состояния процесса бота."""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+
+
+class BoundedStore(MutableMapping):
+    """Словарь с вытеснением по LRU и по времени простоя (TTL).
+
+    - `maxsize` — сколько ключей держать; при переполнении вытесняются самые давние.
+    - `ttl` — секунды с последнего обращения (чтение или запись), после которых ключ
+      считается устаревшим. None — без TTL.
+    - `can_evict(value)` — вернуть False, если значение сейчас нельзя выкинуть
+      (например, захваченный lock); такие ключи переживают и TTL, и переполнение.
+
+    Потокобезопасен (RLock), поэтому годится и для структур, которые трогают
+    потоки `_db_executor`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 10000,
+        ttl: Optional[float] = None,
+        can_evict: Optional[Callable[[Any], bool]] = None,
+        sweep_every: int = 256,
+    ):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl) if ttl else None
+        self._can_evict = can_evict
+        self._sweep_every = max(1, int(sweep_every))
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._touched: Dict[Hashable, float] = {}
+        self._lock = threading.RLock()
+        self._writes = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def _expired(self, key: Hashable, now: float) -> bool:
+        return self.ttl is not None and now - self._touched.get(key, now) > self.ttl
+
+    def _evictable(self, value: Any) -> bool:
+        return self._can_evict is None or self._can_evict(value)
+
+    def _drop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+        self._touched.pop(key, None)
+
+    def _sweep(self, now: float) -> None:
+        if self.ttl is not None:
+            # OrderedDict упорядочен по последнему обращению — старые ключи в начале
+            for key in list(self._data):
+                if not self._expired(key, now):
+                    break
+                if self._evictable(self._data[key]):
+                    self._drop(key)
+                    self.evicted_ttl += 1
+        overflow = len(self._data) - self.maxsize
+        if overflow > 0:
+            for key in list(self._data):
+                if overflow <= 0:
+                    break
+                if self._evictable(self._data[key]):
+                    self._drop(key)
+                    self.evicted_lru += 1
+                    overflow -= 1
+
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._data[key]
+            now = time.monotonic()
+            if self._expired(key, now) and self._evictable(value):
+                self._drop(key)
+                self.evicted_ttl += 1
+                raise KeyError(key)
+            self._data.move_to_end(key)
+            self._touched[key] = now
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._touched[key] = now
+            self._writes += 1
+            if len(self._data) > self.maxsize or self._writes % self._sweep_every == 0:
+                self._sweep(now)
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            del self._data[key]
+            self._touched.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            if self._expired(key, time.monotonic()) and self._evictable(self._data[key]):
+                self._drop(key)
+                self.evicted_ttl += 1
+                return False
+            return True
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                return self[key]
+            except KeyError:
+                self[key] = default
+                return default
+
+    def pop(self, key: Hashable, *args: Any) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._touched.pop(key, None)
+                return self._data.pop(key)
+            if args:
+                return args[0]
+            raise KeyError(key)
+
+    def sweep(self) -> None:
+        """Принудительно вычистить устаревшие ключи."""
+        with self._lock:
+            self._sweep(time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "evicted_lru": self.evicted_lru,
+                "evicted_ttl": self.evicted_ttl,
+            }
+
+    def __repr__(self) -> str:
+        return f"BoundedStore({self.name!r}, size={len(self)}, maxsize={self.maxsize}, ttl={self.ttl})"
+
+
+class _CountedLock(asyncio.Lock):
+    """asyncio.Lock со счётчиком задач, которые держат его или ждут в acquire()."""
+
+    def __init__(self):
+        super().__init__()
+        self.users = 0
+
+    async def acquire(self) -> bool:
+        self.users += 1
+        try:
+            return await super().acquire()
+        except BaseException:
+            self.users -= 1
+            raise
+
+    def release(self) -> None:
+        super().release()
+        self.users -= 1
+
+
+class BoundedLockMap(BoundedStore):
+    """Замена `defaultdict(asyncio.Lock)`: lock создаётся при первом обращении,
+    а простаивающие — вытесняются.
+
+    Вытесняется только lock без владельца и без ожидающих: сразу после release()
+    lock уже не `locked()`, но следующий ожидающий ещё не проснулся — если выкинуть
+    его в этот момент, новая задача получила бы другой lock и вошла параллельно.
+    Между выдачей `locks[key]` и вызовом acquire() в `async with` переключения
+    контекста нет, поэтому выданный lock не успевают вытеснить.
+    """
+
+    def __init__(self, name: str, maxsize: int = 100000, ttl: Optional[float] = 3600.0):
+        super().__init__(
+            name, maxsize=maxsize, ttl=ttl, can_evict=lambda lock: lock.users == 0 and not lock.locked()
+        )
+
+    def __getitem__(self, key: Hashable) -> asyncio.Lock:
+        with self._lock:
+            try:
+                return super().__getitem__(key)
+            except KeyError:
+                lock = _CountedLock()
+                self[key] = lock
+                return lock
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры тестов: `db._connect` без настоящего Postgres.
+
+- `fake_db` — записывает каждый запрос (SQL со схлопнутыми пробелами и параметры)
+  и отвечает тем, что вернёт `fake_db.handler(sql, params)`: None — пустой
+  результат, список кортежей — строки, `fake_db.result(...)` — строки с
+  колонками/rowcount.
+- `sqlite_db` — in-memory sqlite с LEAST/GREATEST, когда важен результат
+  запроса, а не его текст.
+"""
+import sqlite3
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import pytest
+
+from database import db
+
+
+class FakeResult:
+    def __init__(self, rows: Sequence[tuple] = (), columns: Optional[Sequence[str]] = None, rowcount: Optional[int] = None):
+        self.rows = list(rows)
+        self.columns = list(columns) if columns is not None else None
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+
+
+class FakeCursor:
+    def __init__(self, fake: "FakeDB"):
+        self._fake = fake
+        self.description = None
+        self.rowcount = -1
+        self._rows: List[tuple] = []
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self._fake.statements.append((sql, params))
+        result = self._fake.handler(sql, params)
+        if result is None:
+            result = FakeResult(rowcount=0)
+        elif not isinstance(result, FakeResult):
+            result = FakeResult(result)
+        self.description = [(c,) for c in result.columns] if result.columns is not None else None
+        self.rowcount = result.rowcount
+        self._rows = result.rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeDB:
+    def __init__(self):
+        self.statements: List[Tuple[str, Any]] = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.handler: Callable[[str, Any], Any] = lambda sql, params: None
+
+    @staticmethod
+    def result(rows: Sequence[tuple] = (), columns: Optional[Sequence[str]] = None, rowcount: Optional[int] = None) -> FakeResult:
+        return FakeResult(rows, columns, rowcount)
+
+    @property
+    def sql(self) -> List[str]:
+        return [sql for sql, _ in self.statements]
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for sql in self.sql if sql.startswith(prefix))
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(db, "_connect", lambda: fake)
+    return fake
+
+
+class _SqliteConn:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def commit(self):
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("LEAST", -1, min)
+    conn.create_function("GREATEST", -1, max)
+    monkeypatch.setattr(db, "_connect", lambda: _SqliteConn(conn))
+    yield conn
+    conn.close()
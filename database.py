@@ -1,17 +1,48 @@
+import ast
+import atexit
+import functools
+import hashlib
 import os
 import json
 import logging
 import random
 import secrets
 import re
+import threading
 import time
-from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from urllib.parse import urlparse
 
+from bounded_store import BoundedStore
 from config import DB_PATH
+from economy import (
+    BASE_XP_BY_RARITY,
+    LEVEL_XP_REQUIREMENTS,
+    LEVEL_XP_THRESHOLDS,
+    MAX_LEVEL,
+    RARITY_XP_MULTIPLIERS,
+    fish_sale_price,
+    item_xp_details,
+    level_from_xp,
+    level_progress,
+)
 from fish_activity import filter_fish_by_time, get_activity_for_fish_name
+from location_events import (
+    ECO_DISASTER_TYPE,
+    MURDER_EVENT_TYPE,
+    SCHOOL_EVENT_TYPE,
+    SPAWN_EVENT_TYPE,
+    calculate_event_chance,
+    calculate_event_cooldown_hours,
+    calculate_event_duration,
+    generate_event_params,
+)
+from leaderboard import Leaderboard, LeaderboardScope, LeaderboardStore
+from ticket_draw import draw_seed, first_probe_hit, probe_ticket_ids, sample_ticket_slots
 from achievements import (
     ACHIEVEMENTS,
     ACHIEVEMENT_BY_ID,
@@ -40,9 +71,12 @@ class PostgresConnWrapper:
             self._conn = dsn_or_conn
 
     def _translate_sql(self, sql: str) -> str:
+        # Набор SQL-строк в коде конечен — перевод кэшируется по исходному тексту
+        return _translate_sql_cached(sql)
+
+    @staticmethod
+    def _translate_sql_uncached(sql: str) -> str:
         s = sql
-        # normalize whitespace for pattern matching
-        import re
         # Replace SQLite AUTOINCREMENT with Postgres serial primary key
         s = re.sub(r"INTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT", 'SERIAL PRIMARY KEY', s, flags=re.IGNORECASE)
         # Also handle bare AUTOINCREMENT token
@@ -69,7 +103,6 @@ class PostgresConnWrapper:
         # Use a robust parser for matching parentheses instead of a fragile regex,
         # because VALUES(...) can contain nested parentheses (e.g. COALESCE, SELECT).
         try:
-            import re
             m = re.search(r"INSERT\s+OR\s+REPLACE\s+INTO\s+(\w+)", s, re.IGNORECASE)
             if m:
                 table = m.group(1)
@@ -167,6 +200,8 @@ class PostgresConnWrapper:
         out_sql = self._translate_sql(sql)
         if not out_sql:
             return FakeCursor([])
+        if out_sql.lstrip()[:6].upper() in _DDL_PREFIXES:
+            ENSURED_SCHEMAS.count_ddl()
 
         cur = self._conn.cursor()
         # psycopg2 expects a sequence/tuple for parameters
@@ -288,6 +323,125 @@ class PostgresConnWrapper:
         return False
 
 
+SQL_TRANSLATION_CACHE_SIZE = int(os.getenv("PG_SQL_TRANSLATION_CACHE_SIZE", "4096") or 4096)
+_SQL_EXECUTE_METHODS = {"execute", "executemany"}
+
+
+# Первые 6 символов оператора, по которым execute считает DDL
+_DDL_PREFIXES = frozenset({"CREATE", "ALTER ", "DROP T", "DROP I"})
+
+
+class EnsuredSchemas:
+    """Реестр `_ensure_*`-хелперов, уже отработавших в этом процессе, и счётчик DDL.
+
+    Хелпер с `@ensures_schema` выполняет свои CREATE ... IF NOT EXISTS не больше
+    одного раза на процесс; если схема уже на SCHEMA_VERSION, init_db помечает
+    все хелперы из bootstrap сразу, и рантайм не выполняет DDL вовсе.
+    """
+
+    def __init__(self):
+        self._done: set = set()
+        self._lock = threading.RLock()
+        self._ddl_statements = 0
+        self._runs = 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._done
+
+    def mark(self, *names: str) -> None:
+        with self._lock:
+            self._done.update(names)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._done.clear()
+
+    def count_ddl(self) -> None:
+        with self._lock:
+            self._ddl_statements += 1
+
+    def run_once(self, name: str, func, *args, **kwargs) -> None:
+        if name in self._done:
+            return
+        # RLock: составные хелперы вызывают другие хелперы под тем же локом
+        with self._lock:
+            if name in self._done:
+                return
+            func(*args, **kwargs)
+            self._runs += 1
+            self._done.add(name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ensured': sorted(self._done),
+                'helper_runs': self._runs,
+                'ddl_statements': self._ddl_statements,
+            }
+
+
+ENSURED_SCHEMAS = EnsuredSchemas()
+
+
+def ensures_schema(func):
+    """Выполнять DDL-хелпер не чаще раза на процесс (см. EnsuredSchemas)."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        ENSURED_SCHEMAS.run_once(func.__name__, func, self, *args, **kwargs)
+    return wrapper
+
+
+@functools.lru_cache(maxsize=SQL_TRANSLATION_CACHE_SIZE)
+def _translate_sql_cached(sql: str) -> str:
+    return PostgresConnWrapper._translate_sql_uncached(sql)
+
+
+def sql_translation_stats() -> Dict[str, int]:
+    """Счётчики LRU-кэша перевода SQLite -> Postgres SQL."""
+    info = _translate_sql_cached.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize or 0,
+    }
+
+
+def prewarm_sql_translation_cache(paths: Optional[List[Path]] = None) -> int:
+    """Перевести заранее все литеральные SQL из execute()/executemany() проекта.
+
+    Собирает строковые константы первым аргументом вызовов через AST, поэтому
+    ключи совпадают с теми строками, что придут в execute() во время работы.
+    Возвращает количество переведённых уникальных запросов.
+    """
+    if paths is None:
+        root = Path(__file__).resolve().parent
+        paths = sorted(root.glob("*.py")) + sorted((root / "webapp").glob("*.py"))
+    statements = set()
+    for path in paths:
+        try:
+            tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            logger.debug("SQL prewarm: skip %s", path)
+            continue
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            func = node.func
+            if not isinstance(func, ast.Attribute) or func.attr not in _SQL_EXECUTE_METHODS:
+                continue
+            first = node.args[0]
+            if isinstance(first, ast.Constant) and isinstance(first.value, str):
+                statements.add(first.value)
+    for sql in statements:
+        try:
+            _translate_sql_cached(sql)
+        except Exception:
+            logger.debug("SQL prewarm: failed to translate %r", sql[:200])
+    logger.info("SQL translation cache prewarmed: %s statements, stats=%s", len(statements), sql_translation_stats())
+    return len(statements)
+
+
 class FakeCursor:
     def __init__(self, rows):
         self._rows = rows
@@ -406,39 +560,6 @@ TEMP_ROD_RANGES = {
     "Удачливая удочка": (140, 160),
 }
 
-LEVEL_XP_REQUIREMENTS = [
-    100, 250, 700, 1450, 2500, 3850, 5500, 7450, 9700, 12250,
-    15100, 18250, 21700, 25450, 29500, 33850, 38500, 43450, 48700, 54250,
-    60100, 66250, 72700, 79450, 86500, 93850, 101500, 109450, 117700, 126250,
-    135100, 144250, 153700, 163450, 173500, 183850, 194500, 205450, 216700, 228250,
-    240100, 252250, 264700, 277450, 290500, 303850, 317500, 331450, 345700, 360250,
-    375100, 390250, 405700, 421450, 437500, 453850, 470500, 487450, 504700, 522250,
-    540100, 558250, 576700, 595450, 614500, 633850, 653500, 673450, 693700, 714250,
-    735100, 756250, 777700, 799450, 821500, 843850, 866500, 889450, 912700, 936250,
-    960100, 984250, 1008700, 1033450, 1058500, 1083850, 1109500, 1135450, 1161700, 1188250,
-    1215100, 1242250, 1269700, 1297450, 1325500, 1353850, 1382500, 1411450, 1440700, 1470250,
-]
-
-LEVEL_XP_THRESHOLDS = [0]
-for requirement in LEVEL_XP_REQUIREMENTS:
-    LEVEL_XP_THRESHOLDS.append(LEVEL_XP_THRESHOLDS[-1] + requirement)
-
-MAX_LEVEL = len(LEVEL_XP_REQUIREMENTS)
-
-BASE_XP_BY_RARITY = {
-    "Обычная": 5,
-    "Редкая": 20,
-    "Легендарная": 100,
-    "Мифическая": 50,
-}
-
-RARITY_XP_MULTIPLIERS = {
-    "Обычная": 1.0,
-    "Редкая": 1.1,
-    "Легендарная": 1.2,
-    "Мифическая": 1.15,
-}
-
 LIVE_BAIT_FISH_NAMES = ("Плотва", "Верховка")
 LIVE_BAIT_NAME = "Живец"
 
@@ -463,6 +584,444 @@ CLAN_UPGRADE_REQUIREMENTS = {
     },
 }
 
+# Версия схемы, которую ждёт код. Поднимать при любом изменении DDL, миграций или
+# справочников по умолчанию — тогда процессы при старте прогонят bootstrap.
+SCHEMA_VERSION = 3
+SCHEMA_MIGRATIONS_LOCK_ID = 987654320
+# Старты событий на локациях: тики шардов проверяют правила и вставляют по очереди
+LOCATION_EVENTS_START_LOCK_ID = 987654322
+# _ensure_* хелперы, которые выполняет bootstrap схемы (в прежнем порядке вызова)
+BOOTSTRAP_SCHEMA_HELPERS = (
+    '_ensure_boat_tables',
+    '_ensure_boat_catch_table',
+    '_ensure_boat_invites_table',
+    '_ensure_user_effects_table',
+    '_ensure_antibot_captcha_table',
+    '_ensure_duel_tables',
+    '_ensure_project_donations_table',
+    '_ensure_extended_gameplay_tables',
+    '_ensure_webapp_ui_tables',
+    '_ensure_booster_tables',
+    '_ensure_bot_stickers_table',
+)
+CATALOG_VERSION_FLAG = "catalog_version"
+# Отпечаток содержимого справочников, по которому старт решает, поднимать ли версию
+CATALOG_FINGERPRINT_FLAG = "catalog_fingerprint"
+# Как часто (в секундах) процесс сверяет свою версию каталога с system_flags
+CATALOG_VERSION_CHECK_SEC = float(os.getenv("CATALOG_VERSION_CHECK_SEC", "60") or 60)
+FISH_ENCYCLOPEDIA_MIGRATED_FLAG = "fish_encyclopedia_species_migrated"
+# Write-behind статистики улова: сброс раз в N мс или после N событий (0 — писать сразу)
+PLAYER_STATS_FLUSH_MS = max(0, int(os.getenv("PLAYER_STATS_FLUSH_MS", "500") or 0))
+PLAYER_STATS_FLUSH_EVENTS = max(1, int(os.getenv("PLAYER_STATS_FLUSH_EVENTS", "200") or 200))
+# Сколько часов хранить минутные корзины продаж (динамика цены смотрит на последний час)
+FISH_SALES_BUCKET_RETENTION_HOURS = max(1, int(os.getenv("FISH_SALES_BUCKET_RETENTION_HOURS", "3") or 3))
+FISH_ANY_SEASON_MARKERS = ("Все", "Круглый Год")
+# Поля билета, которые отдают случайные выборки и розыгрыши
+TICKET_ITEM_COLUMNS = "ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type"
+# Шаг планировщика событий на локациях: истечение, старты и публикация снимка
+LOCATION_EVENTS_TICK_SEC = max(1.0, float(os.getenv("LOCATION_EVENTS_TICK_SEC", "30") or 30))
+# Порядок, в котором заброс раньше пробовал запустить события (важен: на локации одно событие)
+LOCATION_EVENT_TYPES = (SPAWN_EVENT_TYPE, MURDER_EVENT_TYPE, SCHOOL_EVENT_TYPE)
+# Через сколько секунд перечитать погоду, если строка в БД уже просрочена
+WEATHER_CACHE_RETRY_SEC = max(1.0, float(os.getenv("WEATHER_CACHE_RETRY_SEC", "30") or 30))
+# Таблицы лидеров (leaderboard.py): перечитать доску из БД через N секунд / выкинуть после простоя
+LEADERBOARD_RELOAD_SEC = max(1.0, float(os.getenv("LEADERBOARD_RELOAD_SEC", "60") or 60))
+LEADERBOARD_IDLE_SEC = max(LEADERBOARD_RELOAD_SEC, float(os.getenv("LEADERBOARD_IDLE_SEC", "900") or 900))
+
+
+def _rows_to_dicts(cursor) -> List[Dict[str, Any]]:
+    rows = cursor.fetchall() or []
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def fish_species_key(name: Any) -> str:
+    """Ключ вида рыбы в энциклопедии: нормализованное имя (id в fish не стабилен между версиями справочника)."""
+    return str(name or '').strip().lower()
+
+
+def catalog_fingerprint(*tables: List[Any]) -> str:
+    """Хэш содержимого справочников, не зависящий от порядка строк."""
+    digest = hashlib.sha256()
+    for rows in tables:
+        encoded = sorted(json.dumps(row, sort_keys=True, ensure_ascii=False, default=str) for row in rows)
+        digest.update(json.dumps(encoded, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Порядок книги: сначала редкие виды, внутри редкости — по имени
+WEBAPP_BOOK_ORDER_SQL = '''
+    CASE rarity
+        WHEN 'Аномалия' THEN 6
+        WHEN 'Мифическая' THEN 5
+        WHEN 'Легендарная' THEN 4
+        WHEN 'Аквариумная' THEN 3
+        WHEN 'Редкая' THEN 2
+        ELSE 1
+    END DESC,
+    name ASC
+'''
+
+
+def webapp_book_item(index: int, row: Sequence[Any], stickers: Dict[str, str], caught_keys: set) -> Dict[str, Any]:
+    """Карточка книги webapp из строки (name, rarity, min/max weight, min/max length, locations, suitable_baits, price)."""
+    fish_name = str(row[0] or '')
+    rarity = str(row[1] or 'Обычная')
+    locations = str(row[6] or 'Неизвестно')
+    baits = str(row[7] or 'Неизвестно')
+    image_file = str(stickers.get(fish_name) or 'fishdef.webp')
+    is_caught = fish_species_key(fish_name) in caught_keys
+    return {
+        'index': index,
+        'name': fish_name,
+        'rarity': rarity,
+        'min_weight': round(float(row[2] or 0.0), 2),
+        'max_weight': round(float(row[3] or 0.0), 2),
+        'min_length': round(float(row[4] or 0.0), 1),
+        'max_length': round(float(row[5] or 0.0), 1),
+        'locations': locations,
+        'baits': baits,
+        'price': int(row[8] or 0),
+        'lore': (
+            f"{fish_name} чаще встречается в локациях: {locations}. "
+            f"Рекомендуемая наживка: {baits}."
+        ),
+        'is_caught': is_caught,
+        'catch_status': 'Поймана' if is_caught else 'НЕ СЛОВЛЕНА',
+        'image_url': f'/api/fish-image/{image_file}',
+    }
+
+
+class GameCatalog:
+    """Снимок статичных справочников (рыба, мусор, удочки, наживки, сети, локации).
+
+    Загружается одним подключением и дальше отдаёт данные из памяти.
+    Индексы по (локация, сезон) и по наживке строятся лениво и живут
+    столько же, сколько сам снимок.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        fish: List[Dict[str, Any]],
+        trash: List[Dict[str, Any]],
+        rods: List[Dict[str, Any]],
+        baits: List[Dict[str, Any]],
+        nets: List[Dict[str, Any]],
+        location_names: List[str],
+    ):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.fish = sorted(fish, key=lambda f: (str(f.get('rarity') or ''), int(f.get('id') or 0)))
+        self.fish_by_name = {str(f.get('name')): f for f in self.fish if f.get('name')}
+        self.fish_by_id = {int(f['id']): f for f in self.fish if f.get('id') is not None}
+        # Регистронезависимый поиск вида по имени (как LOWER(TRIM(name)) в SQL)
+        self.fish_by_key = {fish_species_key(f.get('name')): f for f in self.fish if f.get('name')}
+        self.trash = sorted(trash, key=lambda t: str(t.get('name') or ''))
+        self.rods = sorted(rods, key=lambda r: (int(r.get('price') or 0), int(r.get('id') or 0)))
+        self.rods_by_name = {str(r.get('name')): r for r in self.rods if r.get('name')}
+        self.rods_by_id = {int(r['id']): r for r in self.rods if r.get('id') is not None}
+        self.baits = sorted(baits, key=lambda b: str(b.get('name') or ''))
+        self.baits_by_id = {int(b['id']): b for b in self.baits if b.get('id') is not None}
+        self.nets = sorted(nets, key=lambda n: (int(n.get('price') or 0), int(n.get('id') or 0)))
+        self.nets_by_name = {str(n.get('name')): n for n in self.nets if n.get('name')}
+        self.location_names = sorted(set(location_names))
+
+        # fish_name -> None (подходит любая наживка) или множество наживок в нижнем регистре
+        self.fish_baits: Dict[str, Optional[frozenset]] = {}
+        for f in self.fish:
+            raw = f.get('suitable_baits')
+            if raw is None:
+                continue
+            if raw == "Все":
+                self.fish_baits[str(f['name'])] = None
+            else:
+                self.fish_baits[str(f['name'])] = frozenset(
+                    b.strip().lower() for b in str(raw).split(',') if b.strip()
+                )
+
+        self._fish_index: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._trash_index: Dict[str, List[Dict[str, Any]]] = {}
+        self._bait_index: Dict[str, frozenset] = {}
+
+    def fish_for_location(self, location: str, season: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Рыба локации (и сезона, если указан) — те же правила, что у LIKE-запроса."""
+        key = (location, season)
+        cached = self._fish_index.get(key)
+        if cached is not None:
+            return cached
+        result = []
+        for f in self.fish:
+            locations = f.get('locations')
+            if locations is None or location not in str(locations):
+                continue
+            if season is not None:
+                seasons = f.get('seasons')
+                if seasons is None:
+                    continue
+                seasons = str(seasons)
+                if season not in seasons and not any(m in seasons for m in FISH_ANY_SEASON_MARKERS):
+                    continue
+            result.append(f)
+        self._fish_index[key] = result
+        return result
+
+    def trash_for_location(self, location: str) -> List[Dict[str, Any]]:
+        cached = self._trash_index.get(location)
+        if cached is not None:
+            return cached
+        result = [
+            t for t in self.trash
+            if t.get('locations') == 'Все' or (t.get('locations') is not None and location in str(t['locations']))
+        ]
+        if not result:
+            result = list(self.trash)
+        self._trash_index[location] = result
+        return result
+
+    def is_bait_suitable(self, bait_name: Optional[str], fish_name: str) -> bool:
+        if fish_name not in self.fish_baits:
+            return False
+        suitable = self.fish_baits[fish_name]
+        if suitable is None:
+            return True
+        if not bait_name:
+            return False
+        return bait_name.strip().lower() in suitable
+
+    def fish_names_for_bait(self, bait_name: Optional[str]) -> frozenset:
+        """Имена рыб, которые клюют на эту наживку."""
+        key = (bait_name or '').strip().lower()
+        cached = self._bait_index.get(key)
+        if cached is not None:
+            return cached
+        names = frozenset(name for name in self.fish_baits if self.is_bait_suitable(bait_name, name))
+        self._bait_index[key] = names
+        return names
+
+
+BEER_EFFECT_BONUS = {
+    'beer_courage': 5.0,
+    'beer_lucky_wave': 3.0,
+    'beer_foamy_focus': 7.0,
+}
+
+
+@dataclass
+class FishingContext:
+    """Всё, что нужно одному забросу: профиль, удочка и модификаторы игрока.
+
+    Собирается Database.get_fishing_context за одно подключение к пулу.
+    """
+    user_id: int
+    chat_id: int
+    player: Optional[Dict[str, Any]] = None
+    rod: Optional[Dict[str, Any]] = None
+    player_rod: Optional[Dict[str, Any]] = None
+    # effect_type -> оставшиеся секунды (0 = без срока)
+    effects: Dict[str, float] = field(default_factory=dict)
+    active_boat: Optional[Dict[str, Any]] = None
+    has_antibot_block: bool = False
+    feeder_bonus: int = 0
+    clothing_bonus_percent: float = 0.0
+    beer_bonus_percent: float = 0.0
+    sea_god_bonus_percent: float = 0.0
+    population_penalty: float = 0.0
+    consecutive_casts: int = 0
+    # Снимок событий на локациях (общий для процесса, без обращения к БД)
+    location_events: Optional['LocationEventsSnapshot'] = None
+
+    @property
+    def is_on_boat(self) -> bool:
+        return self.active_boat is not None
+
+
+class PlayerStatsBuffer:
+    """Накопитель приращений статистики улова по пользователям (write-behind).
+
+    Только агрегация в памяти; запись в БД делает `Database.flush_player_stats`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._species: set = set()
+        self._events = 0
+
+    def record_catch(self, user_id: int, chat_id: Optional[int], fish_name: str, weight: float,
+                     is_trash: bool) -> int:
+        """Учесть один улов. Возвращает число событий, накопленных с прошлого сброса."""
+        uid = int(user_id)
+        weight = float(weight or 0.0)
+        with self._lock:
+            acc = self._pending.get(uid)
+            if acc is None:
+                acc = self._pending[uid] = {
+                    'fish': 0, 'fish_weight': 0.0, 'trash': 0, 'trash_weight': 0.0,
+                    'biggest_weight': 0.0, 'biggest_name': None, 'chat_id': None,
+                }
+            if is_trash:
+                acc['trash'] += 1
+                acc['trash_weight'] += weight
+            else:
+                acc['fish'] += 1
+                acc['fish_weight'] += weight
+                if weight > acc['biggest_weight']:
+                    acc['biggest_weight'] = weight
+                    acc['biggest_name'] = str(fish_name)
+                fish_key = fish_species_key(fish_name)
+                if fish_key:
+                    self._species.add((uid, fish_key))
+            if chat_id is not None:
+                acc['chat_id'] = chat_id
+            self._events += 1
+            return self._events
+
+    def has_pending(self, user_id: Optional[int] = None) -> bool:
+        with self._lock:
+            return bool(self._pending) if user_id is None else int(user_id) in self._pending
+
+    def drain(self, user_id: Optional[int] = None):
+        """Забрать накопленное: (приращения по пользователям, набор (user_id, fish_key)).
+
+        С user_id забирается только запись этого пользователя, остальные ждут общего сброса.
+        """
+        with self._lock:
+            if user_id is None:
+                pending, species = self._pending, self._species
+                self._pending, self._species, self._events = {}, set(), 0
+                return pending, species
+            uid = int(user_id)
+            acc = self._pending.pop(uid, None)
+            pending = {uid: acc} if acc is not None else {}
+            species = {pair for pair in self._species if pair[0] == uid}
+            self._species -= species
+            if acc is not None:
+                self._events = max(0, self._events - acc['fish'] - acc['trash'])
+        return pending, species
+
+    def restore(self, pending: Dict[int, Dict[str, Any]], species: set) -> None:
+        """Вернуть неудачно сброшенную пачку, слив её с тем, что пришло за время сброса."""
+        with self._lock:
+            for uid, old in pending.items():
+                acc = self._pending.get(uid)
+                if acc is None:
+                    self._pending[uid] = old
+                    continue
+                for key in ('fish', 'fish_weight', 'trash', 'trash_weight'):
+                    acc[key] += old[key]
+                if old['biggest_weight'] > acc['biggest_weight']:
+                    acc['biggest_weight'] = old['biggest_weight']
+                    acc['biggest_name'] = old['biggest_name']
+                if acc['chat_id'] is None:
+                    acc['chat_id'] = old['chat_id']
+            self._species |= species
+            self._events += len(pending)
+
+
+def _parse_event_params(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = json.loads(value) if isinstance(value, str) else {}
+    except Exception:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _event_datetime(value: Any) -> Optional[datetime]:
+    """Время из БД (datetime или ISO-строка) как naive UTC datetime."""
+    if value is None:
+        return None
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _location_key(location: Any) -> str:
+    # Как LOWER(TRIM(location)) в запросах событий
+    return str(location or '').strip().lower()
+
+
+@dataclass(frozen=True)
+class LocationEventsSnapshot:
+    """Неизменяемый снимок активных событий на всех локациях.
+
+    Публикует `Database.tick_location_events`; заброс читает его без обращения к БД.
+    События — read-only словари в формате get_active_location_event /
+    get_active_ecological_disaster; истёкшие по ends_at не отдаются и до следующего тика.
+    """
+    taken_at: float
+    # локация -> эко-катастрофа
+    eco_disasters: Mapping[str, Mapping[str, Any]] = field(default_factory=lambda: MappingProxyType({}))
+    # локация -> тип события -> событие
+    events: Mapping[str, Mapping[str, Mapping[str, Any]]] = field(default_factory=lambda: MappingProxyType({}))
+
+    @staticmethod
+    def _alive(event: Optional[Mapping[str, Any]], now: Optional[datetime]) -> Optional[Mapping[str, Any]]:
+        if event is None:
+            return None
+        ends_at = event.get('ends_at')
+        if ends_at is not None and ends_at <= (now or datetime.utcnow()):
+            return None
+        return event
+
+    def eco_disaster(self, location: str, now: Optional[datetime] = None) -> Optional[Mapping[str, Any]]:
+        return self._alive(self.eco_disasters.get(_location_key(location)), now)
+
+    def event(self, location: str, event_type: str, now: Optional[datetime] = None) -> Optional[Mapping[str, Any]]:
+        return self._alive(self.events.get(_location_key(location), {}).get(event_type), now)
+
+    @classmethod
+    def build(cls, eco_rows: List[Dict[str, Any]], event_rows: List[Dict[str, Any]]) -> 'LocationEventsSnapshot':
+        """Строки отсортированы по started_at DESC: на ключ берётся самое свежее событие."""
+        eco: Dict[str, Mapping[str, Any]] = {}
+        for row in eco_rows:
+            eco.setdefault(_location_key(row.get('location')), MappingProxyType(dict(row)))
+        events: Dict[str, Dict[str, Mapping[str, Any]]] = {}
+        for row in event_rows:
+            frozen = dict(row)
+            frozen['params'] = MappingProxyType(dict(row.get('params') or {}))
+            by_type = events.setdefault(_location_key(row.get('location')), {})
+            by_type.setdefault(str(row.get('event_type')), MappingProxyType(frozen))
+        return cls(
+            taken_at=time.monotonic(),
+            eco_disasters=MappingProxyType(eco),
+            events=MappingProxyType({loc: MappingProxyType(by_type) for loc, by_type in events.items()}),
+        )
+
+
+class LocationCastCounter:
+    """Забросы по локациям между тиками планировщика событий.
+
+    Шанс старта события задан на один заброс; тик бросает его за все N
+    забросов разом (1 - (1 - p) ** N), поэтому частота событий не меняется.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ключ локации -> [имя локации, забросы для эко-катастрофы, забросы для событий]
+        self._casts: Dict[str, List[Any]] = {}
+
+    def record(self, location: str, location_events: bool = True) -> None:
+        key = _location_key(location)
+        if not key:
+            return
+        with self._lock:
+            entry = self._casts.get(key)
+            if entry is None:
+                entry = self._casts[key] = [str(location).strip(), 0, 0]
+            entry[1] += 1
+            if location_events:
+                entry[2] += 1
+
+    def drain(self) -> List[List[Any]]:
+        with self._lock:
+            casts, self._casts = self._casts, {}
+        return list(casts.values())
+
+
 class Database:
     @staticmethod
     def get_safe_fish_column_name(fish_name: str) -> str:
@@ -476,6 +1035,71 @@ class Database:
             safe_name = encoded[:63].decode('utf-8', 'ignore')
         return safe_name
 
+    def _migrate_fish_species_by_id(self, conn) -> None:
+        """Перевести user_fish_species со старого ключа fish_id на fish_key.
+
+        id в fish менялись при каждом перезаполнении справочника, поэтому сохраняем только
+        строки, чей fish_id ещё указывает на рыбу, а широкую таблицу переносим заново.
+        """
+        if 'fish_id' not in self.get_table_columns('user_fish_species'):
+            return
+        cursor = conn.cursor()
+        cursor.execute('ALTER TABLE user_fish_species RENAME TO user_fish_species_by_id')
+        cursor.execute('''
+            CREATE TABLE user_fish_species (
+                user_id BIGINT NOT NULL,
+                fish_key TEXT NOT NULL,
+                first_caught_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, fish_key)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO user_fish_species (user_id, fish_key, first_caught_at)
+            SELECT s.user_id, LOWER(TRIM(f.name)), MIN(s.first_caught_at)
+            FROM user_fish_species_by_id s
+            JOIN fish f ON f.id = s.fish_id
+            GROUP BY s.user_id, LOWER(TRIM(f.name))
+            ON CONFLICT DO NOTHING
+        ''')
+        cursor.execute('DROP TABLE user_fish_species_by_id')
+        conn.commit()
+        self.refresh_schema_cache('user_fish_species')
+        self.set_system_flag(FISH_ENCYCLOPEDIA_MIGRATED_FLAG, '0')
+        logger.info("user_fish_species re-keyed by fish name")
+
+    def _migrate_wide_fish_encyclopedia(self, conn) -> None:
+        """Перенести отметки из широкой user_fish_encyclopedia (fish_<вид> = 1) в user_fish_species.
+
+        Широкая таблица после переноса не пишется и не удаляется: она остаётся
+        read-only источником на случай повторного переноса.
+        """
+        if self.get_system_flag(FISH_ENCYCLOPEDIA_MIGRATED_FLAG) == '1':
+            return
+        wide_columns = {
+            col for col in self.get_table_columns('user_fish_encyclopedia') if col.startswith('fish_')
+        }
+        cursor = conn.cursor()
+        moved = 0
+        if wide_columns:
+            cursor.execute('SELECT name FROM fish')
+            for (fish_name,) in cursor.fetchall():
+                fish_name = str(fish_name or '').strip()
+                column = Database.get_safe_fish_column_name(fish_name) if fish_name else None
+                if column not in wide_columns:
+                    continue
+                cursor.execute(
+                    f'''
+                    INSERT INTO user_fish_species (user_id, fish_key)
+                    SELECT user_id, ? FROM user_fish_encyclopedia WHERE {column} = 1
+                    ON CONFLICT DO NOTHING
+                    ''',
+                    (fish_species_key(fish_name),)
+                )
+                moved += max(0, cursor.rowcount or 0)
+        conn.commit()
+        self.set_system_flag(FISH_ENCYCLOPEDIA_MIGRATED_FLAG, '1')
+        logger.info("Fish encyclopedia migrated to user_fish_species: %s rows from %s columns", moved, len(wide_columns))
+
     def get_system_flag(self, key: str) -> Optional[str]:
         """Получить значение системного флага по ключу."""
         with self._connect() as conn:
@@ -492,62 +1116,152 @@ class Database:
             cursor.execute("INSERT OR REPLACE INTO system_flags (key, value) VALUES (?, ?)", (key, value))
             conn.commit()
 
-    def update_player_fish_stats(self, user_id: int, fish_name: str, weight: float, is_trash: bool = False):
-        """Обновить статистику пользователя при ловле рыбы."""
+    def update_player_fish_stats(self, user_id: int, fish_name: str, weight: float, is_trash: bool = False,
+                                 chat_id: Optional[int] = None) -> None:
+        """Учесть улов в статистике пользователя (счётчики, рекорд, энциклопедия).
+
+        Запись отложенная, только если процесс запустил `start_stats_flusher` (бот):
+        приращения копятся в `PlayerStatsBuffer` и пишутся пачкой в `flush_player_stats`
+        (фоновым потоком, по порогу событий и при завершении). В остальных процессах
+        (webapp, скрипты) запись сразу. Достижения по этим статам проверяются при записи.
+        """
+        events = self._stats_buffer.record_catch(user_id, chat_id, fish_name, weight, is_trash)
+        if PLAYER_STATS_FLUSH_MS <= 0 or self._stats_flusher is None or events >= PLAYER_STATS_FLUSH_EVENTS:
+            self.flush_player_stats()
+
+    def start_stats_flusher(
+        self, on_unlocks: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None
+    ) -> None:
+        """Включить write-behind статистики улова: фоновый поток сброса. Вызывает точка входа бота.
+
+        on_unlocks(user_id, unlocks) получает открытые при сбросе достижения (вместе с
+        накопленными ранее уведомлениями этого игрока); вызывается из потока сброса.
+        """
+        if on_unlocks is not None:
+            self._stats_unlock_listener = on_unlocks
+        if PLAYER_STATS_FLUSH_MS <= 0 or self._stats_flusher is not None:
+            return
+        with self._stats_flush_lock:
+            if self._stats_flusher is not None:
+                return
+            interval = PLAYER_STATS_FLUSH_MS / 1000.0
+
+            def _loop():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.flush_player_stats()
+                    except Exception:
+                        logger.exception("player stats flush failed")
+
+            self._stats_flusher = threading.Thread(target=_loop, name="player-stats-flush", daemon=True)
+            self._stats_flusher.start()
+            atexit.register(self.flush_player_stats)
+
+    def flush_player_stats(self, user_id: Optional[int] = None) -> int:
+        """Записать накопленную статистику улова (всю или одного пользователя).
+
+        Возвращает число обновлённых пользователей.
+        """
+        if user_id is not None and not self._stats_buffer.has_pending(user_id):
+            return 0
+        with self._stats_flush_lock:
+            pending, species = self._stats_buffer.drain(user_id)
+            if not pending and not species:
+                return 0
+            try:
+                changed = self._write_player_stats(pending, species)
+            except Exception:
+                self._stats_buffer.restore(pending, species)
+                raise
+
+        listener = self._stats_unlock_listener
+        for uid, stats in changed.items():
+            try:
+                self.evaluate_achievements(uid, chat_id=pending.get(uid, {}).get('chat_id'), stats=stats)
+            except Exception:
+                logger.exception("evaluate_achievements failed user_id=%s", uid)
+                continue
+            if listener is None:
+                continue
+            unlocks = self.drain_achievement_notifications(uid)
+            if unlocks:
+                try:
+                    listener(uid, unlocks)
+                except Exception:
+                    logger.exception("achievement unlock listener failed user_id=%s", uid)
+        return len(pending)
+
+    def _write_player_stats(self, pending: Dict[int, Dict[str, Any]], species: set) -> Dict[int, Dict[str, float]]:
+        """Один multi-row UPDATE players + один INSERT в энциклопедию. Возвращает новые значения статов."""
+        changed: Dict[int, Dict[str, float]] = {}
+        users = sorted(pending)  # фиксированный порядок блокировок строк players
         with self._connect() as conn:
             cursor = conn.cursor()
-            
-            # Обновляем энциклопедию (отмечаем, что рыба поймана)
-            if not is_trash:
-                # Создаем безопасное имя колонки
-                safe_column_name = Database.get_safe_fish_column_name(fish_name)
-                
-                # Создаем запись для пользователя если её нет
+            if species:
+                pairs = sorted(species)
                 cursor.execute(
-                    'INSERT INTO user_fish_encyclopedia (user_id) VALUES (?) ON CONFLICT (user_id) DO NOTHING',
-                    (int(user_id),)
-                )
-                
-                # Обновляем колонку для этой рыбы
-                try:
+                    'INSERT INTO user_fish_species (user_id, fish_key) VALUES '
+                    + ', '.join('(?, ?)' for _ in pairs)
+                    + ' ON CONFLICT DO NOTHING RETURNING user_id',
+                    [v for pair in pairs for v in pair],
+                )
+                new_species_users = sorted({int(r[0]) for r in cursor.fetchall() or []})
+                if new_species_users:
+                    # Новый вид — единственный случай, когда меняется unique_fish
                     cursor.execute(
-                        f'UPDATE user_fish_encyclopedia SET {safe_column_name} = 1 WHERE user_id = ?',
-                        (int(user_id),)
+                        'SELECT user_id, COUNT(*) FROM user_fish_species WHERE user_id IN ('
+                        + ', '.join('?' for _ in new_species_users) + ') GROUP BY user_id',
+                        new_species_users,
                     )
-                except Exception as e:
-                    logger.warning(f"Failed to update encyclopedia column {safe_column_name} for user {user_id}: {e}")
-            
-            # Обновляем статистику в players
-            if is_trash:
-                cursor.execute(
-                    '''
-                    UPDATE players 
-                    SET total_trash_caught = COALESCE(total_trash_caught, 0) + 1,
-                        total_trash_weight = COALESCE(total_trash_weight, 0) + ?
-                    WHERE user_id = ?
-                    ''',
-                    (float(weight), int(user_id))
-                )
-            else:
+                    for uid, cnt in cursor.fetchall() or []:
+                        changed.setdefault(int(uid), {})['unique_fish'] = float(cnt or 0)
+
+            if users:
                 cursor.execute(
                     '''
-                    UPDATE players 
-                    SET total_fish_caught = COALESCE(total_fish_caught, 0) + 1,
-                        total_weight_caught = COALESCE(total_weight_caught, 0) + ?,
-                        biggest_fish_name = CASE 
-                            WHEN COALESCE(biggest_fish_weight, 0) < ? THEN ?
-                            ELSE biggest_fish_name
+                    UPDATE players AS p
+                    SET total_fish_caught = COALESCE(p.total_fish_caught, 0) + v.fish,
+                        total_weight_caught = COALESCE(p.total_weight_caught, 0) + v.fish_weight,
+                        total_trash_caught = COALESCE(p.total_trash_caught, 0) + v.trash,
+                        total_trash_weight = COALESCE(p.total_trash_weight, 0) + v.trash_weight,
+                        biggest_fish_name = CASE
+                            WHEN COALESCE(p.biggest_fish_weight, 0) < v.biggest_weight THEN v.biggest_name
+                            ELSE p.biggest_fish_name
                         END,
-                        biggest_fish_weight = CASE 
-                            WHEN COALESCE(biggest_fish_weight, 0) < ? THEN ?
-                            ELSE biggest_fish_weight
-                        END
-                    WHERE user_id = ?
+                        biggest_fish_weight = GREATEST(COALESCE(p.biggest_fish_weight, 0), v.biggest_weight)
+                    FROM (VALUES ''' + ', '.join('(?, ?, ?, ?, ?, ?, ?)' for _ in users) + ''')
+                        AS v(user_id, fish, fish_weight, trash, trash_weight, biggest_weight, biggest_name)
+                    WHERE p.user_id = v.user_id
+                    RETURNING p.user_id, p.total_fish_caught, p.total_weight_caught,
+                              p.total_trash_caught, p.biggest_fish_weight
                     ''',
-                    (float(weight), float(weight), str(fish_name), float(weight), float(weight), int(user_id))
+                    [
+                        v
+                        for uid in users
+                        for v in (
+                            uid,
+                            int(pending[uid]['fish']),
+                            float(pending[uid]['fish_weight']),
+                            int(pending[uid]['trash']),
+                            float(pending[uid]['trash_weight']),
+                            float(pending[uid]['biggest_weight']),
+                            pending[uid]['biggest_name'],
+                        )
+                    ],
                 )
-            
+                for uid, fish_total, weight_total, trash_total, biggest in cursor.fetchall() or []:
+                    uid = int(uid)
+                    acc = pending.get(uid, {})
+                    stats = changed.setdefault(uid, {})
+                    if acc.get('fish'):
+                        stats['total_fish'] = max(stats.get('total_fish', 0.0), float(fish_total or 0))
+                        stats['total_weight'] = max(stats.get('total_weight', 0.0), float(weight_total or 0))
+                        stats['biggest_weight'] = max(stats.get('biggest_weight', 0.0), float(biggest or 0))
+                    if acc.get('trash'):
+                        stats['total_trash_caught'] = max(stats.get('total_trash_caught', 0.0), float(trash_total or 0))
             conn.commit()
+        return changed
 
     def update_player_sale_stats(self, user_id: int, weight: float, price: int, fish_count: int = 1):
         """Обновить статистику пользователя при продаже рыбы."""
@@ -560,12 +1274,18 @@ class Database:
                     total_coins_earned = COALESCE(total_coins_earned, 0) + ?,
                     total_fish_sold = COALESCE(total_fish_sold, 0) + ?
                 WHERE user_id = ?
+                RETURNING total_fish_sold, total_coins_earned
                 ''',
                 (float(weight), int(price), int(fish_count), int(user_id))
             )
+            rows = cursor.fetchall() or []
             conn.commit()
 
-        self.evaluate_achievements(int(user_id))
+        if rows:
+            self.evaluate_achievements(int(user_id), stats={
+                'sold_fish_count': float(max(r[0] or 0 for r in rows)),
+                'total_coins_earned': float(max(r[1] or 0 for r in rows)),
+            })
 
     def _collect_achievement_stats(self, user_id: int) -> Dict[str, float]:
         stats = self.get_player_stats(int(user_id), 0)
@@ -587,48 +1307,82 @@ class Database:
             "level": float(level),
         }
 
+    def _get_achievement_tiers(self, cursor, user_id: int) -> Dict[str, int]:
+        """Максимальные открытые уровни достижений пользователя (кэш процесса, один SELECT на пользователя)."""
+        with self._achievement_tiers_lock:
+            cached = self._achievement_tiers.get(user_id)
+        if cached is not None:
+            return cached
+        cursor.execute(
+            '''
+            SELECT achievement_id, MAX(tier)
+            FROM player_achievements
+            WHERE user_id = ?
+            GROUP BY achievement_id
+            ''',
+            (user_id,),
+        )
+        tiers = {str(ach_id): int(tier or 0) for ach_id, tier in cursor.fetchall() or []}
+        with self._achievement_tiers_lock:
+            return self._achievement_tiers.setdefault(user_id, tiers)
+
     def evaluate_achievements(
         self,
         user_id: int,
         chat_id: Optional[int] = None,
+        stats: Optional[Dict[str, float]] = None,
     ) -> List[Dict[str, Any]]:
-        """Проверить и выдать новые уровни достижений."""
+        """Проверить и выдать новые уровни достижений.
+
+        `stats` — новые значения только изменившихся статов (их возвращают
+        update_player_fish_stats / update_player_sale_stats / add_player_xp).
+        Проверяются лишь достижения на этих статах; без открытий запросов к БД нет.
+        Без `stats` статистика собирается целиком, как раньше.
+        """
         uid = int(user_id)
-        stat_values = self._collect_achievement_stats(uid)
-        newly_unlocked: List[Dict[str, Any]] = []
+        if stats is None:
+            stat_values = self._collect_achievement_stats(uid)
+            candidates = ACHIEVEMENTS
+        else:
+            stat_values = stats
+            candidates = [ach for ach in ACHIEVEMENTS if ach["stat"] in stats]
+        if not candidates:
+            return []
 
+        with self._achievement_tiers_lock:
+            known = self._achievement_tiers.get(uid)
+        targets: Dict[str, int] = {}
+        for ach in candidates:
+            target_tier = highest_reachable_tier(ach["id"], float(stat_values.get(ach["stat"]) or 0))
+            if target_tier > 0 and (known is None or target_tier > known.get(ach["id"], 0)):
+                targets[ach["id"]] = target_tier
+        if not targets:
+            return []
+
+        newly_unlocked: List[Dict[str, Any]] = []
         with self._connect() as conn:
             cursor = conn.cursor()
-            for ach in ACHIEVEMENTS:
+            tiers = self._get_achievement_tiers(cursor, uid)
+            for ach in candidates:
                 ach_id = ach["id"]
-                stat_key = ach["stat"]
-                current_value = float(stat_values.get(stat_key) or 0)
-                target_tier = highest_reachable_tier(ach_id, current_value)
-                if target_tier <= 0:
-                    continue
-
-                cursor.execute(
-                    '''
-                    SELECT COALESCE(MAX(tier), 0)
-                    FROM player_achievements
-                    WHERE user_id = ? AND achievement_id = ?
-                    ''',
-                    (uid, ach_id),
-                )
-                row = cursor.fetchone()
-                existing_max = int(row[0] or 0) if row else 0
+                target_tier = targets.get(ach_id, 0)
+                existing_max = tiers.get(ach_id, 0)
                 if target_tier <= existing_max:
                     continue
 
                 for tier_num in range(existing_max + 1, target_tier + 1):
+                    # RETURNING отсекает уровни, уже выданные другим процессом
                     cursor.execute(
                         '''
                         INSERT INTO player_achievements (user_id, achievement_id, tier)
                         VALUES (?, ?, ?)
                         ON CONFLICT (user_id, achievement_id, tier) DO NOTHING
+                        RETURNING tier
                         ''',
                         (uid, ach_id, tier_num),
                     )
+                    if cursor.fetchone() is None:
+                        continue
                     unlock = {
                         "achievement_id": ach_id,
                         "tier": tier_num,
@@ -638,6 +1392,8 @@ class Database:
                         "chat_id": int(chat_id) if chat_id is not None else None,
                     }
                     newly_unlocked.append(unlock)
+                with self._achievement_tiers_lock:
+                    tiers[ach_id] = target_tier
 
             conn.commit()
 
@@ -757,73 +1513,22 @@ class Database:
             "total_count": len(items),
         }
 
-    def get_user_fish_encyclopedia(self, user_id: int) -> Dict[str, bool]:
-        """Получить энциклопедию пойманных рыб пользователя."""
+    def get_caught_species_keys(self, user_id: int) -> set:
+        """Ключи (fish_species_key) видов рыб, которые пользователь уже ловил."""
         with self._connect() as conn:
             cursor = conn.cursor()
-            
-            # Получаем запись пользователя
-            cursor.execute(
-                'SELECT * FROM user_fish_encyclopedia WHERE user_id = ?',
-                (int(user_id),)
-            )
-            row = cursor.fetchone()
-            
-            if not row:
-                return {}
-            
-            # Получаем имена колонок
-            if self.is_postgres:
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'user_fish_encyclopedia' 
-                    AND table_schema = 'public'
-                    AND column_name LIKE 'fish_%'
-                    ORDER BY column_name
-                """)
-                columns = [r[0] for r in cursor.fetchall()]
-            else:
-                cursor.execute("PRAGMA table_info(user_fish_encyclopedia)")
-                columns = [r[1] for r in cursor.fetchall() if r[1].startswith('fish_')]
-            
-            # Получаем список всех рыб для маппинга
-            cursor.execute('SELECT name FROM fish ORDER BY name')
-            all_fish = cursor.fetchall()
-            
-            # Создаем обратный маппинг: имя колонки -> имя рыбы
-            column_to_fish = {}
-            for fish_row in all_fish:
-                fish_name = str(fish_row[0] or '').strip()
-                if not fish_name:
-                    continue
-                safe_column_name = Database.get_safe_fish_column_name(fish_name)
-                column_to_fish[safe_column_name] = fish_name
-            
-            # Получаем значения из строки пользователя
-            cursor.execute(
-                'SELECT * FROM user_fish_encyclopedia WHERE user_id = ?',
-                (int(user_id),)
-            )
-            row = cursor.fetchone()
-            
-            if not row:
-                return {}
-            
-            # Получаем описание колонок для маппинга индексов
-            column_names = [desc[0] for desc in cursor.description]
-            
-            # Создаем словарь: имя рыбы -> поймана (True/False)
-            result = {}
-            for col_name in columns:
-                if col_name in column_names:
-                    col_index = column_names.index(col_name)
-                    value = row[col_index]
-                    fish_name = column_to_fish.get(col_name)
-                    if fish_name:
-                        result[fish_name] = bool(value == 1)
-            
-            return result
+            cursor.execute('SELECT fish_key FROM user_fish_species WHERE user_id = ?', (int(user_id),))
+            return {str(row[0]) for row in cursor.fetchall()}
+
+    def get_user_fish_encyclopedia(self, user_id: int) -> Dict[str, bool]:
+        """Получить энциклопедию пойманных рыб пользователя."""
+        caught_keys = self.get_caught_species_keys(user_id)
+        if not caught_keys:
+            return {}
+        return {
+            str(fish['name']).strip(): fish_key in caught_keys
+            for fish_key, fish in self.get_catalog().fish_by_key.items()
+        }
 
     def migrate_caught_fish_to_stats(self):
         """Мигрировать данные из caught_fish в статистику players и энциклопедию.
@@ -916,63 +1621,19 @@ class Database:
             conn.commit()
             logger.info(f"Step 1/3 completed in {time.time() - start_time:.2f}s")
             
-            # Шаг 2: Создаем записи в энциклопедии для всех пользователей
-            step2_start = time.time()
-            logger.info("Step 2/3: Creating encyclopedia entries...")
+            # Шаг 2-3: Заполняем энциклопедию (какие рыбы пойманы) одним INSERT ... SELECT
+            step3_start = time.time()
+            logger.info("Step 2-3/3: Populating fish encyclopedia...")
             cursor.execute(
                 '''
-                INSERT INTO user_fish_encyclopedia (user_id)
-                SELECT DISTINCT user_id FROM players
-                ON CONFLICT (user_id) DO NOTHING
+                INSERT INTO user_fish_species (user_id, fish_key)
+                SELECT DISTINCT cf.user_id, LOWER(TRIM(f.name))
+                FROM caught_fish cf
+                JOIN fish f ON LOWER(TRIM(cf.fish_name)) = LOWER(TRIM(f.name))
+                WHERE cf.is_trash = 0 OR cf.is_trash IS NULL
+                ON CONFLICT DO NOTHING
                 '''
             )
-            conn.commit()
-            logger.info(f"Step 2/3 completed in {time.time() - step2_start:.2f}s")
-            
-            # Шаг 3: Заполняем энциклопедию (какие рыбы пойманы)
-            step3_start = time.time()
-            logger.info("Step 3/3: Populating fish encyclopedia...")
-            
-            # Получаем список всех рыб
-            cursor.execute('SELECT name FROM fish ORDER BY name')
-            all_fish = cursor.fetchall()
-            
-            # Создаем маппинг имени рыбы -> имя колонки
-            fish_column_map = {}
-            for fish_row in all_fish:
-                fish_name = str(fish_row[0] or '').strip()
-                if not fish_name:
-                    continue
-                safe_column_name = Database.get_safe_fish_column_name(fish_name)
-                fish_column_map[fish_name.lower()] = safe_column_name
-            
-            # Для каждой рыбы обновляем всех пользователей, кто её поймал (батчинг по рыбам)
-            total_fish = len(fish_column_map)
-            for idx, (fish_name_lower, column_name) in enumerate(fish_column_map.items(), 1):
-                try:
-                    # Один UPDATE для всех пользователей, кто поймал эту рыбу
-                    cursor.execute(
-                        f'''
-                        UPDATE user_fish_encyclopedia 
-                        SET {column_name} = 1 
-                        WHERE user_id IN (
-                            SELECT DISTINCT user_id 
-                            FROM caught_fish 
-                            WHERE LOWER(TRIM(fish_name)) = ? 
-                            AND (is_trash = 0 OR is_trash IS NULL)
-                        )
-                        ''',
-                        (fish_name_lower,)
-                    )
-                    
-                    # Коммитим каждые 10 рыб и логируем прогресс
-                    if idx % 10 == 0:
-                        conn.commit()
-                        logger.info(f"Progress: {idx}/{total_fish} fish processed ({idx*100//total_fish}%)")
-                        
-                except Exception as e:
-                    logger.warning(f"Failed to update {column_name}: {e}")
-            
             conn.commit()
             logger.info(f"Step 3/3 completed in {time.time() - step3_start:.2f}s")
             
@@ -1782,6 +2443,8 @@ class Database:
             for uid in members:
                 cursor.execute("DELETE FROM user_effects WHERE user_id = ? AND effect_type = 'seasick'", (uid,))
             conn.commit()
+            if inserted_count:
+                self.invalidate_leaderboards()
             logger.info(
                 "[boat] Возврат лодки %s завершён. assigned=%s inserted_to_caught_fish=%s skipped=%s results=%s",
                 boat_id,
@@ -1798,6 +2461,7 @@ class Database:
                     assigned_count,
                 )
             return results, boat_id, 'ok'
+    @ensures_schema
     def _ensure_boat_invites_table(self):
         """Создать таблицу boat_invites, если её нет."""
         with self._connect() as conn:
@@ -1956,6 +2620,7 @@ class Database:
         username = str(row[0] or '').strip()
         return username or None
 
+    @ensures_schema
     def _ensure_user_effects_table(self):
         """Создать таблицу user_effects, если её нет."""
         with self._connect() as conn:
@@ -2087,11 +2752,6 @@ class Database:
 
     def get_active_beer_bonus_percent(self, user_id: int) -> float:
         """Суммарный бонус от активных пивных эффектов."""
-        beer_effect_bonus = {
-            'beer_courage': 5.0,
-            'beer_lucky_wave': 3.0,
-            'beer_foamy_focus': 7.0,
-        }
         self._ensure_user_effects_table()
         now = datetime.utcnow()
         with self._connect() as conn:
@@ -2108,7 +2768,7 @@ class Database:
             total = 0.0
             for row in cursor.fetchall() or []:
                 effect_type = str(row[0] or '').strip().lower()
-                total += float(beer_effect_bonus.get(effect_type, 0.0))
+                total += float(BEER_EFFECT_BONUS.get(effect_type, 0.0))
             return float(total)
 
     def get_sea_god_catch_modifier_percent(self, user_id: int) -> float:
@@ -2266,6 +2926,7 @@ class Database:
             conn.commit()
         return True
 
+    @ensures_schema
     def _ensure_antibot_captcha_table(self):
         """Создать таблицу анти-абуза для капчи Mini App, если её нет."""
         with self._connect() as conn:
@@ -2300,6 +2961,7 @@ class Database:
 
             conn.commit()
 
+    @ensures_schema
     def _ensure_project_donations_table(self):
         """Таблица пожертвований проекту (Telegram Stars в личке с ботом)."""
         with self._connect() as conn:
@@ -2320,6 +2982,7 @@ class Database:
             ''')
             conn.commit()
 
+    @ensures_schema
     def _ensure_duel_tables(self):
         """Создать таблицы дуэлей и дневных бесплатных попыток."""
         with self._connect() as conn:
@@ -2376,6 +3039,7 @@ class Database:
             ''')
             conn.commit()
 
+    @ensures_schema
     def _ensure_extended_gameplay_tables(self):
         """Создать таблицы расширенных механик: экология, рынок, артели."""
         with self._connect() as conn:
@@ -2444,6 +3108,48 @@ class Database:
                 ON fish_sales_history (fish_name, sold_at)
             ''')
 
+            # Агрегаты продаж для динамики цены: минутные корзины по виду + время последней продажи.
+            # fish_key — нормализованное имя (_normalize_item_name), поиск идёт по первичному ключу.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fish_sales_buckets (
+                    fish_key TEXT NOT NULL,
+                    bucket_start TIMESTAMP NOT NULL,
+                    weight REAL NOT NULL DEFAULT 0,
+                    sales_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (fish_key, bucket_start)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_fish_sales_buckets_start
+                ON fish_sales_buckets (bucket_start)
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fish_sales_stats (
+                    fish_key TEXT PRIMARY KEY,
+                    last_sold_at TIMESTAMP NOT NULL
+                )
+            ''')
+            cursor.execute('SELECT 1 FROM fish_sales_stats LIMIT 1')
+            if cursor.fetchone() is None:
+                # Однократно переносим накопленную историю в агрегаты
+                since = (datetime.utcnow() - timedelta(hours=FISH_SALES_BUCKET_RETENTION_HOURS)).isoformat()
+                cursor.execute('''
+                    INSERT INTO fish_sales_stats (fish_key, last_sold_at)
+                    SELECT LOWER(TRIM(fish_name)), MAX(sold_at)
+                    FROM fish_sales_history
+                    WHERE sold_at IS NOT NULL
+                    GROUP BY LOWER(TRIM(fish_name))
+                    ON CONFLICT (fish_key) DO NOTHING
+                ''')
+                cursor.execute('''
+                    INSERT INTO fish_sales_buckets (fish_key, bucket_start, weight, sales_count)
+                    SELECT LOWER(TRIM(fish_name)), date_trunc('minute', sold_at), SUM(weight), COUNT(*)
+                    FROM fish_sales_history
+                    WHERE sold_at >= ?
+                    GROUP BY LOWER(TRIM(fish_name)), date_trunc('minute', sold_at)
+                    ON CONFLICT (fish_key, bucket_start) DO NOTHING
+                ''', (since,))
+
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS daily_fish_market (
                     id SERIAL PRIMARY KEY,
@@ -2496,6 +3202,7 @@ class Database:
             ''')
             conn.commit()
 
+    @ensures_schema
     def _ensure_webapp_ui_tables(self):
         """Создать таблицы для UI-разделов webapp (приключения/друзья/состояние)."""
         with self._connect() as conn:
@@ -2690,17 +3397,10 @@ class Database:
         return {str(k): int(v) for k, v in requirements.items()}
 
     def get_active_ecological_disaster(self, location: str) -> Optional[Dict[str, Any]]:
+        # Истёкшие гасит tick_location_events; здесь только чтение
         now = datetime.utcnow()
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                '''
-                UPDATE ecological_disasters
-                SET is_active = 0
-                WHERE is_active = 1 AND ends_at <= ?
-                ''',
-                (now,),
-            )
             cursor.execute(
                 '''
                 SELECT id, location, reward_type, reward_multiplier, started_at, ends_at, is_active
@@ -2713,11 +3413,9 @@ class Database:
             )
             row = cursor.fetchone()
             if not row:
-                conn.commit()
                 return None
 
             columns = [d[0] for d in cursor.description]
-            conn.commit()
             return dict(zip(columns, row))
 
     def start_ecological_disaster(
@@ -2727,35 +3425,51 @@ class Database:
         reward_multiplier: int = 5,
         duration_minutes: int = 60,
     ) -> Dict[str, Any]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (LOCATION_EVENTS_START_LOCK_ID,))
+            started = self._insert_ecological_disaster(
+                cursor, location, reward_type, reward_multiplier, duration_minutes
+            )
+            conn.commit()
+        self.invalidate_location_events()
+        return started
+
+    @staticmethod
+    def _insert_ecological_disaster(
+        cursor,
+        location: str,
+        reward_type: str,
+        reward_multiplier: int,
+        duration_minutes: int,
+    ) -> Dict[str, Any]:
+        """Погасить активную эко-катастрофу и вставить новую в транзакции вызывающего."""
         normalized_type = 'coins' if str(reward_type).strip().lower() in ('coins', 'coin', 'money') else 'xp'
         multiplier = max(2, int(reward_multiplier or 5))
         duration = max(5, int(duration_minutes or 60))
         now = datetime.utcnow()
         ends_at = now + timedelta(minutes=duration)
 
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                UPDATE ecological_disasters
-                SET is_active = 0
-                WHERE is_active = 1
-                '''
-            )
-            cursor.execute(
-                '''
-                INSERT INTO ecological_disasters (
-                    location, reward_type, reward_multiplier, started_at, ends_at, is_active
-                )
-                VALUES (?, ?, ?, ?, ?, 1)
-                RETURNING id, location, reward_type, reward_multiplier, started_at, ends_at, is_active
-                ''',
-                (location, normalized_type, multiplier, now, ends_at),
+        cursor.execute(
+            '''
+            UPDATE ecological_disasters
+            SET is_active = 0
+            WHERE is_active = 1
+            '''
+        )
+        cursor.execute(
+            '''
+            INSERT INTO ecological_disasters (
+                location, reward_type, reward_multiplier, started_at, ends_at, is_active
             )
-            row = cursor.fetchone()
-            columns = [d[0] for d in cursor.description] if cursor.description else []
-            conn.commit()
-            return dict(zip(columns, row)) if row else {}
+            VALUES (?, ?, ?, ?, ?, 1)
+            RETURNING id, location, reward_type, reward_multiplier, started_at, ends_at, is_active
+            ''',
+            (location, normalized_type, multiplier, now, ends_at),
+        )
+        row = cursor.fetchone()
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+        return dict(zip(columns, row)) if row else {}
 
     def stop_ecological_disaster(self, location: str) -> bool:
         with self._connect() as conn:
@@ -2770,7 +3484,8 @@ class Database:
             )
             changed = int(getattr(cursor, 'rowcount', 0) or 0)
             conn.commit()
-            return changed > 0
+        self.invalidate_location_events()
+        return changed > 0
 
     def get_any_active_ecological_disaster(self) -> Optional[Dict[str, Any]]:
         """Проверить, есть ли активная эко-катастрофа на любой из локаций."""
@@ -2793,46 +3508,6 @@ class Database:
             columns = [d[0] for d in cursor.description]
             return dict(zip(columns, row))
 
-    def maybe_start_ecological_disaster(self, location: str, chance: float = 0.0005) -> Optional[Dict[str, Any]]:
-        """Попытка начать эко-катастрофу (редко, макс. одна на все локации, длительность 1-2 часа, КД 3 часа)."""
-        # 1. Проверяем, есть ли УЖЕ активная катастрофа ГДЕ-ЛИБО
-        active_anywhere = self.get_any_active_ecological_disaster()
-        if active_anywhere:
-            # Если катастрофа активна на любой локации, новую начинать нельзя.
-            # Если текущая локация совпадает с активной — возвращаем её.
-            if self._normalize_item_name(active_anywhere['location']) == self._normalize_item_name(location):
-                return active_anywhere
-            return None
-
-        # 1.1 Проверяем КД (минимум 3 часа с момента окончания последней катастрофы)
-        now = datetime.utcnow()
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT ends_at FROM ecological_disasters ORDER BY ends_at DESC LIMIT 1')
-            last_end = cursor.fetchone()
-            if last_end:
-                last_end_dt = last_end[0]
-                if isinstance(last_end_dt, str):
-                    last_end_dt = datetime.fromisoformat(last_end_dt)
-                if now < last_end_dt + timedelta(hours=3):
-                    return None
-
-        # 2. Шанс срабатывания
-        if random.random() > float(chance):
-            return None
-
-        # 3. Начинаем новую катастрофу (длительность 60-120 минут)
-        duration = random.randint(60, 120)
-        reward_type = random.choice(['xp', 'coins'])
-        multiplier = random.randint(3, 7)
-        
-        return self.start_ecological_disaster(
-            location=location,
-            reward_type=reward_type,
-            reward_multiplier=multiplier,
-            duration_minutes=duration
-        )
-
     # ===== НОВАЯ СИСТЕМА СОБЫТИЙ =====
 
     def get_active_location_event(self, location: str, event_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -2840,17 +3515,7 @@ class Database:
         now = datetime.utcnow()
         with self._connect() as conn:
             cursor = conn.cursor()
-            # Сначала деактивируем истекшие события
-            cursor.execute(
-                '''
-                UPDATE location_events
-                SET is_active = 0
-                WHERE is_active = 1 AND ends_at <= ?
-                ''',
-                (now,)
-            )
-            conn.commit()
-            
+            # Истёкшие гасит tick_location_events; здесь только чтение
             # Получаем активное событие
             if event_type:
                 cursor.execute(
@@ -2934,17 +3599,7 @@ class Database:
         now = datetime.utcnow()
         with self._connect() as conn:
             cursor = conn.cursor()
-            # Сначала деактивируем истекшие события
-            cursor.execute(
-                '''
-                UPDATE location_events
-                SET is_active = 0
-                WHERE is_active = 1 AND ends_at <= ?
-                ''',
-                (now,)
-            )
-            conn.commit()
-            
+            # Истёкшие гасит tick_location_events; здесь только чтение
             cursor.execute(
                 '''
                 SELECT id, event_type, location, started_at, ends_at, is_active, params
@@ -2982,35 +3637,49 @@ class Database:
         params: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Начать новое событие на локации."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (LOCATION_EVENTS_START_LOCK_ID,))
+            event_dict = self._insert_location_event(cursor, event_type, location, duration_minutes, params)
+            conn.commit()
+
+        self.invalidate_location_events()
+        return event_dict
+
+    @staticmethod
+    def _insert_location_event(
+        cursor,
+        event_type: str,
+        location: str,
+        duration_minutes: int,
+        params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Вставить событие на локации в транзакции вызывающего."""
         import json
         now = datetime.utcnow()
         ends_at = now + timedelta(minutes=duration_minutes)
         params_json = json.dumps(params, ensure_ascii=False)
-        
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                INSERT INTO location_events (
-                    event_type, location, started_at, ends_at, is_active, params
-                )
-                VALUES (?, ?, ?, ?, 1, ?)
-                RETURNING id, event_type, location, started_at, ends_at, is_active, params
-                ''',
-                (event_type, location, now, ends_at, params_json)
+
+        cursor.execute(
+            '''
+            INSERT INTO location_events (
+                event_type, location, started_at, ends_at, is_active, params
             )
-            row = cursor.fetchone()
-            columns = [d[0] for d in cursor.description] if cursor.description else []
-            conn.commit()
-            
-            event_dict = dict(zip(columns, row)) if row else {}
-            if event_dict:
-                try:
-                    event_dict['params'] = json.loads(event_dict.get('params', '{}'))
-                except:
-                    event_dict['params'] = {}
-            
-            return event_dict
+            VALUES (?, ?, ?, ?, 1, ?)
+            RETURNING id, event_type, location, started_at, ends_at, is_active, params
+            ''',
+            (event_type, location, now, ends_at, params_json)
+        )
+        row = cursor.fetchone()
+        columns = [d[0] for d in cursor.description] if cursor.description else []
+
+        event_dict = dict(zip(columns, row)) if row else {}
+        if event_dict:
+            try:
+                event_dict['params'] = json.loads(event_dict.get('params', '{}'))
+            except:
+                event_dict['params'] = {}
+        return event_dict
 
     def stop_location_event(self, location: str, event_type: Optional[str] = None) -> bool:
         """Остановить событие на локации."""
@@ -3039,96 +3708,203 @@ class Database:
                 )
             changed = int(getattr(cursor, 'rowcount', 0) or 0)
             conn.commit()
-            return changed > 0
+        self.invalidate_location_events()
+        return changed > 0
 
-    def maybe_start_location_event(
-        self,
-        location: str,
-        event_type: str,
-        chance: float,
-        cooldown_hours: int
-    ) -> Optional[Dict[str, Any]]:
+    # ===== ПЛАНИРОВЩИК СОБЫТИЙ НА ЛОКАЦИЯХ =====
+
+    def note_location_cast(self, location: str, location_events: bool = True) -> None:
+        """Учесть заброс на локации для следующего тика планировщика (без БД).
+
+        location_events=False — заброс влияет только на эко-катастрофу
+        (гарантированный улов не запускал нерест/убийство/стаю).
         """
-        Попытаться начать событие на локации с учетом шанса и cooldown.
-        
-        ПРАВИЛА:
-        - Только ОДНО событие (любого типа) может быть активно на одной локации
-        - Каждый тип события может быть активен только на ОДНОЙ локации
-        
-        Args:
-            location: название локации
-            event_type: тип события
-            chance: шанс срабатывания (0.0 - 1.0)
-            cooldown_hours: часы cooldown после окончания события
-        
-        Returns:
-            словарь с данными события или None
+        self._location_casts.record(location, location_events=location_events)
+
+    def invalidate_location_events(self) -> None:
+        """Сбросить снимок событий: следующий заброс в этом процессе перечитает его."""
+        self._location_events = None
+
+    def get_location_events_snapshot(self) -> LocationEventsSnapshot:
+        """Текущий снимок активных событий для заброса.
+
+        В процессе с фоновым планировщиком (бот) снимок обновляет только он; без
+        него (webapp, скрипты) или после сброса снимок перечитывается тиком не чаще
+        раза в LOCATION_EVENTS_TICK_SEC.
         """
-        # 1. Проверяем, есть ли УЖЕ ЛЮБОЕ активное событие на этой локации
-        any_active_on_location = self.get_active_location_event(location, event_type=None)
-        if any_active_on_location:
-            # Если на этой локации уже есть событие, возвращаем его если это наш тип
-            if any_active_on_location['event_type'] == event_type:
-                return any_active_on_location
-            # Иначе нельзя начинать новое - локация занята
-            return None
-        
-        # 2. Проверяем, есть ли активное событие ЭТОГО типа где-либо еще
-        active_anywhere = self.get_any_active_location_event(event_type)
-        if active_anywhere:
-            # Если событие этого типа активно на другой локации - нельзя начинать
-            return None
-        
-        # 3. Проверяем cooldown
-        now = datetime.utcnow()
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                SELECT ends_at FROM location_events 
-                WHERE event_type = ? 
-                ORDER BY ends_at DESC 
-                LIMIT 1
-                ''',
-                (event_type,)
-            )
-            last_end = cursor.fetchone()
-            if last_end:
-                last_end_dt = last_end[0]
-                if isinstance(last_end_dt, str):
-                    last_end_dt = datetime.fromisoformat(last_end_dt)
-                if now < last_end_dt + timedelta(hours=cooldown_hours):
-                    return None
-            
-            # 4. Проверяем шанс
-            if random.random() > float(chance):
-                return None
-            
-            # 5. Начинаем событие
-            from location_events import calculate_event_duration, generate_event_params
-            
-            # Получаем рыб на локации для генерации параметров
-            location_fish = []
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                SELECT DISTINCT name 
-                FROM fish 
-                WHERE locations LIKE '%' || ? || '%'
-                ''',
-                (location,)
+        snapshot = self._location_events
+        if snapshot is not None and (
+            self._location_events_ticker is not None
+            or time.monotonic() - snapshot.taken_at < LOCATION_EVENTS_TICK_SEC
+        ):
+            return snapshot
+        try:
+            return self.tick_location_events()
+        except Exception:
+            logger.exception("location events tick failed")
+            return snapshot or LocationEventsSnapshot(taken_at=time.monotonic())
+
+    def start_location_events_ticker(self) -> None:
+        """Запустить фоновый планировщик событий на локациях. Вызывает точка входа бота."""
+        if self._location_events_ticker is not None:
+            return
+        with self._location_events_lock:
+            if self._location_events_ticker is not None:
+                return
+
+            def _loop():
+                while True:
+                    try:
+                        self.tick_location_events()
+                    except Exception:
+                        logger.exception("location events tick failed")
+                    time.sleep(LOCATION_EVENTS_TICK_SEC)
+
+            self._location_events_ticker = threading.Thread(target=_loop, name="location-events-tick", daemon=True)
+            self._location_events_ticker.start()
+
+    def tick_location_events(self) -> LocationEventsSnapshot:
+        """Один шаг планировщика: погасить истёкшие события, бросить старты, опубликовать снимок.
+
+        Старты бросаются только для локаций, где с прошлого тика были забросы, по тем же
+        правилам, что раньше на каждом забросе: одно событие на локации, каждый тип
+        (и эко-катастрофа) только на одной локации, КД после окончания, шанс на заброс.
+        Тикер есть у каждого шарда, поэтому тик со стартами берёт транзакционный
+        advisory-лок: активные строки читаются и старты вставляются под ним одной
+        транзакцией, и соседний шард видит уже запущенное.
+        """
+        with self._location_events_lock:
+            casts = self._location_casts.drain()
+            now = datetime.utcnow()
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                if casts:
+                    cursor.execute('SELECT pg_advisory_xact_lock(?)', (LOCATION_EVENTS_START_LOCK_ID,))
+                cursor.execute(
+                    'UPDATE ecological_disasters SET is_active = 0 WHERE is_active = 1 AND ends_at <= ?',
+                    (now,),
+                )
+                cursor.execute(
+                    'UPDATE location_events SET is_active = 0 WHERE is_active = 1 AND ends_at <= ?',
+                    (now,),
+                )
+                cursor.execute(
+                    '''
+                    SELECT id, location, reward_type, reward_multiplier, started_at, ends_at, is_active
+                    FROM ecological_disasters
+                    WHERE is_active = 1 AND ends_at > ?
+                    ORDER BY started_at DESC
+                    ''',
+                    (now,),
+                )
+                eco_rows = _rows_to_dicts(cursor)
+                cursor.execute(
+                    '''
+                    SELECT id, event_type, location, started_at, ends_at, is_active, params
+                    FROM location_events
+                    WHERE is_active = 1 AND ends_at > ?
+                    ORDER BY started_at DESC
+                    ''',
+                    (now,),
+                )
+                event_rows = _rows_to_dicts(cursor)
+                last_ends: Dict[str, Optional[datetime]] = {}
+                if casts:
+                    cursor.execute('SELECT MAX(ends_at) FROM ecological_disasters')
+                    row = cursor.fetchone()
+                    last_ends[ECO_DISASTER_TYPE] = _event_datetime(row[0]) if row else None
+                    cursor.execute('SELECT event_type, MAX(ends_at) FROM location_events GROUP BY event_type')
+                    for event_type, ends_at in cursor.fetchall() or []:
+                        last_ends[str(event_type)] = _event_datetime(ends_at)
+
+                for row in eco_rows + event_rows:
+                    row['started_at'] = _event_datetime(row.get('started_at'))
+                    row['ends_at'] = _event_datetime(row.get('ends_at'))
+                for row in event_rows:
+                    row['params'] = _parse_event_params(row.get('params'))
+
+                for location, eco_casts, event_casts in casts:
+                    self._roll_location_event_starts(
+                        cursor, location, eco_casts, event_casts, eco_rows, event_rows, last_ends, now
+                    )
+                conn.commit()
+
+            snapshot = LocationEventsSnapshot.build(eco_rows, event_rows)
+            self._location_events = snapshot
+            return snapshot
+
+    @staticmethod
+    def _rolled_for_casts(chance: float, casts: int) -> bool:
+        # Хотя бы один успех из `casts` независимых бросков с шансом `chance`
+        return random.random() < 1.0 - (1.0 - float(chance)) ** max(0, int(casts))
+
+    def _roll_location_event_starts(
+        self,
+        cursor,
+        location: str,
+        eco_casts: int,
+        event_casts: int,
+        eco_rows: List[Dict[str, Any]],
+        event_rows: List[Dict[str, Any]],
+        last_ends: Dict[str, Optional[datetime]],
+        now: datetime,
+    ) -> None:
+        """Попробовать запустить события на локации; новые события дописываются в *_rows.
+
+        Вставки идут через cursor тика — в его транзакции под advisory-локом.
+        """
+
+        def cooled_down(event_type: str) -> bool:
+            last_end = last_ends.get(event_type)
+            return last_end is None or now >= last_end + timedelta(hours=calculate_event_cooldown_hours(event_type))
+
+        # Эко-катастрофа: одна на все локации
+        if eco_casts and not eco_rows and cooled_down(ECO_DISASTER_TYPE) \
+                and self._rolled_for_casts(calculate_event_chance(ECO_DISASTER_TYPE), eco_casts):
+            params = generate_event_params(ECO_DISASTER_TYPE, [])
+            started = self._insert_ecological_disaster(
+                cursor,
+                location=location,
+                reward_type=params['reward_type'],
+                reward_multiplier=params['reward_multiplier'],
+                duration_minutes=calculate_event_duration(ECO_DISASTER_TYPE),
             )
-            location_fish = [row[0] for row in cursor.fetchall()]
-            
-            duration = calculate_event_duration(event_type)
-            params = generate_event_params(event_type, location_fish)
-            
-            return self.start_location_event(
+            if started:
+                started['started_at'] = _event_datetime(started.get('started_at'))
+                started['ends_at'] = _event_datetime(started.get('ends_at'))
+                eco_rows.insert(0, started)
+                last_ends[ECO_DISASTER_TYPE] = started['ends_at']
+
+        if not event_casts:
+            return
+        key = _location_key(location)
+        for event_type in LOCATION_EVENT_TYPES:
+            # Только одно событие на локации, и каждый тип — только на одной локации
+            if any(_location_key(row.get('location')) == key for row in event_rows):
+                return
+            if any(row.get('event_type') == event_type for row in event_rows):
+                continue
+            if not cooled_down(event_type):
+                continue
+            if not self._rolled_for_casts(calculate_event_chance(event_type), event_casts):
+                continue
+            catalog = self.get_catalog()
+            # Как `locations LIKE '%локация%'` в прежнем запросе к fish
+            location_fish = list(dict.fromkeys(
+                str(f['name']) for f in catalog.fish if f.get('name') and location in str(f.get('locations') or '')
+            ))
+            started = self._insert_location_event(
+                cursor,
                 event_type=event_type,
                 location=location,
-                duration_minutes=duration,
-                params=params
+                duration_minutes=calculate_event_duration(event_type),
+                params=generate_event_params(event_type, location_fish),
             )
+            if started:
+                started['started_at'] = _event_datetime(started.get('started_at'))
+                started['ends_at'] = _event_datetime(started.get('ends_at'))
+                event_rows.insert(0, started)
+                last_ends[event_type] = started['ends_at']
 
     def get_school_chain(self, user_id: int, event_id: int) -> Dict[str, Any]:
         """Получить цепочку стайного инстинкта для пользователя."""
@@ -3269,22 +4045,87 @@ class Database:
             'is_open': remaining_weight > 0,
         }
 
+    @staticmethod
+    def fish_sales_bucket_start(moment: datetime) -> datetime:
+        """Начало минутной корзины агрегатов продаж (naive UTC)."""
+        return moment.replace(second=0, microsecond=0)
+
+    def _sales_by_key(self, sales: Iterable[Any]) -> Dict[str, List[float]]:
+        """Продажи [(fish_name, weight), ...] по ключу корзины: {fish_key: [вес, число продаж]}.
+
+        Общая для синхронной продажи и AsyncFishRepository, чтобы ключи совпадали.
+        """
+        per_key: Dict[str, List[float]] = {}
+        for fish_name, weight in sales:
+            key = self._normalize_item_name(fish_name)
+            if not key:
+                continue
+            acc = per_key.setdefault(key, [0.0, 0])
+            acc[0] += float(weight or 0.0)
+            acc[1] += 1
+        return per_key
+
+    def _record_sales_aggregates(self, cursor, sales: List[Any], sold_at: datetime) -> None:
+        """Добавить продажи [(fish_name, weight), ...] в минутные корзины и last_sold_at.
+
+        Вызывается внутри транзакции продажи — одна вставка на пачку видов.
+        """
+        per_key = self._sales_by_key(sales)
+        if not per_key:
+            return
+
+        bucket = self.fish_sales_bucket_start(sold_at)
+        keys = sorted(per_key)
+        cursor.execute(
+            'INSERT INTO fish_sales_buckets (fish_key, bucket_start, weight, sales_count) VALUES '
+            + ', '.join('(?, ?, ?, ?)' for _ in keys)
+            + '''
+            ON CONFLICT (fish_key, bucket_start) DO UPDATE
+            SET weight = fish_sales_buckets.weight + EXCLUDED.weight,
+                sales_count = fish_sales_buckets.sales_count + EXCLUDED.sales_count
+            ''',
+            [v for key in keys for v in (key, bucket, per_key[key][0], per_key[key][1])],
+        )
+        cursor.execute(
+            'INSERT INTO fish_sales_stats (fish_key, last_sold_at) VALUES '
+            + ', '.join('(?, ?)' for _ in keys)
+            + '''
+            ON CONFLICT (fish_key) DO UPDATE
+            SET last_sold_at = GREATEST(fish_sales_stats.last_sold_at, EXCLUDED.last_sold_at)
+            ''',
+            [v for key in keys for v in (key, sold_at)],
+        )
+
+    def prune_fish_sales_buckets(self, retention_hours: Optional[int] = None) -> int:
+        """Удалить минутные корзины старше окна хранения. Возвращает число удалённых строк."""
+        hours = max(1, int(retention_hours or FISH_SALES_BUCKET_RETENTION_HOURS))
+        cutoff = self.fish_sales_bucket_start(datetime.utcnow() - timedelta(hours=hours))
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM fish_sales_buckets WHERE bucket_start < ?', (cutoff,))
+            deleted = cursor.rowcount if isinstance(cursor.rowcount, int) else 0
+            conn.commit()
+        if deleted:
+            logger.info("prune_fish_sales_buckets: removed %s buckets older than %s", deleted, cutoff)
+        return max(0, deleted)
+
     def get_recent_fish_sales_weight(self, fish_name: str, hours: int = 1) -> float:
         normalized_name = self._normalize_item_name(fish_name)
         if not normalized_name:
             return 0.0
 
-        window_hours = max(1, int(hours or 1))
-        since_iso = (datetime.utcnow() - timedelta(hours=window_hours)).isoformat()
+        # Окно не может быть больше срока хранения корзин
+        window_hours = min(max(1, int(hours or 1)), FISH_SALES_BUCKET_RETENTION_HOURS)
+        since = self.fish_sales_bucket_start(datetime.utcnow() - timedelta(hours=window_hours))
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 '''
                 SELECT COALESCE(SUM(weight), 0)
-                FROM fish_sales_history
-                WHERE LOWER(TRIM(fish_name)) = ? AND sold_at >= ?
+                FROM fish_sales_buckets
+                WHERE fish_key = ? AND bucket_start >= ?
                 ''',
-                (normalized_name, since_iso),
+                (normalized_name, since),
             )
             row = cursor.fetchone()
             return float(row[0] or 0.0) if row else 0.0
@@ -3296,16 +4137,7 @@ class Database:
 
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                '''
-                SELECT sold_at
-                FROM fish_sales_history
-                WHERE LOWER(TRIM(fish_name)) = ?
-                ORDER BY sold_at DESC
-                LIMIT 1
-                ''',
-                (normalized_name,),
-            )
+            cursor.execute('SELECT last_sold_at FROM fish_sales_stats WHERE fish_key = ?', (normalized_name,))
             row = cursor.fetchone()
             if not row or not row[0]:
                 return None
@@ -3317,6 +4149,58 @@ class Database:
 
     def get_fish_price_modifiers(self, fish_name: str) -> Dict[str, Any]:
         normalized_name = self._normalize_item_name(fish_name)
+        if not normalized_name:
+            return self._price_modifiers_from_stats('', 0.0, None, None)
+
+        hour_volume = self.get_recent_fish_sales_weight(normalized_name, hours=1)
+        hours_since_last_sale = self.get_hours_since_last_sale(normalized_name)
+        market_offer = self.get_daily_market_offer(create_if_missing=True)
+        return self._price_modifiers_from_stats(normalized_name, hour_volume, hours_since_last_sale, market_offer)
+
+    def get_fish_price_modifiers_bulk(self, fish_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Модификаторы цены сразу для набора видов: один запрос к агрегатам продаж
+        и один снимок рынка дня. Ключ результата — нормализованное имя."""
+        names = sorted({n for n in (self._normalize_item_name(v) for v in fish_names) if n})
+        if not names:
+            return {}
+
+        since = self.fish_sales_bucket_start(datetime.utcnow() - timedelta(hours=1))
+        stats: Dict[str, Any] = {}
+        now = datetime.now(timezone.utc)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join('?' for _ in names)
+            cursor.execute(
+                f'''
+                SELECT s.fish_key,
+                       COALESCE((
+                           SELECT SUM(b.weight) FROM fish_sales_buckets b
+                           WHERE b.fish_key = s.fish_key AND b.bucket_start >= ?
+                       ), 0),
+                       s.last_sold_at
+                FROM fish_sales_stats s
+                WHERE s.fish_key IN ({placeholders})
+                ''',
+                [since, *names],
+            )
+            for norm_name, hour_volume, last_sold_at in cursor.fetchall():
+                last_sale = self._parse_utc_datetime(last_sold_at) if last_sold_at else None
+                hours_since = max(0.0, (now - last_sale).total_seconds() / 3600.0) if last_sale else None
+                stats[norm_name] = (float(hour_volume or 0.0), hours_since)
+
+        market_offer = self.get_daily_market_offer(create_if_missing=True)
+        return {
+            name: self._price_modifiers_from_stats(name, *stats.get(name, (0.0, None)), market_offer)
+            for name in names
+        }
+
+    @staticmethod
+    def _price_modifiers_from_stats(
+        normalized_name: str,
+        hour_volume: float,
+        hours_since_last_sale: Optional[float],
+        market_offer: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
         if not normalized_name:
             return {
                 'volume_multiplier': 1.0,
@@ -3329,7 +4213,6 @@ class Database:
                 'market_active': False,
             }
 
-        hour_volume = self.get_recent_fish_sales_weight(normalized_name, hours=1)
         # Динамика лавки: при массовых продажах цена падает ступенчато.
         # В пике просадка может доходить до x0.6.
         if hour_volume >= 260.0:
@@ -3349,7 +4232,6 @@ class Database:
         else:
             volume_multiplier = 1.0
 
-        hours_since_last_sale = self.get_hours_since_last_sale(normalized_name)
         if hours_since_last_sale is None:
             scarcity_multiplier = 1.08
         elif hours_since_last_sale >= 24:
@@ -3366,11 +4248,10 @@ class Database:
         dynamic_multiplier = volume_multiplier * scarcity_multiplier
         dynamic_multiplier = max(0.60, min(1.20, dynamic_multiplier))
 
-        market_offer = self.get_daily_market_offer(create_if_missing=True)
         market_multiplier = 1.0
         market_active = False
         if market_offer:
-            market_fish = self._normalize_item_name(market_offer.get('fish_name'))
+            market_fish = Database._normalize_item_name(market_offer.get('fish_name'))
             sold_weight = float(market_offer.get('sold_weight') or 0.0)
             target_weight = float(market_offer.get('target_weight') or 0.0)
             if market_fish == normalized_name and sold_weight < target_weight:
@@ -4449,7 +5330,7 @@ class Database:
 
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1', (int(duel_id),))
+            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1 FOR UPDATE', (int(duel_id),))
             row = cursor.fetchone()
             if not row:
                 return {'ok': False, 'error': 'duel_not_found'}
@@ -4552,7 +5433,7 @@ class Database:
 
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1', (int(duel_id),))
+            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1 FOR UPDATE', (int(duel_id),))
             row = cursor.fetchone()
             if not row:
                 return {'ok': False, 'error': 'duel_not_found'}
@@ -4859,7 +5740,7 @@ class Database:
 
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1', (int(duel_id),))
+            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1 FOR UPDATE', (int(duel_id),))
             row = cursor.fetchone()
             if not row:
                 return {'ok': False, 'error': 'duel_not_found'}
@@ -4948,7 +5829,7 @@ class Database:
 
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1', (int(duel_id),))
+            cursor.execute('SELECT * FROM duels WHERE id = ? LIMIT 1 FOR UPDATE', (int(duel_id),))
             row = cursor.fetchone()
             if not row:
                 return {'ok': False, 'error': 'duel_not_found'}
@@ -5274,8 +6155,12 @@ class Database:
             )
             moved = int(getattr(cursor, 'rowcount', 0) or 0) > 0
             conn.commit()
-            return moved
+        if moved:
+            # Рыба меняет владельца (и могла быть проданной) — доски проще перечитать
+            self.invalidate_leaderboards()
+        return moved
 
+    @ensures_schema
     def _ensure_boat_tables(self):
         """Создать таблицы для лодок и участников лодки, если их еще нет."""
         with self._connect() as conn:
@@ -5338,6 +6223,7 @@ class Database:
         except Exception:
             pass
 
+    @ensures_schema
     def _ensure_boat_catch_table(self):
         """Создать таблицу общего улова лодки, если её еще нет."""
         with self._connect() as conn:
@@ -5677,7 +6563,31 @@ class Database:
         self._pool = None
         self._db_url = None
         self.is_postgres = os.getenv('DATABASE_URL') is not None or os.getenv('DB_HOST') is not None
-        self._achievement_notifications: Dict[int, List[Dict[str, Any]]] = {}
+        self._achievement_notifications: BoundedStore = BoundedStore(
+            "achievement_notifications", maxsize=50000, ttl=3600
+        )
+        # user_id -> {achievement_id: max tier}; заполняется лениво в _get_achievement_tiers
+        # Вытесненный пользователь просто перечитается одним SELECT
+        self._achievement_tiers: BoundedStore = BoundedStore("achievement_tiers", maxsize=50000, ttl=6 * 3600)
+        self._achievement_tiers_lock = threading.Lock()
+        self._stats_buffer = PlayerStatsBuffer()
+        self._stats_flush_lock = threading.Lock()
+        self._stats_flusher: Optional[threading.Thread] = None
+        self._stats_unlock_listener: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None
+        self._location_casts = LocationCastCounter()
+        self._location_events: Optional[LocationEventsSnapshot] = None
+        self._location_events_lock = threading.Lock()
+        self._location_events_ticker: Optional[threading.Thread] = None
+        # location -> (строка weather, когда истекает); см. get_or_update_weather
+        self._weather: Dict[str, tuple] = {}
+        self._weather_lock = threading.Lock()
+        # Топы /tour и /top; см. _load_leaderboard
+        self._leaderboards = LeaderboardStore(LEADERBOARD_RELOAD_SEC, LEADERBOARD_IDLE_SEC)
+        self._catalog: Optional[GameCatalog] = None
+        self._catalog_checked_at = 0.0
+        self._catalog_lock = threading.Lock()
+        # table -> множество колонок (information_schema), см. get_table_columns
+        self._table_columns: Dict[str, frozenset] = {}
 
     def _get_db_url(self):
         if self._db_url:
@@ -5752,14 +6662,115 @@ class Database:
             raw_conn = psycopg2.connect(self._get_db_url(), connect_timeout=5)
             return PostgresConnWrapper(raw_conn)
 
+    def get_table_columns(self, table: str) -> frozenset:
+        """Колонки таблицы из кэша схемы; information_schema читается один раз на процесс."""
+        cached = self._table_columns.get(table)
+        if cached is not None:
+            return cached
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = ? AND table_schema = 'public'",
+                (table,),
+            )
+            columns = frozenset(row[0] for row in cursor.fetchall())
+        # Несуществующую таблицу не кэшируем: её может создать ленивый _ensure_*
+        if columns:
+            self._table_columns[table] = columns
+        return columns
+
+    def refresh_schema_cache(self, *tables: str) -> None:
+        """Сбросить кэш схемы (все таблицы или только перечисленные) после DDL."""
+        if tables:
+            for table in tables:
+                self._table_columns.pop(table, None)
+        else:
+            self._table_columns = {}
+        try:
+            self.get_table_columns('players')
+        except Exception:
+            logger.exception("Failed to warm schema cache for players")
+
     def _get_temp_rod_uses(self, rod_name: str) -> Optional[int]:
         rod_range = TEMP_ROD_RANGES.get(rod_name)
         if not rod_range:
             return None
         return random.randint(rod_range[0], rod_range[1])
     
+    def get_schema_version(self) -> int:
+        """Версия схемы из schema_migrations; 0 — таблицы ещё нет (схема не разворачивалась)."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT MAX(version) FROM schema_migrations')
+                row = cursor.fetchone()
+                return int((row[0] if row else 0) or 0)
+        except Exception:
+            return 0
+
     def init_db(self):
-        """Инициализация базы данных"""
+        """Старт процесса: одна проверка версии схемы вместо сотен CREATE IF NOT EXISTS.
+
+        Полный bootstrap (`apply_migrations`) запускается, только если схема отстала
+        от SCHEMA_VERSION. Обычно это делает scripts/apply_migrations.py или шаг
+        launcher.py до запуска процессов; при DB_AUTO_MIGRATE=0 отставшая схема — ошибка.
+        """
+        version = self.get_schema_version()
+        if version < SCHEMA_VERSION:
+            if os.getenv('DB_AUTO_MIGRATE', '1') == '0':
+                raise RuntimeError(
+                    f"DB schema is at version {version}, code needs {SCHEMA_VERSION}: run scripts/apply_migrations.py"
+                )
+            logger.info("init_db: schema version %s < %s, applying migrations", version, SCHEMA_VERSION)
+            self.apply_migrations(force=False)
+        else:
+            # Схема развёрнута bootstrap'ом этой версии — ленивые _ensure_* больше не нужны
+            ENSURED_SCHEMAS.mark(*BOOTSTRAP_SCHEMA_HELPERS, '_ensure_fishing_context_tables')
+
+        if os.getenv('PG_SQL_PREWARM', '0') == '1':
+            prewarm_sql_translation_cache()
+
+    def apply_migrations(self, force: bool = True) -> int:
+        """Полный bootstrap схемы и справочников, затем запись SCHEMA_VERSION.
+
+        Процессы, стартующие одновременно, ждут друг друга на advisory-локе; кто
+        дождался при force=False, перепроверяет версию и ничего не делает, если
+        схему уже развернул другой. Возвращает версию схемы после вызова.
+        """
+        with self._connect() as lock_conn:
+            lock_cursor = lock_conn.cursor()
+            try:
+                lock_cursor.execute('SELECT pg_advisory_lock(?)', (SCHEMA_MIGRATIONS_LOCK_ID,))
+                locked = True
+            except Exception:
+                logger.exception("apply_migrations: advisory lock failed, migrating without it")
+                locked = False
+            try:
+                if not force and self.get_schema_version() >= SCHEMA_VERSION:
+                    return SCHEMA_VERSION
+                started = time.monotonic()
+                self._bootstrap_schema()
+                with self._connect() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT INTO schema_migrations (version) VALUES (?)
+                        ON CONFLICT (version) DO NOTHING
+                    ''', (SCHEMA_VERSION,))
+                logger.info(
+                    "apply_migrations: schema at version %s (%.1fs)", SCHEMA_VERSION, time.monotonic() - started
+                )
+                return SCHEMA_VERSION
+            finally:
+                if locked:
+                    try:
+                        lock_cursor.execute('SELECT pg_advisory_unlock(?)', (SCHEMA_MIGRATIONS_LOCK_ID,))
+                    except Exception:
+                        logger.exception("apply_migrations: advisory unlock failed")
+
+    def _bootstrap_schema(self):
+        """Все CREATE TABLE/INDEX, миграции колонок и справочники по умолчанию."""
+        # Явный прогон (apply_migrations) обязан выполнить DDL, даже если хелперы уже отмечены
+        ENSURED_SCHEMAS.reset()
         with self._connect() as conn:
             cursor = conn.cursor()
             
@@ -5771,6 +6782,13 @@ class Database:
                 )
             ''')
 
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
             # Таблица игроков
             # Enable WAL mode for better concurrency in SQLite
             if not self.is_postgres:
@@ -5902,62 +6920,19 @@ class Database:
                 except:
                     pass
 
-            # Таблица энциклопедии пойманных рыб пользователя
-            # Вместо отдельных строк для каждой рыбы, создаем колонки для каждого вида
+            # Энциклопедия пойманных рыб: узкая таблица (user_id, fish_key), ключ — нормализованное имя.
+            # Старая широкая user_fish_encyclopedia (колонка на вид) переносится один раз и больше не пишется.
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_fish_encyclopedia (
-                    user_id BIGINT PRIMARY KEY,
-                    FOREIGN KEY (user_id) REFERENCES players (user_id)
+                CREATE TABLE IF NOT EXISTS user_fish_species (
+                    user_id BIGINT NOT NULL,
+                    fish_key TEXT NOT NULL,
+                    first_caught_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, fish_key)
                 )
             ''')
-            
-            # Получаем список всех рыб и добавляем колонки для каждой
-            cursor.execute('SELECT name FROM fish ORDER BY name')
-            all_fish = cursor.fetchall()
-            
-            # Получаем существующие колонки в таблице
-            if self.is_postgres:
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'user_fish_encyclopedia' 
-                    AND table_schema = 'public'
-                """)
-            else:
-                cursor.execute("PRAGMA table_info(user_fish_encyclopedia)")
-            
-            existing_columns = set()
-            for row in cursor.fetchall():
-                if self.is_postgres:
-                    existing_columns.add(row[0])
-                else:
-                    existing_columns.add(row[1])  # SQLite PRAGMA возвращает (cid, name, ...)
-            
-            # Добавляем колонки для рыб, которых еще нет
-            for fish_row in all_fish:
-                fish_name = str(fish_row[0] or '').strip()
-                if not fish_name:
-                    continue
-                
-                # Создаем безопасное имя колонки (заменяем пробелы и спецсимволы)
-                safe_column_name = Database.get_safe_fish_column_name(fish_name)
-                
-                if safe_column_name not in existing_columns:
-                    try:
-                        cursor.execute(f'''
-                            ALTER TABLE user_fish_encyclopedia 
-                            ADD COLUMN {safe_column_name} INTEGER DEFAULT 0
-                        ''')
-                        logger.info(f"Added column {safe_column_name} for fish '{fish_name}'")
-                    except Exception as e:
-                        logger.warning(f"Failed to add column {safe_column_name}: {e}")
-            
             conn.commit()
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_user_fish_encyclopedia_user
-                ON user_fish_encyclopedia (user_id)
-            ''')
+            self._migrate_fish_species_by_id(conn)
+            self._migrate_wide_fish_encyclopedia(conn)
 
             # Таблица трофеев игроков (отдельно от обычного инвентаря/лавки)
             cursor.execute('''
@@ -5968,6 +6943,11 @@ class Database:
                 CREATE INDEX IF NOT EXISTS idx_caught_fish_user_sold
                 ON caught_fish (user_id, sold)
             ''')
+            # Загрузка таблиц лидеров (_load_leaderboard): непроданное за период
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_caught_fish_unsold_caught_at
+                ON caught_fish (caught_at) WHERE sold = 0
+            ''')
 
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS player_trophies (
@@ -6035,6 +7015,15 @@ class Database:
                 CREATE INDEX IF NOT EXISTS idx_ticket_items_code
                 ON ticket_items (ticket_code)
             ''')
+            # Розыгрыш (ticket_draw.py): счётчики по игрокам за период и MIN/MAX(id) по типу
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ticket_items_type_created_user
+                ON ticket_items (ticket_type, created_at, user_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ticket_items_type_id
+                ON ticket_items (ticket_type, id)
+            ''')
 
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS ticket_draw_runs (
@@ -6070,6 +7059,9 @@ class Database:
                 CREATE INDEX IF NOT EXISTS idx_ticket_draw_items_run
                 ON ticket_draw_items (run_id)
             ''')
+            # seed и размер пула записываются, чтобы розыгрыш можно было перепроверить
+            cursor.execute("ALTER TABLE ticket_draw_runs ADD COLUMN IF NOT EXISTS seed TEXT")
+            cursor.execute("ALTER TABLE ticket_draw_runs ADD COLUMN IF NOT EXISTS pool_size INTEGER")
 
             # Backfill legacy `players.tickets` balances into the new per-ticket ledger once.
             try:
@@ -6352,16 +7344,9 @@ class Database:
                 ON raf_event_prizes (event_id, is_claimed)
             ''')
             
-            # Initialize boat-related tables
-            self._ensure_boat_tables()
-            self._ensure_boat_catch_table()
-            self._ensure_boat_invites_table()
-            self._ensure_user_effects_table()
-            self._ensure_antibot_captcha_table()
-            self._ensure_duel_tables()
-            self._ensure_project_donations_table()
-            self._ensure_extended_gameplay_tables()
-            self._ensure_webapp_ui_tables()
+            # Таблицы, которые рантайм лениво проверяет через _ensure_* хелперы
+            for helper in BOOTSTRAP_SCHEMA_HELPERS:
+                getattr(self, helper)()
 
             # Ensure integer PK columns have sequences/defaults (Postgres)
             try:
@@ -6386,6 +7371,9 @@ class Database:
             self.migrate_caught_fish_to_stats()
         except Exception:
             logger.exception('Failed to migrate caught_fish stats')
+
+        # Схема окончательно сложилась — заполняем кэш колонок заново
+        self.refresh_schema_cache()
     
     def _run_migrations(self):
         """Выполнение миграций для обновления схемы БД"""
@@ -6415,6 +7403,9 @@ class Database:
                 except Exception:
                     pass
 
+        # Миграции могли добавить колонки
+        self.refresh_schema_cache()
+
     def _run_migrations_inner(self, conn):
         """Actual migration logic, called with advisory lock held."""
         cursor = conn.cursor()
@@ -6723,24 +7714,6 @@ class Database:
             except Exception:
                 pass
 
-        # Create user_fish_encyclopedia table (энциклопедия пойманных рыб)
-        try:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_fish_encyclopedia (
-                    user_id BIGINT NOT NULL,
-                    fish_name TEXT NOT NULL,
-                    first_caught_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, fish_name)
-                )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_ufe_user ON user_fish_encyclopedia(user_id)')
-            conn.commit()
-        except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-
         # Add performance indexes on caught_fish
         try:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_cf_user_sold ON caught_fish(user_id, sold)')
@@ -7911,7 +8884,12 @@ class Database:
                 ))
             fish_data = normalized_fish_data
             
-            cursor.execute('DELETE FROM fish')
+            # Upsert по имени вместо DELETE + INSERT: id рыб остаются стабильными между стартами
+            fish_names = [row[0] for row in fish_data]
+            cursor.execute(
+                'DELETE FROM fish WHERE name NOT IN (' + ', '.join('?' for _ in fish_names) + ')',
+                fish_names,
+            )
             cursor.executemany('''
                 INSERT OR REPLACE INTO fish (name, rarity, min_weight, max_weight, min_length, max_length, price, locations, seasons, suitable_baits, max_rod_weight, required_level, sticker_id, activity_period)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -8087,15 +9065,42 @@ class Database:
                    OR current_rod = ''
             ''')
             conn.commit()
+
+        self._publish_catalog_if_changed()
+
+    def _publish_catalog_if_changed(self) -> bool:
+        """Поднять версию каталога, только если содержимое справочников реально изменилось.
+
+        _fill_default_data выполняется при каждом старте процесса; без сравнения отпечатков
+        каждый рестарт заставлял бы все процессы перечитывать каталог.
+        """
+        try:
+            fingerprint = catalog_fingerprint(*self._read_catalog_tables())
+            if fingerprint == self.get_system_flag(CATALOG_FINGERPRINT_FLAG):
+                return False
+            self.set_system_flag(CATALOG_FINGERPRINT_FLAG, fingerprint)
+        except Exception:
+            logger.exception("Failed to compare catalog fingerprint, publishing new version")
+        self.invalidate_catalog()
+        return True
     
-    def get_fishing_context(self, user_id: int, chat_id: int) -> Dict[str, Any]:
-        """Получить полный контекст для рыбалки (игрок, эффекты, состояние) за один запрос."""
+    @ensures_schema
+    def _ensure_fishing_context_tables(self):
+        """Таблицы, которые читает get_fishing_context, должны существовать до первого запроса."""
+        self._ensure_user_effects_table()
+        self._ensure_booster_tables()
+        self._ensure_boat_tables()
+        self._ensure_antibot_captcha_table()
+
+    def get_fishing_context(self, user_id: int, chat_id: int) -> FishingContext:
+        """Получить полный контекст для рыбалки (игрок, удочка, эффекты, бонусы) за одно подключение."""
+        self._ensure_fishing_context_tables()
+        ctx = FishingContext(user_id=int(user_id), chat_id=int(chat_id))
         with self._connect() as conn:
             cursor = conn.cursor()
             
             # 1. Получаем игрока
-            cursor.execute("PRAGMA table_info(players)")
-            cols = [c[1] for c in cursor.fetchall()]
+            cols = self.get_table_columns('players')
             if 'chat_id' in cols:
                 cursor.execute('SELECT * FROM players WHERE user_id = ? AND (chat_id IS NULL OR chat_id < 1) LIMIT 1', (user_id,))
                 row = cursor.fetchone()
@@ -8107,44 +9112,122 @@ class Database:
                 row = cursor.fetchone()
             
             if not row:
-                return {'player': None}
+                return ctx
                 
             columns = [description[0] for description in cursor.description]
-            player = dict(zip(columns, row))
-            
-            # 2. Проверяем эффекты (пьянство, морская болезнь)
-            cursor.execute("SELECT effect_type, expires_at FROM user_effects WHERE user_id = ?", (user_id,))
-            effects_rows = cursor.fetchall()
-            effects = {}
-            now = datetime.now(timezone.utc)
-            for etype, exp_at in effects_rows:
-                if exp_at:
-                    try:
-                        exp_dt = datetime.fromisoformat(exp_at)
-                        if exp_dt > now:
-                            effects[etype] = (exp_dt - now).total_seconds()
-                    except Exception:
-                        pass
-                else:
-                    effects[etype] = 0 # No expiry
-            
-            # 3. Проверяем наличие активной лодки
-            cursor.execute('SELECT id, is_active FROM boats WHERE user_id = ? AND is_active = 1 LIMIT 1', (user_id,))
-            boat_row = cursor.fetchone()
-            active_boat = dict(zip(['id', 'is_active'], boat_row)) if boat_row else None
+            self._fill_fishing_player(ctx, dict(zip(columns, row)))
+            rod_name = ctx.player['current_rod']
+
+            # 2. Все числовые модификаторы одним запросом
+            now_utc = datetime.utcnow()
+            now_iso = datetime.now(timezone.utc).isoformat()
+            cursor.execute(
+                '''
+                SELECT
+                    (SELECT COALESCE(SUM(bonus_percent), 0) FROM player_clothing WHERE user_id = ?),
+                    (SELECT COALESCE(MAX(bonus_percent), 0) FROM player_feeders
+                      WHERE user_id = ? AND (chat_id = ? OR chat_id IS NULL OR chat_id < 1)
+                        AND expires_at > CURRENT_TIMESTAMP),
+                    (SELECT b.id FROM boats b JOIN boat_members bm ON bm.boat_id = b.id
+                      WHERE bm.user_id = ? AND b.is_active = 1 ORDER BY b.id DESC LIMIT 1),
+                    (SELECT 1 FROM anti_abuse_captcha
+                      WHERE user_id = ? AND (penalty_until > ? OR active_expires_at > ?) LIMIT 1),
+                    (SELECT population_penalty FROM players WHERE user_id = ? AND chat_id = -1),
+                    (SELECT consecutive_casts_at_location FROM players WHERE user_id = ? AND chat_id = -1)
+                ''',
+                (user_id, user_id, chat_id, user_id, user_id, now_iso, now_iso, user_id, user_id),
+            )
+            active_boat_id = self._fill_fishing_modifiers(ctx, cursor.fetchone())
 
-            # 4. Проверяем антибот (активный блок или ожидание капчи)
-            cursor.execute("SELECT 1 FROM anti_abuse_captcha WHERE user_id = ? AND (penalty_until > ? OR active_expires_at > ?) LIMIT 1", 
-                           (user_id, now.isoformat(), now.isoformat()))
-            ab_row = cursor.fetchone()
-            has_antibot_block = bool(ab_row)
+            # 3. Активные эффекты (пиво, морская болезнь, молитва)
+            cursor.execute(
+                "SELECT effect_type, expires_at FROM user_effects WHERE user_id = ? AND expires_at > ?",
+                (user_id, now_utc),
+            )
+            self._fill_fishing_effects(ctx, cursor.fetchall() or [], now_utc)
 
-            return {
-                'player': player,
-                'effects': effects,
-                'active_boat': active_boat,
-                'has_antibot_block': has_antibot_block
-            }
+            # 4. Состояние текущей удочки игрока (глобальная строка приоритетнее)
+            cursor.execute(
+                '''
+                SELECT * FROM player_rods
+                WHERE user_id = ? AND rod_name = ?
+                ORDER BY CASE WHEN chat_id IS NULL OR chat_id < 1 THEN 0 ELSE 1 END
+                LIMIT 1
+                ''',
+                (user_id, rod_name),
+            )
+            rod_row = cursor.fetchone()
+            if rod_row:
+                ctx.player_rod = dict(zip([d[0] for d in cursor.description], rod_row))
+
+            # 5. Лодка — только если игрок сейчас в плавании
+            if active_boat_id is not None:
+                cursor.execute('SELECT * FROM boats WHERE id = ?', (active_boat_id,))
+                boat_row = cursor.fetchone()
+                if boat_row:
+                    boat = dict(zip([d[0] for d in cursor.description], boat_row))
+                    cursor.execute('SELECT COUNT(DISTINCT user_id) FROM boat_members WHERE boat_id = ?', (active_boat_id,))
+                    members_row = cursor.fetchone()
+                    boat['members_count'] = int(members_row[0] or 0) if members_row else 0
+                    ctx.active_boat = boat
+
+        self._fill_fishing_catalog(ctx)
+        return ctx
+
+    # Разбор строк контекста рыбалки — общий для get_fishing_context и
+    # AsyncFishRepository.get_fishing_context (asyncpg)
+
+    @staticmethod
+    def _fill_fishing_player(ctx: FishingContext, player: Dict[str, Any]) -> None:
+        if not player.get('current_location'):
+            player['current_location'] = 'Городской пруд'
+        if not player.get('current_bait'):
+            player['current_bait'] = 'Черви'
+        if not player.get('current_rod'):
+            player['current_rod'] = BAMBOO_ROD
+        for key in ('xp', 'level', 'tickets'):
+            if player.get(key) is None:
+                player[key] = 0
+        ctx.player = player
+
+    @staticmethod
+    def _fill_fishing_modifiers(ctx: FishingContext, agg: Optional[Sequence[Any]]) -> Optional[int]:
+        """Числовые модификаторы из агрегирующего запроса. Возвращает id активной лодки."""
+        agg = agg or (0, 0, None, None, None, None)
+        ctx.clothing_bonus_percent = max(0.0, float(agg[0] or 0.0))
+        ctx.feeder_bonus = max(0, int(agg[1] or 0))
+        ctx.has_antibot_block = bool(agg[3])
+        ctx.population_penalty = float(agg[4] or 0.0)
+        ctx.consecutive_casts = int(agg[5] or 0)
+        return agg[2]
+
+    @staticmethod
+    def _fill_fishing_effects(ctx: FishingContext, rows: Iterable[Sequence[Any]], now_utc: datetime) -> None:
+        from sea_pray import BLESSING_EFFECT, BLESSING_CATCH_BONUS, WRATH_CATCH_PENALTY, WRATH_EFFECT
+
+        for etype, exp_at in rows:
+            remaining = 0.0
+            if exp_at:
+                try:
+                    exp_dt = exp_at if isinstance(exp_at, datetime) else datetime.fromisoformat(str(exp_at))
+                    if exp_dt.tzinfo is not None:
+                        exp_dt = exp_dt.astimezone(timezone.utc).replace(tzinfo=None)
+                    remaining = max(0.0, (exp_dt - now_utc).total_seconds())
+                except Exception:
+                    continue
+            ctx.effects[etype] = max(remaining, ctx.effects.get(etype, 0.0))
+            normalized = str(etype or '').strip().lower()
+            ctx.beer_bonus_percent += float(BEER_EFFECT_BONUS.get(normalized, 0.0))
+            if normalized == WRATH_EFFECT:
+                ctx.sea_god_bonus_percent += WRATH_CATCH_PENALTY
+            elif normalized == BLESSING_EFFECT:
+                ctx.sea_god_bonus_percent += BLESSING_CATCH_BONUS
+
+    def _fill_fishing_catalog(self, ctx: FishingContext) -> None:
+        """Удочка из каталога и снимок событий — кэши процесса, без запроса на каждый заброс."""
+        if ctx.player:
+            ctx.rod = self.get_rod(ctx.player['current_rod'])
+        ctx.location_events = self.get_location_events_snapshot()
 
     def count_caught_fish(self, user_id: int) -> int:
         """Подсчитать количество непроданной рыбы у игрока."""
@@ -8159,8 +9242,7 @@ class Database:
         with self._connect() as conn:
             cursor = conn.cursor()
             # If players table contains chat-specific rows, prefer the row for this chat_id.
-            cursor.execute("PRAGMA table_info(players)")
-            cols = [c[1] for c in cursor.fetchall()]
+            cols = self.get_table_columns('players')
             if 'chat_id' in cols:
                 # Prefer a global profile row (chat_id IS NULL or < 1) which stores shared data
                 cursor.execute('SELECT * FROM players WHERE user_id = ? AND (chat_id IS NULL OR chat_id < 1) LIMIT 1', (user_id,))
@@ -8211,8 +9293,7 @@ class Database:
         """Получить список всех игроков (глобальные профили)."""
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(players)")
-            cols = [c[1] for c in cursor.fetchall()]
+            cols = self.get_table_columns('players')
             
             if 'chat_id' in cols:
                 # Выбираем только глобальные профили
@@ -8330,8 +9411,7 @@ class Database:
         # Decide whether to include chat_id in WHERE depending on DB schema
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(players)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.get_table_columns('players')
             uses_chat = 'chat_id' in columns
 
             if uses_chat:
@@ -8499,8 +9579,7 @@ class Database:
                 if cursor.fetchone():
                     return {"ok": False, "reason": "already_owned"}
 
-                cursor.execute("PRAGMA table_info(players)")
-                columns = [col[1] for col in cursor.fetchall()]
+                columns = self.get_table_columns('players')
                 uses_chat = 'chat_id' in columns
 
                 if uses_chat:
@@ -8607,41 +9686,138 @@ class Database:
                 pass
             return {"ok": False, "reason": "db_error"}
 
-    def get_fish_by_name(self, name: str) -> Optional[Dict[str, Any]]:
-        """Получить данные рыбы по её имени."""
+    # ==================== СТИКЕРЫ УЛОВА (ОБЩИЕ ДЛЯ ШАРДОВ) ====================
+
+    @ensures_schema
+    def _ensure_bot_stickers_table(self):
+        """Последний стикер улова бота в каждом чате — общий для всех шардов бота."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS bot_last_stickers (
+                    chat_id BIGINT PRIMARY KEY,
+                    message_id BIGINT NOT NULL,
+                    fish_meta TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+
+    def remember_bot_sticker(self, chat_id: int, message_id: int, fish_meta: Optional[Dict[str, Any]] = None) -> None:
+        """Запомнить последний стикер улова в чате (и данные рыбы, если это рыба)."""
+        self._ensure_bot_stickers_table()
+        meta_json = json.dumps(fish_meta, ensure_ascii=False, default=str) if fish_meta else None
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                '''
+                INSERT INTO bot_last_stickers (chat_id, message_id, fish_meta, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (chat_id) DO UPDATE
+                SET message_id = EXCLUDED.message_id,
+                    fish_meta = EXCLUDED.fish_meta,
+                    updated_at = EXCLUDED.updated_at
+                ''',
+                (int(chat_id), int(message_id), meta_json),
+            )
+            conn.commit()
+
+    def get_bot_sticker_fish(self, chat_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Данные рыбы, если message_id — последний стикер улова бота в этом чате."""
+        self._ensure_bot_stickers_table()
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM fish WHERE name = ? LIMIT 1", (name,))
+            cursor.execute(
+                'SELECT fish_meta FROM bot_last_stickers WHERE chat_id = ? AND message_id = ?',
+                (int(chat_id), int(message_id)),
+            )
             row = cursor.fetchone()
-            if row:
-                columns = [desc[0] for desc in cursor.description]
-                return dict(zip(columns, row))
+        if not row or not row[0]:
+            return None
+        try:
+            return json.loads(row[0])
+        except (TypeError, ValueError):
             return None
 
+    # ==================== КЭШ СТАТИЧНОГО КАТАЛОГА ====================
+
+    def _read_catalog_tables(self) -> tuple:
+        """Прочитать все справочники за одно подключение: (fish, trash, rods, baits, nets, location_names)."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM fish')
+            fish = _rows_to_dicts(cursor)
+            cursor.execute('SELECT * FROM trash')
+            trash = _rows_to_dicts(cursor)
+            cursor.execute('SELECT * FROM rods')
+            rods = _rows_to_dicts(cursor)
+            cursor.execute('SELECT * FROM baits')
+            baits = _rows_to_dicts(cursor)
+            cursor.execute('SELECT * FROM nets')
+            nets = _rows_to_dicts(cursor)
+            cursor.execute('SELECT DISTINCT name FROM locations')
+            location_names = [row[0] for row in cursor.fetchall() if row[0]]
+        return fish, trash, rods, baits, nets, location_names
+
+    def _load_catalog(self, version: str) -> GameCatalog:
+        fish, trash, rods, baits, nets, location_names = self._read_catalog_tables()
+        catalog = GameCatalog(version, fish, trash, rods, baits, nets, location_names)
+        logger.info(
+            "Game catalog loaded (version=%s): fish=%s trash=%s rods=%s baits=%s nets=%s",
+            version, len(catalog.fish), len(catalog.trash), len(catalog.rods), len(catalog.baits), len(catalog.nets),
+        )
+        return catalog
+
+    def get_catalog(self) -> GameCatalog:
+        """Текущий снимок каталога; перечитывается, если версия в system_flags сменилась."""
+        catalog = self._catalog
+        now = time.monotonic()
+        if catalog is not None and now - self._catalog_checked_at < CATALOG_VERSION_CHECK_SEC:
+            return catalog
+        with self._catalog_lock:
+            catalog = self._catalog
+            if catalog is not None and now - self._catalog_checked_at < CATALOG_VERSION_CHECK_SEC:
+                return catalog
+            try:
+                version = self.get_system_flag(CATALOG_VERSION_FLAG) or '0'
+            except Exception:
+                logger.exception("Failed to read catalog version flag")
+                version = catalog.version if catalog is not None else '0'
+            if catalog is None or catalog.version != version:
+                catalog = self._load_catalog(version)
+                self._catalog = catalog
+            self._catalog_checked_at = now
+            return catalog
+
+    def invalidate_catalog(self, publish: bool = True) -> None:
+        """Сбросить кэш каталога. publish=True поднимает версию для остальных процессов."""
+        with self._catalog_lock:
+            self._catalog = None
+            self._catalog_checked_at = 0.0
+        if publish:
+            try:
+                self.set_system_flag(CATALOG_VERSION_FLAG, str(time.time_ns()))
+            except Exception:
+                logger.exception("Failed to publish catalog version")
+
+    def get_fish_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Получить данные рыбы по её имени."""
+        fish = self.get_catalog().fish_by_name.get(name)
+        return dict(fish) if fish else None
+
     def get_fish_by_location(
         self,
-        location: str,
-        season: str = "Лето",
-        min_level: Optional[int] = None,
-        apply_time_filter: bool = True,
-    ) -> List[Dict[str, Union[str, int, float]]]:
-        """Получить список рыб для локации"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            query = '''
-                SELECT * FROM fish 
-                WHERE locations LIKE ? AND (seasons LIKE ? OR seasons LIKE '%Все%' OR seasons LIKE '%Круглый Год%')
-            '''
-            params: List[Union[str, int]] = [f"%{location}%", f"%{season}%"]
-            # min_level игнорируется: никакой рыбе не нужно уровень
-            query += " ORDER BY rarity"
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            result = [dict(zip(columns, row)) for row in rows]
-            if apply_time_filter:
-                result = filter_fish_by_time(result)
-            return result
+        location: str,
+        season: str = "Лето",
+        min_level: Optional[int] = None,
+        apply_time_filter: bool = True,
+    ) -> List[Dict[str, Union[str, int, float]]]:
+        """Получить список рыб для локации"""
+        # min_level игнорируется: никакой рыбе не нужно уровень
+        result = [dict(f) for f in self.get_catalog().fish_for_location(location, season)]
+        if apply_time_filter:
+            result = filter_fish_by_time(result)
+        return result
 
     def get_fish_by_location_any_season(
         self,
@@ -8650,22 +9826,11 @@ class Database:
         apply_time_filter: bool = True,
     ) -> List[Dict[str, Any]]:
         """Получить список рыб для локации без учета сезона"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            query = '''
-                SELECT * FROM fish 
-                WHERE locations LIKE ?
-            '''
-            params: List[Union[str, int]] = [f"%{location}%"]
-            # min_level игнорируется: никакой рыбе не нужно уровень
-            query += " ORDER BY rarity"
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            result = [dict(zip(columns, row)) for row in rows]
-            if apply_time_filter:
-                result = filter_fish_by_time(result)
-            return result
+        # min_level игнорируется: никакой рыбе не нужно уровень
+        result = [dict(f) for f in self.get_catalog().fish_for_location(location)]
+        if apply_time_filter:
+            result = filter_fish_by_time(result)
+        return result
     
     def get_random_fish(self, location: str, season: str = "Лето", bait_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Получить случайную рыбу для локации с учетом наживки"""
@@ -8674,14 +9839,14 @@ class Database:
             return None
 
         if bait_name:
-            fish_list = [fish for fish in fish_list if self.check_bait_suitable_for_fish(bait_name, fish['name'])]
+            suitable = self.get_catalog().fish_names_for_bait(bait_name)
+            fish_list = [fish for fish in fish_list if fish['name'] in suitable]
             if not fish_list:
                 return None
         
         # Взвешенный случайный выбор с учетом редкости
         weights = self.calculate_weights(fish_list)
 
-        import random
         return random.choices(fish_list, weights=weights)[0]
 
     def get_fish_for_location(self, location: str, season: str = "Лето", min_level: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -8692,6 +9857,7 @@ class Database:
         """Добавить пойманную рыбу"""
         normalized_name = fish_name.strip() if isinstance(fish_name, str) else fish_name
         is_trash = False
+        is_fish = False
         
         # Normalize fish_name to canonical name from `fish` table when possible
         try:
@@ -8702,6 +9868,7 @@ class Database:
                 r = cur.fetchone()
                 if r:
                     normalized_name = r[0]
+                    is_fish = True
                 else:
                     # Проверяем, это мусор?
                     cur.execute("SELECT name FROM trash WHERE LOWER(TRIM(name)) = LOWER(TRIM(?)) LIMIT 1", (normalized_name,))
@@ -8722,6 +9889,7 @@ class Database:
             normalized_name, weight, length, location
         )
 
+        begun_at = time.monotonic()
         with self._connect() as conn:
             cursor = conn.cursor()
             clan_id = None
@@ -8740,19 +9908,15 @@ class Database:
             )
             saved = cursor.fetchone()
             
-            # Обновляем статистику пользователя
-            self.update_player_fish_stats(user_id, normalized_name, float(weight), is_trash)
-            try:
-                self.evaluate_achievements(int(user_id), chat_id=chat_id_to_store)
-            except Exception:
-                logger.exception("evaluate_achievements failed user_id=%s", user_id)
+            # Обновляем статистику пользователя (отложенно; достижения проверяются при сбросе)
+            self.update_player_fish_stats(user_id, normalized_name, float(weight), is_trash, chat_id=chat_id_to_store)
 
         if saved:
             logger.info(
                 "add_caught_fish SAVED IN DB: id=%s user_id=%s chat_id=%s clan_id=%s fish=%s weight=%s length=%s location=%s caught_at=%s",
                 saved[0], saved[1], saved[2], saved[3], saved[4], saved[5], saved[6], saved[7], saved[8]
             )
-            return {
+            catch = {
                 'id': saved[0],
                 'user_id': saved[1],
                 'chat_id': saved[2],
@@ -8763,6 +9927,8 @@ class Database:
                 'location': saved[7],
                 'caught_at': saved[8],
             }
+            self._record_leaderboard_catch(catch, is_fish, begun_at)
+            return catch
         else:
             logger.warning(
                 "add_caught_fish: INSERT returned no row — possible constraint violation. user_id=%s chat_id=%s fish=%s",
@@ -8837,6 +10003,8 @@ class Database:
                 normalized_name,
             )
             return None
+        # Улов задним числом: попадает в уже загруженные периоды, доски перечитываем
+        self.invalidate_leaderboards()
 
         logger.info(
             "add_caught_fish_owner_manual saved: id=%s user_id=%s chat_id=%s clan_id=%s fish=%s weight=%s length=%s location=%s caught_at=%s sold=%s",
@@ -8858,10 +10026,13 @@ class Database:
     
     def remove_caught_fish(self, fish_id: int):
         """Удалить пойманную рыбу по ID"""
+        begun_at = time.monotonic()
         with self._connect() as conn:
             cursor = conn.cursor()
+            leaving = self._unsold_leaderboard_fish(cursor, [fish_id])
             cursor.execute('DELETE FROM caught_fish WHERE id = ?', (fish_id,))
             conn.commit()
+        self._leaderboards.forget_catches(leaving, begun_at)
 
     def _resolve_fish_image_file(self, fish_name: str) -> str:
         default_image = 'fishdef.webp'
@@ -9027,6 +10198,8 @@ class Database:
             )
             trophy_row = cursor.fetchone()
 
+            begun_at = time.monotonic()
+            leaving = self._unsold_leaderboard_fish(cursor, [fid])
             cursor.execute('DELETE FROM caught_fish WHERE id = ? AND user_id = ?', (fid, uid))
 
             new_balance = current_coins - cost
@@ -9051,6 +10224,7 @@ class Database:
                 )
 
             conn.commit()
+            self._leaderboards.forget_catches(leaving, begun_at)
 
             if not trophy_row:
                 return {'ok': False, 'error': 'trophy_insert_failed'}
@@ -9095,6 +10269,8 @@ class Database:
         location = str(result.get('location') or '').strip()
         is_on_boat = bool(result.get('is_on_boat')) or self.is_user_on_boat_trip(int(user_id))
 
+        begun_at = time.monotonic()
+        leaving: List[Dict[str, Any]] = []
         with self._connect() as conn:
             cursor = conn.cursor()
             try:
@@ -9146,6 +10322,7 @@ class Database:
                     )
                     fish_row = cursor.fetchone()
                     if fish_row:
+                        leaving = self._unsold_leaderboard_fish(cursor, [int(fish_row[0])])
                         cursor.execute('DELETE FROM caught_fish WHERE id = ?', (int(fish_row[0]),))
                         info['caught_fish_removed'] = True
 
@@ -9189,6 +10366,7 @@ class Database:
                     info['treasure_removed'] = bool(getattr(cursor, 'rowcount', 0))
 
                 conn.commit()
+                self._leaderboards.forget_catches(leaving, begun_at)
             except Exception:
                 logger.exception("rollback_reward_after_raf_win failed for user=%s chat=%s", user_id, chat_id)
                 try:
@@ -9207,8 +10385,11 @@ class Database:
         # allowed in a single statement. To be robust when selling many items at
         # once, perform the update in chunks.
         chunk_size = 500
+        sold_totals: Dict[int, float] = {}
+        begun_at = time.monotonic()
         with self._connect() as conn:
             cursor = conn.cursor()
+            leaving = self._unsold_leaderboard_fish(cursor, fish_ids)
             total_updated = 0
             sales_to_record: List[Dict[str, Any]] = []
             for i in range(0, len(fish_ids), chunk_size):
@@ -9251,15 +10432,21 @@ class Database:
                 # Группируем продажи по пользователям для обновления статистики
                 user_sales: Dict[int, Dict[str, Any]] = {}
                 
-                for sale in sales_to_record:
+                sold_at = datetime.utcnow()
+                for start in range(0, len(sales_to_record), chunk_size):
+                    part = sales_to_record[start:start + chunk_size]
                     cursor.execute(
-                        '''
-                        INSERT INTO fish_sales_history (fish_name, weight, sold_at)
-                        VALUES (?, ?, CURRENT_TIMESTAMP)
-                        ''',
-                        (sale['fish_name'], sale['weight']),
+                        'INSERT INTO fish_sales_history (fish_name, weight, sold_at) VALUES '
+                        + ', '.join('(?, ?, ?)' for _ in part),
+                        [v for sale in part for v in (sale['fish_name'], sale['weight'], sold_at)],
                     )
-                    
+                self._record_sales_aggregates(
+                    cursor,
+                    [(sale['fish_name'], sale['weight']) for sale in sales_to_record],
+                    sold_at,
+                )
+
+                for sale in sales_to_record:
                     # Суммируем вес и количество по пользователям
                     user_id = sale['user_id']
                     if user_id not in user_sales:
@@ -9275,9 +10462,13 @@ class Database:
                         SET total_weight_sold = COALESCE(total_weight_sold, 0) + ?,
                             total_fish_sold = COALESCE(total_fish_sold, 0) + ?
                         WHERE user_id = ?
+                        RETURNING total_fish_sold
                         ''',
                         (float(stats['weight']), int(stats['count']), int(user_id))
                     )
+                    totals = [float(r[0] or 0) for r in cursor.fetchall() or []]
+                    if totals:
+                        sold_totals[int(user_id)] = max(totals)
 
                 day_key = datetime.utcnow().date().isoformat()
                 cursor.execute(
@@ -9314,6 +10505,13 @@ class Database:
 
             conn.commit()
             logger.info("mark_fish_as_sold: total ids=%s total_updated=%s", len(fish_ids), total_updated)
+        self._leaderboards.forget_catches(leaving, begun_at)
+
+        for user_id, sold_total in sold_totals.items():
+            try:
+                self.evaluate_achievements(user_id, stats={'sold_fish_count': sold_total})
+            except Exception:
+                logger.exception("evaluate_achievements after sale failed user_id=%s", user_id)
             
             # TODO: После ручного тестирования добавить VACUUM для очистки мертвых строк
             # После коммита выполняем VACUUM для очистки мертвых строк (только для PostgreSQL)
@@ -9333,6 +10531,7 @@ class Database:
     
     def get_player_stats(self, user_id: int, chat_id: int) -> Dict[str, Any]:
         """Получить статистику игрока из таблицы players и энциклопедии"""
+        self.flush_player_stats(user_id)
         with self._connect() as conn:
             cursor = conn.cursor()
             
@@ -9379,24 +10578,9 @@ class Database:
             biggest_fish_weight = float(player_stats[8] or 0.0)
             
             # Получаем количество уникальных рыб из энциклопедии
-            cursor.execute(
-                'SELECT * FROM user_fish_encyclopedia WHERE user_id = ?',
-                (int(user_id),)
-            )
+            cursor.execute('SELECT COUNT(*) FROM user_fish_species WHERE user_id = ?', (int(user_id),))
             row = cursor.fetchone()
-            
-            unique_fish = 0
-            if row:
-                # Получаем имена колонок
-                column_names = [desc[0] for desc in cursor.description]
-                
-                # Считаем количество колонок со значением 1
-                for col_name in column_names:
-                    if col_name.startswith('fish_'):
-                        col_index = column_names.index(col_name)
-                        value = row[col_index]
-                        if value == 1:
-                            unique_fish += 1
+            unique_fish = int(row[0] or 0) if row else 0
             
             return {
                 'total_fish': total_fish_caught,
@@ -9413,33 +10597,20 @@ class Database:
 
     def get_total_fish_species(self) -> int:
         """Возвращает общее количество видов рыб в каталоге."""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) FROM fish')
-            row = cursor.fetchone()
-            return row[0] if row else 0
+        return len(self.get_catalog().fish)
 
     def get_rod(self, rod_name: str) -> Optional[Dict[str, Any]]:
         """Получить информацию об удочке"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM rods WHERE name = ?', (rod_name,))
-            row = cursor.fetchone()
-            if not row:
-                return None
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
+        rod = self.get_catalog().rods_by_name.get(rod_name)
+        return dict(rod) if rod else None
     
     def get_rod_by_id(self, rod_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию об удочке по ID"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM rods WHERE id = ?', (rod_id,))
-            row = cursor.fetchone()
-            if not row:
-                return None
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
+        try:
+            rod = self.get_catalog().rods_by_id.get(int(rod_id))
+        except (TypeError, ValueError):
+            return None
+        return dict(rod) if rod else None
     
     def get_location(self, location_name: str) -> Optional[Dict[str, Any]]:
         """Получить информацию о локации"""
@@ -9604,15 +10775,17 @@ class Database:
                 except Exception:
                     logger.exception("get_caught_fish: secondary orphan lookup failed")
 
-            for item in results:
-                # Only skip price recalculation for genuine trash items (in the trash catalog).
-                # Fish with is_trash=1 but no trash_name match were not found in either catalog;
-                # they still get a price so they don't show as 0 coins in the shop.
-                if item.get('is_trash') and item.get('trash_name') is not None:
-                    continue
-                item['price'] = self.calculate_fish_price(item, item.get('weight', 0), item.get('length', 0))
+        # Only skip price recalculation for genuine trash items (in the trash catalog).
+        # Fish with is_trash=1 but no trash_name match were not found in either catalog;
+        # they still get a price so they don't show as 0 coins in the shop.
+        priced = [
+            item for item in results
+            if not (item.get('is_trash') and item.get('trash_name') is not None)
+        ]
+        for item, price in zip(priced, self.price_fish_items(priced)):
+            item['price'] = price
 
-            return results
+        return results
 
     def get_inventory_summary(self, user_id: int, chat_id: int) -> Dict[str, Any]:
         """Return compact inventory counters for the main inventory menu."""
@@ -9671,132 +10844,59 @@ class Database:
 
         return summary
 
-    def calculate_fish_price(self, fish: Dict[str, Any], weight: float, length: float) -> int:
-        """Рассчитать цену рыбы: редкость/размер + динамика спроса + дневной рынок."""
-        base_price = fish.get('price', 0) or 0
-        rarity = fish.get('rarity', 'Обычная')
-        fish_name = str(fish.get('fish_name') or fish.get('name') or '').strip()
-
-        # Аномалия: отдельная экономика продажи.
-        # Всегда минимум 10 000 + явный бонус за вес.
-        if rarity == 'Аномалия':
-            safe_weight = max(0.0, float(weight or 0))
-            weight_bonus = int(round(safe_weight * 1000))
-            base_anomaly_price = 10000 + weight_bonus
-            modifiers = self.get_fish_price_modifiers(fish_name)
-            return max(1, int(round(base_anomaly_price * float(modifiers.get('total_multiplier') or 1.0))))
-
-        rarity_multipliers = {
-            'Обычная': 1.15,
-            'Редкая': 1.5,
-            'Легендарная': 2.2,
-            'Мифическая': 5.0,
-        }
-        rarity_multiplier = rarity_multipliers.get(rarity, 1.0)
-
-        min_weight = fish.get('min_weight') or 0
-        max_weight = fish.get('max_weight') or 0
-        min_length = fish.get('min_length') or 0
-        max_length = fish.get('max_length') or 0
-
-        def normalize(value: float, minimum: float, maximum: float) -> float:
-            if maximum <= minimum:
-                return 0.5
-            return max(0.0, min(1.0, (value - minimum) / (maximum - minimum)))
+    def calculate_fish_price(
+        self,
+        fish: Dict[str, Any],
+        weight: float,
+        length: float,
+        modifiers: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Рассчитать цену рыбы: редкость/размер + динамика спроса + дневной рынок.
 
-        weight_ratio = normalize(weight, min_weight, max_weight)
-        length_ratio = normalize(length, min_length, max_length)
-        size_ratio = (0.7 * weight_ratio) + (0.3 * length_ratio)
-        size_multiplier = 0.7 + (0.8 * size_ratio)
+        `modifiers` — заранее посчитанные модификаторы вида (см. `price_fish_items`).
+        """
+        if modifiers is None:
+            fish_name = str(fish.get('fish_name') or fish.get('name') or '').strip()
+            modifiers = self.get_fish_price_modifiers(fish_name)
+        return fish_sale_price(fish, weight, length, float(modifiers.get('total_multiplier') or 1.0))
 
-        price = int(round(base_price * rarity_multiplier * size_multiplier))
-        modifiers = self.get_fish_price_modifiers(fish_name)
-        price = int(round(price * float(modifiers.get('total_multiplier') or 1.0)))
-        return max(1, price)
+    def price_fish_items(
+        self,
+        items: List[Dict[str, Any]],
+        weight_key: str = 'weight',
+        length_key: str = 'length',
+    ) -> List[int]:
+        """Цены для набора рыб: модификаторы считаются один раз на вид.
+
+        Порядок результата совпадает с `items`; каждый элемент — словарь рыбы
+        в формате `calculate_fish_price` (name/fish_name, rarity, price, min/max).
+        """
+        if not items:
+            return []
+        names = [str(item.get('fish_name') or item.get('name') or '').strip() for item in items]
+        modifiers_by_name = self.get_fish_price_modifiers_bulk(names)
+        neutral = self._price_modifiers_from_stats('', 0.0, None, None)
+        return [
+            self.calculate_fish_price(
+                item,
+                item.get(weight_key, 0),
+                item.get(length_key, 0),
+                modifiers=modifiers_by_name.get(self._normalize_item_name(name), neutral),
+            )
+            for item, name in zip(items, names)
+        ]
 
     def get_level_from_xp(self, xp: int) -> int:
         """Получить уровень по суммарному опыту"""
-        xp_value = max(0, int(xp or 0))
-        level = 0
-        for idx in range(1, len(LEVEL_XP_THRESHOLDS)):
-            if xp_value >= LEVEL_XP_THRESHOLDS[idx]:
-                level = idx
-            else:
-                break
-        return min(level, MAX_LEVEL)
+        return level_from_xp(xp)
 
     def get_level_progress(self, xp: int) -> Dict[str, Any]:
         """Получить прогресс уровня по суммарному опыту"""
-        xp_value = max(0, int(xp or 0))
-        level = self.get_level_from_xp(xp_value)
-        if level >= MAX_LEVEL:
-            return {
-                "level": MAX_LEVEL,
-                "xp_total": xp_value,
-                "level_start_xp": LEVEL_XP_THRESHOLDS[MAX_LEVEL],
-                "next_level_xp": None,
-                "xp_into_level": 0,
-                "xp_needed": 0,
-                "progress": 1.0,
-            }
-
-        level_start = LEVEL_XP_THRESHOLDS[level]
-        next_level_xp = LEVEL_XP_THRESHOLDS[level + 1]
-        xp_into_level = xp_value - level_start
-        xp_needed = max(1, next_level_xp - level_start)
-        progress = max(0.0, min(1.0, xp_into_level / xp_needed))
-
-        return {
-            "level": level,
-            "xp_total": xp_value,
-            "level_start_xp": level_start,
-            "next_level_xp": next_level_xp,
-            "xp_into_level": xp_into_level,
-            "xp_needed": xp_needed,
-            "progress": progress,
-        }
+        return level_progress(xp)
 
     def calculate_item_xp_details(self, item: Dict[str, Any]) -> Dict[str, Any]:
         """Рассчитать опыт за предмет с деталями бонуса"""
-        if item.get('is_trash') or item.get('rarity') == 'Мусор':
-            return {
-                'xp_total': 1,
-                'xp_base': 1,
-                'rarity_bonus': 0,
-                'rarity_multiplier': 1.0,
-                'weight_multiplier': 1.0,
-                'weight_bonus': 0,
-            }
-
-        rarity = item.get('rarity', 'Обычная')
-        base_xp = BASE_XP_BY_RARITY.get(rarity, BASE_XP_BY_RARITY['Обычная'])
-        rarity_multiplier = RARITY_XP_MULTIPLIERS.get(rarity, 1.0)
-
-        weight = float(item.get('weight') or 0)
-        min_weight = float(item.get('min_weight') or 0)
-        max_weight = float(item.get('max_weight') or 0)
-
-        weight_multiplier = 1.0
-        if max_weight > min_weight and weight > 0:
-            ratio = (weight - min_weight) / (max_weight - min_weight)
-            ratio = max(0.0, min(1.0, ratio))
-            weight_multiplier = 1.0 + (0.6 * ratio)
-
-        xp_before_weight = base_xp * rarity_multiplier
-        xp_rarity = int(round(xp_before_weight))
-        xp_total = int(round(xp_before_weight * weight_multiplier))
-        xp_base = int(round(base_xp))
-        rarity_bonus = max(0, xp_rarity - xp_base)
-        weight_bonus = max(0, xp_total - xp_rarity)
-
-        return {
-            'xp_total': max(1, xp_total),
-            'xp_base': max(1, xp_base),
-            'rarity_bonus': rarity_bonus,
-            'rarity_multiplier': rarity_multiplier,
-            'weight_multiplier': weight_multiplier,
-            'weight_bonus': weight_bonus,
-        }
+        return item_xp_details(item)
 
     def calculate_item_xp(self, item: Dict[str, Any]) -> int:
         """Рассчитать опыт за предмет (рыба или мусор)"""
@@ -9837,8 +10937,7 @@ class Database:
             cursor = conn.cursor()
             # Use the same player-row selection logic as `update_player`:
             # prefer a global profile row (chat_id IS NULL or <1) when chat-aware schema is used.
-            cursor.execute('PRAGMA table_info(players)')
-            cols = [c[1] for c in cursor.fetchall()]
+            cols = self.get_table_columns('players')
             if 'chat_id' in cols:
                 cursor.execute('SELECT COALESCE(xp, 0), COALESCE(level, 0) FROM players WHERE user_id = ? AND (chat_id IS NULL OR chat_id < 1) LIMIT 1', (user_id,))
                 row = cursor.fetchone()
@@ -9865,6 +10964,11 @@ class Database:
 
         progress = self.get_level_progress(new_xp)
         progress['leveled_up'] = new_level > (current_level or 0)
+        if progress['leveled_up']:
+            try:
+                self.evaluate_achievements(int(user_id), chat_id=chat_id, stats={'level': float(new_level)})
+            except Exception:
+                logger.exception("evaluate_achievements failed user_id=%s", user_id)
         return progress
     
     def get_leaderboard(self, limit: int = 10) -> List[Dict[str, Any]]:
@@ -9925,8 +11029,7 @@ class Database:
                     )
                     ticket_codes.append(ticket_code)
 
-            cursor.execute("PRAGMA table_info(players)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.get_table_columns('players')
             uses_chat = 'chat_id' in columns
             ticket_column = 'gold_tickets' if safe_ticket_type == 'gold' else 'tickets'
 
@@ -10115,37 +11218,60 @@ class Database:
         }
 
     def get_random_ticket(self, ticket_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        """Получить случайный билет из общего пула."""
+        """Получить случайный билет из общего пула.
+
+        Без ORDER BY RANDOM(): пробы случайных id в [MIN(id), MAX(id)] по первичному
+        ключу (см. ticket_draw). Если редкий тип не попался ни одной пробе —
+        случайная позиция по COUNT(*).
+        """
         safe_ticket_type = str(ticket_type or '').strip().lower() if ticket_type else None
         if safe_ticket_type not in (None, 'normal', 'gold'):
             safe_ticket_type = None
+        type_filter = 'AND ticket_type = ?' if safe_ticket_type else ''
+        type_params = (safe_ticket_type,) if safe_ticket_type else ()
         with self._connect() as conn:
             cursor = conn.cursor()
-            if safe_ticket_type:
-                cursor.execute(
-                    '''
-                    SELECT ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
-                    FROM ticket_items
-                    WHERE ticket_type = ?
-                    ORDER BY RANDOM()
-                    LIMIT 1
-                    ''',
-                    (safe_ticket_type,),
-                )
+            cursor.execute(
+                f'SELECT MIN(id), MAX(id) FROM ticket_items WHERE 1 = 1 {type_filter}',
+                type_params,
+            )
+            bounds = cursor.fetchone() or (None, None)
+            probes = probe_ticket_ids(bounds[0], bounds[1])
+            if not probes:
+                return None
+            cursor.execute(
+                f'''
+                SELECT id, {TICKET_ITEM_COLUMNS}
+                FROM ticket_items
+                WHERE id = ANY(?) {type_filter}
+                ''',
+                (probes, *type_params),
+            )
+            by_id = {int(row['id']): row for row in _rows_to_dicts(cursor)}
+            hit = first_probe_hit(probes, by_id)
+            if hit is not None:
+                ticket = by_id[hit]
             else:
+                cursor.execute(f'SELECT COUNT(*) FROM ticket_items WHERE 1 = 1 {type_filter}', type_params)
+                total = int((cursor.fetchone() or (0,))[0] or 0)
+                if total <= 0:
+                    return None
                 cursor.execute(
-                    '''
-                    SELECT ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
+                    f'''
+                    SELECT id, {TICKET_ITEM_COLUMNS}
                     FROM ticket_items
-                    ORDER BY RANDOM()
-                    LIMIT 1
-                    '''
+                    WHERE 1 = 1 {type_filter}
+                    ORDER BY id
+                    OFFSET ? LIMIT 1
+                    ''',
+                    (*type_params, random.randrange(total)),
                 )
-            row = cursor.fetchone()
-            if not row:
-                return None
-            columns = [description[0] for description in cursor.description]
-            return dict(zip(columns, row))
+                rows = _rows_to_dicts(cursor)
+                if not rows:
+                    return None
+                ticket = rows[0]
+        ticket.pop('id', None)
+        return ticket
 
     def get_random_tickets_in_period(
         self,
@@ -10153,48 +11279,71 @@ class Database:
         end_at: datetime,
         limit: int = 1,
         ticket_type: Optional[str] = None,
+        seed: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
-        """Получить случайные билеты из диапазона дат."""
+        """Получить случайные билеты из диапазона дат (без повторов, в порядке выпадения).
+
+        Один GROUP BY user_id по периоду, выбор k билетов в памяти по seed
+        (ticket_draw.sample_ticket_slots) и одна выборка победителей.
+        """
+        return self._draw_tickets_in_period(start_at, end_at, limit, ticket_type, seed or draw_seed())[1]
+
+    def _draw_tickets_in_period(
+        self,
+        start_at: datetime,
+        end_at: datetime,
+        limit: int,
+        ticket_type: Optional[str],
+        seed: str,
+    ):
+        """(размер пула, победители) розыгрыша за период с заданным seed."""
         safe_limit = max(1, int(limit or 1))
         safe_ticket_type = str(ticket_type or '').strip().lower() if ticket_type else None
         if safe_ticket_type not in (None, 'normal', 'gold'):
             safe_ticket_type = None
+        type_filter = 'AND ticket_type = ?' if safe_ticket_type else ''
+        period_params = (
+            start_at.strftime('%Y-%m-%d %H:%M:%S'),
+            end_at.strftime('%Y-%m-%d %H:%M:%S'),
+            *((safe_ticket_type,) if safe_ticket_type else ()),
+        )
         with self._connect() as conn:
             cursor = conn.cursor()
-            if safe_ticket_type:
-                cursor.execute(
-                    '''
-                    SELECT ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
-                    FROM ticket_items
-                    WHERE created_at >= ? AND created_at <= ? AND ticket_type = ?
-                    ORDER BY RANDOM()
-                    LIMIT ?
-                    ''',
-                    (
-                        start_at.strftime('%Y-%m-%d %H:%M:%S'),
-                        end_at.strftime('%Y-%m-%d %H:%M:%S'),
-                        safe_ticket_type,
-                        safe_limit,
-                    ),
-                )
-            else:
-                cursor.execute(
-                    '''
-                    SELECT ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
+            cursor.execute(
+                f'''
+                SELECT user_id, COUNT(*)
+                FROM ticket_items
+                WHERE created_at >= ? AND created_at <= ? {type_filter}
+                GROUP BY user_id
+                ''',
+                period_params,
+            )
+            user_counts = [(int(row[0]), int(row[1] or 0)) for row in cursor.fetchall() or []]
+            pool_size = sum(count for _, count in user_counts)
+            slots = sample_ticket_slots(user_counts, safe_limit, seed)
+            if not slots:
+                return pool_size, []
+
+            # n-й билет игрока в периоде — тем же порядком (created_at, id), что и при подсчёте
+            values_sql = ', '.join(['(?, ?, ?)'] * len(slots))
+            values_params = [value for ord_, (user_id, index) in enumerate(slots) for value in (ord_, user_id, index)]
+            cursor.execute(
+                f'''
+                SELECT t.ticket_code, t.award_id, t.user_id, t.username, t.source_type, t.source_ref,
+                       t.created_at, t.ticket_type
+                FROM (VALUES {values_sql}) AS w (ord, user_id, idx)
+                CROSS JOIN LATERAL (
+                    SELECT {TICKET_ITEM_COLUMNS}
                     FROM ticket_items
-                    WHERE created_at >= ? AND created_at <= ?
-                    ORDER BY RANDOM()
-                    LIMIT ?
-                    ''',
-                    (
-                        start_at.strftime('%Y-%m-%d %H:%M:%S'),
-                        end_at.strftime('%Y-%m-%d %H:%M:%S'),
-                        safe_limit,
-                    ),
-                )
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description] if cursor.description else []
-            return [dict(zip(columns, row)) for row in rows]
+                    WHERE user_id = w.user_id AND created_at >= ? AND created_at <= ? {type_filter}
+                    ORDER BY created_at, id
+                    OFFSET w.idx LIMIT 1
+                ) t
+                ORDER BY w.ord
+                ''',
+                [*values_params, *period_params],
+            )
+            return pool_size, _rows_to_dicts(cursor)
 
     def get_ticket_counts_for_users_in_period(
         self,
@@ -10259,24 +11408,28 @@ class Database:
         end_at: datetime,
         requested_count: int,
         created_by: int,
+        seed: Optional[str] = None,
     ) -> Dict[str, Any]:
+        """Провести розыгрыш за период и записать его: прогон с seed и победители одной вставкой."""
         safe_ticket_type = str(ticket_type or 'normal').strip().lower()
         if safe_ticket_type not in ('normal', 'gold'):
             safe_ticket_type = 'normal'
+        seed = str(seed or draw_seed())
 
-        draws = self.get_random_tickets_in_period(
+        pool_size, draws = self._draw_tickets_in_period(
             start_at=start_at,
             end_at=end_at,
             limit=requested_count,
             ticket_type=safe_ticket_type,
+            seed=seed,
         )
 
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 '''
-                INSERT INTO ticket_draw_runs (ticket_type, start_at, end_at, requested_count, created_by)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO ticket_draw_runs (ticket_type, start_at, end_at, requested_count, created_by, seed, pool_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
                 RETURNING id
                 ''',
                 (
@@ -10285,42 +11438,48 @@ class Database:
                     end_at.strftime('%Y-%m-%d %H:%M:%S'),
                     int(requested_count or 1),
                     int(created_by),
+                    seed,
+                    pool_size,
                 ),
             )
             run_row = cursor.fetchone()
             run_id = int(run_row[0]) if run_row else None
 
             stored_items: List[Dict[str, Any]] = []
-            if run_id:
+            if run_id and draws:
+                # id ticket_draw_items растут в порядке выпадения — по ним читает get_latest_ticket_draw_results
+                values_sql = ', '.join(['(?, ?, ?, ?, ?, ?, ?, ?, ?)'] * len(draws))
+                params: List[Any] = []
                 for row in draws:
-                    cursor.execute(
-                        '''
-                        INSERT INTO ticket_draw_items (
-                            run_id,
-                            ticket_code,
-                            award_id,
-                            user_id,
-                            username,
-                            source_type,
-                            source_ref,
-                            ticket_type,
-                            created_at
-                        )
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''',
-                        (
-                            run_id,
-                            row.get('ticket_code'),
-                            int(row.get('award_id') or 0),
-                            int(row.get('user_id') or 0),
-                            str(row.get('username') or 'Неизвестно'),
-                            str(row.get('source_type') or ''),
-                            str(row.get('source_ref') or '') if row.get('source_ref') is not None else None,
-                            safe_ticket_type,
-                            row.get('created_at'),
-                        ),
+                    params.extend((
+                        run_id,
+                        row.get('ticket_code'),
+                        int(row.get('award_id') or 0),
+                        int(row.get('user_id') or 0),
+                        str(row.get('username') or 'Неизвестно'),
+                        str(row.get('source_type') or ''),
+                        str(row.get('source_ref') or '') if row.get('source_ref') is not None else None,
+                        safe_ticket_type,
+                        row.get('created_at'),
+                    ))
+                cursor.execute(
+                    f'''
+                    INSERT INTO ticket_draw_items (
+                        run_id,
+                        ticket_code,
+                        award_id,
+                        user_id,
+                        username,
+                        source_type,
+                        source_ref,
+                        ticket_type,
+                        created_at
                     )
-                    stored_items.append(row)
+                    VALUES {values_sql}
+                    ''',
+                    params,
+                )
+                stored_items = list(draws)
             conn.commit()
 
         return {
@@ -10329,6 +11488,8 @@ class Database:
             'ticket_type': safe_ticket_type,
             'start_at': start_at,
             'end_at': end_at,
+            'seed': seed,
+            'pool_size': pool_size,
         }
 
     def get_latest_ticket_draw_results(self, ticket_type: str) -> Optional[Dict[str, Any]]:
@@ -10340,7 +11501,7 @@ class Database:
             cursor = conn.cursor()
             cursor.execute(
                 '''
-                SELECT id, start_at, end_at, requested_count, created_by, created_at
+                SELECT id, start_at, end_at, requested_count, created_by, created_at, seed, pool_size
                 FROM ticket_draw_runs
                 WHERE ticket_type = ?
                 ORDER BY created_at DESC
@@ -10374,73 +11535,21 @@ class Database:
             'requested_count': int(run_row[3] or 0),
             'created_by': int(run_row[4] or 0),
             'created_at': run_row[5],
+            'seed': run_row[6],
+            'pool_size': run_row[7],
             'items': items,
         }
 
     def get_chat_leaderboard_period(self, chat_id: int, limit: int = 10, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """Получить топ по общему весу улова в конкретном чате за период.
-        Логика идентична get_leaderboard_period (sold=0, JOIN fish),
+        Логика идентична get_leaderboard_period (sold=0, только рыба из fish),
         но с обязательным фильтром cf.chat_id = chat_id.
         """
-        with self._connect() as conn:
-            cursor = conn.cursor()
-
-            where_clauses: List[str] = ['cf.chat_id = %s', 'cf.sold = 0']
-            params: List = [chat_id]
-
-            if since is not None:
-                where_clauses.append('cf.caught_at >= %s')
-                params.append(since.strftime('%Y-%m-%d %H:%M:%S'))
-            if until is not None:
-                where_clauses.append('cf.caught_at <= %s')
-                params.append(until.strftime('%Y-%m-%d %H:%M:%S'))
-
-            where_sql = 'WHERE ' + ' AND '.join(where_clauses)
-
-            query = f'''
-                SELECT
-                    COALESCE(MAX(p.username), 'Неизвестно') as username,
-                    cf.user_id,
-                    COUNT(cf.id) as total_fish,
-                    COALESCE(SUM(cf.weight), 0) as total_weight
-                FROM caught_fish cf
-                JOIN fish f ON TRIM(cf.fish_name) = f.name
-                LEFT JOIN players p ON p.user_id = cf.user_id
-                {where_sql}
-                GROUP BY cf.user_id
-                ORDER BY total_weight DESC, total_fish DESC
-                LIMIT %s
-            '''
-
-            params.append(limit)
-            logger.info(
-                'get_chat_leaderboard_period QUERY: chat_id=%s since=%s until=%s limit=%s',
-                chat_id, since, until, limit
-            )
-            try:
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                logger.info(
-                    'get_chat_leaderboard_period RESULT: %d rows for chat_id=%s',
-                    len(rows), chat_id
-                )
-                for row in rows:
-                    logger.info(
-                        '  row: username=%s user_id=%s total_fish=%s total_weight=%s',
-                        row[0], row[1], row[2], row[3]
-                    )
-                return [
-                    {
-                        'username': row[0],
-                        'user_id': row[1],
-                        'total_fish': row[2],
-                        'total_weight': row[3],
-                    }
-                    for row in rows
-                ]
-            except Exception:
-                logger.exception('get_chat_leaderboard_period failed')
-                return []
+        try:
+            return self._period_leaderboard_top(limit, since, until, chat_id=int(chat_id))
+        except Exception:
+            logger.exception('get_chat_leaderboard_period failed')
+            return []
 
     def get_users_weight_leaderboard(
         self,
@@ -11081,232 +12190,187 @@ class Database:
                     'prize_text': cand.get('prize_text'),
                     'rarity_key': normalized_rarity,
                     'chance_percent': chance,
-                    'roll_value': roll,
-                    'creator_user_id': cand.get('creator_user_id'),
-                    'target_chat_id': cand.get('target_chat_id'),
-                    'remaining_prizes': remaining,
-                }
-
-            return None
-
-    def get_tour_leaderboard_weight(self, starts_at: datetime, ends_at: datetime, limit: int = 10, locations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            if locations:
-                # Фильтр по нескольким локациям
-                location_conditions = ' OR '.join(['cf.location = ?' for _ in locations])
-                query = f'''
-                SELECT
-                    COALESCE(MAX(p.username), 'Неизвестно') AS username,
-                    cf.user_id,
-                    COUNT(cf.id) AS total_fish,
-                    COALESCE(SUM(cf.weight), 0) AS total_weight
-                FROM caught_fish cf
-                LEFT JOIN players p ON p.user_id = cf.user_id
-                WHERE cf.caught_at >= ?
-                  AND cf.caught_at <= ?
-                  AND COALESCE(cf.sold, 0) = 0
-                  AND ({location_conditions})
-                GROUP BY cf.user_id
-                ORDER BY total_weight DESC, total_fish DESC
-                LIMIT ?
-                '''
-                params = [starts_at, ends_at] + locations + [max(1, int(limit or 10))]
-                cursor.execute(query, params)
-            else:
-                cursor.execute(
-                    '''
+                    'roll_value': roll,
+                    'creator_user_id': cand.get('creator_user_id'),
+                    'target_chat_id': cand.get('target_chat_id'),
+                    'remaining_prizes': remaining,
+                }
+
+            return None
+
+    def _load_leaderboard(self, scope: LeaderboardScope) -> Leaderboard:
+        """Собрать доску одним запросом: агрегаты непроданной рыбы каждого игрока области."""
+        where_clauses: List[str] = ['cf.sold = 0']
+        params: List[Any] = []
+        if scope.starts_at is not None:
+            where_clauses.append('cf.caught_at >= ?')
+            params.append(scope.starts_at)
+        if scope.ends_at is not None:
+            where_clauses.append('cf.caught_at <= ?')
+            params.append(scope.ends_at)
+        if scope.locations is not None:
+            where_clauses.append(f"cf.location IN ({', '.join('?' for _ in scope.locations)})")
+            params.extend(sorted(scope.locations))
+        if scope.chat_id is not None:
+            where_clauses.append('cf.chat_id = ?')
+            params.append(scope.chat_id)
+        if scope.fish_only:
+            where_clauses.append('EXISTS (SELECT 1 FROM fish f WHERE f.name = TRIM(cf.fish_name))')
+
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            # players может хранить несколько строк на игрока — ник берём отдельно,
+            # чтобы JOIN не размножал строки улова
+            cursor.execute(
+                f'''
+                SELECT t.*, COALESCE(p.username, 'Неизвестно') AS username
+                FROM (
                     SELECT
-                        COALESCE(MAX(p.username), 'Неизвестно') AS username,
                         cf.user_id,
                         COUNT(cf.id) AS total_fish,
-                        COALESCE(SUM(cf.weight), 0) AS total_weight
+                        COALESCE(SUM(cf.weight), 0) AS total_weight,
+                        COALESCE(SUM(cf.length), 0) AS total_length,
+                        COALESCE(MAX(cf.weight), 0) AS best_weight,
+                        (ARRAY_AGG(cf.fish_name ORDER BY cf.weight DESC NULLS LAST))[1] AS best_weight_fish,
+                        COALESCE(MAX(cf.length), 0) AS best_length,
+                        (ARRAY_AGG(cf.fish_name ORDER BY cf.length DESC NULLS LAST))[1] AS best_length_fish
                     FROM caught_fish cf
-                    LEFT JOIN players p ON p.user_id = cf.user_id
-                    WHERE cf.caught_at >= ?
-                      AND cf.caught_at <= ?
-                      AND COALESCE(cf.sold, 0) = 0
+                    WHERE {' AND '.join(where_clauses)}
                     GROUP BY cf.user_id
-                    ORDER BY total_weight DESC, total_fish DESC
-                    LIMIT ?
-                    ''',
-                    (starts_at, ends_at, max(1, int(limit or 10))),
-                )
-            rows = cursor.fetchall()
-            cols = [d[0] for d in cursor.description]
-            return [dict(zip(cols, r)) for r in rows]
+                ) t
+                LEFT JOIN LATERAL (
+                    SELECT MAX(username) AS username FROM players WHERE user_id = t.user_id
+                ) p ON TRUE
+                ''',
+                params,
+            )
+            return Leaderboard(scope, _rows_to_dicts(cursor))
+
+    def _leaderboard_top(self, scope: LeaderboardScope, limit: int, key: Any = None) -> List[Dict[str, Any]]:
+        return self._leaderboards.top(
+            scope if key is None else key,
+            lambda: self._load_leaderboard(scope),
+            max(1, int(limit or 10)),
+        )
+
+    @staticmethod
+    def _tour_leaderboard_scope(
+        kind: str,
+        starts_at: Any,
+        ends_at: Any,
+        locations: Optional[Sequence[str]] = None,
+    ) -> LeaderboardScope:
+        return LeaderboardScope(
+            kind,
+            _event_datetime(starts_at),
+            _event_datetime(ends_at),
+            frozenset(locations) if locations else None,
+        )
+
+    def get_tour_leaderboard_weight(self, starts_at: datetime, ends_at: datetime, limit: int = 10, locations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Топ турнира по общему весу непроданной рыбы (опционально по нескольким локациям)."""
+        return self._leaderboard_top(self._tour_leaderboard_scope('total_weight', starts_at, ends_at, locations), limit)
 
     def get_tour_leaderboard_length(self, starts_at: datetime, ends_at: datetime, limit: int = 10, locations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            if locations:
-                # Фильтр по нескольким локациям
-                location_conditions = ' OR '.join(['cf.location = ?' for _ in locations])
-                query = f'''
-                SELECT
-                    COALESCE(MAX(p.username), 'Неизвестно') AS username,
-                    cf.user_id,
-                    COUNT(cf.id) AS total_fish,
-                    COALESCE(SUM(cf.length), 0) AS total_length
-                FROM caught_fish cf
-                LEFT JOIN players p ON p.user_id = cf.user_id
-                WHERE cf.caught_at >= ?
-                  AND cf.caught_at <= ?
-                  AND COALESCE(cf.sold, 0) = 0
-                  AND ({location_conditions})
-                GROUP BY cf.user_id
-                ORDER BY total_length DESC, total_fish DESC
-                LIMIT ?
-                '''
-                params = [starts_at, ends_at] + locations + [max(1, int(limit or 10))]
-                cursor.execute(query, params)
-            else:
-                cursor.execute(
-                    '''
-                    SELECT
-                        COALESCE(MAX(p.username), 'Неизвестно') AS username,
-                        cf.user_id,
-                        COUNT(cf.id) AS total_fish,
-                        COALESCE(SUM(cf.length), 0) AS total_length
-                    FROM caught_fish cf
-                    LEFT JOIN players p ON p.user_id = cf.user_id
-                    WHERE cf.caught_at >= ?
-                      AND cf.caught_at <= ?
-                      AND COALESCE(cf.sold, 0) = 0
-                    GROUP BY cf.user_id
-                    ORDER BY total_length DESC, total_fish DESC
-                    LIMIT ?
-                    ''',
-                    (starts_at, ends_at, max(1, int(limit or 10))),
-                )
-            rows = cursor.fetchall()
-            cols = [d[0] for d in cursor.description]
-            return [dict(zip(cols, r)) for r in rows]
+        """Топ турнира по общей длине непроданной рыбы (опционально по нескольким локациям)."""
+        return self._leaderboard_top(self._tour_leaderboard_scope('total_length', starts_at, ends_at, locations), limit)
 
     def get_location_leaderboard_length(self, location_name: str, starts_at: datetime, ends_at: datetime, limit: int = 10) -> List[Dict[str, Any]]:
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''
-                SELECT
-                    COALESCE(MAX(p.username), 'Неизвестно') AS username,
-                    cf.user_id,
-                    COALESCE(MAX(cf.fish_name), 'Неизвестно') AS fish_name,
-                    COALESCE(MAX(cf.length), 0) AS best_length
-                FROM caught_fish cf
-                LEFT JOIN players p ON p.user_id = cf.user_id
-                WHERE cf.location = ?
-                  AND cf.caught_at >= ?
-                  AND cf.caught_at <= ?
-                  AND COALESCE(cf.sold, 0) = 0
-                GROUP BY cf.user_id
-                ORDER BY best_length DESC
-                LIMIT ?
-                ''',
-                (location_name, starts_at, ends_at, max(1, int(limit or 10))),
-            )
-            rows = cursor.fetchall()
-            cols = [d[0] for d in cursor.description]
-            return [dict(zip(cols, r)) for r in rows]
+        """Топ локации по самой длинной рыбе игрока."""
+        return self._leaderboard_top(self._tour_leaderboard_scope('best_length', starts_at, ends_at, [location_name]), limit)
 
     def get_location_leaderboard_weight(self, location_name: str, starts_at: datetime, ends_at: datetime, limit: int = 10) -> List[Dict[str, Any]]:
         """Leaderboard of single best (max) fish weight per user for a location."""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            # Use a CTE to find max weight per user, then join back to caught_fish
-            # to get the fish name corresponding to that max weight. This avoids
-            # taking an arbitrary MAX(fish_name) unrelated to the weight.
-            cursor.execute(
-                '''
-                WITH best AS (
-                    SELECT user_id, MAX(weight) AS best_weight
-                    FROM caught_fish
-                    WHERE location = ?
-                      AND caught_at >= ?
-                      AND caught_at <= ?
-                      AND COALESCE(sold, 0) = 0
-                    GROUP BY user_id
-                )
-                SELECT
-                    COALESCE(MAX(p.username), 'Неизвестно') AS username,
-                    b.user_id,
-                    COALESCE(MAX(cf.fish_name), 'Неизвестно') AS fish_name,
-                    b.best_weight
-                FROM best b
-                LEFT JOIN caught_fish cf ON cf.user_id = b.user_id AND cf.weight = b.best_weight
-                LEFT JOIN players p ON p.user_id = b.user_id
-                GROUP BY b.user_id, b.best_weight
-                ORDER BY b.best_weight DESC
-                LIMIT ?
-                ''',
-                (location_name, starts_at, ends_at, max(1, int(limit or 10))),
-            )
-            rows = cursor.fetchall()
-            cols = [d[0] for d in cursor.description]
-            return [dict(zip(cols, r)) for r in rows]
+        return self._leaderboard_top(self._tour_leaderboard_scope('best_weight', starts_at, ends_at, [location_name]), limit)
 
-    def get_leaderboard_period(self, limit: int = 10, since: Optional[datetime] = None, until: Optional[datetime] = None, chat_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Получить таблицу лидеров за период (с фильтром по началу и концу) и/или по чату"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
+    def get_tour_leaderboard_rank(
+        self,
+        kind: str,
+        user_id: int,
+        starts_at: datetime,
+        ends_at: datetime,
+        locations: Optional[List[str]] = None,
+    ) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+        """Место игрока в той же доске, что и get_tour_leaderboard_* / get_location_leaderboard_*.
 
-            where_clauses: List[str] = []
-            params: List = []
+        kind — total_weight / total_length (locations — список локаций турнира) или
+        best_weight / best_length (locations — одна локация). (None, None), если
+        игрок ещё ничего не поймал в области турнира.
+        """
+        scope = self._tour_leaderboard_scope(kind, starts_at, ends_at, locations)
+        return self._leaderboards.rank(scope, lambda: self._load_leaderboard(scope), int(user_id))
 
-            # Always join players to get username
-            join_clause = "LEFT JOIN players p ON p.user_id = cf.user_id"
+    def invalidate_leaderboards(self) -> None:
+        """Забыть доски процесса: следующий /tour или /top перечитает их из БД."""
+        self._leaderboards.clear()
 
-            # NOTE: Per configuration, leaderboard no longer supports filtering by chat_id.
-            # The `chat_id` parameter is accepted for compatibility but ignored.
+    def _record_leaderboard_catch(self, catch: Dict[str, Any], is_fish: bool, begun_at: float) -> None:
+        """Прибавить только что записанный улов к загруженным доскам."""
+        if not self._leaderboards:
+            return
+        entry = dict(catch, caught_at=_event_datetime(catch.get('caught_at')), is_fish=is_fish)
+        try:
+            if self._leaderboards.wants_username(entry):
+                with self._connect() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT MAX(username) FROM players WHERE user_id = ?', (int(entry['user_id']),))
+                    row = cursor.fetchone()
+                    entry['username'] = row[0] if row else None
+            self._leaderboards.record_catch(entry, begun_at)
+        except Exception:
+            logger.exception("leaderboard catch update failed user_id=%s", catch.get('user_id'))
+            self.invalidate_leaderboards()
 
-            if since is not None:
-                where_clauses.append("datetime(cf.caught_at) >= datetime(?)")
-                params.append(since.strftime("%Y-%m-%d %H:%M:%S"))
-            if until is not None:
-                where_clauses.append("datetime(cf.caught_at) <= datetime(?)")
-                params.append(until.strftime("%Y-%m-%d %H:%M:%S"))
+    def _unsold_leaderboard_fish(self, cursor, fish_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Строки непроданной рыбы, которые сейчас уйдут из caught_fish (до DELETE/UPDATE sold).
 
-            where_clauses.append("cf.sold = 0")
+        Без загруженных досок запрос не делается.
+        """
+        if not fish_ids or not self._leaderboards:
+            return []
+        cursor.execute(
+            '''
+            SELECT cf.id, cf.user_id, cf.chat_id, cf.fish_name, cf.weight, cf.length, cf.location, cf.caught_at,
+                   EXISTS (SELECT 1 FROM fish f WHERE f.name = TRIM(cf.fish_name)) AS is_fish
+            FROM caught_fish cf
+            WHERE cf.id = ANY(?) AND cf.sold = 0
+            ''',
+            ([int(fid) for fid in fish_ids],),
+        )
+        rows = _rows_to_dicts(cursor)
+        for row in rows:
+            row['caught_at'] = _event_datetime(row.get('caught_at'))
+        return rows
 
-            where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    def _period_leaderboard_top(
+        self,
+        limit: int,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        chat_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        if since is None or until is not None:
+            scope = LeaderboardScope('total_weight', since, until, chat_id=chat_id, fish_only=True)
+            return self._leaderboard_top(scope, limit)
+        # «За последние N»: ключ — длина окна, начало окна сдвигается при каждой перезагрузке доски
+        window = timedelta(minutes=round((datetime.now() - since).total_seconds() / 60))
+        key = ('period', window, chat_id)
 
-            query = f'''
-                SELECT 
-                    COALESCE(MAX(p.username), 'Неизвестно') as username,
-                    cf.user_id as user_id,
-                    COUNT(cf.id) as total_fish,
-                    COALESCE(SUM(cf.weight), 0) as total_weight
-                FROM caught_fish cf
-                JOIN fish f ON TRIM(cf.fish_name) = f.name
-                {join_clause}
-                {where_sql}
-                GROUP BY cf.user_id
-                ORDER BY total_weight DESC, total_fish DESC
-                LIMIT ?
-            '''
+        def _load() -> Leaderboard:
+            scope = LeaderboardScope('total_weight', datetime.now() - window, chat_id=chat_id, fish_only=True)
+            return self._load_leaderboard(scope)
 
-            params.append(limit)
-            cursor.execute(query, params)
+        return self._leaderboards.top(key, _load, max(1, int(limit or 10)))
 
-            rows = cursor.fetchall()
-            return [
-                {
-                    'username': row[0],
-                    'user_id': row[1],
-                    'total_fish': row[2],
-                    'total_weight': row[3]
-                }
-                for row in rows
-            ]
+    def get_leaderboard_period(self, limit: int = 10, since: Optional[datetime] = None, until: Optional[datetime] = None, chat_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Получить таблицу лидеров за период (с фильтром по началу и концу)"""
+        # NOTE: Per configuration, leaderboard no longer supports filtering by chat_id.
+        # The `chat_id` parameter is accepted for compatibility but ignored.
+        return self._period_leaderboard_top(limit, since, until)
     
     def get_rods(self) -> List[Dict[str, Any]]:
         """Получить список всех удочек"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM rods ORDER BY price')
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+        return [dict(r) for r in self.get_catalog().rods]
 
     def ensure_rod_catalog(self):
         """Гарантировать наличие базового каталога удочек и корректного max_weight."""
@@ -11326,20 +12390,31 @@ class Database:
             (650, "Удачливая удочка"),
         ]
 
+        changed = 0
         with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.executemany(
-                '''
-                INSERT OR IGNORE INTO rods (name, price, durability, max_durability, fish_bonus, max_weight, required_level)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''',
-                rods_data,
-            )
+            for rod in rods_data:
+                cursor.execute(
+                    '''
+                    INSERT OR IGNORE INTO rods (name, price, durability, max_durability, fish_bonus, max_weight, required_level)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    rod,
+                )
+                changed += max(0, cursor.rowcount or 0)
 
             for max_w, rod_name in rods_weight_updates:
-                cursor.execute('UPDATE rods SET max_weight = ? WHERE name = ?', (max_w, rod_name))
+                cursor.execute(
+                    'UPDATE rods SET max_weight = ? WHERE name = ? AND max_weight IS DISTINCT FROM ?',
+                    (max_w, rod_name, max_w),
+                )
+                changed += max(0, cursor.rowcount or 0)
 
             conn.commit()
+
+        # Вызывается из обработчиков; версию поднимаем, только если каталог удочек правда поменялся
+        if changed:
+            self.invalidate_catalog()
     
     def get_locations(self) -> List[Dict[str, Any]]:
         """Получить список всех локаций"""
@@ -11364,23 +12439,15 @@ class Database:
     
     def get_baits(self) -> List[Dict[str, Any]]:
         """Получить список всех наживок"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM baits ORDER BY name')
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+        return [dict(b) for b in self.get_catalog().baits]
 
     def get_bait_by_id(self, bait_id: int) -> Optional[Dict[str, Any]]:
         """Получить наживку по ID"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM baits WHERE id = ?', (bait_id,))
-            row = cursor.fetchone()
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
+        try:
+            bait = self.get_catalog().baits_by_id.get(int(bait_id))
+        except (TypeError, ValueError):
             return None
+        return dict(bait) if bait else None
     
     def get_player_baits(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить наживки игрока"""
@@ -11417,11 +12484,7 @@ class Database:
 
             for table in candidate_tables:
                 try:
-                    cursor.execute(
-                        "SELECT column_name FROM information_schema.columns WHERE table_name = %s AND table_schema = 'public'",
-                        (table,)
-                    )
-                    columns = {row[0] for row in cursor.fetchall()}
+                    columns = self.get_table_columns(table)
                     if not columns or 'user_id' not in columns:
                         continue
 
@@ -11456,6 +12519,7 @@ class Database:
 
         return 0
 
+    @ensures_schema
     def _ensure_booster_tables(self):
         """Создать таблицы бустеров (кормушки/эхолот), если их еще нет."""
         with self._connect() as conn:
@@ -11724,19 +12788,11 @@ class Database:
     
     def get_all_rods(self) -> List[Dict[str, Any]]:
         """Получить список всех удочек."""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM rods ORDER BY price ASC')
-            rows = cursor.fetchall()
-            columns = [d[0] for d in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+        return [dict(r) for r in self.get_catalog().rods]
     
     def get_all_locations(self) -> List[str]:
         """Получить список всех локаций."""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT DISTINCT name FROM locations ORDER BY name')
-            return [row[0] for row in cursor.fetchall()]
+        return list(self.get_catalog().location_names)
     
     def get_baits_for_location(self, location: str) -> List[Dict[str, Any]]:
         """Получить наживки для локации."""
@@ -11808,60 +12864,20 @@ class Database:
     
     def get_trash_by_location(self, location: str) -> List[Dict[str, Any]]:
         """Получить список мусора для локации"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM trash 
-                WHERE locations LIKE ? OR locations = 'Все'
-                ORDER BY name
-            ''', (f"%{location}%",))
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            result = [dict(zip(columns, row)) for row in rows]
-            # Если нет мусора для конкретной локации — вернём весь мусор 
-            if not result:
-                cursor.execute('SELECT * FROM trash ORDER BY name')
-                rows = cursor.fetchall()
-                result = [dict(zip(columns, row)) for row in rows]
-            return result
+        # Если нет мусора для конкретной локации — каталог вернёт весь мусор
+        return [dict(t) for t in self.get_catalog().trash_for_location(location)]
     
     def get_random_trash(self, location: str) -> Optional[Dict[str, Any]]:
         """Получить случайный мусор для локации"""
-        trash_list = self.get_trash_by_location(location)
+        trash_list = self.get_catalog().trash_for_location(location)
         if not trash_list:
-            with self._connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM trash ORDER BY name')
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                trash_list = [dict(zip(columns, row)) for row in rows]
-            if not trash_list:
-                return None
-        
-        import random
-        return random.choice(trash_list)
+            return None
+        return dict(random.choice(trash_list))
     
     def check_bait_suitable_for_fish(self, bait_name: str, fish_name: str) -> bool:
         """Проверить подходит ли наживка для рыбы"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT suitable_baits FROM fish WHERE name = ?
-            ''', (fish_name,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return False
-            
-            suitable_baits = result[0]
-            if suitable_baits == "Все":
-                return True
-            
-            # Сравниваем без учёта регистра и пробелов
-            suitable_list = [b.strip().lower() for b in suitable_baits.split(',') if b.strip()]
-            if not bait_name:
-                return False
-            return bait_name.strip().lower() in suitable_list
+        # Сравнение без учёта регистра и пробелов — см. GameCatalog.fish_baits
+        return self.get_catalog().is_bait_suitable(bait_name, fish_name)
 
     def add_star_transaction(self, user_id: int, telegram_payment_charge_id: str, total_amount: int, refund_status: str = "none", chat_id: Optional[int] = None, chat_title: Optional[str] = None) -> bool:
         """Добавить запись о транзакции Telegram Stars"""
@@ -11871,10 +12887,9 @@ class Database:
             cursor = conn.cursor()
             # If DB has chat_id/chat_title columns, insert them as well when provided via kwargs
             try:
-                cursor.execute("PRAGMA table_info(star_transactions)")
-                cols = [c[1] for c in cursor.fetchall()]
+                cols = self.get_table_columns('star_transactions')
             except Exception:
-                cols = []
+                cols = frozenset()
 
             if 'chat_id' in cols and 'chat_title' in cols:
                 cursor.execute('''
@@ -12157,6 +13172,8 @@ class Database:
                 key = str(fish_name or '')
                 fish_counter[key] = int(fish_counter.get(key, 0) or 0) + 1
 
+            begun_at = time.monotonic()
+            leaving = self._unsold_leaderboard_fish(cursor, fish_ids)
             sold_placeholders = ','.join('?' for _ in fish_ids)
             cursor.execute(
                 f'''
@@ -12177,6 +13194,7 @@ class Database:
                 (int(user_id), LIVE_BAIT_NAME, converted),
             )
             conn.commit()
+        self._leaderboards.forget_catches(leaving, begun_at)
 
         return {
             'ok': True,
@@ -12241,6 +13259,8 @@ class Database:
                 return {'ok': False, 'reason': 'no_convertible_fish'}
 
             # 3. Помечаем рыбу как использованную
+            begun_at = time.monotonic()
+            leaving = self._unsold_leaderboard_fish(cursor, actual_fish_ids)
             id_placeholders = ','.join('?' for _ in actual_fish_ids)
             cursor.execute(
                 f'UPDATE caught_fish SET sold = 1, sold_at = CURRENT_TIMESTAMP WHERE id IN ({id_placeholders})',
@@ -12260,6 +13280,7 @@ class Database:
                 )
             
             conn.commit()
+        self._leaderboards.forget_catches(leaving, begun_at)
 
         return {
             'ok': True,
@@ -12357,6 +13378,8 @@ class Database:
                     'required': donate_qty,
                 }
 
+            begun_at = time.monotonic()
+            leaving = self._unsold_leaderboard_fish(cursor, selected_ids)
             sold_placeholders = ','.join('?' for _ in selected_ids)
             cursor.execute(
                 f'''
@@ -12388,6 +13411,7 @@ class Database:
             )
             total_row = cursor.fetchone()
             conn.commit()
+        self._leaderboards.forget_catches(leaving, begun_at)
 
         return {
             'ok': True,
@@ -12413,103 +13437,26 @@ class Database:
 
         caught_name_set: set[str] = set()
         if safe_user_id > 0:
-            with self._connect() as conn:
-                cursor = conn.cursor()
-                # Используем новую таблицу user_fish_encyclopedia с колонками для каждой рыбы
-                cursor.execute(
-                    'SELECT * FROM user_fish_encyclopedia WHERE user_id = ?',
-                    (safe_user_id,)
-                )
-                row = cursor.fetchone()
-                
-                if row:
-                    # Получаем имена колонок
-                    column_names = [desc[0] for desc in cursor.description]
-                    
-                    # Получаем список всех рыб для маппинга
-                    cursor.execute('SELECT name FROM fish ORDER BY name')
-                    all_fish = cursor.fetchall()
-                    
-                    # Создаем маппинг: имя колонки -> имя рыбы
-                    column_to_fish = {}
-                    for fish_row in all_fish:
-                        fish_name = str(fish_row[0] or '').strip()
-                        if not fish_name:
-                            continue
-                        safe_column_name = Database.get_safe_fish_column_name(fish_name)
-                        column_to_fish[safe_column_name] = fish_name
-                    
-                    # Проверяем какие рыбы пойманы (значение = 1)
-                    for col_name in column_names:
-                        if col_name.startswith('fish_'):
-                            col_index = column_names.index(col_name)
-                            value = row[col_index]
-                            if value == 1:
-                                fish_name = column_to_fish.get(col_name)
-                                if fish_name:
-                                    caught_name_set.add(fish_name.lower().strip())
+            caught_name_set = self.get_caught_species_keys(safe_user_id)
 
         with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                '''
+                f'''
                 SELECT name, rarity, min_weight, max_weight, min_length, max_length, locations, suitable_baits, price
                 FROM fish
                 WHERE LOWER(TRIM(name)) LIKE LOWER(TRIM(?))
-                ORDER BY
-                    CASE rarity
-                        WHEN 'Аномалия' THEN 6
-                        WHEN 'Мифическая' THEN 5
-                        WHEN 'Легендарная' THEN 4
-                        WHEN 'Аквариумная' THEN 3
-                        WHEN 'Редкая' THEN 2
-                        ELSE 1
-                    END DESC,
-                    name ASC
+                ORDER BY {WEBAPP_BOOK_ORDER_SQL}
                 LIMIT ?
                 ''',
                 (like_pattern, safe_limit),
             )
             rows = cursor.fetchall() or []
 
-        items: List[Dict[str, Any]] = []
-        for idx, row in enumerate(rows, start=1):
-            fish_name = str(row[0] or '')
-            rarity = str(row[1] or 'Обычная')
-            min_weight = float(row[2] or 0.0)
-            max_weight = float(row[3] or 0.0)
-            min_length = float(row[4] or 0.0)
-            max_length = float(row[5] or 0.0)
-            locations = str(row[6] or 'Неизвестно')
-            baits = str(row[7] or 'Неизвестно')
-            image_file = str(fish_stickers.get(fish_name) or 'fishdef.webp')
-            is_caught = str(fish_name).strip().lower() in caught_name_set
-
-            lore = (
-                f"{fish_name} чаще встречается в локациях: {locations}. "
-                f"Рекомендуемая наживка: {baits}."
-            )
-
-            items.append(
-                {
-                    'index': idx,
-                    'name': fish_name,
-                    'rarity': rarity,
-                    'min_weight': round(min_weight, 2),
-                    'max_weight': round(max_weight, 2),
-                    'min_length': round(min_length, 1),
-                    'max_length': round(max_length, 1),
-                    'locations': locations,
-                    'baits': baits,
-                    'price': int(row[8] or 0),
-                    'lore': lore,
-                    'is_caught': is_caught,
-                    'catch_status': 'Поймана' if is_caught else 'НЕ СЛОВЛЕНА',
-                    'image_url': f'/api/fish-image/{image_file}',
-                }
-            )
-
-        return items
+        return [
+            webapp_book_item(idx, row, fish_stickers, caught_name_set)
+            for idx, row in enumerate(rows, start=1)
+        ]
 
     def get_webapp_book_total_count(self) -> int:
         """Общее количество рыб в игре для пагинации книги."""
@@ -13559,7 +14506,31 @@ class Database:
             return None
 
     def get_or_update_weather(self, location: str) -> Dict[str, Any]:
-        """Получить или обновить информацию о погоде"""
+        """Погода локации из памяти процесса; БД трогается, только когда погода истекла.
+
+        Срок — last_updated + интервал WeatherSystem. Истёкшую погоду обновляет
+        `_refresh_weather` прежним CAS по last_updated: при нескольких процессах
+        новую погоду пишет один, остальные перечитывают его строку.
+        """
+        from weather import weather_system
+
+        entry = self._weather.get(location)
+        if entry is not None and datetime.now() <= entry[1]:
+            return dict(entry[0])
+        with self._weather_lock:
+            entry = self._weather.get(location)
+            now = datetime.now()
+            if entry is None or now > entry[1]:
+                weather = self._refresh_weather(location)
+                # Строка, которую никто не обновил вовремя, перечитывается не чаще раза в N секунд
+                retry_at = now + timedelta(seconds=WEATHER_CACHE_RETRY_SEC)
+                expires_at = weather_system.weather_expires_at(weather.get('last_updated'))
+                entry = (weather, max(expires_at or retry_at, retry_at))
+                self._weather[location] = entry
+            return dict(entry[0])
+
+    def _refresh_weather(self, location: str) -> Dict[str, Any]:
+        """Прочитать погоду из БД, при необходимости создать или обновить её (CAS по last_updated)."""
         from weather import weather_system
 
         with self._connect() as conn:
@@ -13587,20 +14558,17 @@ class Database:
                     UPDATE weather 
                     SET condition = ?, temperature = ?, last_updated = CURRENT_TIMESTAMP
                     WHERE location = ? AND last_updated = ?
+                    RETURNING *
                 ''', (new_condition, new_temp, location, weather['last_updated']))
+                row = cursor.fetchone()
                 conn.commit()
 
-                if cursor.rowcount:
-                    cursor.execute('SELECT * FROM weather WHERE location = ?', (location,))
-                    row = cursor.fetchone()
-                    columns = [description[0] for description in cursor.description]
-                    weather = dict(zip(columns, row))
-                else:
+                if not row:
                     # Погода уже обновлена другим процессом/запросом
                     cursor.execute('SELECT * FROM weather WHERE location = ?', (location,))
                     row = cursor.fetchone()
-                    columns = [description[0] for description in cursor.description]
-                    weather = dict(zip(columns, row))
+                columns = [description[0] for description in cursor.description]
+                weather = dict(zip(columns, row))
 
             return weather
 
@@ -13614,6 +14582,7 @@ class Database:
                 WHERE location = ?
             ''', (condition, temperature, location))
             conn.commit()
+        self._weather.pop(location, None)
 
     def init_player_rod(self, user_id: int, rod_name: str, chat_id: int):
         """Инициализировать удочку для игрока"""
@@ -13762,27 +14731,47 @@ class Database:
                 ''', (rod['max_durability'], recovery_amount, user_id, rod_name))
                 conn.commit()
 
+    def recover_rods_tick(self, rod_name: str = BAMBOO_ROD) -> Dict[str, Any]:
+        """Один тик восстановления прочности для всех удочек сразу (джоба раз в 10 минут).
+
+        За тик удочка получает max_durability / 30 (не меньше 1), то есть полностью
+        восстанавливается за 30 тиков = 5 часов. Один UPDATE на все строки; выражения
+        в SET видят старые значения, поэтому recovery_start_time сбрасывается ровно
+        у тех удочек, которые этим тиком дошли до максимума.
+        """
+        started = time.perf_counter()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE player_rods
+                SET current_durability = LEAST(max_durability, current_durability + GREATEST(1, max_durability / 30)),
+                    recovery_start_time = CASE
+                        WHEN current_durability + GREATEST(1, max_durability / 30) >= max_durability THEN NULL
+                        ELSE recovery_start_time
+                    END
+                WHERE rod_name = ?
+                  AND recovery_start_time IS NOT NULL
+                  AND current_durability < max_durability
+                  AND (chat_id IS NULL OR chat_id < 1)
+                RETURNING user_id, recovery_start_time IS NULL
+            ''', (rod_name,))
+            rows = cursor.fetchall() or []
+        return {
+            'updated': len(rows),
+            'recovered_user_ids': [int(row[0]) for row in rows if row[1]],
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
     # ==================== МЕТОДЫ ДЛЯ РАБОТЫ С СЕТЯМИ ====================
     
     def get_nets(self) -> List[Dict[str, Any]]:
         """Получить список всех сетей"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM nets ORDER BY price')
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return [dict(zip(columns, row)) for row in rows]
+        return [dict(n) for n in self.get_catalog().nets]
     
     def get_net(self, net_name: str) -> Optional[Dict[str, Any]]:
         """Получить информацию о сети"""
-        with self._connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM nets WHERE name = ?', (net_name,))
-            row = cursor.fetchone()
-            if row:
-                columns = [description[0] for description in cursor.description]
-                return dict(zip(columns, row))
-            return None
+        net = self.get_catalog().nets_by_name.get(net_name)
+        return dict(net) if net else None
     
     def init_player_net(self, user_id: int, net_name: str, chat_id: int):
         """Инициализировать сеть для игрока в конкретном чате"""
@@ -14661,13 +15650,15 @@ class Database:
         withdrawn = self.get_withdrawn_stars(user_id, chat_id)
         return max(0, gross - withdrawn)
 
-    def update_population_state(self, user_id: int, current_location: str) -> tuple:
+    def update_population_state(self, user_id: int, current_location: str,
+                                ctx: Optional[FishingContext] = None) -> tuple:
         """
         Обновить состояние популяции рыб на локации.
         Отслеживает, сколько раз подряд игрок ловит на одной локации.
         Логика снятия штрафа:
         - если не ловить 60+ минут, штраф сбрасывается;
         - при смене локации штраф не снимается сразу: нужно 10 забросов на новой локации.
+        Если передан ctx, новые штраф и счётчик записываются и в него — заброс идёт с ним дальше.
         Возвращает (location_changed, consecutive_casts, show_warning)
         """
         with self._connect() as conn:
@@ -14752,7 +15743,10 @@ class Database:
                 WHERE user_id = %s AND chat_id = -1
             ''', (consecutive_casts, current_location, population_penalty, recovery_casts, now_iso, user_id))
             conn.commit()
-            
+            if ctx is not None:
+                ctx.population_penalty = float(population_penalty or 0.0)
+                ctx.consecutive_casts = int(consecutive_casts or 0)
+
             # show_warning если достигли 30 забросов
             show_warning = (consecutive_casts == 30 and not location_changed)
             
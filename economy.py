@@ -0,0 +1,214 @@
+"""Экономика игры без зависимостей: уровни, опыт за продажу и формула цены рыбы.
+
+Модуль не ходит в БД и не тянет ни bot.py, ни database.py, поэтому его
+импортируют и бот, и webapp. Модификаторы спроса и рынка дня, которые нужны
+цене, считает `Database` и передаёт сюда готовым множителем.
+"""
+from typing import Any, Dict, Iterable, Tuple
+
+LEVEL_XP_REQUIREMENTS = [
+    100, 250, 700, 1450, 2500, 3850, 5500, 7450, 9700, 12250,
+    15100, 18250, 21700, 25450, 29500, 33850, 38500, 43450, 48700, 54250,
+    60100, 66250, 72700, 79450, 86500, 93850, 101500, 109450, 117700, 126250,
+    135100, 144250, 153700, 163450, 173500, 183850, 194500, 205450, 216700, 228250,
+    240100, 252250, 264700, 277450, 290500, 303850, 317500, 331450, 345700, 360250,
+    375100, 390250, 405700, 421450, 437500, 453850, 470500, 487450, 504700, 522250,
+    540100, 558250, 576700, 595450, 614500, 633850, 653500, 673450, 693700, 714250,
+    735100, 756250, 777700, 799450, 821500, 843850, 866500, 889450, 912700, 936250,
+    960100, 984250, 1008700, 1033450, 1058500, 1083850, 1109500, 1135450, 1161700, 1188250,
+    1215100, 1242250, 1269700, 1297450, 1325500, 1353850, 1382500, 1411450, 1440700, 1470250,
+]
+
+LEVEL_XP_THRESHOLDS = [0]
+for requirement in LEVEL_XP_REQUIREMENTS:
+    LEVEL_XP_THRESHOLDS.append(LEVEL_XP_THRESHOLDS[-1] + requirement)
+
+MAX_LEVEL = len(LEVEL_XP_REQUIREMENTS)
+
+BASE_XP_BY_RARITY = {
+    "Обычная": 5,
+    "Редкая": 20,
+    "Легендарная": 100,
+    "Мифическая": 50,
+}
+
+RARITY_XP_MULTIPLIERS = {
+    "Обычная": 1.0,
+    "Редкая": 1.1,
+    "Легендарная": 1.2,
+    "Мифическая": 1.15,
+}
+
+# Множитель цены по редкости (для Аномалии своя формула)
+RARITY_PRICE_MULTIPLIERS = {
+    'Обычная': 1.15,
+    'Редкая': 1.5,
+    'Легендарная': 2.2,
+    'Мифическая': 5.0,
+}
+
+
+def level_from_xp(xp: int) -> int:
+    """Уровень по суммарному опыту."""
+    xp_value = max(0, int(xp or 0))
+    level = 0
+    for idx in range(1, len(LEVEL_XP_THRESHOLDS)):
+        if xp_value >= LEVEL_XP_THRESHOLDS[idx]:
+            level = idx
+        else:
+            break
+    return min(level, MAX_LEVEL)
+
+
+def level_progress(xp: int) -> Dict[str, Any]:
+    """Прогресс уровня по суммарному опыту."""
+    xp_value = max(0, int(xp or 0))
+    level = level_from_xp(xp_value)
+    if level >= MAX_LEVEL:
+        return {
+            "level": MAX_LEVEL,
+            "xp_total": xp_value,
+            "level_start_xp": LEVEL_XP_THRESHOLDS[MAX_LEVEL],
+            "next_level_xp": None,
+            "xp_into_level": 0,
+            "xp_needed": 0,
+            "progress": 1.0,
+        }
+
+    level_start = LEVEL_XP_THRESHOLDS[level]
+    next_level_xp = LEVEL_XP_THRESHOLDS[level + 1]
+    xp_into_level = xp_value - level_start
+    xp_needed = max(1, next_level_xp - level_start)
+    progress = max(0.0, min(1.0, xp_into_level / xp_needed))
+
+    return {
+        "level": level,
+        "xp_total": xp_value,
+        "level_start_xp": level_start,
+        "next_level_xp": next_level_xp,
+        "xp_into_level": xp_into_level,
+        "xp_needed": xp_needed,
+        "progress": progress,
+    }
+
+
+def format_level_progress(level_info):
+    if not level_info:
+        return ""
+
+    level = level_info.get('level', 0)
+    next_level_xp = level_info.get('next_level_xp')
+    if next_level_xp is None:
+        bar = "[" + ("=" * 10) + "]"
+        return f"Уровень {level}: {bar} MAX"
+
+    progress = level_info.get('progress', 0.0)
+    filled = int(progress * 10)
+    filled = max(0, min(10, filled))
+    bar = "[" + ("=" * filled) + ("-" * (10 - filled)) + "]"
+    xp_into = level_info.get('xp_into_level', 0)
+    xp_needed = level_info.get('xp_needed', 0)
+    return f"Уровень {level}: {bar} {xp_into}/{xp_needed}"
+
+
+def format_percent_value(value: float) -> str:
+    try:
+        normalized = float(value)
+    except Exception:
+        normalized = 0.0
+    formatted = f"{normalized:.2f}".rstrip('0').rstrip('.')
+    return formatted if formatted else "0"
+
+
+def item_xp_details(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Опыт за предмет с деталями бонуса."""
+    if item.get('is_trash') or item.get('rarity') == 'Мусор':
+        return {
+            'xp_total': 1,
+            'xp_base': 1,
+            'rarity_bonus': 0,
+            'rarity_multiplier': 1.0,
+            'weight_multiplier': 1.0,
+            'weight_bonus': 0,
+        }
+
+    rarity = item.get('rarity', 'Обычная')
+    base_xp = BASE_XP_BY_RARITY.get(rarity, BASE_XP_BY_RARITY['Обычная'])
+    rarity_multiplier = RARITY_XP_MULTIPLIERS.get(rarity, 1.0)
+
+    weight = float(item.get('weight') or 0)
+    min_weight = float(item.get('min_weight') or 0)
+    max_weight = float(item.get('max_weight') or 0)
+
+    weight_multiplier = 1.0
+    if max_weight > min_weight and weight > 0:
+        ratio = (weight - min_weight) / (max_weight - min_weight)
+        ratio = max(0.0, min(1.0, ratio))
+        weight_multiplier = 1.0 + (0.6 * ratio)
+
+    xp_before_weight = base_xp * rarity_multiplier
+    xp_rarity = int(round(xp_before_weight))
+    xp_total = int(round(xp_before_weight * weight_multiplier))
+    xp_base = int(round(base_xp))
+    rarity_bonus = max(0, xp_rarity - xp_base)
+    weight_bonus = max(0, xp_total - xp_rarity)
+
+    return {
+        'xp_total': max(1, xp_total),
+        'xp_base': max(1, xp_base),
+        'rarity_bonus': rarity_bonus,
+        'rarity_multiplier': rarity_multiplier,
+        'weight_multiplier': weight_multiplier,
+        'weight_bonus': weight_bonus,
+    }
+
+
+def calculate_sale_summary(items: Iterable[Dict[str, Any]]) -> Tuple[int, int, int, int, float]:
+    """Опыт за продажу набора рыб: (xp, базовый xp, бонус редкости, бонус веса, общий вес)."""
+    total_xp = 0
+    total_weight_bonus = 0
+    total_rarity_bonus = 0
+    total_base = 0
+    total_weight = 0.0
+    for item in items:
+        details = item_xp_details(item)
+        total_xp += details['xp_total']
+        total_weight_bonus += details['weight_bonus']
+        total_rarity_bonus += details.get('rarity_bonus', 0)
+        total_base += details['xp_base']
+        total_weight += float(item.get('weight') or 0)
+    return total_xp, total_base, total_rarity_bonus, total_weight_bonus, total_weight
+
+
+def fish_sale_price(fish: Dict[str, Any], weight: float, length: float, total_multiplier: float = 1.0) -> int:
+    """Цена рыбы по редкости и размеру, умноженная на итоговый модификатор спроса и рынка."""
+    rarity = fish.get('rarity', 'Обычная')
+
+    # Аномалия: отдельная экономика продажи.
+    # Всегда минимум 10 000 + явный бонус за вес.
+    if rarity == 'Аномалия':
+        safe_weight = max(0.0, float(weight or 0))
+        base_anomaly_price = 10000 + int(round(safe_weight * 1000))
+        return max(1, int(round(base_anomaly_price * total_multiplier)))
+
+    base_price = fish.get('price', 0) or 0
+    rarity_multiplier = RARITY_PRICE_MULTIPLIERS.get(rarity, 1.0)
+
+    min_weight = fish.get('min_weight') or 0
+    max_weight = fish.get('max_weight') or 0
+    min_length = fish.get('min_length') or 0
+    max_length = fish.get('max_length') or 0
+
+    def normalize(value: float, minimum: float, maximum: float) -> float:
+        if maximum <= minimum:
+            return 0.5
+        return max(0.0, min(1.0, (value - minimum) / (maximum - minimum)))
+
+    weight_ratio = normalize(weight, min_weight, max_weight)
+    length_ratio = normalize(length, min_length, max_length)
+    size_ratio = (0.7 * weight_ratio) + (0.3 * length_ratio)
+    size_multiplier = 0.7 + (0.8 * size_ratio)
+
+    price = int(round(base_price * rarity_multiplier * size_multiplier))
+    price = int(round(price * total_multiplier))
+    return max(1, price)
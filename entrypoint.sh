@@ -46,6 +46,11 @@ if [ "$SERVICE_MODE_VALUE" = "webapp" ]; then
     exec python -u launcher.py
   fi
 
+  if [ "${WEBAPP_SERVER:-gunicorn}" = "uvicorn" ]; then
+    echo "Starting webapp-only mode on ${APP_HOST}:${APP_PORT} with uvicorn workers=${UVICORN_WORKERS:-2}"
+    exec uvicorn "webapp.asgi:app" --host "${APP_HOST}" --port "${APP_PORT}" --workers "${UVICORN_WORKERS:-2}"
+  fi
+
   echo "Starting webapp-only mode on ${APP_HOST}:${APP_PORT} with gunicorn workers=${GUNICORN_WORKERS}"
 
   exec gunicorn -w "${GUNICORN_WORKERS}" -b "${APP_HOST}:${APP_PORT}" "webapp.app:app" --timeout "${GUNICORN_TIMEOUT:-120}"
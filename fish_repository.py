@@ -0,0 +1,279 @@
+"""Асинхронный доступ к БД для горячего пути продажи улова (asyncpg, без пула потоков)."""
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+from database import FishingContext, _event_datetime, db
+from game_logic import game
+
+logger = logging.getLogger(__name__)
+
+# Все запросы — константные строки: asyncpg готовит их один раз на соединение
+# и дальше берёт из своего statement cache.
+# Все уходящие строки улова: рыба (is_fish) продаётся, остальное только удаляется;
+# все они вычитаются из таблиц лидеров процесса
+_SELECT_SALE_ROWS = """
+    SELECT cf.id, cf.user_id, cf.chat_id, cf.fish_name, COALESCE(cf.weight, 0) AS weight,
+           cf.length, cf.location, cf.caught_at,
+           EXISTS (SELECT 1 FROM fish f WHERE LOWER(TRIM(f.name)) = LOWER(TRIM(cf.fish_name))) AS is_fish
+    FROM caught_fish cf
+    WHERE cf.id = ANY($1::bigint[]) AND COALESCE(cf.sold, 0) = 0
+"""
+_DELETE_CAUGHT = "DELETE FROM caught_fish WHERE id = ANY($1::bigint[])"
+_INSERT_SALES_HISTORY = """
+    INSERT INTO fish_sales_history (fish_name, weight, sold_at)
+    SELECT name, weight, $3::timestamp
+    FROM UNNEST($1::text[], $2::real[]) AS s(name, weight)
+"""
+_UPSERT_SALES_BUCKETS = """
+    INSERT INTO fish_sales_buckets (fish_key, bucket_start, weight, sales_count)
+    SELECT key, $4::timestamp, weight, cnt
+    FROM UNNEST($1::text[], $2::real[], $3::int[]) AS s(key, weight, cnt)
+    ON CONFLICT (fish_key, bucket_start) DO UPDATE
+    SET weight = fish_sales_buckets.weight + EXCLUDED.weight,
+        sales_count = fish_sales_buckets.sales_count + EXCLUDED.sales_count
+"""
+_UPSERT_SALES_STATS = """
+    INSERT INTO fish_sales_stats (fish_key, last_sold_at)
+    SELECT key, $2::timestamp FROM UNNEST($1::text[]) AS s(key)
+    ON CONFLICT (fish_key) DO UPDATE
+    SET last_sold_at = GREATEST(fish_sales_stats.last_sold_at, EXCLUDED.last_sold_at)
+"""
+_UPDATE_SALE_STATS = """
+    UPDATE players p
+    SET total_weight_sold = COALESCE(p.total_weight_sold, 0) + s.weight,
+        total_fish_sold = COALESCE(p.total_fish_sold, 0) + s.cnt
+    FROM UNNEST($1::bigint[], $2::double precision[], $3::int[]) AS s(user_id, weight, cnt)
+    WHERE p.user_id = s.user_id
+    RETURNING p.user_id, p.total_fish_sold
+"""
+_SELECT_MARKET = """
+    SELECT id, fish_name, sold_weight, target_weight
+    FROM daily_fish_market
+    WHERE market_day = $1
+    LIMIT 1
+"""
+_UPDATE_MARKET = "UPDATE daily_fish_market SET sold_weight = $1 WHERE id = $2"
+# Профиль блокируем до любых записей: нет профиля — транзакция ничего не меняет
+_LOCK_PLAYER_GLOBAL = """
+    SELECT 1 FROM players
+    WHERE user_id = $1 AND (chat_id IS NULL OR chat_id < 1)
+    LIMIT 1
+    FOR UPDATE
+"""
+_LOCK_PLAYER_CHAT = "SELECT 1 FROM players WHERE user_id = $1 AND chat_id = $2 LIMIT 1 FOR UPDATE"
+_CREDIT_GLOBAL = """
+    UPDATE players
+    SET coins = COALESCE(coins, 0) + $2,
+        xp = GREATEST(0, COALESCE(xp, 0) + $3)
+    WHERE user_id = $1 AND (chat_id IS NULL OR chat_id < 1)
+    RETURNING coins, xp, COALESCE(level, 0)
+"""
+_CREDIT_CHAT = """
+    UPDATE players
+    SET coins = COALESCE(coins, 0) + $3,
+        xp = GREATEST(0, COALESCE(xp, 0) + $4)
+    WHERE user_id = $1 AND chat_id = $2
+    RETURNING coins, xp, COALESCE(level, 0)
+"""
+_SET_LEVEL_GLOBAL = "UPDATE players SET level = $2 WHERE user_id = $1 AND (chat_id IS NULL OR chat_id < 1)"
+_SET_LEVEL_CHAT = "UPDATE players SET level = $3 WHERE user_id = $1 AND chat_id = $2"
+
+# Контекст заброса — те же запросы, что в Database.get_fishing_context
+_SELECT_PLAYER_GLOBAL = "SELECT * FROM players WHERE user_id = $1 AND (chat_id IS NULL OR chat_id < 1) LIMIT 1"
+_SELECT_PLAYER_CHAT = "SELECT * FROM players WHERE user_id = $1 AND chat_id = $2 LIMIT 1"
+_SELECT_FISHING_MODIFIERS = """
+    SELECT
+        (SELECT COALESCE(SUM(bonus_percent), 0) FROM player_clothing WHERE user_id = $1),
+        (SELECT COALESCE(MAX(bonus_percent), 0) FROM player_feeders
+          WHERE user_id = $1 AND (chat_id = $2 OR chat_id IS NULL OR chat_id < 1)
+            AND expires_at > CURRENT_TIMESTAMP),
+        (SELECT b.id FROM boats b JOIN boat_members bm ON bm.boat_id = b.id
+          WHERE bm.user_id = $1 AND b.is_active = 1 ORDER BY b.id DESC LIMIT 1),
+        (SELECT 1 FROM anti_abuse_captcha
+          WHERE user_id = $1 AND (penalty_until > $3 OR active_expires_at > $3) LIMIT 1),
+        (SELECT population_penalty FROM players WHERE user_id = $1 AND chat_id = -1),
+        (SELECT consecutive_casts_at_location FROM players WHERE user_id = $1 AND chat_id = -1)
+"""
+_SELECT_EFFECTS = "SELECT effect_type, expires_at FROM user_effects WHERE user_id = $1 AND expires_at > $2"
+_SELECT_PLAYER_ROD = """
+    SELECT * FROM player_rods
+    WHERE user_id = $1 AND rod_name = $2
+    ORDER BY CASE WHEN chat_id IS NULL OR chat_id < 1 THEN 0 ELSE 1 END
+    LIMIT 1
+"""
+_SELECT_BOAT = "SELECT * FROM boats WHERE id = $1"
+_COUNT_BOAT_MEMBERS = "SELECT COUNT(DISTINCT user_id) FROM boat_members WHERE boat_id = $1"
+
+
+class SaleNotCommitted(Exception):
+    """Транзакция продажи откатилась, ничего не записано — можно продать запасным путём."""
+
+
+class AsyncFishRepository:
+    """Горячий путь рыбалки на asyncpg: контекст заброса, проверка кулдауна и продажа улова.
+
+    Продажа повторяет семантику `Database.mark_fish_as_sold` + начисление монет и
+    опыта одной транзакцией, но без `_run_sync` и без чтения баланса перед записью:
+    монеты и XP прибавляются атомарно в UPDATE.
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+
+    async def get_fishing_context(self, user_id: int, chat_id: int) -> FishingContext:
+        """То же, что `Database.get_fishing_context`, одним соединением пула без пула потоков."""
+        uid, cid = int(user_id), int(chat_id)
+        ctx = FishingContext(user_id=uid, chat_id=cid)
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(_SELECT_PLAYER_GLOBAL, uid)
+            if row is None:
+                row = await conn.fetchrow(_SELECT_PLAYER_CHAT, uid, cid)
+            if row is None:
+                return ctx
+            db._fill_fishing_player(ctx, dict(row))
+
+            now_utc = datetime.utcnow()
+            active_boat_id = db._fill_fishing_modifiers(
+                ctx, await conn.fetchrow(_SELECT_FISHING_MODIFIERS, uid, cid, now_utc)
+            )
+            db._fill_fishing_effects(ctx, await conn.fetch(_SELECT_EFFECTS, uid, now_utc), now_utc)
+            rod_row = await conn.fetchrow(_SELECT_PLAYER_ROD, uid, ctx.player['current_rod'])
+            if rod_row is not None:
+                ctx.player_rod = dict(rod_row)
+            if active_boat_id is not None:
+                boat_row = await conn.fetchrow(_SELECT_BOAT, active_boat_id)
+                if boat_row is not None:
+                    boat = dict(boat_row)
+                    boat['members_count'] = int(await conn.fetchval(_COUNT_BOAT_MEMBERS, active_boat_id) or 0)
+                    ctx.active_boat = boat
+
+        db._fill_fishing_catalog(ctx)
+        return ctx
+
+    async def can_fish(
+        self, user_id: int, chat_id: int, ctx: Optional[FishingContext] = None
+    ) -> Optional[Tuple[bool, str]]:
+        """Проверка кулдауна и прочности удочки, как `FishingGame.can_fish`.
+
+        None — игрок с гарпуном в руке: сброс на бамбук пишет в БД, это делает
+        синхронный `game.can_fish`.
+        """
+        if ctx is None or not ctx.player:
+            ctx = await self.get_fishing_context(user_id, chat_id)
+        if not ctx.player:
+            return False, "Сначала создайте профиль командой /start"
+        if ctx.player.get('current_rod') == 'Гарпун':
+            return None
+        return game.check_fishing_ready(ctx)
+
+    async def sell_fish(
+        self,
+        user_id: int,
+        chat_id: int,
+        fish_ids: Sequence[int],
+        coins: int,
+        xp: int,
+    ) -> Optional[Dict[str, Any]]:
+        """Удалить проданный улов, записать историю продаж и начислить монеты/опыт.
+
+        Возвращает {'balance': int, 'level_info': dict, 'sold_totals': {user_id: total_fish_sold}}
+        или None, если профиль не найден; в этом случае улов не трогается и вызывающий
+        может идти запасным путём. Ошибка до COMMIT поднимается как `SaleNotCommitted`;
+        любая другая означает, что продажа могла пройти, и повторять её нельзя.
+        """
+        ids = [int(fish_id) for fish_id in fish_ids]
+        sold_totals: Dict[int, float] = {}
+        leaving: List[Dict[str, Any]] = []
+        begun_at = time.monotonic()
+        committing = False
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    per_chat = await conn.fetchval(_LOCK_PLAYER_GLOBAL, int(user_id)) is None
+                    if per_chat and await conn.fetchval(_LOCK_PLAYER_CHAT, int(user_id), int(chat_id)) is None:
+                        return None
+                    if ids:
+                        sold_totals, leaving = await self._mark_sold(conn, ids)
+                    if per_chat:
+                        row = await conn.fetchrow(_CREDIT_CHAT, int(user_id), int(chat_id), int(coins), int(xp))
+                    else:
+                        row = await conn.fetchrow(_CREDIT_GLOBAL, int(user_id), int(coins), int(xp))
+                    balance, new_xp, old_level = int(row[0] or 0), int(row[1] or 0), int(row[2] or 0)
+                    new_level = db.get_level_from_xp(new_xp)
+                    if new_level != old_level:
+                        if per_chat:
+                            await conn.execute(_SET_LEVEL_CHAT, int(user_id), int(chat_id), new_level)
+                        else:
+                            await conn.execute(_SET_LEVEL_GLOBAL, int(user_id), new_level)
+                    # Дальше только COMMIT: его ошибка не значит, что ничего не записано
+                    committing = True
+        except Exception as exc:
+            if committing:
+                raise
+            raise SaleNotCommitted(str(exc)) from exc
+
+        db._leaderboards.forget_catches(leaving, begun_at)
+        level_info = db.get_level_progress(new_xp)
+        level_info['leveled_up'] = new_level > old_level
+        return {'balance': balance, 'level_info': level_info, 'sold_totals': sold_totals}
+
+    async def _mark_sold(
+        self, conn: asyncpg.Connection, ids: List[int]
+    ) -> Tuple[Dict[int, float], List[Dict[str, Any]]]:
+        """Удалить улов и учесть продажу.
+
+        Возвращает новые total_fish_sold по владельцам и удалённые непроданные строки
+        (для `LeaderboardStore.forget_catches` после коммита).
+        """
+        leaving = [dict(r) for r in await conn.fetch(_SELECT_SALE_ROWS, ids)]
+        for row in leaving:
+            row['caught_at'] = _event_datetime(row.get('caught_at'))
+        status = await conn.execute(_DELETE_CAUGHT, ids)
+        logger.info("AsyncFishRepository.sell_fish: ids=%s %s", len(ids), status)
+        sale_rows = [r for r in leaving if r['is_fish']]
+        if not sale_rows:
+            return {}, leaving
+
+        names = [str(r['fish_name'] or '') for r in sale_rows]
+        weights = [float(r['weight'] or 0.0) for r in sale_rows]
+        sold_at = datetime.utcnow()
+        await conn.execute(_INSERT_SALES_HISTORY, names, weights, sold_at)
+
+        per_key = db._sales_by_key(zip(names, weights))
+        if per_key:
+            keys = sorted(per_key)
+            await conn.execute(
+                _UPSERT_SALES_BUCKETS,
+                keys,
+                [per_key[k][0] for k in keys],
+                [per_key[k][1] for k in keys],
+                db.fish_sales_bucket_start(sold_at),
+            )
+            await conn.execute(_UPSERT_SALES_STATS, keys, sold_at)
+
+        per_user: Dict[int, List[float]] = {}
+        for row, weight in zip(sale_rows, weights):
+            stats = per_user.setdefault(int(row['user_id']), [0.0, 0])
+            stats[0] += weight
+            stats[1] += 1
+        sold_totals: Dict[int, float] = {}
+        for owner_id, total in await conn.fetch(
+            _UPDATE_SALE_STATS,
+            list(per_user.keys()),
+            [v[0] for v in per_user.values()],
+            [v[1] for v in per_user.values()],
+        ):
+            sold_totals[int(owner_id)] = max(sold_totals.get(int(owner_id), 0.0), float(total or 0))
+
+        market = await conn.fetchrow(_SELECT_MARKET, datetime.utcnow().date())
+        if market:
+            market_fish = db._normalize_item_name(market[1])
+            sold_add = sum(w for n, w in zip(names, weights) if db._normalize_item_name(n) == market_fish)
+            if sold_add > 0:
+                new_sold = min(float(market[3] or 0.0), float(market[2] or 0.0) + sold_add)
+                await conn.execute(_UPDATE_MARKET, new_sold, int(market[0]))
+        return sold_totals, leaving
@@ -5,7 +5,7 @@ import random
 import logging
 from pathlib import Path
 from config import CATCH_CHANCE, NO_BITE_CHANCE, GUARANTEED_CATCH_COST, COOLDOWN_MINUTES, ROD_REPAIR_COST, CURRENT_SEASON, TRASH_CHANCE, get_current_season
-from database import db, DB_PATH, BAMBOO_ROD, TEMP_ROD_RANGES
+from database import db, DB_PATH, BAMBOO_ROD, TEMP_ROD_RANGES, FishingContext
 from fish_activity import time_hint_message_ru
 from weather import weather_system
 
@@ -166,19 +166,34 @@ class FishingGame:
             db.update_player(user_id, chat_id, current_rod=BAMBOO_ROD)
         return result
     
-    def can_fish(self, user_id: int, chat_id: int) -> Tuple[bool, str]:
+    def _reset_harpoon_rod(self, user_id: int, chat_id: int) -> FishingContext:
+        """Гарпун — не удочка: вернуть игроку бамбук и перечитать контекст."""
+        db.init_player_rod(user_id, BAMBOO_ROD, chat_id)
+        db.update_player(user_id, chat_id, current_rod=BAMBOO_ROD)
+        return db.get_fishing_context(user_id, chat_id)
+
+    def can_fish(self, user_id: int, chat_id: int, ctx: Optional[FishingContext] = None) -> Tuple[bool, str]:
         """Проверить, может ли игрок рыбачить"""
-        player: Dict[str, Any] = db.get_player(user_id, chat_id)
+        if ctx is None:
+            ctx = db.get_fishing_context(user_id, chat_id)
+        player = ctx.player
         if not player:
             return False, "Сначала создайте профиль командой /start"
 
         if player.get('current_rod') == 'Гарпун':
-            db.init_player_rod(user_id, BAMBOO_ROD, chat_id)
-            db.update_player(user_id, chat_id, current_rod=BAMBOO_ROD)
-            player = db.get_player(user_id, chat_id) or player
-        
+            ctx = self._reset_harpoon_rod(user_id, chat_id)
+            if not ctx.player:
+                ctx.player = player
+        return self.check_fishing_ready(ctx)
+
+    def check_fishing_ready(self, ctx: FishingContext) -> Tuple[bool, str]:
+        """Прочность удочки и кулдаун по уже собранному контексту, без обращений к БД."""
+        user_id = ctx.user_id
+        chat_id = ctx.chat_id
+        player = ctx.player
+
         # Проверка прочности удочки - если 0, нельзя ловить вообще
-        player_rod = db.get_player_rod(user_id, player['current_rod'], chat_id)
+        player_rod = ctx.player_rod
         if player_rod:
             current_dur = player_rod.get('current_durability', 100)
             if current_dur <= 0:
@@ -209,9 +224,17 @@ class FishingGame:
         minutes = int((remaining.total_seconds() % 3600) // 60)
         return f"{hours}ч {minutes}мин"
 
-    def fish_with_harpoon(self, user_id: int, chat_id: int, location: str) -> Dict[str, Any]:
+    def fish_with_harpoon(
+        self,
+        user_id: int,
+        chat_id: int,
+        location: str,
+        ctx: Optional[FishingContext] = None,
+    ) -> Dict[str, Any]:
         """Отдельная механика гарпуна (не удочка, отдельный инструмент)."""
-        player = db.get_player(user_id, chat_id)
+        if ctx is None:
+            ctx = db.get_fishing_context(user_id, chat_id)
+        player = ctx.player
         if not player:
             return {
                 "success": False,
@@ -255,10 +278,23 @@ class FishingGame:
             "harpoon": True,
         }
     
-    def fish(self, user_id: int, chat_id: int, location: str = "Городской пруд", guaranteed: bool = False) -> Dict[str, Any]:
-        """Основная функция ловли рыбы"""
+    def fish(
+        self,
+        user_id: int,
+        chat_id: int,
+        location: str = "Городской пруд",
+        guaranteed: bool = False,
+        ctx: Optional[FishingContext] = None,
+    ) -> Dict[str, Any]:
+        """Основная функция ловли рыбы.
+
+        ctx — контекст, уже загруженный обработчиком заброса; без него читается заново.
+        """
+        # Профиль, удочка и все модификаторы игрока — одним походом в БД
+        if ctx is None or ctx.player is None:
+            ctx = db.get_fishing_context(user_id, chat_id)
+        player = ctx.player
         # Проверка на арест рыбнадзором
-        player = db.get_player(user_id, chat_id)
         if not player:
             return {
                 "success": False,
@@ -281,45 +317,25 @@ class FishingGame:
                     }
                 db.update_player(user_id, chat_id, is_banned=0, ban_until=None)
 
+        if player.get('current_rod') == 'Гарпун':
+            ctx = self._reset_harpoon_rod(user_id, chat_id)
+            player = ctx.player or player
+
         # Проверка cooldown - не нужна для гарантированного улова (расплачено звездами)
         if not guaranteed:
-            can_fish, message = self.can_fish(user_id, chat_id)
+            can_fish, message = self.can_fish(user_id, chat_id, ctx)
             if not can_fish:
                 return {"success": False, "message": message}
 
-        if player.get('current_rod') == 'Гарпун':
-            db.init_player_rod(user_id, BAMBOO_ROD, chat_id)
-            db.update_player(user_id, chat_id, current_rod=BAMBOO_ROD)
-            player = db.get_player(user_id, chat_id) or player
         player_level = player.get('level', 0) or 0
-        rod = db.get_rod(player['current_rod'])
-
-        # Получаем бонус от наживки
-        current_bait = db.get_player_baits(user_id) or []
-        bait_bonus = 0
-        for bait in current_bait:
-            if bait['name'] == player['current_bait']:
-                bait_bonus = bait['fish_bonus']
-                break
+        rod = ctx.rod
 
         # Обновляем сезон
         self.current_season = self._get_current_season()
-        feeder_bonus = db.get_active_feeder_bonus(user_id, chat_id)
-        try:
-            clothing_bonus_percent = max(0.0, float(db.get_clothing_bonus_percent(user_id) or 0.0))
-        except Exception:
-            logger.exception("Failed to load clothing bonus for user=%s", user_id)
-            clothing_bonus_percent = 0.0
-        try:
-            beer_bonus_percent = max(0.0, float(db.get_active_beer_bonus_percent(user_id) or 0.0))
-        except Exception:
-            logger.exception("Failed to load beer bonus for user=%s", user_id)
-            beer_bonus_percent = 0.0
-        try:
-            sea_god_bonus_percent = float(db.get_sea_god_catch_modifier_percent(user_id) or 0.0)
-        except Exception:
-            logger.exception("Failed to load sea god bonus for user=%s", user_id)
-            sea_god_bonus_percent = 0.0
+        feeder_bonus = ctx.feeder_bonus
+        clothing_bonus_percent = ctx.clothing_bonus_percent
+        beer_bonus_percent = ctx.beer_bonus_percent
+        sea_god_bonus_percent = ctx.sea_god_bonus_percent
 
         # Если гарантированный улов
         if guaranteed:
@@ -331,9 +347,10 @@ class FishingGame:
                 feeder_bonus,
                 clothing_bonus_percent,
                 beer_bonus_percent,
+                ctx=ctx,
             )
 
-        # Получаем погоду и применяем бонус
+        # Погода из памяти процесса (БД — только когда она истекла) и её бонус
         weather = db.get_or_update_weather(location)
         weather_bonus = 0
         weather_condition = "Ясно"
@@ -344,13 +361,16 @@ class FishingGame:
             logger.info(f"   🌍 Weather: {weather_condition} (bonus: {weather_bonus:+d}%)")
 
         # Проверяем, находится ли игрок на лодке
-        active_boat = db.get_active_boat_by_user(user_id)
-        is_on_boat = active_boat is not None
+        active_boat = ctx.active_boat
+        is_on_boat = ctx.is_on_boat
+
+        # События на локации — из снимка планировщика, без обращения к БД;
+        # заброс только учитывается для бросков старта на следующем тике
+        events = ctx.location_events or db.get_location_events_snapshot()
+        db.note_location_cast(location)
 
         # Проверяем старое событие (эко-катастрофа) для обратной совместимости
-        eco_disaster = db.get_active_ecological_disaster(location)
-        if not eco_disaster:
-            eco_disaster = db.maybe_start_ecological_disaster(location)
+        eco_disaster = events.eco_disaster(location)
         force_trash_only = bool(eco_disaster)
         if force_trash_only:
             logger.info(
@@ -365,39 +385,14 @@ class FishingGame:
             SPAWN_EVENT_TYPE,
             MURDER_EVENT_TYPE,
             SCHOOL_EVENT_TYPE,
-            calculate_event_chance,
-            calculate_event_cooldown_hours,
             should_apply_spawn_bonus,
             should_force_murder_fish,
             calculate_school_weight_bonus,
         )
-        
-        spawn_event = db.get_active_location_event(location, SPAWN_EVENT_TYPE)
-        if not spawn_event:
-            spawn_event = db.maybe_start_location_event(
-                location,
-                SPAWN_EVENT_TYPE,
-                calculate_event_chance(SPAWN_EVENT_TYPE),
-                calculate_event_cooldown_hours(SPAWN_EVENT_TYPE)
-            )
-        
-        murder_event = db.get_active_location_event(location, MURDER_EVENT_TYPE)
-        if not murder_event:
-            murder_event = db.maybe_start_location_event(
-                location,
-                MURDER_EVENT_TYPE,
-                calculate_event_chance(MURDER_EVENT_TYPE),
-                calculate_event_cooldown_hours(MURDER_EVENT_TYPE)
-            )
-        
-        school_event = db.get_active_location_event(location, SCHOOL_EVENT_TYPE)
-        if not school_event:
-            school_event = db.maybe_start_location_event(
-                location,
-                SCHOOL_EVENT_TYPE,
-                calculate_event_chance(SCHOOL_EVENT_TYPE),
-                calculate_event_cooldown_hours(SCHOOL_EVENT_TYPE)
-            )
+
+        spawn_event = events.event(location, SPAWN_EVENT_TYPE)
+        murder_event = events.event(location, MURDER_EVENT_TYPE)
+        school_event = events.event(location, SCHOOL_EVENT_TYPE)
         
         # Применяем бонус нереста
         spawn_bonus_percent = 0
@@ -459,8 +454,8 @@ class FishingGame:
         adjusted_roll = max(0, min(ROLL_MAX, adjusted_roll))  # Ограничиваем от 0 до 20000
 
         # Применяем штраф популяции (снижаем roll за перелов на одной локации)
-        population_penalty = db.get_population_penalty(user_id)
-        consecutive_casts = db.get_consecutive_casts(user_id)
+        population_penalty = ctx.population_penalty
+        consecutive_casts = ctx.consecutive_casts
         
         penalty_points = int((population_penalty / 100) * ROLL_MAX)  # Конвертируем % в points
         adjusted_roll = adjusted_roll - penalty_points
@@ -777,9 +772,10 @@ class FishingGame:
             use_correct_bait = bait_success_roll <= 90
             
             # Ищем рыбу с НУЖНОЙ наживкой И НУЖНОЙ РЕДКОСТЬЮ
+            bait_fish_names = db.get_catalog().fish_names_for_bait(player['current_bait'])
             correct_bait_fish = [
                 f for f in fish_list 
-                if db.check_bait_suitable_for_fish(player['current_bait'], f['name'])
+                if f['name'] in bait_fish_names
                 and f['rarity'] == target_rarity
             ]
             
@@ -1014,8 +1010,11 @@ class FishingGame:
         feeder_bonus: int = 0,
         clothing_bonus_percent: float = 0.0,
         beer_bonus_percent: float = 0.0,
+        ctx: Optional[FishingContext] = None,
     ) -> Dict[str, Any]:
         """Гарантированный улов с фиксированными шансами."""
+        if ctx is None:
+            ctx = db.get_fishing_context(user_id, chat_id)
         ROLL_MAX = 20000
         TRASH_MAX = 7999
         COMMON_MAX = 14999   # 35% обычная (8000-14999)
@@ -1029,12 +1028,12 @@ class FishingGame:
         adjusted_roll = max(0, min(ROLL_MAX, roll + (feeder_bonus * 250) + (clothing_bonus_percent * 50) + (beer_bonus_percent * 50)))
         
         # Применяем штраф популяции для гарантированного улова
-        population_penalty = db.get_population_penalty(user_id)
+        population_penalty = ctx.population_penalty
         penalty_points = int((population_penalty / 100) * ROLL_MAX)  # Конвертируем % в points
         adjusted_roll = adjusted_roll - penalty_points
         adjusted_roll = max(0, adjusted_roll)  # Не может быть меньше 0
         # Текущее количество подряд выполненных забросов на этой локации
-        consecutive_casts = db.get_consecutive_casts(user_id)
+        consecutive_casts = ctx.consecutive_casts
         
         logger.info(
             f"   🎲 Guaranteed roll: {roll}/{ROLL_MAX} "
@@ -1043,9 +1042,9 @@ class FishingGame:
 
         is_lucky_rod_g = (player.get('current_rod') == 'Удачливая удочка')
 
-        eco_disaster = db.get_active_ecological_disaster(location)
-        if not eco_disaster:
-            eco_disaster = db.maybe_start_ecological_disaster(location)
+        events = ctx.location_events or db.get_location_events_snapshot()
+        db.note_location_cast(location, location_events=False)
+        eco_disaster = events.eco_disaster(location)
         force_trash_only = bool(eco_disaster)
 
         if roll == ROLL_MAX: # NFT win only on exact raw roll 20000, no buffs
@@ -1092,8 +1091,8 @@ class FishingGame:
                 level_info = db.add_player_xp(user_id, chat_id, xp_earned)
 
                 # Проверяем, находится ли игрок на лодке
-                active_boat = db.get_active_boat_by_user(user_id)
-                is_on_boat = active_boat is not None
+                active_boat = ctx.active_boat
+                is_on_boat = ctx.is_on_boat
 
                 if is_on_boat:
                     db.add_boat_catch(active_boat['id'], trash['name'], trash['weight'], chat_id, location=location, user_id=user_id)
@@ -1290,7 +1289,7 @@ class FishingGame:
             "Удачливая удочка": 710.0,
         }
         RARITY_ORDER_GUARANTEED = ["Обычная", "Редкая", "Легендарная", "Мифическая"]
-        rod_obj = db.get_rod(player['current_rod'])
+        rod_obj = ctx.rod if ctx.rod and ctx.rod.get('name') == player.get('current_rod') else db.get_rod(player['current_rod'])
         rod_max_weight = float(rod_obj.get('max_weight', 999)) if rod_obj else 999.0
         weight_cap = ROD_GUARANTEED_CAPS.get(player.get('current_rod', ''), rod_max_weight + 45.0)
 
@@ -1338,8 +1337,7 @@ class FishingGame:
         rod_broken = current_dur <= 0
 
         # Проверяем, находится ли игрок на лодке
-        active_boat = db.get_active_boat_by_user(user_id)
-        is_on_boat = active_boat is not None
+        is_on_boat = ctx.is_on_boat
 
         if is_on_boat:
             # На лодке рыба идёт в общий садок (boat_catch)
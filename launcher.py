@@ -4,6 +4,8 @@ import subprocess
 import sys
 import time
 
+from webhook_forwarder import unix_socket_url
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO,
@@ -24,17 +26,50 @@ def _public_base_url() -> str:
     return raw
 
 
-def start_bot_process() -> subprocess.Popen:
-    """Start PTB webhook server on an internal localhost port."""
+def _bot_workers() -> int:
+    try:
+        return max(1, int(os.getenv("BOT_WORKERS", "1")))
+    except ValueError:
+        return 1
+
+
+def _use_unix_socket() -> bool:
+    """Bot and WebApp share a container: talk over Unix sockets instead of loopback TCP."""
+    return os.getenv("BOT_INTERNAL_WEBHOOK_UNIX", "0") == "1"
+
+
+def _unix_socket_path(shard_index: int) -> str:
+    socket_dir = os.getenv("BOT_INTERNAL_SOCKET_DIR") or "/tmp"
+    return os.path.join(socket_dir, f"fishbot-bot-{shard_index}.sock")
+
+
+def _internal_webhook_url(shard_index: int) -> str:
+    webhook_path = os.getenv("WEBHOOK_PATH") or "telegram-webhook"
+    if _use_unix_socket():
+        return unix_socket_url(_unix_socket_path(shard_index), webhook_path)
+    base_port = int(os.getenv("BOT_INTERNAL_WEBHOOK_PORT") or "9000")
+    return f"http://127.0.0.1:{base_port + shard_index}/{webhook_path}"
+
+
+def _internal_webhook_urls(workers: int) -> list:
+    return [_internal_webhook_url(i) for i in range(workers)]
+
+
+def start_bot_process(shard_index: int = 0, shard_count: int = 1) -> subprocess.Popen:
+    """Start PTB webhook server for one shard on an internal localhost port."""
     env = os.environ.copy()
     webhook_path = env.get("WEBHOOK_PATH") or "telegram-webhook"
-    internal_port = env.get("BOT_INTERNAL_WEBHOOK_PORT") or "9000"
+    internal_port = str(int(env.get("BOT_INTERNAL_WEBHOOK_PORT") or "9000") + shard_index)
 
     env["BOT_USE_WEBHOOK"] = "1"
     env["WEBHOOK_LISTEN"] = "127.0.0.1"
     env["WEBHOOK_PORT"] = internal_port
     env["WEBHOOK_PATH"] = webhook_path
-    env["BOT_INTERNAL_WEBHOOK_URL"] = f"http://127.0.0.1:{internal_port}/{webhook_path}"
+    env["BOT_INTERNAL_WEBHOOK_URL"] = _internal_webhook_url(shard_index)
+    if _use_unix_socket():
+        env["WEBHOOK_UNIX_SOCKET"] = _unix_socket_path(shard_index)
+    env["BOT_SHARD_INDEX"] = str(shard_index)
+    env["BOT_SHARD_COUNT"] = str(shard_count)
 
     public_url = _public_base_url()
     if public_url:
@@ -42,7 +77,9 @@ def start_bot_process() -> subprocess.Popen:
 
     cmd = [sys.executable, "-u", "bot.py"]
     logger.info(
-        "Starting Bot webhook server: internal=%s public=%s/%s",
+        "Starting Bot webhook server: shard=%s/%s internal=%s public=%s/%s",
+        shard_index,
+        shard_count,
         env["BOT_INTERNAL_WEBHOOK_URL"],
         env.get("WEBHOOK_URL", ""),
         webhook_path,
@@ -50,17 +87,17 @@ def start_bot_process() -> subprocess.Popen:
     return subprocess.Popen(cmd, env=env)
 
 
-def start_webapp_process() -> subprocess.Popen:
+def start_webapp_process(bot_workers: int = 1) -> subprocess.Popen:
     """Start WebApp on Railway public port."""
     env = os.environ.copy()
     webhook_path = env.get("WEBHOOK_PATH") or "telegram-webhook"
-    internal_port = env.get("BOT_INTERNAL_WEBHOOK_PORT") or "9000"
     host = env.get("APP_HOST") or "0.0.0.0"
     port = env.get("PORT") or env.get("APP_PORT") or "8080"
     workers = env.get("GUNICORN_WORKERS") or "4"
     timeout = env.get("GUNICORN_TIMEOUT") or "120"
     env["WEBHOOK_PATH"] = webhook_path
-    env["BOT_INTERNAL_WEBHOOK_URL"] = f"http://127.0.0.1:{internal_port}/{webhook_path}"
+    env["BOT_INTERNAL_WEBHOOK_URL"] = _internal_webhook_url(0)
+    env["BOT_INTERNAL_WEBHOOK_URLS"] = ",".join(_internal_webhook_urls(bot_workers))
     try:
         proxy_timeout = float(env.get("WEBHOOK_PROXY_TIMEOUT", "0") or "0")
     except ValueError:
@@ -69,6 +106,23 @@ def start_webapp_process() -> subprocess.Popen:
         env["WEBHOOK_PROXY_TIMEOUT"] = "30"
     env.setdefault("WEBHOOK_PROXY_LOG_UPDATES", "1")
 
+    if (env.get("WEBAPP_SERVER") or "gunicorn").strip().lower() == "uvicorn":
+        # Async-режим: чтения Mini App идут через asyncpg в event loop, остальное — через WSGI-мост
+        cmd = [
+            "uvicorn",
+            "webapp.asgi:app",
+            "--host",
+            host,
+            "--port",
+            port,
+            "--workers",
+            env.get("UVICORN_WORKERS") or "2",
+            "--timeout-keep-alive",
+            env.get("UVICORN_KEEPALIVE") or "5",
+        ]
+        logger.info("Starting WebApp via subprocess: %s", " ".join(cmd))
+        return subprocess.Popen(cmd, env=env)
+
     cmd = [
         "gunicorn",
         "-w",
@@ -87,26 +141,50 @@ def start_webapp_process() -> subprocess.Popen:
     return subprocess.Popen(cmd, env=env)
 
 
+def apply_migrations_once() -> None:
+    """One-shot schema bootstrap before any process starts, so shards and WebApp only check the version."""
+    if os.getenv("DB_MIGRATE_ON_LAUNCH", "1") == "0":
+        return
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts", "apply_migrations.py")
+    started = time.monotonic()
+    result = subprocess.run([sys.executable, script], env=os.environ.copy())
+    if result.returncode != 0:
+        # Не фатально: процессы сами прогонят bootstrap, если схема отстала
+        logger.error("DB migrations step failed with code %s", result.returncode)
+        return
+    logger.info("DB migrations step finished in %.1fs", time.monotonic() - started)
+
+
 def main():
     logger.info("Starting FishBot unified launcher: public WebApp + proxied Telegram webhook")
 
-    bot_process = start_bot_process()
-    logger.info("Bot process started (pid=%s)", bot_process.pid)
+    apply_migrations_once()
+
+    bot_workers = _bot_workers()
+    bot_processes = []
+    for shard_index in range(bot_workers):
+        process = start_bot_process(shard_index, bot_workers)
+        bot_processes.append(process)
+        logger.info("Bot shard %s process started (pid=%s)", shard_index, process.pid)
 
-    webapp_process = start_webapp_process()
+    webapp_process = start_webapp_process(bot_workers)
     logger.info("WebApp process started (pid=%s)", webapp_process.pid)
 
     try:
         while True:
-            bot_code = bot_process.poll()
+            for shard_index, process in enumerate(bot_processes):
+                bot_code = process.poll()
+                if bot_code is not None:
+                    raise RuntimeError(f"Bot shard {shard_index} process exited with code {bot_code}")
             webapp_code = webapp_process.poll()
-            if bot_code is not None:
-                raise RuntimeError(f"Bot process exited with code {bot_code}")
             if webapp_code is not None:
                 raise RuntimeError(f"WebApp process exited with code {webapp_code}")
             time.sleep(5)
     finally:
-        for process, name in ((webapp_process, "WebApp"), (bot_process, "Bot")):
+        named = [(webapp_process, "WebApp")] + [
+            (process, f"Bot shard {shard_index}") for shard_index, process in enumerate(bot_processes)
+        ]
+        for process, name in named:
             if process.poll() is None:
                 logger.info("Stopping %s process...", name)
                 process.terminate()
@@ -0,0 +1,284 @@
+"""Таблицы лидеров в памяти процесса: агрегаты по игрокам, топ-N и место за O(log n).
+
+Модуль без зависимостей. `Database` один раз собирает доску агрегирующим
+запросом по caught_fish, а дальше поддерживает её сама: улов (`add_caught_fish`)
+прибавляется к доскам, в область которых попал, продажа/конвертация вычитается.
+Изменения, сделанные другими процессами (webapp, соседние шарды), доска
+подхватывает перезагрузкой по сроку `LeaderboardStore.ttl`.
+
+- Доска хранит на игрока число рыб, сумму веса и длины и лучшую рыбу по весу и
+  по длине, а также отсортированный список ключей сортировки. Топ-N — срез
+  списка, место игрока — bisect по его ключу; изменение игрока — bisect и
+  вставка в список.
+- Лучшую рыбу нельзя «вычесть»: если продана рыба, равная лучшей по метрике
+  доски, доска помечается устаревшей и перечитывается при следующем чтении.
+- Изменение, начатое во время загрузки доски, могло попасть в её запрос, а могло
+  и нет. Такую доску тоже перечитываем, чтобы не посчитать улов дважды.
+"""
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+LEADERBOARD_KINDS = ('total_weight', 'total_length', 'best_weight', 'best_length')
+
+UNKNOWN_NAME = 'Неизвестно'
+
+
+@dataclass(frozen=True)
+class LeaderboardScope:
+    """Какие уловы попадают в доску (всё непроданное по умолчанию) и по чему она сортируется."""
+
+    kind: str
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    locations: Optional[FrozenSet[str]] = None
+    chat_id: Optional[int] = None
+    # Только рыба из справочника fish (без мусора), как JOIN fish в топе /top
+    fish_only: bool = False
+
+    def __post_init__(self):
+        if self.kind not in LEADERBOARD_KINDS:
+            raise ValueError(f"unknown leaderboard kind: {self.kind}")
+
+    def matches(self, catch: Mapping[str, Any]) -> bool:
+        caught_at = catch.get('caught_at')
+        if self.starts_at is not None and (caught_at is None or caught_at < self.starts_at):
+            return False
+        if self.ends_at is not None and (caught_at is None or caught_at > self.ends_at):
+            return False
+        if self.locations is not None and catch.get('location') not in self.locations:
+            return False
+        if self.chat_id is not None and catch.get('chat_id') != self.chat_id:
+            return False
+        return not self.fish_only or bool(catch.get('is_fish'))
+
+
+class _Entry:
+    __slots__ = (
+        'user_id', 'username', 'total_fish', 'total_weight', 'total_length',
+        'best_weight', 'best_weight_fish', 'best_length', 'best_length_fish',
+    )
+
+    def __init__(self, user_id: int, username: Optional[str] = None):
+        self.user_id = user_id
+        self.username = username or UNKNOWN_NAME
+        self.total_fish = 0
+        self.total_weight = 0.0
+        self.total_length = 0.0
+        self.best_weight = 0.0
+        self.best_weight_fish: Optional[str] = None
+        self.best_length = 0.0
+        self.best_length_fish: Optional[str] = None
+
+
+def _sort_key(kind: str, entry: _Entry) -> tuple:
+    # По возрастанию ключа = по убыванию метрики; user_id делает порядок однозначным
+    if kind == 'total_weight':
+        return (-entry.total_weight, -entry.total_fish, entry.user_id)
+    if kind == 'total_length':
+        return (-entry.total_length, -entry.total_fish, entry.user_id)
+    if kind == 'best_weight':
+        return (-entry.best_weight, entry.user_id)
+    return (-entry.best_length, entry.user_id)
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Leaderboard:
+    """Одна доска: агрегаты игроков области и отсортированные ключи."""
+
+    def __init__(self, scope: LeaderboardScope, rows: Iterable[Mapping[str, Any]] = ()):
+        self.scope = scope
+        self.stale = False
+        self._entries: Dict[int, _Entry] = {}
+        for row in rows:
+            entry = _Entry(int(row['user_id']), row.get('username'))
+            entry.total_fish = int(row.get('total_fish') or 0)
+            entry.total_weight = _as_float(row.get('total_weight'))
+            entry.total_length = _as_float(row.get('total_length'))
+            entry.best_weight = _as_float(row.get('best_weight'))
+            entry.best_weight_fish = row.get('best_weight_fish')
+            entry.best_length = _as_float(row.get('best_length'))
+            entry.best_length_fish = row.get('best_length_fish')
+            self._entries[entry.user_id] = entry
+        self._keys: List[tuple] = sorted(_sort_key(scope.kind, e) for e in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def _unindex(self, entry: _Entry) -> None:
+        key = _sort_key(self.scope.kind, entry)
+        del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def add_catch(self, catch: Mapping[str, Any]) -> None:
+        user_id = int(catch['user_id'])
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = _Entry(user_id, catch.get('username'))
+        else:
+            self._unindex(entry)
+        weight, length = _as_float(catch.get('weight')), _as_float(catch.get('length'))
+        entry.total_fish += 1
+        entry.total_weight += weight
+        entry.total_length += length
+        if entry.best_weight_fish is None or weight > entry.best_weight:
+            entry.best_weight, entry.best_weight_fish = weight, catch.get('fish_name')
+        if entry.best_length_fish is None or length > entry.best_length:
+            entry.best_length, entry.best_length_fish = length, catch.get('fish_name')
+        bisect.insort(self._keys, _sort_key(self.scope.kind, entry))
+
+    def remove_catch(self, catch: Mapping[str, Any]) -> None:
+        entry = self._entries.get(int(catch['user_id']))
+        if entry is None:
+            self.stale = True
+            return
+        weight, length = _as_float(catch.get('weight')), _as_float(catch.get('length'))
+        if (self.scope.kind == 'best_weight' and weight >= entry.best_weight) or (
+            self.scope.kind == 'best_length' and length >= entry.best_length
+        ):
+            # Следующую лучшую рыбу игрока знает только БД
+            self.stale = True
+        self._unindex(entry)
+        entry.total_fish -= 1
+        if entry.total_fish <= 0:
+            del self._entries[entry.user_id]
+            return
+        entry.total_weight -= weight
+        entry.total_length -= length
+        bisect.insort(self._keys, _sort_key(self.scope.kind, entry))
+
+    def _row(self, entry: _Entry) -> Dict[str, Any]:
+        kind = self.scope.kind
+        row: Dict[str, Any] = {'username': entry.username, 'user_id': entry.user_id}
+        if kind in ('total_weight', 'total_length'):
+            row['total_fish'] = entry.total_fish
+            row[kind] = getattr(entry, kind)
+        else:
+            row['fish_name'] = getattr(entry, f'{kind}_fish') or UNKNOWN_NAME
+            row[kind] = getattr(entry, kind)
+        return row
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return [self._row(self._entries[key[-1]]) for key in self._keys[:max(0, int(limit))]]
+
+    def rank(self, user_id: int) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+        """Место игрока (с 1) и его строка; (None, None), если его нет в доске."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None, None
+        place = bisect.bisect_left(self._keys, _sort_key(self.scope.kind, entry)) + 1
+        return place, self._row(entry)
+
+
+class _Slot:
+    __slots__ = ('board', 'loaded_at', 'expires_at', 'read_at')
+
+    def __init__(self, board: Leaderboard, loaded_at: float, ttl: float):
+        self.board = board
+        self.loaded_at = loaded_at
+        self.expires_at = loaded_at + ttl
+        self.read_at = loaded_at
+
+
+class LeaderboardStore:
+    """Доски процесса по ключу: загрузка по требованию, перезагрузка по сроку и простою.
+
+    Ключ выбирает вызывающий: для турнира это сама область, для «топа за неделю»
+    — длина окна, а область с началом окна строит функция загрузки.
+    Потокобезопасен: чтения и изменения идут под одним lock, как кэш погоды, а
+    запрос загрузки — вне его.
+    """
+
+    def __init__(self, ttl: float, idle_ttl: float):
+        self.ttl = float(ttl)
+        self.idle_ttl = float(idle_ttl)
+        self._slots: Dict[Hashable, _Slot] = {}
+        self._loading: Dict[object, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self._slots)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots.clear()
+
+    def _read(self, key: Hashable, load: Callable[[], Leaderboard], read: Callable[[Leaderboard], Any]) -> Any:
+        with self._lock:
+            now = time.monotonic()
+            slot = self._slots.get(key)
+            if slot is not None and not slot.board.stale and now < slot.expires_at:
+                slot.read_at = now
+                return read(slot.board)
+            # Изменения, пришедшие во время загрузки, применяются к новой доске после неё
+            changes: List[tuple] = []
+            token = object()
+            self._loading[token] = changes
+        try:
+            board = load()  # агрегат по caught_fish — без lock, уловы процесса его не ждут
+        finally:
+            with self._lock:
+                del self._loading[token]
+        with self._lock:
+            slot = _Slot(board, now, self.ttl)
+            for catches, begun_at, remove in changes:
+                self._apply_slot(slot, catches, begun_at, remove)
+            for idle_key in [k for k, s in self._slots.items() if now - s.read_at > self.idle_ttl]:
+                del self._slots[idle_key]
+            self._slots[key] = slot
+            return read(board)
+
+    def top(self, key: Hashable, load: Callable[[], Leaderboard], limit: int) -> List[Dict[str, Any]]:
+        return self._read(key, load, lambda board: board.top(limit))
+
+    def rank(self, key: Hashable, load: Callable[[], Leaderboard], user_id: int):
+        return self._read(key, load, lambda board: board.rank(user_id))
+
+    def wants_username(self, catch: Mapping[str, Any]) -> bool:
+        """Нужен ли ник игрока: улов откроет ему строку хотя бы в одной доске."""
+        user_id = int(catch['user_id'])
+        with self._lock:
+            if self._loading:
+                return True  # загружаемая доска может ещё не знать игрока
+            return any(
+                user_id not in s.board and s.board.scope.matches(catch) for s in self._slots.values()
+            )
+
+    @staticmethod
+    def _apply_slot(slot: _Slot, catches: Iterable[Mapping[str, Any]], begun_at: float, remove: bool) -> None:
+        board = slot.board
+        if slot.loaded_at >= begun_at:
+            # Запрос загрузки мог уже увидеть это изменение
+            board.stale = True
+            return
+        for catch in catches:
+            if board.scope.matches(catch):
+                (board.remove_catch if remove else board.add_catch)(catch)
+
+    def _apply(self, catches: Iterable[Mapping[str, Any]], begun_at: float, remove: bool) -> None:
+        catches = list(catches)
+        with self._lock:
+            for slot in self._slots.values():
+                self._apply_slot(slot, catches, begun_at, remove)
+            for changes in self._loading.values():
+                changes.append((catches, begun_at, remove))
+
+    def record_catch(self, catch: Mapping[str, Any], begun_at: float) -> None:
+        """Улов записан в БД; begun_at — time.monotonic() до начала записи."""
+        self._apply((catch,), begun_at, remove=False)
+
+    def forget_catches(self, catches: List[Mapping[str, Any]], begun_at: float) -> None:
+        """Непроданная рыба ушла из caught_fish (продажа, трофей, живец)."""
+        if catches:
+            self._apply(catches, begun_at, remove=True)
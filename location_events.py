@@ -6,7 +6,7 @@
 ВАЖНЫЕ ПРАВИЛА:
 1. На одной локации может быть активно только ОДНО событие одновременно
 2. Каждый тип события может быть активен только на ОДНОЙ локации
-3. Это обеспечивается логикой в database.py (maybe_start_location_event)
+3. Это обеспечивается планировщиком в database.py (tick_location_events)
 """
 import random
 from dataclasses import dataclass
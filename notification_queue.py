@@ -0,0 +1,229 @@
+"""Хранилище очереди уведомлений: Postgres (основная БД) или SQLite (локальная разработка).
+
+Строки забираются пачками под аренду (`claimed_until`): забранная строка не видна
+другим воркерам, пока аренда не истечёт. Если процесс упал посреди отправки,
+строка вернётся в очередь сама. На Postgres выборка идёт через
+`FOR UPDATE SKIP LOCKED`, поэтому несколько воркеров не ждут друг друга.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_TABLE = "notifications_queue"
+
+# (id, method, kwargs_json, attempts, created_at)
+ClaimedRow = Tuple[int, str, str, int, int]
+
+_CREATE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {NOTIFICATIONS_TABLE} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method TEXT NOT NULL,
+        kwargs TEXT NOT NULL,
+        attempts INTEGER DEFAULT 0,
+        next_try BIGINT NOT NULL,
+        created_at BIGINT NOT NULL,
+        claimed_until BIGINT NOT NULL DEFAULT 0
+    )
+"""
+_CREATE_INDEX = f"CREATE INDEX IF NOT EXISTS idx_{NOTIFICATIONS_TABLE}_next_try ON {NOTIFICATIONS_TABLE} (next_try)"
+_INSERT = (
+    f"INSERT INTO {NOTIFICATIONS_TABLE} (method, kwargs, attempts, next_try, created_at, claimed_until) "
+    "VALUES (?, ?, 0, ?, ?, 0)"
+)
+_CLAIM_POSTGRES = f"""
+    UPDATE {NOTIFICATIONS_TABLE} SET claimed_until = ?
+    WHERE id IN (
+        SELECT id FROM {NOTIFICATIONS_TABLE}
+        WHERE next_try <= ? AND claimed_until <= ?
+        ORDER BY next_try, id
+        LIMIT ?
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, method, kwargs, attempts, created_at
+"""
+_SELECT_READY = f"""
+    SELECT id, method, kwargs, attempts, created_at FROM {NOTIFICATIONS_TABLE}
+    WHERE next_try <= ? AND claimed_until <= ?
+    ORDER BY next_try, id
+    LIMIT ?
+"""
+_RESCHEDULE = f"UPDATE {NOTIFICATIONS_TABLE} SET attempts = ?, next_try = ?, claimed_until = 0 WHERE id = ?"
+_METRICS = f"""
+    SELECT COUNT(*),
+           COALESCE(SUM(CASE WHEN next_try <= ? THEN 1 ELSE 0 END), 0),
+           MIN(CASE WHEN next_try <= ? AND claimed_until <= ? THEN next_try END)
+    FROM {NOTIFICATIONS_TABLE}
+"""
+
+
+class NotificationQueue:
+    """Операции над таблицей очереди. Все методы синхронные — вызывать через `asyncio.to_thread`."""
+
+    def __init__(self, dialect: str, sqlite_path: Optional[str] = None):
+        if dialect not in ("postgres", "sqlite"):
+            raise ValueError(f"Unsupported notifications queue dialect: {dialect}")
+        self.dialect = dialect
+        self._sqlite_path = sqlite_path
+        self._sqlite_conn: Optional[sqlite3.Connection] = None
+        self._sqlite_lock = threading.Lock()
+
+    # --- соединения ---
+
+    def _sqlite(self) -> sqlite3.Connection:
+        if self._sqlite_conn is None:
+            # autocommit: транзакции открываем явно (BEGIN IMMEDIATE при claim)
+            conn = sqlite3.connect(str(self._sqlite_path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._sqlite_conn = conn
+        return self._sqlite_conn
+
+    def _run(self, fn):
+        """Выполнить fn(conn) в транзакции на соединении своей БД."""
+        if self.dialect == "postgres":
+            from database import db
+
+            conn = db._connect()
+            try:
+                result = fn(conn)
+                conn.commit()
+                return result
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                raise
+            finally:
+                conn.close()
+
+        with self._sqlite_lock:
+            conn = self._sqlite()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # --- схема ---
+
+    def init_table(self) -> None:
+        def _init(conn):
+            cur = conn.cursor()
+            cur.execute(_CREATE_TABLE)
+            cur.execute(f"PRAGMA table_info({NOTIFICATIONS_TABLE})")
+            columns = {row[1] for row in cur.fetchall()}
+            if "claimed_until" not in columns:
+                cur.execute(f"ALTER TABLE {NOTIFICATIONS_TABLE} ADD COLUMN claimed_until BIGINT NOT NULL DEFAULT 0")
+            cur.execute(_CREATE_INDEX)
+
+        self._run(_init)
+
+    # --- запись ---
+
+    def enqueue_many(self, items: Iterable[Tuple[str, Dict[str, Any], int]]) -> int:
+        """Добавить пачку (method, kwargs, delay_seconds) одной транзакцией."""
+        now = int(time.time())
+        rows = [
+            (method, json.dumps(kwargs, ensure_ascii=False), now + int(delay or 0), now)
+            for method, kwargs, delay in items
+        ]
+        if not rows:
+            return 0
+
+        def _insert(conn):
+            conn.cursor().executemany(_INSERT, rows)
+
+        self._run(_insert)
+        return len(rows)
+
+    def claim(self, limit: int, lease_seconds: int) -> List[ClaimedRow]:
+        """Забрать до `limit` готовых строк под аренду на `lease_seconds`."""
+        now = int(time.time())
+        lease_until = now + int(lease_seconds)
+
+        def _claim(conn):
+            cur = conn.cursor()
+            if self.dialect == "postgres":
+                cur.execute(_CLAIM_POSTGRES, (lease_until, now, now, int(limit)))
+                return list(cur.fetchall())
+            cur.execute(_SELECT_READY, (now, now, int(limit)))
+            rows = list(cur.fetchall())
+            if rows:
+                placeholders = ",".join("?" * len(rows))
+                cur.execute(
+                    f"UPDATE {NOTIFICATIONS_TABLE} SET claimed_until = ? WHERE id IN ({placeholders})",
+                    (lease_until, *[row[0] for row in rows]),
+                )
+            return rows
+
+        rows = self._run(_claim)
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def delete_many(self, ids: Sequence[int]) -> None:
+        ids = [int(nid) for nid in ids]
+        if not ids:
+            return
+        placeholders = ",".join("?" * len(ids))
+
+        def _delete(conn):
+            conn.cursor().execute(f"DELETE FROM {NOTIFICATIONS_TABLE} WHERE id IN ({placeholders})", tuple(ids))
+
+        self._run(_delete)
+
+    def reschedule_many(self, items: Sequence[Tuple[int, int, int]]) -> None:
+        """Вернуть строки в очередь: (id, attempts, next_try)."""
+        rows = [(int(attempts), int(next_try), int(nid)) for nid, attempts, next_try in items]
+        if not rows:
+            return
+
+        def _reschedule(conn):
+            conn.cursor().executemany(_RESCHEDULE, rows)
+
+        self._run(_reschedule)
+
+    # --- метрики ---
+
+    def metrics(self) -> Dict[str, Any]:
+        """Глубина очереди, число готовых к отправке и лаг самой старой готовой строки (сек)."""
+        now = int(time.time())
+
+        def _metrics(conn):
+            cur = conn.cursor()
+            cur.execute(_METRICS, (now, now, now))
+            return cur.fetchone()
+
+        row = self._run(_metrics) or (0, 0, None)
+        depth, ready, oldest_ready = int(row[0] or 0), int(row[1] or 0), row[2]
+        return {
+            "depth": depth,
+            "ready": ready,
+            "lag_seconds": max(0, now - int(oldest_ready)) if oldest_ready is not None else 0,
+        }
+
+
+_default_queue: Optional[NotificationQueue] = None
+
+
+def get_queue() -> NotificationQueue:
+    """Очередь на той же БД, что и бот: Postgres при DATABASE_URL=postgres..., иначе SQLite (DB_PATH)."""
+    global _default_queue
+    if _default_queue is None:
+        database_url = str(os.getenv("DATABASE_URL") or "").lower()
+        if database_url.startswith("postgres"):
+            _default_queue = NotificationQueue("postgres")
+        else:
+            _default_queue = NotificationQueue("sqlite", sqlite_path=str(DB_PATH))
+        logger.info("Notifications queue backend: %s", _default_queue.dialect)
+    return _default_queue
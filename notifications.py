@@ -1,157 +1,240 @@
-import sqlite3
+import os
 import time
 import json
 import asyncio
 import logging
 from io import BytesIO
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
-from config import DB_PATH
 from telegram.error import RetryAfter, BadRequest
 
+from notification_queue import ClaimedRow, get_queue
+from telegram_rate_limiter import LANE_BULK, outbound_lane
+from update_routing import is_primary_shard, shard_count
+
 logger = logging.getLogger(__name__)
 
-NOTIFICATIONS_TABLE = "notifications_queue"
+
+def _per_shard(total: int) -> int:
+    """Доля общего лимита на один шард: воркеры всех шардов делят одну очередь."""
+    return max(1, -(-int(total) // shard_count()))
+
+
+# Сколько отправителей работает параллельно (значение на весь бот, делится между шардами)
+NOTIFICATIONS_SENDERS = _per_shard(os.getenv('NOTIFICATIONS_SENDERS', '8'))
+# Сколько строк забирать из очереди за раз и на сколько секунд их арендовать
+NOTIFICATIONS_CLAIM_BATCH = _per_shard(os.getenv('NOTIFICATIONS_CLAIM_BATCH', '100'))
+NOTIFICATIONS_LEASE_SEC = max(10, int(os.getenv('NOTIFICATIONS_LEASE_SEC', '300')))
+# Строку, до конца аренды которой осталось меньше этого запаса, не отправляем:
+# её вот-вот заберёт другой воркер, и отправка вышла бы двойной
+NOTIFICATIONS_LEASE_MARGIN_SEC = max(1, NOTIFICATIONS_LEASE_SEC // 5)
+# Удаление отправленных — пачками не больше этого размера
+NOTIFICATIONS_DELETE_BATCH = max(1, int(os.getenv('NOTIFICATIONS_DELETE_BATCH', '100')))
+
 
 def init_notifications_table():
-    path = str(DB_PATH)
-    conn = sqlite3.connect(path)
-    try:
-        cur = conn.cursor()
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {NOTIFICATIONS_TABLE} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                method TEXT NOT NULL,
-                kwargs TEXT NOT NULL,
-                attempts INTEGER DEFAULT 0,
-                next_try INTEGER NOT NULL,
-                created_at INTEGER NOT NULL
-            )
-        """)
-        conn.commit()
-    finally:
-        conn.close()
+    get_queue().init_table()
+
+
+def runs_on_this_shard() -> bool:
+    """Postgres-очередь разбирают все шарды (SKIP LOCKED делит строки), SQLite — только шард 0."""
+    return is_primary_shard() or get_queue().dialect == "postgres"
+
 
 async def enqueue_notification(method: str, kwargs: Dict[str, Any], delay_seconds: int = 0):
     """Добавить уведомление в очередь. `kwargs` сериализуются в JSON. Для файлов используйте ключ `document_path`."""
-    path = str(DB_PATH)
-    next_try = int(time.time()) + int(delay_seconds)
-    created_at = int(time.time())
-    conn = sqlite3.connect(path)
-    try:
-        cur = conn.cursor()
-        cur.execute(f"INSERT INTO {NOTIFICATIONS_TABLE} (method, kwargs, attempts, next_try, created_at) VALUES (?, ?, 0, ?, ?)",
-                    (method, json.dumps(kwargs, ensure_ascii=False), next_try, created_at))
-        conn.commit()
-        logger.debug("Enqueued notification: %s %s (next_try=%s)", method, kwargs if isinstance(kwargs, dict) else str(kwargs), next_try)
-    finally:
-        conn.close()
+    await enqueue_notifications([(method, kwargs, delay_seconds)])
 
-async def start_worker(application, poll_interval: float = 1.0):
-    """Запустить фоновую задачу-воркер для отправки уведомлений."""
-    loop = asyncio.get_running_loop()
-    loop.create_task(_worker(application, poll_interval))
-    logger.info("Notifications worker scheduled on running event loop")
 
-async def _worker(application, poll_interval: float):
-    path = str(DB_PATH)
-    while True:
-        try:
-            now = int(time.time())
-            conn = sqlite3.connect(path)
-            cur = conn.cursor()
-            cur.execute(f"SELECT id, method, kwargs, attempts FROM {NOTIFICATIONS_TABLE} WHERE next_try <= ? ORDER BY created_at LIMIT 10", (now,))
-            rows = cur.fetchall()
-            conn.close()
-
-            if not rows:
-                await asyncio.sleep(poll_interval)
-                continue
-
-            for row in rows:
-                nid, method, kwargs_json, attempts = row
-                try:
-                    logger.debug("Processing notification %s method=%s attempts=%s", nid, method, attempts)
-                    kwargs = json.loads(kwargs_json)
-                except Exception:
-                    logger.exception("Invalid kwargs in notification %s, deleting", nid)
-                    _delete_notification(nid)
+async def enqueue_notifications(items: Iterable[Tuple[str, Dict[str, Any], int]]) -> int:
+    """Добавить пачку уведомлений (method, kwargs, delay_seconds) одной транзакцией.
+
+    Для массовых рассылок (итоги турниров, розыгрыши) — вместо цикла по enqueue_notification.
+    """
+    items = list(items)
+    count = await asyncio.to_thread(get_queue().enqueue_many, items)
+    logger.debug("Enqueued %s notifications", count)
+    return count
+
+
+class _NotificationWorker:
+    """Забирает очередь пачками и раздаёт строки параллельным отправителям."""
+
+    def __init__(self, application, poll_interval: float):
+        self.application = application
+        self.poll_interval = poll_interval
+        self.queue = get_queue()
+        # (строка, момент, после которого её уже нельзя отправлять)
+        self._pending: asyncio.Queue = asyncio.Queue(maxsize=NOTIFICATIONS_CLAIM_BATCH + NOTIFICATIONS_SENDERS)
+        self._done: List[int] = []
+        self._retry: List[Tuple[int, int, int]] = []
+        self._flush_event = asyncio.Event()
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'dropped': 0, 'claimed': 0, 'lease_expired': 0}
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for idx in range(NOTIFICATIONS_SENDERS):
+            loop.create_task(self._sender(idx))
+        loop.create_task(self._flusher())
+        while True:
+            try:
+                # Новую пачку берём, только когда прошлая почти разобрана: иначе строки
+                # ждали бы в памяти, пока их аренда не истечёт
+                if self._pending.qsize() >= NOTIFICATIONS_SENDERS:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                rows = await asyncio.to_thread(self.queue.claim, NOTIFICATIONS_CLAIM_BATCH, NOTIFICATIONS_LEASE_SEC)
+                if not rows:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                send_before = time.time() + NOTIFICATIONS_LEASE_SEC - NOTIFICATIONS_LEASE_MARGIN_SEC
+                self.stats['claimed'] += len(rows)
+                for row in rows:
+                    await self._pending.put((row, send_before))
+            except Exception as e:
+                logger.exception("Notifications worker critical error: %s", e)
+                await asyncio.sleep(5)
+
+    async def _sender(self, idx: int):
+        # Лимиты Telegram (общий и на чат) соблюдает EmojiBot; рассылка идёт фоновой
+        # полосой и уступает интерактивным ответам
+        outbound_lane.set(LANE_BULK)
+        while True:
+            row, send_before = await self._pending.get()
+            try:
+                if time.time() >= send_before:
+                    # Не трогаем строку: после аренды её заберут заново и отправят один раз
+                    self.stats['lease_expired'] += 1
                     continue
+                await self._process(row)
+            except Exception:
+                logger.exception("Notifications sender %s failed on row %s", idx, row[0])
+            finally:
+                self._pending.task_done()
 
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def flush(self):
+        done, self._done = self._done, []
+        retry, self._retry = self._retry, []
+        try:
+            for start in range(0, len(done), NOTIFICATIONS_DELETE_BATCH):
+                await asyncio.to_thread(self.queue.delete_many, done[start:start + NOTIFICATIONS_DELETE_BATCH])
+            if retry:
+                await asyncio.to_thread(self.queue.reschedule_many, retry)
+        except Exception:
+            # Не удалили — строки вернутся после окончания аренды; лучше дубль, чем потеря
+            logger.exception("Failed to flush notifications: done=%s retry=%s", len(done), len(retry))
+
+    def _finish(self, nid: int):
+        self._done.append(nid)
+        if len(self._done) >= NOTIFICATIONS_DELETE_BATCH:
+            self._flush_event.set()
+
+    def _reschedule(self, nid: int, attempts: int, next_try: int):
+        self._retry.append((nid, attempts, next_try))
+        self.stats['retried'] += 1
+
+    async def _process(self, row: ClaimedRow):
+        nid, method, kwargs_json, attempts, _created_at = row
+        try:
+            logger.debug("Processing notification %s method=%s attempts=%s", nid, method, attempts)
+            kwargs = json.loads(kwargs_json)
+        except Exception:
+            logger.exception("Invalid kwargs in notification %s, deleting", nid)
+            self.stats['dropped'] += 1
+            self._finish(nid)
+            return
+
+        try:
+            if await self._deliver(nid, method, kwargs):
+                self.stats['sent'] += 1
+            else:
+                self.stats['dropped'] += 1
+            self._finish(nid)
+        except RetryAfter as e:
+            wait = getattr(e, 'retry_after', None) or 1
+            if hasattr(wait, 'total_seconds'):
+                wait = wait.total_seconds()
+            wait = int(wait)
+            self._reschedule(nid, attempts + 1, int(time.time()) + wait + 1)
+            logger.warning("RetryAfter for notification %s, retrying in %s sec", nid, wait)
+        except Exception:
+            # non-retryable error: exponential backoff
+            attempts_next = attempts + 1
+            backoff = min(3600, 2 ** attempts_next)
+            self.stats['failed'] += 1
+            self._reschedule(nid, attempts_next, int(time.time()) + backoff)
+            logger.exception("Error sending notification %s, rescheduled (attempt %s)", nid, attempts_next)
+
+    async def _deliver(self, nid: int, method: str, kwargs: Dict[str, Any]) -> bool:
+        """Отправить уведомление. False — строку надо выкинуть без отправки."""
+        bot = self.application.bot
+        # Special handling for document path
+        if method == 'send_document' and 'document_path' in kwargs:
+            doc_path = kwargs.pop('document_path')
+            # ensure file exists
+            if not Path(doc_path).exists():
+                logger.error("Document not found for notification %s: %s", nid, doc_path)
+                return False
+
+            data = await asyncio.to_thread(Path(doc_path).read_bytes)
+            document = BytesIO(data)
+            document.name = Path(doc_path).name
+            await bot.send_document(**{**kwargs, 'document': document})
+            return True
+
+        func = getattr(bot, method, None)
+        if not func:
+            logger.error("Unknown bot method for notification %s: %s", nid, method)
+            return False
+        try:
+            await func(**kwargs)
+        except BadRequest as bre:
+            # Try fallback: if entities parsing failed, resend as plain text
+            msg = str(bre)
+            logger.warning("BadRequest while sending notification %s: %s", nid, msg)
+            if "Can't parse entities" in msg or "unexpected end of name token" in msg:
+                # attempt to resend without parse_mode (plain text)
+                fallback_kwargs = dict(kwargs)
+                fallback_kwargs.pop('parse_mode', None)
                 try:
-                    # Special handling for document path
-                    if method == 'send_document' and 'document_path' in kwargs:
-                        doc_path = kwargs.pop('document_path')
-                        # ensure file exists
-                        if not Path(doc_path).exists():
-                            logger.error("Document not found for notification %s: %s", nid, doc_path)
-                            _delete_notification(nid)
-                            continue
-
-                        data = await asyncio.to_thread(Path(doc_path).read_bytes)
-                        document = BytesIO(data)
-                        document.name = Path(doc_path).name
-                        await application.bot.send_document(**{**kwargs, 'document': document})
-                    else:
-                        func = getattr(application.bot, method, None)
-                        if not func:
-                            logger.error("Unknown bot method for notification %s: %s", nid, method)
-                            _delete_notification(nid)
-                            continue
-                        try:
-                            await func(**kwargs)
-                        except BadRequest as bre:
-                            # Try fallback: if entities parsing failed, resend as plain text
-                            msg = str(bre)
-                            logger.warning("BadRequest while sending notification %s: %s", nid, msg)
-                            if "Can't parse entities" in msg or "unexpected end of name token" in msg:
-                                # attempt to resend without parse_mode (plain text)
-                                fallback_kwargs = dict(kwargs)
-                                fallback_kwargs.pop('parse_mode', None)
-                                try:
-                                    await func(**fallback_kwargs)
-                                except Exception as e2:
-                                    logger.exception("Fallback send failed for notification %s: %s", nid, e2)
-                                    raise
-                            else:
-                                raise
-
-                    # success -> delete
-                    _delete_notification(nid)
-                except RetryAfter as e:
-                    wait = getattr(e, 'retry_after', None) or 1
-                    attempts_next = attempts + 1
-                    next_try = int(time.time()) + int(wait) + 1
-                    await _reschedule_notification(nid, attempts_next, next_try)
-                    logger.warning("RetryAfter for notification %s, retrying in %s sec", nid, wait)
-                except Exception as e:
-                    # non-retryable error: exponential backoff
-                    attempts_next = attempts + 1
-                    backoff = min(3600, 2 ** attempts_next)
-                    next_try = int(time.time()) + backoff
-                    await _reschedule_notification(nid, attempts_next, next_try)
-                    logger.exception("Error sending notification %s, rescheduled (attempt %s)", nid, attempts_next)
-
-        except Exception as e:
-            logger.exception("Notifications worker critical error: %s", e)
-            await asyncio.sleep(5)
-
-async def _reschedule_notification(nid: int, attempts: int, next_try: int):
-    path = str(DB_PATH)
-    conn = sqlite3.connect(path)
-    try:
-        cur = conn.cursor()
-        cur.execute(f"UPDATE {NOTIFICATIONS_TABLE} SET attempts = ?, next_try = ? WHERE id = ?", (attempts, next_try, nid))
-        conn.commit()
-    finally:
-        conn.close()
-
-def _delete_notification(nid: int):
-    path = str(DB_PATH)
-    conn = sqlite3.connect(path)
-    try:
-        cur = conn.cursor()
-        cur.execute(f"DELETE FROM {NOTIFICATIONS_TABLE} WHERE id = ?", (nid,))
-        conn.commit()
-    finally:
-        conn.close()
+                    await func(**fallback_kwargs)
+                except Exception as e2:
+                    logger.exception("Fallback send failed for notification %s: %s", nid, e2)
+                    raise
+            else:
+                raise
+        return True
+
+
+_worker: Optional[_NotificationWorker] = None
+
+
+async def start_worker(application, poll_interval: float = 1.0):
+    """Запустить фоновую задачу-воркер для отправки уведомлений."""
+    global _worker
+    if _worker is not None:
+        return
+    _worker = _NotificationWorker(application, poll_interval)
+    asyncio.get_running_loop().create_task(_worker.run())
+    logger.info(
+        "Notifications worker scheduled on running event loop: backend=%s senders=%s batch=%s",
+        _worker.queue.dialect, NOTIFICATIONS_SENDERS, NOTIFICATIONS_CLAIM_BATCH,
+    )
+
+
+async def queue_metrics() -> Dict[str, Any]:
+    """Глубина и лаг очереди плюс счётчики воркера этого процесса."""
+    metrics = await asyncio.to_thread(get_queue().metrics)
+    if _worker is not None:
+        metrics.update(_worker.stats)
+        metrics['pending'] = _worker._pending.qsize()
+    return metrics
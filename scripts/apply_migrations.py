@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 """
-Apply DB migrations by instantiating the project's Database class.
-Run: python scripts/apply_migrations.py
-It will use the environment variable FISHBOT_DB_PATH if set, otherwise 'fishbot.initial.db'.
+Apply DB migrations: full schema bootstrap, default catalog data and the
+schema_migrations version record.
+Run: python scripts/apply_migrations.py [--if-behind]
+Uses DATABASE_URL like the bot. With --if-behind nothing is done when the
+schema is already at the version the code expects (what processes check on start).
 """
-import os
 import sys
 from pathlib import Path
 
@@ -12,22 +13,21 @@ from pathlib import Path
 project_root = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(project_root))
 
-db_path = os.environ.get('FISHBOT_DB_PATH', 'fishbot.initial.db')
-os.environ['FISHBOT_DB_PATH'] = db_path
-
-print('Using DB path:', db_path)
-
 try:
-    # Import Database after setting env so config picks up the path
-    from database import Database
+    from database import SCHEMA_VERSION, Database
 except Exception as e:
     print('Failed to import Database:', e)
     sys.exit(2)
 
 try:
     db = Database()
-    db.init_db()
-    print('Database initialized / migrations applied (if any).')
+    before = db.get_schema_version()
+    print(f'Schema version: {before}, code expects: {SCHEMA_VERSION}')
+    if '--if-behind' in sys.argv[1:] and before >= SCHEMA_VERSION:
+        print('Schema is up to date, nothing to apply.')
+        sys.exit(0)
+    after = db.apply_migrations(force=True)
+    print(f'Database initialized / migrations applied: schema version {after}.')
 except Exception as e:
     print('Error while applying migrations:', repr(e))
     sys.exit(3)
@@ -8,6 +8,7 @@ If DATABASE_URL is not set, provide full DSN as first arg.
 """
 import os
 import sys
+import time
 import psycopg2
 
 
@@ -35,6 +36,16 @@ def main():
     try:
         cur.execute(sql)
         print('SQL executed successfully')
+        # The script may have touched fish/rods/baits/...; make running
+        # processes reload their in-memory game catalog.
+        try:
+            cur.execute(
+                "INSERT INTO system_flags (key, value) VALUES ('catalog_version', %s) "
+                "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value",
+                (str(time.time_ns()),),
+            )
+        except Exception as e:
+            print('Catalog version bump skipped:', e)
     except Exception as e:
         print('Execution failed:', e)
         # print a snippet of SQL to help debugging
@@ -0,0 +1,256 @@
+"""Проактивное ограничение исходящих вызовов Telegram и склейка текстов в один чат.
+
+Лимиты Bot API: ~30 сообщений/сек на бота, ~20 сообщений/мин в группу и ~1/сек
+в личный чат. Вместо того чтобы упираться в RetryAfter и потом ждать, отправка
+заранее берёт токены из общего ведра и ведра чата.
+
+Лимиты на бота общие для всех шардов, а ведро у каждого процесса своё, поэтому
+общий бюджет (TG_GLOBAL_RATE/TG_GLOBAL_BURST — значения на весь бот) делится
+на число шардов. Лимиты на чат не делятся: личный чат обслуживает один шард, а
+группу, где играют пользователи разных шардов, страхует реакция на RetryAfter.
+
+Две полосы приоритета: интерактивные ответы (по умолчанию) и фоновые рассылки
+(`outbound_lane` = LANE_BULK). Рассылка не трогает резерв общего ведра и пропускает
+вперёд интерактивные отправки, которые уже ждут токен.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bounded_store import BoundedStore
+from update_routing import shard_count
+
+LANE_INTERACTIVE = 0
+LANE_BULK = 1
+
+# Полоса текущей задачи: воркер рассылок выставляет LANE_BULK у себя в контексте
+outbound_lane: contextvars.ContextVar[int] = contextvars.ContextVar('tg_outbound_lane', default=LANE_INTERACTIVE)
+
+# Бюджет этого процесса: доля от общего лимита бота
+TG_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', '30')) / shard_count()
+TG_GLOBAL_BURST = max(1.0, float(os.getenv('TG_GLOBAL_BURST', '30')) / shard_count())
+# Доля общего ведра, которую рассылки не имеют права выбирать
+TG_BULK_RESERVE = float(os.getenv('TG_BULK_RESERVE', '0.3'))
+TG_GROUP_PER_MINUTE = float(os.getenv('TG_GROUP_PER_MINUTE', '20'))
+TG_GROUP_BURST = float(os.getenv('TG_GROUP_BURST', '5'))
+TG_PRIVATE_RATE = float(os.getenv('TG_PRIVATE_RATE', '1'))
+TG_PRIVATE_BURST = float(os.getenv('TG_PRIVATE_BURST', '3'))
+TG_COALESCE_WINDOW_MS = float(os.getenv('TG_COALESCE_WINDOW_MS', '250'))
+TG_MESSAGE_MAX_LEN = 4096
+
+
+class TokenBucket:
+    """Классическое ведро токенов: `rate` токенов в секунду, не больше `capacity`."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = max(1e-6, float(rate))
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float, keep: float = 0.0) -> float:
+        """Через сколько секунд можно взять токен, оставив в ведре не меньше `keep`."""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        missing = 1.0 + keep - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1.0
+
+    def block(self, now: float, seconds: float) -> None:
+        """RetryAfter: ведро закрыто на `seconds`, после — один токен и обычное пополнение."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1.0)
+        self.updated = now + seconds
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class OutboundRateLimiter:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._global = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_BURST, clock())
+        self._bulk_keep = TG_GLOBAL_BURST * TG_BULK_RESERVE
+        self._chats = BoundedStore('tg_chat_buckets', maxsize=200000, ttl=900)
+        self._interactive_waiting = 0
+        self.waited = {LANE_INTERACTIVE: 0, LANE_BULK: 0}
+        self.penalties = 0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                bucket = TokenBucket(TG_GROUP_PER_MINUTE / 60.0, TG_GROUP_BURST, now)
+            else:
+                bucket = TokenBucket(TG_PRIVATE_RATE, TG_PRIVATE_BURST, now)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def try_acquire(self, chat_id: Optional[int], lane: int = LANE_INTERACTIVE) -> float:
+        """Взять токены, если можно (вернёт 0), иначе — сколько секунд подождать."""
+        now = self._clock()
+        chat_bucket = self._chat_bucket(chat_id, now) if chat_id is not None else None
+        if lane == LANE_BULK:
+            if self._interactive_waiting:
+                return 1.0 / self._global.rate
+            wait = self._global.wait_time(now, keep=self._bulk_keep)
+        else:
+            wait = self._global.wait_time(now)
+        if chat_bucket is not None:
+            wait = max(wait, chat_bucket.wait_time(now))
+        if wait > 0:
+            return wait
+        self._global.take(now)
+        if chat_bucket is not None:
+            chat_bucket.take(now)
+        return 0.0
+
+    async def acquire(self, chat_id: Optional[int], lane: Optional[int] = None) -> None:
+        lane = outbound_lane.get() if lane is None else lane
+        wait = self.try_acquire(chat_id, lane)
+        if wait <= 0:
+            return
+        self.waited[lane] = self.waited.get(lane, 0) + 1
+        interactive = lane != LANE_BULK
+        if interactive:
+            self._interactive_waiting += 1
+        try:
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.try_acquire(chat_id, LANE_INTERACTIVE if interactive else lane)
+        finally:
+            if interactive:
+                self._interactive_waiting -= 1
+
+    def penalize(self, chat_id: Optional[int], seconds: float) -> None:
+        """Telegram вернул RetryAfter: закрыть чат (или весь бот, если чат неизвестен)."""
+        now = self._clock()
+        self.penalties += 1
+        if chat_id is None:
+            self._global.block(now, seconds)
+        else:
+            self._chat_bucket(chat_id, now).block(now, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            # Доля общего лимита бота, доставшаяся этому шарду
+            'global_rate': round(self._global.rate, 2),
+            'global_tokens': round(self._global.tokens, 2),
+            'chats': len(self._chats),
+            'interactive_waiting': self._interactive_waiting,
+            'waited_interactive': self.waited.get(LANE_INTERACTIVE, 0),
+            'waited_bulk': self.waited.get(LANE_BULK, 0),
+            'penalties': self.penalties,
+        }
+
+
+class _Batch:
+    __slots__ = ('send', 'kwargs', 'texts', 'futures', 'length')
+
+    def __init__(self, send, kwargs: Dict[str, Any]):
+        self.send = send
+        self.kwargs = kwargs
+        self.texts: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.length = 0
+
+
+class MessageCoalescer:
+    """Склеивает тексты, отправленные в один чат в пределах короткого окна, в одно сообщение.
+
+    Включается только явно (`send_message(..., coalesce=True)`) — там, где обработчику
+    не нужен отдельный message_id на каждый текст. Все участники склейки получают
+    один и тот же объект отправленного сообщения.
+    """
+
+    def __init__(self, window: float = TG_COALESCE_WINDOW_MS / 1000.0, max_len: int = TG_MESSAGE_MAX_LEN, separator: str = "\n\n"):
+        self.window = window
+        self.max_len = max_len
+        self.separator = separator
+        self._batches: Dict[Tuple, _Batch] = {}
+        self.merged = 0
+
+    @staticmethod
+    def can_coalesce(kwargs: Dict[str, Any]) -> bool:
+        return isinstance(kwargs.get('text'), str) and kwargs.get('chat_id') is not None and not kwargs.get('reply_markup')
+
+    @staticmethod
+    def _key(kwargs: Dict[str, Any]) -> Tuple:
+        return (
+            kwargs.get('chat_id'),
+            kwargs.get('parse_mode'),
+            kwargs.get('reply_to_message_id'),
+            kwargs.get('message_thread_id'),
+            bool(kwargs.get('disable_notification')),
+        )
+
+    async def submit(self, send: Callable[..., Awaitable[Any]], kwargs: Dict[str, Any]) -> Any:
+        key = self._key(kwargs)
+        text = kwargs['text']
+        batch = self._batches.get(key)
+        if batch is not None and batch.length + len(self.separator) + len(text) > self.max_len:
+            self._start_flush(key)
+            batch = None
+        if batch is None:
+            batch = _Batch(send, dict(kwargs))
+            self._batches[key] = batch
+            asyncio.get_running_loop().call_later(self.window, self._start_flush, key, batch)
+        elif batch.texts:
+            batch.length += len(self.separator)
+            self.merged += 1
+        future = asyncio.get_running_loop().create_future()
+        batch.texts.append(text)
+        batch.futures.append(future)
+        batch.length += len(text)
+        return await future
+
+    def _start_flush(self, key: Tuple, expected: Optional[_Batch] = None) -> None:
+        batch = self._batches.get(key)
+        if batch is None or (expected is not None and batch is not expected):
+            return
+        del self._batches[key]
+        asyncio.get_running_loop().create_task(self._flush(batch))
+
+    async def _flush(self, batch: _Batch) -> None:
+        kwargs = dict(batch.kwargs)
+        kwargs['text'] = self.separator.join(batch.texts)
+        try:
+            result = await batch.send(**kwargs)
+        except Exception as exc:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future in batch.futures:
+            if not future.done():
+                future.set_result(result)
+
+
+_LIMITER: Optional[OutboundRateLimiter] = None
+_COALESCER: Optional[MessageCoalescer] = None
+
+
+def get_outbound_limiter() -> OutboundRateLimiter:
+    global _LIMITER
+    if _LIMITER is None:
+        _LIMITER = OutboundRateLimiter()
+    return _LIMITER
+
+
+def get_message_coalescer() -> MessageCoalescer:
+    global _COALESCER
+    if _COALESCER is None:
+        _COALESCER = MessageCoalescer()
+    return _COALESCER
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Инкрементальная проверка достижений: без новых уровней нет обращений к БД.
+"""
+from bounded_store import BoundedStore
+from database import db
+
+
+def test_no_queries_when_nothing_unlocks(monkeypatch):
+    def no_db():
+        raise AssertionError("unexpected DB access")
+
+    monkeypatch.setattr(db, "_connect", no_db)
+    monkeypatch.setitem(db._achievement_tiers, 777, {"fisherman": 1, "heavy_catch": 0})
+
+    assert db.evaluate_achievements(777, stats={"total_fish": 900.0, "total_weight": 50.0}) == []
+    # Статы без достижений тоже ничего не стоят
+    assert db.evaluate_achievements(777, stats={"unknown_stat": 1e9}) == []
+
+
+def test_unlock_writes_tier_and_queues_notification(monkeypatch, fake_db):
+    fake_db.handler = lambda sql, params: [(params[2],)] if sql.startswith("INSERT INTO player_achievements") else None
+    monkeypatch.setitem(db._achievement_tiers, 778, {"fisherman": 1})
+    monkeypatch.setattr(db, "_achievement_notifications", BoundedStore("test_notifications"))
+
+    unlocked = db.evaluate_achievements(778, chat_id=-5, stats={"total_fish": 1000.0})
+
+    assert [(u["achievement_id"], u["tier"], u["chat_id"]) for u in unlocked] == [("fisherman", 2, -5)]
+    assert fake_db.statements[-1][1] == (778, "fisherman", 2)
+    assert db._achievement_tiers[778]["fisherman"] == 2
+    assert db.drain_achievement_notifications(778) == unlocked
+    assert db.drain_achievement_notifications(778) == []
+    # Уровень уже известен процессу — повторная проверка в БД не ходит
+    assert db.evaluate_achievements(778, stats={"total_fish": 1000.0}) == []
+    assert fake_db.count("INSERT INTO player_achievements") == 1
+
+
+def test_tier_cache_is_bounded():
+    assert isinstance(db._achievement_tiers, BoundedStore)
+    assert db._achievement_tiers.ttl and db._achievement_tiers.maxsize
+
+
+def test_player_stats_buffer_coalesces_per_user():
+    from database import PlayerStatsBuffer
+
+    buf = PlayerStatsBuffer()
+    buf.record_catch(1, -100, "Щука", 3.0, False)
+    buf.record_catch(1, -100, "Сом", 7.5, False)
+    buf.record_catch(1, -100, "Ботинок", 0.4, True)
+    assert buf.record_catch(2, None, " Щука ", 1.0, False) == 4
+
+    pending, species = buf.drain()
+    assert not buf.has_pending()
+    assert pending[1]["fish"] == 2 and pending[1]["trash"] == 1
+    assert pending[1]["biggest_name"] == "Сом" and pending[1]["biggest_weight"] == 7.5
+    assert species == {(1, "щука"), (1, "сом"), (2, "щука")}
+
+    buf.record_catch(1, None, "Карась", 9.0, False)
+    buf.restore(pending, species)
+    pending, _ = buf.drain()
+    assert pending[1]["fish"] == 3
+    assert pending[1]["biggest_name"] == "Карась"
+    assert pending[1]["chat_id"] == -100
+
+
+def test_player_stats_buffer_drains_single_user():
+    from database import PlayerStatsBuffer
+
+    buf = PlayerStatsBuffer()
+    buf.record_catch(1, None, "Щука", 3.0, False)
+    buf.record_catch(2, None, "Сом", 5.0, False)
+    buf.record_catch(2, None, "Ботинок", 0.4, True)
+
+    pending, species = buf.drain(2)
+    assert set(pending) == {2} and species == {(2, "сом")}
+    assert buf.has_pending(1) and not buf.has_pending(2)
+    assert buf.drain(2) == ({}, set())
+    # Счётчик событий уменьшился на сброшенные уловы пользователя 2
+    assert buf.record_catch(1, None, "Карась", 1.0, False) == 2
+
+
+def test_catch_stats_written_through_without_flusher(monkeypatch):
+    from database import db
+
+    written = []
+    monkeypatch.setattr(db, "_stats_flusher", None)
+    monkeypatch.setattr(db, "_write_player_stats", lambda pending, species: written.append(set(pending)) or {})
+    db.update_player_fish_stats(901, "Щука", 2.0)
+    # Процесс без фонового потока (webapp, скрипты) пишет сразу, а не копит в памяти
+    assert written == [{901}]
+    assert not db._stats_buffer.has_pending(901)
+
+
+def test_periodic_flush_hands_unlocks_to_listener(monkeypatch):
+    announced = []
+    monkeypatch.setattr(db, "_achievement_notifications", BoundedStore("test_notifications"))
+    monkeypatch.setattr(db, "_write_player_stats", lambda pending, species: {902: {"total_fish": 10.0}})
+
+    def evaluate(uid, chat_id=None, stats=None):
+        unlock = {"achievement_id": "fisherman", "tier": 1, "chat_id": chat_id}
+        db._achievement_notifications.setdefault(uid, []).append(unlock)
+        return [unlock]
+
+    monkeypatch.setattr(db, "evaluate_achievements", evaluate)
+    monkeypatch.setattr(db, "_stats_unlock_listener", lambda uid, unlocks: announced.append((uid, unlocks)))
+    db._stats_buffer.record_catch(902, -7, "Щука", 1.0, False)
+    db._stats_buffer.record_catch(902, -7, "Сом", 2.0, False)
+
+    # Оба улова уходят одним сбросом, достижения объявляет он же
+    assert db.flush_player_stats() == 1
+    assert announced == [(902, [{"achievement_id": "fisherman", "tier": 1, "chat_id": -7}])]
+    assert db.drain_achievement_notifications(902) == []
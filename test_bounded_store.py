@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка ограниченных хранилищ состояния процесса.
+"""
+import asyncio
+
+from bounded_store import BoundedLockMap, BoundedStore
+
+
+def test_lru_eviction_and_counters():
+    store = BoundedStore("t", maxsize=2)
+    store["a"] = 1
+    store["b"] = 2
+    assert store["a"] == 1  # "a" становится самым свежим
+    store["c"] = 3
+    assert "b" not in store
+    assert set(store) == {"a", "c"}
+    assert store.stats()["evicted_lru"] == 1
+    assert store.setdefault("d", []) == [] and len(store) == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("bounded_store.time.monotonic", lambda: now[0])
+    store = BoundedStore("t", maxsize=10, ttl=5)
+    store["a"] = 1
+    now[0] += 6
+    assert store.get("a") is None
+    assert store.stats()["evicted_ttl"] == 1
+    assert store.pop("missing", "x") == "x"
+
+
+def test_lock_map_keeps_held_locks(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("bounded_store.time.monotonic", lambda: now[0])
+
+    async def scenario():
+        locks = BoundedLockMap("locks", maxsize=1, ttl=10)
+        held = locks[1]
+        async with held:
+            locks[2]  # переполнение, но захваченный lock не трогаем
+            now[0] += 60
+            locks.sweep()
+            assert locks[1] is held
+        now[0] += 60
+        locks.sweep()
+        assert locks[1] is not held
+
+    asyncio.run(scenario())
+
+
+def test_lock_map_keeps_locks_with_waiters(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("bounded_store.time.monotonic", lambda: now[0])
+
+    async def scenario():
+        locks = BoundedLockMap("locks", maxsize=1, ttl=10)
+        held = locks[1]
+        await held.acquire()
+        waiter = asyncio.ensure_future(locks[1].acquire())
+        await asyncio.sleep(0)
+        # Владелец отпустил, ожидающий ещё не проснулся: lock свободен, но занят очередью
+        held.release()
+        assert not held.locked() and held.users == 1
+        now[0] += 60
+        locks[2]
+        locks.sweep()
+        assert locks[1] is held
+        await waiter
+        held.release()
+        assert held.users == 0
+
+    asyncio.run(scenario())
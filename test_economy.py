@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Общая экономика бота и webapp: опыт за продажу, уровни и формула цены.
+"""
+import ast
+import subprocess
+import sys
+from pathlib import Path
+
+import economy
+from database import db
+
+ROOT = Path(__file__).resolve().parent
+
+
+def test_economy_is_dependency_free():
+    code = "import sys, economy; print(sorted(m for m in ('bot', 'database', 'telegram') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_webapp_never_imports_bot():
+    for path in (ROOT / "webapp").glob("*.py"):
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if isinstance(node, ast.ImportFrom):
+                assert node.module != "bot", path
+            elif isinstance(node, ast.Import):
+                assert all(alias.name != "bot" for alias in node.names), path
+
+
+def test_sale_summary_matches_database_xp():
+    items = [
+        {"name": "Щука", "rarity": "Редкая", "weight": 4.0, "min_weight": 1.0, "max_weight": 9.0},
+        {"name": "Сапог", "rarity": "Мусор", "weight": 1.5},
+    ]
+    xp, base, rarity_bonus, weight_bonus, total_weight = economy.calculate_sale_summary(items)
+    assert xp == sum(db.calculate_item_xp_details(item)["xp_total"] for item in items)
+    assert (base, rarity_bonus, total_weight) == (21, 2, 5.5)
+    assert weight_bonus == xp - base - rarity_bonus
+
+
+def test_level_helpers():
+    assert economy.level_from_xp(0) == 0
+    assert economy.level_from_xp(economy.LEVEL_XP_THRESHOLDS[3]) == 3
+    assert db.get_level_progress(10**9) == economy.level_progress(10**9)
+    assert economy.level_progress(10**9)["next_level_xp"] is None
+    assert economy.format_level_progress(economy.level_progress(150)) == "Уровень 1: [==--------] 50/250"
+    assert economy.format_percent_value(2.50) == "2.5"
+
+
+def test_fish_sale_price_applies_multiplier_once():
+    fish = {"name": "Карась", "rarity": "Обычная", "price": 100, "min_weight": 1, "max_weight": 1}
+    assert economy.fish_sale_price(fish, 1, 0) == 126
+    assert economy.fish_sale_price(fish, 1, 0, 2.0) == 252
+    anomaly = {"name": "Аномалия", "rarity": "Аномалия"}
+    assert economy.fish_sale_price(anomaly, 2.5, 0, 1.0) == 12500
+    assert db.calculate_fish_price(fish, 1, 0, modifiers={"total_multiplier": 2.0}) == 252
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+`_ensure_*`-хелперы выполняют DDL не больше одного раза на процесс.
+"""
+import pytest
+
+from database import BOOTSTRAP_SCHEMA_HELPERS, ENSURED_SCHEMAS, SCHEMA_VERSION, db
+
+
+@pytest.fixture
+def fresh_registry(fake_db):
+    saved = set(ENSURED_SCHEMAS._done)
+    ENSURED_SCHEMAS.reset()
+    yield fake_db
+    ENSURED_SCHEMAS.reset()
+    ENSURED_SCHEMAS.mark(*saved)
+
+
+def test_helper_runs_ddl_once_per_process(fresh_registry):
+    runs_before = ENSURED_SCHEMAS.stats()["helper_runs"]
+    db._ensure_duel_tables()
+    statements = len(fresh_registry.sql)
+    assert statements and fresh_registry.sql[0].startswith("CREATE TABLE IF NOT EXISTS")
+
+    db._ensure_duel_tables()
+    assert len(fresh_registry.sql) == statements
+    stats = ENSURED_SCHEMAS.stats()
+    assert stats["helper_runs"] == runs_before + 1
+    assert "_ensure_duel_tables" in stats["ensured"]
+
+
+def test_init_db_marks_helpers_when_schema_is_current(monkeypatch, fresh_registry):
+    monkeypatch.setattr(db, "get_schema_version", lambda: SCHEMA_VERSION)
+    db.init_db()
+    for helper in BOOTSTRAP_SCHEMA_HELPERS:
+        assert helper in ENSURED_SCHEMAS
+        getattr(db, helper)()
+    assert fresh_registry.sql == []
+
+
+def test_wrapper_counts_ddl_statements():
+    from database import PostgresConnWrapper
+
+    class _RawCursor:
+        def execute(self, sql, params=None):
+            pass
+
+    class _RawConn:
+        def cursor(self):
+            return _RawCursor()
+
+    wrapper = PostgresConnWrapper.__new__(PostgresConnWrapper)
+    wrapper._conn = _RawConn()
+    before = ENSURED_SCHEMAS.stats()["ddl_statements"]
+    wrapper.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER)")
+    wrapper.execute("  ALTER TABLE t ADD COLUMN IF NOT EXISTS x INTEGER")
+    wrapper.execute("SELECT 1")
+    assert ENSURED_SCHEMAS.stats()["ddl_statements"] == before + 2
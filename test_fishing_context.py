@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Контекст заброса и проверка кулдауна без обращений к БД после сборки контекста.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import COOLDOWN_MINUTES
+from database import BAMBOO_ROD, FishingContext, db
+from game_logic import game
+
+PLAYER_COLUMNS = ("user_id", "chat_id", "current_location", "current_bait", "current_rod", "xp", "level", "tickets")
+
+
+@pytest.fixture
+def context_db(monkeypatch, fake_db):
+    monkeypatch.setattr(db, "_ensure_fishing_context_tables", lambda: None)
+    monkeypatch.setattr(db, "get_table_columns", lambda table: frozenset({"chat_id"}))
+    monkeypatch.setattr(db, "get_rod", lambda name: {"name": name})
+    monkeypatch.setattr(db, "get_location_events_snapshot", lambda: "snapshot")
+
+    def handler(sql, params):
+        if sql.startswith("SELECT * FROM players WHERE user_id = ? AND (chat_id IS NULL"):
+            return fake_db.result([(7, -1, None, None, None, None, 3, None)], PLAYER_COLUMNS)
+        if sql.startswith("SELECT (SELECT COALESCE(SUM(bonus_percent)"):
+            return [(12.5, 3, None, 1, 0.2, 4)]
+        if sql.startswith("SELECT effect_type, expires_at FROM user_effects"):
+            return [("beer_courage", datetime.utcnow() + timedelta(minutes=5)), ("seasick", None)]
+        if sql.startswith("SELECT * FROM player_rods"):
+            return fake_db.result([(BAMBOO_ROD, 40)], ("rod_name", "current_durability"))
+        return None
+
+    fake_db.handler = handler
+    return fake_db
+
+
+def test_fishing_context_fills_defaults_and_modifiers(context_db):
+    ctx = db.get_fishing_context(7, 100)
+
+    assert ctx.player["current_location"] == "Городской пруд"
+    assert ctx.player["current_rod"] == BAMBOO_ROD and ctx.player["xp"] == 0 and ctx.player["level"] == 3
+    assert (ctx.clothing_bonus_percent, ctx.feeder_bonus, ctx.has_antibot_block) == (12.5, 3, True)
+    assert (ctx.population_penalty, ctx.consecutive_casts, ctx.active_boat) == (0.2, 4, None)
+    assert 290 < ctx.effects["beer_courage"] < 301 and ctx.effects["seasick"] == 0.0
+    assert ctx.beer_bonus_percent == 5.0
+    assert ctx.player_rod == {"rod_name": BAMBOO_ROD, "current_durability": 40}
+    assert ctx.rod == {"name": BAMBOO_ROD} and ctx.location_events == "snapshot"
+    # Лодки нет — её строки не читаются
+    assert context_db.count("SELECT * FROM boats") == 0
+
+
+def _ctx(last_fish=None, durability=50, rod=BAMBOO_ROD):
+    return FishingContext(
+        user_id=1,
+        chat_id=2,
+        player={"current_rod": rod, "last_fish_time": last_fish},
+        player_rod={"current_durability": durability},
+    )
+
+
+def test_check_fishing_ready_uses_only_context(fake_db):
+    assert game.check_fishing_ready(_ctx()) == (True, "")
+
+    recent = (datetime.now() - timedelta(minutes=COOLDOWN_MINUTES - 1)).isoformat()
+    ok, message = game.check_fishing_ready(_ctx(last_fish=recent))
+    assert not ok and message.startswith("Следующий заброс через 0мин")
+
+    old = (datetime.now() - timedelta(minutes=COOLDOWN_MINUTES + 1)).isoformat()
+    assert game.check_fishing_ready(_ctx(last_fish=old)) == (True, "")
+
+    ok, message = game.check_fishing_ready(_ctx(durability=0))
+    assert not ok and "/repair" in message
+    assert fake_db.statements == []
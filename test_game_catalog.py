@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка индексов in-memory каталога (без подключения к БД).
+"""
+from database import GameCatalog
+
+
+def _catalog():
+    fish = [
+        {"id": 1, "name": "Карась", "rarity": "Обычная", "locations": "Городской пруд,Озеро",
+         "seasons": "Весна,Лето", "suitable_baits": "Черви, Хлеб"},
+        {"id": 2, "name": "Щука", "rarity": "Редкая", "locations": "Река",
+         "seasons": "Все", "suitable_baits": "Живец"},
+        {"id": 3, "name": "Сом", "rarity": "Легендарная", "locations": "Река,Озеро",
+         "seasons": "Зима", "suitable_baits": "Все"},
+        {"id": 4, "name": "Призрак", "rarity": "Обычная", "locations": None,
+         "seasons": "Лето", "suitable_baits": None},
+    ]
+    trash = [
+        {"id": 1, "name": "Коряга", "locations": "Все"},
+        {"id": 2, "name": "Ботинок", "locations": "Озеро"},
+    ]
+    rods = [
+        {"id": 2, "name": "Золотая удочка", "price": 15000},
+        {"id": 1, "name": "Бамбуковая удочка", "price": 0},
+    ]
+    return GameCatalog("1", fish, trash, rods, [], [], ["Озеро", "Река", "Озеро"])
+
+
+def test_fish_for_location_matches_like_semantics():
+    catalog = _catalog()
+    assert [f["name"] for f in catalog.fish_for_location("Озеро", "Лето")] == ["Карась"]
+    assert [f["name"] for f in catalog.fish_for_location("Река", "Лето")] == ["Щука"]
+    assert {f["name"] for f in catalog.fish_for_location("Озеро")} == {"Карась", "Сом"}
+    # Повторный вызов отдаёт тот же закэшированный список
+    assert catalog.fish_for_location("Озеро", "Лето") is catalog.fish_for_location("Озеро", "Лето")
+
+
+def test_bait_suitability_index():
+    catalog = _catalog()
+    assert catalog.is_bait_suitable(" хлеб ", "Карась")
+    assert not catalog.is_bait_suitable("Живец", "Карась")
+    assert catalog.is_bait_suitable("Что угодно", "Сом")
+    assert not catalog.is_bait_suitable("Черви", "Призрак")
+    assert catalog.fish_names_for_bait("Черви") == frozenset({"Карась", "Сом"})
+
+
+def test_trash_and_rods():
+    catalog = _catalog()
+    assert [t["name"] for t in catalog.trash_for_location("Озеро")] == ["Ботинок", "Коряга"]
+    assert [t["name"] for t in catalog.trash_for_location("Море")] == ["Коряга"]
+    assert [r["name"] for r in catalog.rods] == ["Бамбуковая удочка", "Золотая удочка"]
+    assert catalog.rods_by_id[2]["name"] == "Золотая удочка"
+    assert catalog.location_names == ["Озеро", "Река"]
+
+
+def test_encyclopedia_maps_species_keys_through_catalog(monkeypatch):
+    from database import db, fish_species_key
+
+    catalog = _catalog()
+    monkeypatch.setattr(db, "get_catalog", lambda: catalog)
+    # Ключ не зависит от id: перезаполнение справочника не теряет отметки
+    monkeypatch.setattr(db, "get_caught_species_keys", lambda user_id: {"щука", fish_species_key(" Сом ")})
+    assert catalog.fish_by_key["щука"]["id"] == 2
+    assert db.get_user_fish_encyclopedia(1) == {
+        "Карась": False, "Щука": True, "Сом": True, "Призрак": False,
+    }
+
+
+def test_catalog_fingerprint_ignores_row_order():
+    from database import catalog_fingerprint
+
+    catalog = _catalog()
+    fish = list(catalog.fish)
+    assert catalog_fingerprint(fish, ["Озеро"]) == catalog_fingerprint(list(reversed(fish)), ["Озеро"])
+    changed = [dict(fish[0], price=999)] + fish[1:]
+    assert catalog_fingerprint(fish, ["Озеро"]) != catalog_fingerprint(changed, ["Озеро"])
+
+
+def test_catalog_version_published_only_on_change(monkeypatch):
+    from database import CATALOG_FINGERPRINT_FLAG, db
+
+    flags = {}
+    published = []
+    tables = (list(_catalog().fish), [], [], [], [], ["Озеро"])
+    monkeypatch.setattr(db, "_read_catalog_tables", lambda: tables)
+    monkeypatch.setattr(db, "get_system_flag", lambda key: flags.get(key))
+    monkeypatch.setattr(db, "set_system_flag", lambda key, value: flags.__setitem__(key, value))
+    monkeypatch.setattr(db, "invalidate_catalog", lambda publish=True: published.append(publish))
+
+    assert db._publish_catalog_if_changed()
+    assert CATALOG_FINGERPRINT_FLAG in flags
+    # Повторный старт с теми же справочниками версию не трогает
+    assert not db._publish_catalog_if_changed()
+    assert published == [True]
+
+
+def test_insert_or_replace_fish_upserts_by_name():
+    from database import PostgresConnWrapper
+
+    sql = PostgresConnWrapper._translate_sql_uncached("INSERT OR REPLACE INTO fish (name, price) VALUES (?, ?)")
+    # Upsert по имени сохраняет id рыбы, на который ссылаются другие таблицы
+    assert "ON CONFLICT (name) DO UPDATE SET" in sql
+    assert "price = EXCLUDED.price" in sql
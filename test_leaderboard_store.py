@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Таблицы лидеров: доска грузится одним запросом, дальше живёт уловами и продажами процесса.
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db
+from leaderboard import Leaderboard, LeaderboardScope, LeaderboardStore
+
+START, END = datetime(2026, 5, 1), datetime(2026, 5, 8)
+AGG_COLUMNS = (
+    "user_id", "total_fish", "total_weight", "total_length",
+    "best_weight", "best_weight_fish", "best_length", "best_length_fish", "username",
+)
+UNSOLD_COLUMNS = ("id", "user_id", "chat_id", "fish_name", "weight", "length", "location", "caught_at", "is_fish")
+
+
+def _agg(user_id, fish, weight, length, username):
+    return (user_id, fish, weight, length, weight / fish, "Щука", length / fish, "Щука", username)
+
+
+def _respond(state):
+    def handler(sql, params):
+        if sql.startswith("SELECT t.*"):
+            return state["db"].result(state["agg"], AGG_COLUMNS)
+        if sql.startswith("SELECT cf.id, cf.user_id"):
+            rows = [tuple(r[c] for c in UNSOLD_COLUMNS) for r in state["unsold"] if r["id"] in params[0]]
+            return state["db"].result(rows, UNSOLD_COLUMNS)
+        if sql.startswith("SELECT name FROM fish"):
+            return [(params[0],)]
+        if sql.startswith("INSERT INTO caught_fish"):
+            uid, chat_id, clan_id, name, weight, length, location = params
+            return [(900, uid, chat_id, clan_id, name, weight, length, location, datetime(2026, 5, 3))]
+        if sql.startswith("SELECT MAX(username) FROM players"):
+            return [("newbie",)]
+        return None
+    return handler
+
+
+@pytest.fixture
+def boards(monkeypatch, fake_db):
+    state = {
+        "db": fake_db,
+        "agg": [_agg(1, 3, 12.0, 90.0, "alice"), _agg(2, 2, 20.0, 60.0, "bob"), _agg(3, 1, 5.0, 40.0, "carol")],
+        "unsold": [],
+    }
+    fake_db.handler = _respond(state)
+    monkeypatch.setattr(db, "_leaderboards", LeaderboardStore(ttl=60, idle_ttl=600))
+    monkeypatch.setattr(db, "update_player_fish_stats", lambda *a, **kw: None)
+    return state
+
+
+def _loads(state):
+    return state["db"].count("SELECT t.*")
+
+
+def test_board_top_and_rank_follow_updates():
+    board = Leaderboard(LeaderboardScope("total_weight"), [
+        {"user_id": 1, "username": "a", "total_fish": 1, "total_weight": 5.0},
+        {"user_id": 2, "username": "b", "total_fish": 2, "total_weight": 5.0},
+        {"user_id": 3, "username": "c", "total_fish": 1, "total_weight": 9.0},
+    ])
+    assert [r["user_id"] for r in board.top(10)] == [3, 2, 1]
+    board.add_catch({"user_id": 1, "weight": 6.0, "fish_name": "Сом"})
+    assert board.rank(1) == (1, {"username": "a", "user_id": 1, "total_fish": 2, "total_weight": 11.0})
+    board.remove_catch({"user_id": 3, "weight": 9.0})
+    assert [r["user_id"] for r in board.top(10)] == [1, 2] and board.rank(3) == (None, None)
+    assert not board.stale
+
+
+def test_selling_best_fish_marks_best_board_stale():
+    board = Leaderboard(LeaderboardScope("best_length"))
+    board.add_catch({"user_id": 7, "length": 30, "fish_name": "Окунь"})
+    board.add_catch({"user_id": 7, "length": 80, "fish_name": "Щука"})
+    assert board.top(1) == [{"username": "Неизвестно", "user_id": 7, "fish_name": "Щука", "best_length": 80.0}]
+    board.remove_catch({"user_id": 7, "length": 30})
+    assert not board.stale
+    board.remove_catch({"user_id": 7, "length": 80})
+    assert board.stale
+
+
+def test_tour_is_loaded_once_and_served_from_memory(boards):
+    top = db.get_tour_leaderboard_weight(START, END, 2, ["Озеро", "Река"])
+    assert [(r["user_id"], r["total_weight"]) for r in top] == [(2, 20.0), (1, 12.0)]
+    sql, params = boards["db"].statements[0]
+    assert "cf.location IN (?, ?)" in sql and params == [START, END, "Озеро", "Река"]
+    assert "JOIN players" not in sql
+
+    assert db.get_tour_leaderboard_rank("total_weight", 3, START, END, ["Река", "Озеро"])[0] == 3
+    assert db.get_tour_leaderboard_rank("total_weight", 99, START, END, ["Озеро", "Река"]) == (None, None)
+    db.get_tour_leaderboard_weight(START, END, 10, ["Река", "Озеро"])
+    assert _loads(boards) == 1
+
+
+def test_catch_and_sale_update_loaded_board(boards):
+    db.get_tour_leaderboard_weight(START, END, 10)
+    db.add_caught_fish(3, 5, "Сом", 30.0, "Озеро", 110.0)
+    place, row = db.get_tour_leaderboard_rank("total_weight", 3, START, END)
+    assert place == 1 and row["total_weight"] == 35.0 and row["total_fish"] == 2
+
+    db.add_caught_fish(4, 5, "Карп", 1.0, "Озеро", 20.0)
+    assert db.get_tour_leaderboard_rank("total_weight", 4, START, END) == (
+        4, {"username": "newbie", "user_id": 4, "total_fish": 1, "total_weight": 1.0},
+    )
+
+    boards["unsold"] = [{"id": 900, "user_id": 3, "chat_id": 5, "fish_name": "Сом", "weight": 30.0, "length": 110.0,
+                         "location": "Озеро", "caught_at": datetime(2026, 5, 3), "is_fish": True}]
+    db.mark_fish_as_sold([900])
+    assert db.get_tour_leaderboard_rank("total_weight", 3, START, END)[1]["total_weight"] == 5.0
+    assert _loads(boards) == 1
+
+    # Улов вне окна турнира доску не трогает
+    boards["db"].statements.clear()
+    db._leaderboards.record_catch({"user_id": 1, "weight": 50.0, "caught_at": END + timedelta(days=1)}, time.monotonic())
+    assert db.get_tour_leaderboard_rank("total_weight", 1, START, END)[1]["total_weight"] == 12.0
+    assert boards["db"].statements == []
+
+
+def test_period_top_keeps_index_friendly_filter(boards):
+    now = datetime.now()
+    db.get_leaderboard_period(limit=10, since=now - timedelta(days=7))
+    sql, params = boards["db"].statements[0]
+    assert "datetime(" not in sql and "cf.caught_at >= ?" in sql
+    assert "EXISTS (SELECT 1 FROM fish f WHERE f.name = TRIM(cf.fish_name))" in sql
+    # Следующий /top через секунды попадает в ту же доску «за 7 дней»
+    db.get_leaderboard_period(limit=10, since=datetime.now() - timedelta(days=7))
+    db.get_chat_leaderboard_period(chat_id=-100, limit=10, since=now - timedelta(days=7))
+    assert _loads(boards) == 2
+    assert "cf.chat_id = ?" in boards["db"].sql[-1]
+
+
+def test_load_during_write_is_reread(boards):
+    db.get_tour_leaderboard_weight(START, END, 10)
+    # Запись началась до загрузки доски: запрос мог её уже увидеть
+    db._leaderboards.record_catch({"user_id": 1, "weight": 1.0, "caught_at": START}, begun_at=0.0)
+    db.get_tour_leaderboard_weight(START, END, 10)
+    assert _loads(boards) == 2
+
+
+def test_load_runs_outside_lock_and_keeps_concurrent_changes():
+    store = LeaderboardStore(ttl=60, idle_ttl=600)
+    scope = LeaderboardScope("total_weight")
+
+    def load():
+        # Улов процесса во время загрузки не ждёт её (иначе lock не отпустился бы)
+        assert store.wants_username({"user_id": 5})
+        store.record_catch({"user_id": 5, "weight": 2.0}, time.monotonic())
+        return Leaderboard(scope, [{"user_id": 1, "total_fish": 1, "total_weight": 3.0}])
+
+    assert [r["user_id"] for r in store.top("all", load, 10)] == [1, 5]
+
+    def load_seen():
+        # Запись началась до загрузки — доска перечитается при следующем чтении
+        store.record_catch({"user_id": 6, "weight": 1.0}, begun_at=0.0)
+        return Leaderboard(scope)
+
+    store.clear()
+    store.top("all", load_seen, 10)
+    assert store._slots["all"].board.stale
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Планировщик событий на локациях: тик гасит/запускает события, заброс читает снимок.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from database import LocationEventsSnapshot, db
+from location_events import MURDER_EVENT_TYPE, SCHOOL_EVENT_TYPE, SPAWN_EVENT_TYPE
+
+EVENT_COLUMNS = ("id", "event_type", "location", "started_at", "ends_at", "is_active", "params")
+ECO_COLUMNS = ("id", "location", "reward_type", "reward_multiplier", "started_at", "ends_at", "is_active")
+
+
+def _respond(state):
+    def handler(sql, params):
+        if sql.startswith("SELECT id, location, reward_type"):
+            return state["db"].result([tuple(r[c] for c in ECO_COLUMNS) for r in state["eco"]], ECO_COLUMNS)
+        if sql.startswith("SELECT id, event_type"):
+            return state["db"].result([tuple(r[c] for c in EVENT_COLUMNS) for r in state["events"]], EVENT_COLUMNS)
+        if sql == "SELECT MAX(ends_at) FROM ecological_disasters":
+            return [(state["last_eco_end"],)]
+        if "GROUP BY event_type" in sql:
+            return list(state["last_ends"].items())
+        return None
+    return handler
+
+
+def _event(event_id, event_type, location, minutes_left=30, params='{}'):
+    now = datetime.utcnow()
+    return {
+        "id": event_id, "event_type": event_type, "location": location,
+        "started_at": now - timedelta(minutes=5), "ends_at": now + timedelta(minutes=minutes_left),
+        "is_active": 1, "params": params,
+    }
+
+
+@pytest.fixture
+def engine(monkeypatch, fake_db):
+    state = {"db": fake_db, "eco": [], "events": [], "last_eco_end": None, "last_ends": {}, "started": [],
+             "commits_at_insert": []}
+    fake_db.handler = _respond(state)
+    monkeypatch.setattr(db, "_location_casts", database.LocationCastCounter())
+    monkeypatch.setattr(db, "_location_events", None)
+    monkeypatch.setattr(db, "_location_events_ticker", None)
+    monkeypatch.setattr(db, "get_catalog", lambda: SimpleNamespace(fish=[
+        {"name": "Карась", "locations": "Городской пруд, Озеро"},
+        {"name": "Тунец", "locations": "Море"},
+    ]))
+
+    def _start_event(cursor, event_type, location, duration_minutes, params):
+        state["commits_at_insert"].append(fake_db.commits)
+        started = _event(100 + len(state["started"]), event_type, location, duration_minutes, params)
+        state["started"].append(started)
+        return dict(started)
+
+    def _start_eco(cursor, location, reward_type, reward_multiplier, duration_minutes):
+        state["commits_at_insert"].append(fake_db.commits)
+        started = {"id": 7, "location": location, "reward_type": reward_type, "reward_multiplier": reward_multiplier,
+                   "started_at": datetime.utcnow(), "ends_at": datetime.utcnow() + timedelta(minutes=duration_minutes),
+                   "is_active": 1}
+        state["started"].append(started)
+        return dict(started)
+
+    monkeypatch.setattr(db, "_insert_location_event", _start_event)
+    monkeypatch.setattr(db, "_insert_ecological_disaster", _start_eco)
+    return state
+
+
+def test_snapshot_is_read_only_and_hides_expired_events():
+    snapshot = LocationEventsSnapshot.build([], [
+        dict(_event(1, SPAWN_EVENT_TYPE, "Городской пруд"), params={"catch_bonus_percent": 20}),
+        dict(_event(2, MURDER_EVENT_TYPE, "Море", minutes_left=-1), params={}),
+    ])
+    spawn = snapshot.event("  городской ПРУД ", SPAWN_EVENT_TYPE)
+    assert spawn["params"]["catch_bonus_percent"] == 20
+    with pytest.raises(TypeError):
+        spawn["params"]["catch_bonus_percent"] = 99
+    assert snapshot.event("Море", MURDER_EVENT_TYPE) is None
+    assert snapshot.eco_disaster("Городской пруд") is None
+
+
+def test_tick_expires_in_db_and_cast_path_reads_snapshot_without_db(engine):
+    engine["events"] = [_event(1, SCHOOL_EVENT_TYPE, "Озеро", params='{"school_fish": "Карась"}')]
+    db.tick_location_events()
+    assert engine["db"].sql[0].startswith("UPDATE ecological_disasters SET is_active = 0")
+    assert engine["db"].sql[1].startswith("UPDATE location_events SET is_active = 0")
+
+    queries = len(engine["db"].sql)
+    db._location_events_ticker = object()  # в процессе бота снимок обновляет только тикер
+    events = db.get_location_events_snapshot()
+    db.note_location_cast("Озеро")
+    assert len(engine["db"].sql) == queries
+    assert events.event("озеро", SCHOOL_EVENT_TYPE)["params"]["school_fish"] == "Карась"
+
+
+def test_one_event_per_location_and_per_type(engine, monkeypatch):
+    monkeypatch.setattr(database.random, "random", lambda: 0.0)
+    engine["events"] = [_event(1, SPAWN_EVENT_TYPE, "Море")]
+    db.note_location_cast("Городской пруд")
+    db.note_location_cast("Море")
+    snapshot = db.tick_location_events()
+
+    # Нерест уже идёт на Море — на пруду стартует следующий тип, и только один
+    assert [(e["event_type"], e["location"]) for e in engine["started"] if "event_type" in e] == [
+        (MURDER_EVENT_TYPE, "Городской пруд"),
+    ]
+    assert snapshot.event("Городской пруд", MURDER_EVENT_TYPE)["params"]["forced_fish"] == "Карась"
+    assert snapshot.event("Городской пруд", SCHOOL_EVENT_TYPE) is None
+    # Эко-катастрофа одна на все локации
+    assert snapshot.eco_disaster("Городской пруд") is not None
+    assert snapshot.eco_disaster("Море") is None
+
+
+def test_cooldown_and_casts_gate_starts(engine, monkeypatch):
+    monkeypatch.setattr(database.random, "random", lambda: 0.0)
+    engine["last_eco_end"] = datetime.utcnow() - timedelta(hours=1)
+    engine["last_ends"] = {t: datetime.utcnow() - timedelta(hours=1) for t in (SPAWN_EVENT_TYPE, MURDER_EVENT_TYPE, SCHOOL_EVENT_TYPE)}
+    db.note_location_cast("Озеро")
+    db.tick_location_events()
+    assert engine["started"] == []
+
+    # Без забросов старты не бросаются
+    engine["last_eco_end"], engine["last_ends"] = None, {}
+    db.tick_location_events()
+    assert engine["started"] == []
+
+
+def test_guaranteed_cast_rolls_only_eco_disaster(engine, monkeypatch):
+    monkeypatch.setattr(database.random, "random", lambda: 0.0)
+    db.note_location_cast("Озеро", location_events=False)
+    snapshot = db.tick_location_events()
+    assert snapshot.eco_disaster("Озеро") is not None
+    assert snapshot.events == {}
+
+
+def test_starts_are_serialised_across_shards(engine, monkeypatch):
+    monkeypatch.setattr(database.random, "random", lambda: 0.0)
+    db.tick_location_events()
+    # Без забросов тик только гасит и читает — без лока
+    assert not any("pg_advisory_xact_lock" in sql for sql in engine["db"].sql)
+
+    engine["db"].statements.clear()
+    commits = engine["db"].commits
+    db.note_location_cast("Озеро")
+    db.tick_location_events()
+    # Лок до чтения активных строк; старты вставляются в той же транзакции до COMMIT
+    assert engine["db"].statements[0] == (
+        "SELECT pg_advisory_xact_lock(?)", (database.LOCATION_EVENTS_START_LOCK_ID,),
+    )
+    assert engine["commits_at_insert"] == [commits, commits]
+    assert engine["db"].commits == commits + 1
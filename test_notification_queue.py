@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка очереди уведомлений на SQLite-бэкенде.
+"""
+from notification_queue import NotificationQueue
+
+
+def _queue(tmp_path):
+    queue = NotificationQueue("sqlite", sqlite_path=str(tmp_path / "queue.db"))
+    queue.init_table()
+    return queue
+
+
+def test_claim_leases_rows_until_deleted(tmp_path):
+    queue = _queue(tmp_path)
+    assert queue.enqueue_many([
+        ("send_message", {"chat_id": 1, "text": "a"}, 0),
+        ("send_message", {"chat_id": 2, "text": "б"}, 0),
+        ("send_message", {"chat_id": 3, "text": "later"}, 3600),
+    ]) == 3
+
+    claimed = queue.claim(10, lease_seconds=60)
+    assert [row[1] for row in claimed] == ["send_message", "send_message"]
+    assert '"б"' in claimed[1][2]
+    # Арендованные строки повторно не выдаются
+    assert queue.claim(10, lease_seconds=60) == []
+    assert queue.metrics()["depth"] == 3
+
+    queue.delete_many([row[0] for row in claimed])
+    assert queue.metrics() == {"depth": 1, "ready": 0, "lag_seconds": 0}
+
+
+def test_reschedule_releases_lease(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue_many([("send_message", {"chat_id": 1}, 0)])
+    (nid, _, _, attempts, _), = queue.claim(5, lease_seconds=60)
+    queue.reschedule_many([(nid, attempts + 1, 0)])
+    (row,) = queue.claim(5, lease_seconds=60)
+    assert row[0] == nid and row[3] == 1
+
+
+def test_init_table_adds_lease_column_to_old_schema(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE notifications_queue (id INTEGER PRIMARY KEY AUTOINCREMENT, method TEXT NOT NULL,"
+        " kwargs TEXT NOT NULL, attempts INTEGER DEFAULT 0, next_try INTEGER NOT NULL, created_at INTEGER NOT NULL)"
+    )
+    conn.execute("INSERT INTO notifications_queue (method, kwargs, next_try, created_at) VALUES ('send_message', '{}', 0, 0)")
+    conn.commit()
+    conn.close()
+
+    queue = NotificationQueue("sqlite", sqlite_path=str(path))
+    queue.init_table()
+    assert len(queue.claim(5, lease_seconds=60)) == 1
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка пакетного расчёта цен (без подключения к БД).
+"""
+from database import Database, db
+
+
+def test_price_modifiers_from_stats():
+    offer = {'fish_name': ' Карась ', 'sold_weight': 10.0, 'target_weight': 50.0, 'multiplier': 2.0}
+    mods = Database._price_modifiers_from_stats('карась', 45.0, 1.0, offer)
+    assert mods['volume_multiplier'] == 0.95
+    assert mods['scarcity_multiplier'] == 1.0
+    assert mods['market_active'] is True
+    assert abs(mods['total_multiplier'] - 1.9) < 1e-9
+
+    never_sold = Database._price_modifiers_from_stats('щука', 0.0, None, offer)
+    assert never_sold['scarcity_multiplier'] == 1.08
+    assert never_sold['market_active'] is False
+
+
+def test_price_fish_items_uses_one_bulk_lookup(monkeypatch):
+    calls = []
+
+    def fake_bulk(names):
+        calls.append(list(names))
+        return {'карась': Database._price_modifiers_from_stats('карась', 300.0, 0.5, None)}
+
+    monkeypatch.setattr(db, 'get_fish_price_modifiers_bulk', fake_bulk)
+    monkeypatch.setattr(db, 'get_fish_price_modifiers', lambda name: (_ for _ in ()).throw(AssertionError(name)))
+
+    fish = {'name': 'Карась', 'rarity': 'Обычная', 'price': 100, 'min_weight': 1, 'max_weight': 1}
+    items = [dict(fish, weight=1, length=0) for _ in range(3)]
+    prices = db.price_fish_items(items)
+
+    assert len(calls) == 1
+    assert prices == [db.calculate_fish_price(fish, 1, 0, modifiers=fake_bulk(['x'])['карась'])] * 3
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Тик восстановления удочек — один UPDATE на все строки (проверяется на sqlite).
+"""
+from database import BAMBOO_ROD, db
+
+STARTED = "2026-01-01 00:00:00"
+
+
+def _rods(sqlite_db, rows):
+    sqlite_db.execute(
+        "CREATE TABLE player_rods (user_id INTEGER, chat_id INTEGER, rod_name TEXT, "
+        "current_durability INTEGER, max_durability INTEGER, recovery_start_time TEXT)"
+    )
+    sqlite_db.executemany("INSERT INTO player_rods VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def _state(sqlite_db):
+    return {
+        uid: (cur, started)
+        for uid, cur, started in sqlite_db.execute(
+            "SELECT user_id, current_durability, recovery_start_time FROM player_rods ORDER BY user_id"
+        )
+    }
+
+
+def test_recover_rods_tick_steps_clamps_and_clears(sqlite_db):
+    _rods(sqlite_db, [
+        (1, -1, BAMBOO_ROD, 10, 100, STARTED),   # шаг 100/30 = 3 (целочисленно)
+        (2, -1, BAMBOO_ROD, 98, 100, STARTED),   # 98+3 упирается в максимум
+        (3, -1, BAMBOO_ROD, 97, 100, STARTED),   # ровно до максимума
+        (4, -1, BAMBOO_ROD, 5, 20, STARTED),     # 20/30 = 0 -> не меньше 1
+        (5, -1, BAMBOO_ROD, 50, 100, None),      # восстановление не запущено
+        (6, 42, BAMBOO_ROD, 50, 100, STARTED),   # удочка чата, не глобальная
+        (7, -1, "Гарпун", 50, 100, STARTED),     # другая удочка
+    ])
+
+    result = db.recover_rods_tick()
+
+    assert _state(sqlite_db) == {
+        1: (13, STARTED),
+        2: (100, None),
+        3: (100, None),
+        4: (6, STARTED),
+        5: (50, None),
+        6: (50, STARTED),
+        7: (50, STARTED),
+    }
+    assert result["updated"] == 4
+    assert sorted(result["recovered_user_ids"]) == [2, 3]
+    assert result["elapsed_ms"] >= 0
+
+
+def test_full_recovery_takes_thirty_ticks(sqlite_db):
+    _rods(sqlite_db, [(1, -1, BAMBOO_ROD, 0, 90, STARTED)])
+    for _ in range(29):
+        assert db.recover_rods_tick()["recovered_user_ids"] == []
+    assert db.recover_rods_tick()["recovered_user_ids"] == [1]
+    assert _state(sqlite_db) == {1: (90, None)}
+    assert db.recover_rods_tick()["updated"] == 0
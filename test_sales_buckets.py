@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Минутные корзины продаж: из них live-цены берут объём за час (проверяется на sqlite).
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import FISH_SALES_BUCKET_RETENTION_HOURS, db
+
+
+@pytest.fixture
+def buckets(monkeypatch, sqlite_db):
+    sqlite_db.execute(
+        "CREATE TABLE fish_sales_buckets (fish_key TEXT NOT NULL, bucket_start TIMESTAMP NOT NULL, "
+        "weight REAL NOT NULL DEFAULT 0, sales_count INTEGER NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (fish_key, bucket_start))"
+    )
+    sqlite_db.execute("CREATE TABLE fish_sales_stats (fish_key TEXT PRIMARY KEY, last_sold_at TIMESTAMP NOT NULL)")
+    monkeypatch.setattr(db, "get_daily_market_offer", lambda create_if_missing=False: None)
+    return sqlite_db
+
+
+def _sell(conn, sales, sold_at):
+    db._record_sales_aggregates(conn.cursor(), sales, sold_at)
+    conn.commit()
+
+
+def _rows(conn):
+    return conn.execute(
+        "SELECT fish_key, bucket_start, weight, sales_count FROM fish_sales_buckets ORDER BY fish_key, bucket_start"
+    ).fetchall()
+
+
+def test_sales_in_one_minute_add_up_in_one_bucket(buckets):
+    minute = datetime(2026, 5, 1, 12, 30)
+    _sell(buckets, [(" Щука", 2.0), ("щука ", 3.5), ("Карась", 1.0)], minute + timedelta(seconds=5))
+    _sell(buckets, [("ЩУКА", 0.5)], minute + timedelta(seconds=59, microseconds=999))
+    _sell(buckets, [("Щука", 4.0)], minute + timedelta(minutes=1))
+
+    assert _rows(buckets) == [
+        ("карась", "2026-05-01 12:30:00", 1.0, 1),
+        ("щука", "2026-05-01 12:30:00", 6.0, 3),
+        ("щука", "2026-05-01 12:31:00", 4.0, 1),
+    ]
+    last_sold = dict(buckets.execute("SELECT fish_key, last_sold_at FROM fish_sales_stats").fetchall())
+    assert last_sold["щука"] == "2026-05-01 12:31:00"
+
+
+def test_hour_volume_reads_respect_cutoff(buckets):
+    now = datetime.utcnow()
+    _sell(buckets, [("Щука", 5.0)], now - timedelta(minutes=10))
+    _sell(buckets, [("Щука", 7.0)], now - timedelta(minutes=58))
+    _sell(buckets, [("Щука", 100.0)], now - timedelta(minutes=62))
+    _sell(buckets, [("Карась", 9.0)], now - timedelta(minutes=5))
+
+    assert db.get_recent_fish_sales_weight(" ЩУКА ") == 12.0
+    # Окно шире срока хранения корзин урезается до него
+    assert db.get_recent_fish_sales_weight("Щука", hours=FISH_SALES_BUCKET_RETENTION_HOURS + 5) == 112.0
+
+    mods = db.get_fish_price_modifiers_bulk(["Щука", "щука", "Карась", "Сом"])
+    assert {name: m["hour_volume"] for name, m in mods.items()} == {"щука": 12.0, "карась": 9.0, "сом": 0.0}
+    assert mods["сом"]["hours_since_last_sale"] is None
+
+
+def test_prune_deletes_only_buckets_past_retention(buckets):
+    now = datetime.utcnow()
+    _sell(buckets, [("Щука", 1.0)], now - timedelta(hours=2, minutes=59))
+    _sell(buckets, [("Щука", 2.0)], now - timedelta(hours=3, minutes=2))
+    _sell(buckets, [("Карась", 3.0)], now - timedelta(hours=5))
+
+    assert db.prune_fish_sales_buckets(retention_hours=3) == 2
+    assert [(key, weight) for key, _, weight, _ in _rows(buckets)] == [("щука", 1.0)]
+    # Последняя продажа не удаляется вместе с корзинами
+    assert buckets.execute("SELECT COUNT(*) FROM fish_sales_stats").fetchone() == (2,)
+
+
+class _SaleConn:
+    """asyncpg-соединение продажи: отдаёт строки улова и записывает execute."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    async def fetch(self, sql, *args):
+        return self.rows if "FROM caught_fish" in sql else []
+
+    async def fetchrow(self, sql, *args):
+        return None
+
+    async def execute(self, sql, *args):
+        self.executed.append((sql, args))
+        return "OK"
+
+
+def test_async_sale_uses_sync_bucket_keys():
+    fish_repository = pytest.importorskip("fish_repository")
+
+    names = [" Щука", "ЩУКА ", "Карась"]
+    conn = _SaleConn([
+        {"id": i, "user_id": 1, "chat_id": -5, "fish_name": name, "weight": 1.5, "length": 30.0,
+         "location": "Озеро", "caught_at": datetime(2026, 5, 1), "is_fish": True}
+        for i, name in enumerate(names)
+    ])
+    repo = fish_repository.AsyncFishRepository(pool=None)
+    asyncio.run(repo._mark_sold(conn, [0, 1, 2]))
+
+    keys, weights, counts, _ = next(args for sql, args in conn.executed if sql is fish_repository._UPSERT_SALES_BUCKETS)
+    expected = db._sales_by_key(zip(names, [1.5] * 3))
+    assert dict(zip(keys, zip(weights, counts))) == {key: tuple(acc) for key, acc in expected.items()}
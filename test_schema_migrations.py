@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Старт процесса проверяет только версию схемы; bootstrap — когда схема отстала.
+"""
+import pytest
+
+from database import SCHEMA_VERSION, db
+
+
+def _forbid(name):
+    def _fail(*args, **kwargs):
+        raise AssertionError(f"{name} must not run")
+    return _fail
+
+
+def test_init_db_is_one_version_check_when_schema_is_current(monkeypatch):
+    monkeypatch.setattr(db, "get_schema_version", lambda: SCHEMA_VERSION)
+    monkeypatch.setattr(db, "apply_migrations", _forbid("apply_migrations"))
+    monkeypatch.setattr(db, "_bootstrap_schema", _forbid("_bootstrap_schema"))
+    db.init_db()
+
+
+def test_init_db_refuses_stale_schema_without_auto_migrate(monkeypatch):
+    monkeypatch.setattr(db, "get_schema_version", lambda: SCHEMA_VERSION - 1)
+    monkeypatch.setattr(db, "apply_migrations", _forbid("apply_migrations"))
+    monkeypatch.setenv("DB_AUTO_MIGRATE", "0")
+    with pytest.raises(RuntimeError, match="apply_migrations"):
+        db.init_db()
+
+
+def test_waiting_process_skips_bootstrap_done_by_another(monkeypatch, fake_db):
+    monkeypatch.setattr(db, "get_schema_version", lambda: SCHEMA_VERSION)
+    monkeypatch.setattr(db, "_bootstrap_schema", _forbid("_bootstrap_schema"))
+    assert db.apply_migrations(force=False) == SCHEMA_VERSION
+    assert fake_db.sql == ["SELECT pg_advisory_lock(?)", "SELECT pg_advisory_unlock(?)"]
+
+
+def test_forced_migration_bootstraps_and_records_version(monkeypatch, fake_db):
+    calls = []
+    monkeypatch.setattr(db, "get_schema_version", lambda: SCHEMA_VERSION)
+    monkeypatch.setattr(db, "_bootstrap_schema", lambda: calls.append("bootstrap"))
+    assert db.apply_migrations() == SCHEMA_VERSION
+    assert calls == ["bootstrap"]
+    assert fake_db.statements[1][0].startswith("INSERT INTO schema_migrations (version) VALUES (?)")
+    assert fake_db.statements[1][1] == (SCHEMA_VERSION,)
+    assert fake_db.statements[-1][0] == "SELECT pg_advisory_unlock(?)"
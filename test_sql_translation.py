@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка трансляции SQL из sqlite-диалекта в Postgres (без подключения к БД).
+"""
+
+
+def test_sql_translation_is_memoized():
+    from database import PostgresConnWrapper, _translate_sql_cached, sql_translation_stats
+
+    sql = "INSERT OR IGNORE INTO test_memo (a, b) VALUES (?, ?)"
+    before = sql_translation_stats()
+    first = _translate_sql_cached(sql)
+    second = _translate_sql_cached(sql)
+    after = sql_translation_stats()
+    assert first == second == PostgresConnWrapper._translate_sql_uncached(sql)
+    assert "%s" in first and "ON CONFLICT DO NOTHING" in first
+    assert after["hits"] >= before["hits"] + 1
+
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка ведра токенов, приоритетных полос и склейки сообщений.
+"""
+import asyncio
+
+from telegram_rate_limiter import LANE_BULK, LANE_INTERACTIVE, MessageCoalescer, OutboundRateLimiter, TokenBucket
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, capacity=2.0, now=0.0)
+    assert bucket.wait_time(0.0) == 0.0
+    bucket.take(0.0)
+    bucket.take(0.0)
+    assert bucket.wait_time(0.0) == 0.5
+    assert bucket.wait_time(0.5) == 0.0
+    bucket.block(0.5, 10.0)
+    assert bucket.wait_time(1.0) == 9.5
+
+
+def test_group_chat_is_limited_separately_from_private():
+    clock = _Clock()
+    limiter = OutboundRateLimiter(clock=clock)
+    group_burst = [limiter.try_acquire(-100) for _ in range(6)]
+    assert group_burst[:5] == [0.0] * 5 and group_burst[5] > 0
+    # Другой чат не страдает от исчерпанной группы
+    assert limiter.try_acquire(42) == 0.0
+
+
+def test_bulk_lane_leaves_reserve_for_interactive():
+    clock = _Clock()
+    limiter = OutboundRateLimiter(clock=clock)
+    granted_bulk = 0
+    while limiter.try_acquire(None, LANE_BULK) == 0.0:
+        granted_bulk += 1
+    assert 0 < granted_bulk < 30
+    assert limiter.try_acquire(None, LANE_INTERACTIVE) == 0.0
+
+
+def test_penalize_blocks_chat():
+    clock = _Clock()
+    limiter = OutboundRateLimiter(clock=clock)
+    limiter.penalize(7, 5.0)
+    assert limiter.try_acquire(7) == 5.0
+    clock.now += 5.0
+    assert limiter.try_acquire(7) == 0.0
+
+
+def test_coalescer_merges_concurrent_texts():
+    sent = []
+
+    async def send(**kwargs):
+        sent.append(kwargs)
+        return len(sent)
+
+    async def scenario():
+        coalescer = MessageCoalescer(window=0.01)
+        results = await asyncio.gather(
+            coalescer.submit(send, {"chat_id": 1, "text": "a"}),
+            coalescer.submit(send, {"chat_id": 1, "text": "b"}),
+            coalescer.submit(send, {"chat_id": 2, "text": "c"}),
+        )
+        return results, coalescer.merged
+
+    results, merged = asyncio.run(scenario())
+    assert merged == 1
+    assert sorted(m["text"] for m in sent) == ["a\n\nb", "c"]
+    assert results[0] == results[1] != results[2]
+
+
+def test_global_budget_is_split_between_shards(monkeypatch):
+    import importlib
+
+    import telegram_rate_limiter
+
+    monkeypatch.setenv("BOT_SHARD_COUNT", "3")
+    monkeypatch.setenv("TG_GLOBAL_RATE", "30")
+    monkeypatch.setenv("TG_GLOBAL_BURST", "30")
+    try:
+        module = importlib.reload(telegram_rate_limiter)
+        assert module.TG_GLOBAL_RATE == 10.0
+        assert module.TG_GLOBAL_BURST == 10.0
+    finally:
+        monkeypatch.undo()
+        importlib.reload(telegram_rate_limiter)
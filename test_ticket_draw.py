@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Розыгрыш билетов: выборка без повторов по seed и запись прогона одной вставкой.
+"""
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+import ticket_draw
+from database import db
+
+COLUMNS = ("ticket_code", "award_id", "user_id", "username", "source_type", "source_ref", "created_at", "ticket_type")
+
+
+def test_slots_are_distinct_deterministic_and_capped():
+    counts = [(30, 2), (10, 5), (20, 0), (40, 1)]
+    slots = ticket_draw.sample_ticket_slots(counts, 100, "seed-1")
+    assert len(slots) == 8
+    assert sorted(slots) == sorted({(10, i) for i in range(5)} | {(30, 0), (30, 1), (40, 0)})
+    # Тот же seed и те же счётчики (в любом порядке) — тот же результат
+    assert ticket_draw.sample_ticket_slots(list(reversed(counts)), 100, "seed-1") == slots
+    assert ticket_draw.sample_ticket_slots(counts, 3, "seed-1") == slots[:3]
+    assert ticket_draw.sample_ticket_slots([], 5, "seed-1") == []
+
+
+def test_each_ticket_is_equally_likely():
+    counts = [(1, 1), (2, 3), (3, 6)]
+    hits = Counter()
+    for n in range(6000):
+        hits.update(ticket_draw.sample_ticket_slots(counts, 2, f"s{n}"))
+    # 10 билетов, по 2 победителя: каждый выпадает в ~20% розыгрышей
+    for slot, count in hits.items():
+        assert 0.17 < count / 6000 < 0.23, slot
+    assert len(hits) == 10
+
+
+def test_first_probe_hit_respects_probe_order():
+    assert ticket_draw.first_probe_hit([5, 9, 2], {2: "b", 9: "a"}) == 9
+    assert ticket_draw.first_probe_hit([5], []) is None
+    assert ticket_draw.probe_ticket_ids(None, None) == []
+    assert all(3 <= i <= 7 for i in ticket_draw.probe_ticket_ids(3, 7))
+
+
+def _respond(state):
+    def handler(sql, params):
+        if "GROUP BY user_id" in sql:
+            return list(state["counts"])
+        if "CROSS JOIN LATERAL" in sql:
+            triples = [params[i:i + 3] for i in range(0, len(state["slots"]) * 3, 3)]
+            return state["db"].result(
+                [(f"T-{uid}-{idx}", 1, uid, f"user{uid}", "catch", None, "2026-01-01", "normal") for _, uid, idx in triples],
+                COLUMNS,
+            )
+        if sql.startswith("INSERT INTO ticket_draw_runs"):
+            return [(77,)]
+        if sql.startswith("SELECT MIN(id), MAX(id)"):
+            return [(1, 1000)]
+        if "WHERE id = ANY(?)" in sql:
+            return state["db"].result([(params[0][3], "T-probe", 1, 5, "u", "catch", None, "2026-01-01", "gold")], ("id",) + COLUMNS)
+        return None
+    return handler
+
+
+@pytest.fixture
+def ticket_db(fake_db):
+    state = {"db": fake_db, "counts": [(5, 3), (6, 1), (7, 2)], "slots": []}
+    fake_db.handler = _respond(state)
+    return state
+
+
+def test_draw_is_recorded_with_seed_and_one_batch_insert(ticket_db):
+    ticket_db["slots"] = ticket_draw.sample_ticket_slots(ticket_db["counts"], 4, "audit")
+    start, end = datetime(2026, 1, 1), datetime(2026, 1, 31, 23, 59, 59)
+    result = db.create_ticket_draw_results("normal", start, end, 4, created_by=1, seed="audit")
+
+    assert result["run_id"] == 77 and result["seed"] == "audit" and result["pool_size"] == 6
+    assert [item["ticket_code"] for item in result["items"]] == [f"T-{u}-{i}" for u, i in ticket_db["slots"]]
+    statements = ticket_db["db"].sql
+    assert not any("RANDOM()" in sql for sql in statements)
+    run_sql, run_params = ticket_db["db"].statements[2]
+    assert run_sql.startswith("INSERT INTO ticket_draw_runs") and list(run_params[-2:]) == ["audit", 6]
+    inserts = [(sql, params) for sql, params in ticket_db["db"].statements if sql.startswith("INSERT INTO ticket_draw_items")]
+    assert len(inserts) == 1
+    assert inserts[0][0].count("(?, ?, ?, ?, ?, ?, ?, ?, ?)") == 4 and len(inserts[0][1]) == 36
+
+
+def test_random_ticket_uses_id_probes(ticket_db):
+    ticket = db.get_random_ticket("gold")
+    assert ticket["ticket_code"] == "T-probe" and "id" not in ticket
+    assert not any("RANDOM()" in sql for sql, _ in ticket_db["db"].statements)
+    probe_sql, probe_params = ticket_db["db"].statements[1]
+    assert probe_sql.endswith("AND ticket_type = ?") and probe_params[1] == "gold"
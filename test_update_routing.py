@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка маршрутизации апдейтов между шардами бота.
+"""
+import json
+
+from update_routing import parse_target_urls, routing_key, shard_for_payload
+
+
+def test_routing_key_prefers_sender():
+    assert routing_key({"update_id": 1, "message": {"from": {"id": 42}, "chat": {"id": -100}}}) == 42
+    assert routing_key({"update_id": 2, "callback_query": {"from": {"id": 7}}}) == 7
+    assert routing_key({"update_id": 3, "message": {"chat": {"id": -100}}}) == -100
+    assert routing_key({"update_id": 4}) == 4
+
+
+def test_same_user_always_lands_on_same_shard():
+    message = json.dumps({"update_id": 10, "message": {"from": {"id": 123456}}}).encode()
+    callback = json.dumps({"update_id": 11, "callback_query": {"from": {"id": 123456}}}).encode()
+    assert shard_for_payload(message, 4) == shard_for_payload(callback, 4)
+    assert 0 <= shard_for_payload(message, 4) < 4
+    assert shard_for_payload(b"not json", 4) == 0
+    assert shard_for_payload(message, 1) == 0
+
+
+def test_parse_target_urls():
+    assert parse_target_urls(" http://a/x, ,http://b/x ") == ["http://a/x", "http://b/x"]
+    assert parse_target_urls("") == []
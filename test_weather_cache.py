@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Погода живёт в памяти процесса до своего срока; БД — только при истечении.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db
+from weather import WeatherSystem
+
+COLUMNS = ("id", "location", "condition", "temperature", "last_updated")
+
+
+def _respond(state):
+    def handler(sql, params):
+        row = state["row"]
+        if sql.startswith("SELECT * FROM weather"):
+            return state["db"].result([tuple(row[c] for c in COLUMNS)], COLUMNS)
+        if sql.startswith("UPDATE weather") and "RETURNING" in sql:
+            if state["lose_cas"]:
+                # Другой процесс успел обновить строку раньше
+                row.update(condition="Туман", last_updated=datetime.now())
+                return state["db"].result([], COLUMNS)
+            row.update(condition=params[0], temperature=params[1], last_updated=datetime.now())
+            return state["db"].result([tuple(row[c] for c in COLUMNS)], COLUMNS)
+        return None
+    return handler
+
+
+@pytest.fixture
+def weather_db(monkeypatch, fake_db):
+    state = {
+        "db": fake_db,
+        "lose_cas": False,
+        "row": {"id": 1, "location": "Озеро", "condition": "Дождь", "temperature": 12,
+                "last_updated": datetime.now() - timedelta(minutes=10)},
+    }
+    fake_db.handler = _respond(state)
+    monkeypatch.setattr(db, "_weather", {})
+    return state
+
+
+def test_fresh_weather_is_read_once_per_interval(weather_db):
+    first = db.get_or_update_weather("Озеро")
+    assert first["condition"] == "Дождь"
+    assert len(weather_db["db"].sql) == 1
+
+    for _ in range(5):
+        assert db.get_or_update_weather("Озеро")["condition"] == "Дождь"
+    assert len(weather_db["db"].sql) == 1
+
+    # Вызывающий получает копию и не портит кэш
+    first["condition"] = "Гроза"
+    assert db.get_or_update_weather("Озеро")["condition"] == "Дождь"
+
+
+def test_expired_weather_is_rolled_with_compare_and_set(weather_db):
+    weather_db["row"]["last_updated"] = datetime.now() - timedelta(minutes=WeatherSystem.UPDATE_INTERVAL_MINUTES + 1)
+    weather = db.get_or_update_weather("Озеро")
+    assert weather_db["db"].sql[1].startswith("UPDATE weather SET condition = ?")
+    assert weather_db["db"].sql[1].endswith("WHERE location = ? AND last_updated = ? RETURNING *")
+    assert len(weather_db["db"].sql) == 2
+    assert weather["last_updated"] == weather_db["row"]["last_updated"]
+
+    # Новый срок отсчитывается от новой строки
+    db.get_or_update_weather("Озеро")
+    assert len(weather_db["db"].sql) == 2
+
+
+def test_lost_compare_and_set_rereads_winner(weather_db):
+    weather_db["row"]["last_updated"] = datetime.now() - timedelta(hours=4)
+    weather_db["lose_cas"] = True
+    assert db.get_or_update_weather("Озеро")["condition"] == "Туман"
+    assert weather_db["db"].sql[-1] == "SELECT * FROM weather WHERE location = ?"
+
+
+def test_cache_entry_expires_with_weather(weather_db):
+    db.get_or_update_weather("Озеро")
+    weather, _expires_at = db._weather["Озеро"]
+    db._weather["Озеро"] = (weather, datetime.now() - timedelta(seconds=1))
+    db.get_or_update_weather("Озеро")
+    assert len(weather_db["db"].sql) == 2
+
+
+def test_should_update_weather_matches_expiry():
+    now = datetime.now()
+    assert WeatherSystem.should_update_weather(None)
+    assert not WeatherSystem.should_update_weather(now - timedelta(minutes=179))
+    assert WeatherSystem.should_update_weather((now - timedelta(minutes=181)).isoformat())
+    assert WeatherSystem.weather_expires_at(now) == now + timedelta(minutes=180)
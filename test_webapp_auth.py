@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка initData Telegram WebApp и кэша уже проверенных строк.
+"""
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+from webapp import telegram_auth
+
+TOKEN = "123:test"
+
+
+def _init_data(user_id=42, auth_date=None, token=TOKEN):
+    fields = {
+        "auth_date": str(int(auth_date if auth_date is not None else time.time())),
+        "query_id": "AAE",
+        "user": json.dumps({"id": user_id, "username": "angler"}),
+    }
+    check = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def test_verified_init_data_is_cached(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", TOKEN)
+    init_data = _init_data()
+    assert telegram_auth.verify_init_data(init_data) == ({"id": 42, "username": "angler"}, None)
+
+    # Повторный запрос сессии не пересчитывает HMAC
+    monkeypatch.setattr(telegram_auth, "_verify_uncached", lambda *args: (_ for _ in ()).throw(AssertionError("recomputed")))
+    user, error = telegram_auth.verify_init_data(init_data)
+    assert error is None and user["id"] == 42
+    # Вызывающий не может испортить закэшированного пользователя
+    user["id"] = 1
+    assert telegram_auth.verify_init_data(init_data)[0]["id"] == 42
+
+
+def test_tampered_and_foreign_token_rejected(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", TOKEN)
+    valid = _init_data(user_id=7)
+    assert telegram_auth.verify_init_data(valid)[1] is None
+    assert telegram_auth.verify_init_data(valid.replace("%22id%22%3A+7", "%22id%22%3A+8"))[1] == "auth_invalid"
+    assert telegram_auth.verify_init_data(_init_data(token="999:other"))[1] == "auth_invalid"
+
+    monkeypatch.setenv("BOT_TOKEN", "")
+    monkeypatch.delenv("TELEGRAM_BOT_TOKEN", raising=False)
+    assert telegram_auth.verify_init_data(valid) == (None, "server_misconfigured")
+
+
+def test_cached_entry_honours_auth_date_expiry(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", TOKEN)
+    monkeypatch.setattr(telegram_auth, "WEBAPP_AUTH_MAX_AGE_SEC", 100)
+    init_data = _init_data(user_id=9, auth_date=time.time() - 50)
+    assert telegram_auth.verify_init_data(init_data)[1] is None
+
+    monkeypatch.setattr(telegram_auth, "WEBAPP_AUTH_MAX_AGE_SEC", 10)
+    assert telegram_auth.verify_init_data(init_data) == (None, "auth_expired")
+    assert telegram_auth.verify_init_data(_init_data(user_id=10, auth_date=time.time() - 50))[1] == "auth_expired"
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Асинхронные чтения Mini App: формы ответов совпадают с синхронным Database (без БД).
+"""
+import asyncio
+
+from database import webapp_book_item
+from webapp_repository import AsyncWebappRepository
+
+
+class _FakeConn:
+    def __init__(self, answers):
+        self.answers = answers
+        self.queries = []
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.answers.pop(0)
+
+    async def fetchrow(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.answers.pop(0)
+
+    async def fetchval(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.answers.pop(0)
+
+
+class _FakePool:
+    def __init__(self, *answers):
+        self.conn = _FakeConn(list(answers))
+        self.acquired = 0
+
+    def acquire(self):
+        pool = self
+
+        class _Ctx:
+            async def __aenter__(self):
+                pool.acquired += 1
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Ctx()
+
+
+def test_book_entries_mark_caught_species_on_one_connection():
+    row = ("Карась", "Обычная", 0.1, 1.5, 5, 30, "Пруд", "Черви", 12)
+    pool = _FakePool([("карась",)], [row])
+    items = asyncio.run(AsyncWebappRepository(pool).get_book_entries(5, {"Карась": "crucian.webp"}, search="кар"))
+
+    assert pool.acquired == 1
+    assert pool.conn.queries[1][1] == ("%кар%", 128)
+    assert items == [webapp_book_item(1, row, {"Карась": "crucian.webp"}, {"карась"})]
+    assert items[0]["is_caught"] is True
+    assert items[0]["image_url"] == "/api/fish-image/crucian.webp"
+
+
+def test_tickets_rank_without_tickets_goes_after_everyone():
+    pool = _FakePool({"total_users": 3, "rank": None, "tickets": None})
+    rank = asyncio.run(AsyncWebappRepository(pool).get_user_tickets_rank(9, "gold"))
+    assert rank == {"rank": 4, "tickets": 0, "total_users": 3}
+
+    empty = _FakePool({"total_users": 0, "rank": None, "tickets": None})
+    assert asyncio.run(AsyncWebappRepository(empty).get_user_tickets_rank(9, "gold"))["rank"] == 1
+
+    ranked = _FakePool({"total_users": 3, "rank": 2, "tickets": 7})
+    assert asyncio.run(AsyncWebappRepository(ranked).get_user_tickets_rank(9, "normal")) == {
+        "rank": 2,
+        "tickets": 7,
+        "total_users": 3,
+    }
+
+
+def test_latest_draw_results_shape():
+    run = {"id": 4, "start_at": "s", "end_at": "e", "requested_count": 2, "created_by": 1, "created_at": "c",
+           "seed": "ab12", "pool_size": 9}
+    pool = _FakePool(run, [{"ticket_code": "A1", "user_id": 3}])
+    result = asyncio.run(AsyncWebappRepository(pool).get_latest_ticket_draw_results("normal"))
+    assert result["run_id"] == 4
+    assert result["ticket_type"] == "normal"
+    assert (result["seed"], result["pool_size"]) == ("ab12", 9)
+    assert result["items"] == [{"ticket_code": "A1", "user_id": 3}]
+
+    assert asyncio.run(AsyncWebappRepository(_FakePool(None)).get_latest_ticket_draw_results("gold")) is None
+
+
+def test_random_ticket_probes_ids_then_falls_back_to_count(monkeypatch):
+    import webapp_repository
+
+    monkeypatch.setattr(webapp_repository, "probe_ticket_ids", lambda lo, hi: [8, 3] if lo is not None else [])
+    hit = _FakePool((1, 9), [{"id": 3, "ticket_code": "G3"}, {"id": 8, "ticket_code": "G8"}])
+    assert asyncio.run(AsyncWebappRepository(hit).get_random_ticket("gold")) == {"ticket_code": "G8"}
+    assert hit.conn.queries[1][1] == ([8, 3], "gold")
+
+    miss = _FakePool((1, 9), [], 2, {"id": 5, "ticket_code": "G5"})
+    assert asyncio.run(AsyncWebappRepository(miss).get_random_ticket("gold")) == {"ticket_code": "G5"}
+    assert "OFFSET $2" in miss.conn.queries[-1][0]
+
+    assert asyncio.run(AsyncWebappRepository(_FakePool((None, None))).get_random_ticket()) is None
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка пересылки апдейтов по keep-alive соединениям и через Unix-сокет.
+"""
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from webhook_forwarder import ForwardTarget, WebhookForwarder, unix_socket_url
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.append((self.path, body, self.headers.get("X-Telegram-Bot-Api-Secret-Token")))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def _wait_for(forwarder, count):
+    deadline = time.time() + 5
+    while forwarder.stats()["forwarded"] + forwarder.stats()["failed"] < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_forwarder_reuses_connection():
+    _Handler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/telegram-webhook"
+        forwarder = WebhookForwarder([url], workers=1, queue_size=100, timeout=5)
+        for idx in range(5):
+            assert forwarder.submit(0, f'{{"update_id": {idx}}}'.encode(), {"X-Telegram-Bot-Api-Secret-Token": "s"})
+        _wait_for(forwarder, 5)
+        stats = forwarder.stats()
+        assert stats["forwarded"] == 5 and stats["connects"] == 1
+        assert [r[1] for r in _Handler.received] == [f'{{"update_id": {idx}}}'.encode() for idx in range(5)]
+        assert {r[0] for r in _Handler.received} == {"/telegram-webhook"}
+        assert {r[2] for r in _Handler.received} == {"s"}
+    finally:
+        server.shutdown()
+
+
+def test_forwarder_over_unix_socket():
+    _Handler.received = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bot.sock")
+        server = _UnixHTTPServer(path, _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = unix_socket_url(path, "telegram-webhook")
+            assert ForwardTarget(url).socket_path == path
+            forwarder = WebhookForwarder([url], workers=1, timeout=5)
+            assert forwarder.submit(0, b"{}", {})
+            _wait_for(forwarder, 1)
+            assert forwarder.stats()["forwarded"] == 1
+            assert _Handler.received[0][:2] == ("/telegram-webhook", b"{}")
+        finally:
+            server.shutdown()
+
+
+def test_full_queue_rejects():
+    forwarder = WebhookForwarder(["http://127.0.0.1:9/x"], workers=1, queue_size=1)
+    forwarder._started = True  # без потоков очередь не разгребается
+    assert forwarder.submit(0, b"{}", {})
+    assert not forwarder.submit(0, b"{}", {})
+    assert forwarder.stats()["rejected"] == 1
+
+
+def test_same_key_keeps_order_across_lanes():
+    _Handler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/telegram-webhook"
+        forwarder = WebhookForwarder([url], workers=4, timeout=5)
+        for idx in range(20):
+            assert forwarder.submit(0, str(idx).encode(), {}, key=777)
+        _wait_for(forwarder, 20)
+        assert [int(r[1]) for r in _Handler.received] == list(range(20))
+    finally:
+        server.shutdown()
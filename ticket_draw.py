@@ -0,0 +1,114 @@
+"""Розыгрыш билетов без ORDER BY RANDOM(): выборка по счётчикам и по диапазону id.
+
+Модуль без зависимостей, его используют и `Database`, и асинхронный репозиторий
+webapp. Запросы к БД строят вызывающие; здесь только выбор победителей.
+
+- Розыгрыш за период: БД отдаёт число билетов каждого игрока за период, а
+  `sample_ticket_slots` выбирает k разных билетов за O(u + k log u) (u — игроки)
+  деревом Фенвика. Билет задаётся парой (user_id, порядковый номер билета игрока
+  в периоде по created_at, id). Генератор детерминирован от seed, поэтому
+  записанный seed и те же счётчики воспроизводят результат для проверки.
+- Один случайный билет из пула: `probe_ticket_ids` бросает id, равномерно
+  распределённые в [MIN(id), MAX(id)]. Первый существующий подходящий id
+  равномерен среди подходящих билетов; каждая проба — поиск по первичному ключу.
+"""
+import random
+import secrets
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Сколько id пробовать за один запрос для случайного билета
+RANDOM_TICKET_PROBES = 64
+
+
+def draw_seed() -> str:
+    """Новый seed розыгрыша (записывается в ticket_draw_runs.seed)."""
+    return secrets.token_hex(16)
+
+
+def draw_rng(seed: str) -> random.Random:
+    # random.Random(str) детерминирован между запусками и версиями CPython 3
+    return random.Random(str(seed))
+
+
+class _Fenwick:
+    """Дерево Фенвика над числом ещё не выбранных билетов у каждого игрока."""
+
+    def __init__(self, counts: Sequence[int]):
+        self.size = len(counts)
+        self.tree = [0] * (self.size + 1)
+        for idx, value in enumerate(counts, start=1):
+            self.tree[idx] += value
+            parent = idx + (idx & -idx)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[idx]
+        self.total = sum(counts)
+
+    def add(self, pos: int, delta: int) -> None:
+        self.total += delta
+        idx = pos + 1
+        while idx <= self.size:
+            self.tree[idx] += delta
+            idx += idx & -idx
+
+    def find(self, target: int) -> Tuple[int, int]:
+        """Позиция игрока с target-м (с нуля) оставшимся билетом и номер билета у него."""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos, target
+
+
+def sample_ticket_slots(
+    user_counts: Sequence[Tuple[int, int]],
+    k: int,
+    seed: str,
+) -> List[Tuple[int, int]]:
+    """Выбрать k разных билетов без возвращения, равновероятно среди всех билетов.
+
+    user_counts — пары (user_id, число билетов за период) в любом порядке.
+    Возвращает (user_id, номер билета игрока с нуля) в порядке выпадения.
+    """
+    counts = sorted((int(uid), int(cnt)) for uid, cnt in user_counts if int(cnt or 0) > 0)
+    tree = _Fenwick([cnt for _, cnt in counts])
+    rng = draw_rng(seed)
+    taken: Dict[int, List[int]] = {}
+    slots: List[Tuple[int, int]] = []
+    for _ in range(min(max(0, int(k)), tree.total)):
+        pos, nth_left = tree.find(rng.randrange(tree.total))
+        # nth_left-й ещё не выбранный билет игрока -> его номер среди всех билетов
+        index = nth_left
+        for drawn in taken.setdefault(pos, []):
+            if drawn <= index:
+                index += 1
+        taken[pos].append(index)
+        taken[pos].sort()
+        tree.add(pos, -1)
+        slots.append((counts[pos][0], index))
+    return slots
+
+
+def probe_ticket_ids(
+    min_id: Optional[int],
+    max_id: Optional[int],
+    rng: Optional[random.Random] = None,
+    probes: int = RANDOM_TICKET_PROBES,
+) -> List[int]:
+    """Случайные id в [min_id, max_id] для поиска одного случайного билета."""
+    if min_id is None or max_id is None:
+        return []
+    rng = rng or random.Random()
+    return [rng.randint(int(min_id), int(max_id)) for _ in range(max(1, probes))]
+
+
+def first_probe_hit(probes: Sequence[int], found_ids) -> Optional[int]:
+    """Первый id из проб, который нашёлся в БД (равномерен среди подходящих билетов)."""
+    found = set(int(i) for i in found_ids)
+    for ticket_id in probes:
+        if ticket_id in found:
+            return ticket_id
+    return None
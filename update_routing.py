@@ -0,0 +1,98 @@
+"""Маршрутизация апдейтов Telegram между шардами бота по user_id.
+
+Все апдейты одного пользователя попадают в один и тот же процесс бота, поэтому
+состояние, ключом которого служит сам пользователь (локи действий, бои, локации,
+инвойсы), остаётся локальным для шарда.
+
+Состояние, которое трогают разные пользователи, локальным быть не может:
+- последний стикер улова в чате (на него отвечает любой участник) хранится в БД
+  при BOT_SHARD_COUNT > 1;
+- таймауты дуэлей планируются на шарде пригласившего, а отменяются апдейтами цели
+  с другого шарда — поэтому их обработчики сверяются со статусом дуэли в БД;
+- лимиты Telegram на бота общие — ведро каждого шарда получает 1/BOT_SHARD_COUNT.
+"""
+import json
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+
+# Типы апдейтов, у которых отправитель лежит в поле "from"
+_USER_UPDATE_FIELDS = (
+    "message",
+    "edited_message",
+    "callback_query",
+    "pre_checkout_query",
+    "shipping_query",
+    "chosen_inline_result",
+    "inline_query",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+
+def shard_count() -> int:
+    """Сколько шардов бота запущено (BOT_SHARD_COUNT, по умолчанию 1)."""
+    try:
+        return max(1, int(os.getenv("BOT_SHARD_COUNT", "1")))
+    except ValueError:
+        return 1
+
+
+def shard_index() -> int:
+    """Номер текущего шарда (BOT_SHARD_INDEX, по умолчанию 0)."""
+    try:
+        return max(0, int(os.getenv("BOT_SHARD_INDEX", "0")))
+    except ValueError:
+        return 0
+
+
+def is_primary_shard() -> bool:
+    """Шард 0 владеет глобальными задачами: периодические scheduler-джобы и setWebhook."""
+    return shard_index() == 0
+
+
+def routing_key(update: Dict[str, Any]) -> Optional[int]:
+    """Ключ маршрутизации: id отправителя, иначе id чата, иначе update_id."""
+    for field in _USER_UPDATE_FIELDS:
+        body = update.get(field)
+        if not isinstance(body, dict):
+            continue
+        sender = body.get("from")
+        if isinstance(sender, dict) and sender.get("id") is not None:
+            return int(sender["id"])
+        chat = body.get("chat")
+        if isinstance(chat, dict) and chat.get("id") is not None:
+            return int(chat["id"])
+    update_id = update.get("update_id")
+    return int(update_id) if update_id is not None else None
+
+
+def shard_for_key(key: Optional[int], count: int) -> int:
+    if count <= 1 or key is None:
+        return 0
+    # crc32 стабилен между процессами, в отличие от hash() для строк
+    return zlib.crc32(str(int(key)).encode("ascii")) % count
+
+
+def payload_routing_key(payload: bytes) -> Optional[int]:
+    """Ключ маршрутизации для сырого JSON апдейта; для битого JSON — None."""
+    try:
+        update = json.loads(payload)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(update, dict):
+        return None
+    return routing_key(update)
+
+
+def shard_for_payload(payload: bytes, count: int) -> int:
+    """Номер шарда для сырого JSON апдейта; битый JSON уходит в шард 0."""
+    if count <= 1:
+        return 0
+    return shard_for_key(payload_routing_key(payload), count)
+
+
+def parse_target_urls(raw: str) -> List[str]:
+    """Список внутренних webhook-URL шардов из строки через запятую."""
+    return [url.strip() for url in (raw or "").split(",") if url.strip()]
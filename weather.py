@@ -2,7 +2,7 @@
 import random
 import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 from config import get_current_season
 
 class WeatherSystem:
@@ -121,6 +121,30 @@ class WeatherSystem:
         """Получить бонус/штраф к улову из-за погоды"""
         return WeatherSystem.WEATHER_CONDITIONS.get(weather_condition, {}).get('bonus', 0)
     
+    # Погода на локации обновляется раз в ~3 часа (несколько раз в день)
+    UPDATE_INTERVAL_MINUTES = 180
+
+    @staticmethod
+    def _parse_timestamp(value) -> datetime:
+        # Accept either a string timestamp (ISO) or a datetime object (Postgres may return TIMESTAMP)
+        if isinstance(value, datetime):
+            return value
+        # if it's bytes or other, try to decode/convert to str first
+        if isinstance(value, (bytes, bytearray)):
+            try:
+                value = value.decode()
+            except Exception:
+                pass
+        return datetime.fromisoformat(str(value))
+
+    @staticmethod
+    def weather_expires_at(last_update) -> Optional[datetime]:
+        """Момент, после которого погоду с этим last_updated пора обновить (None — уже пора)."""
+        if not last_update:
+            return None
+        last_time = WeatherSystem._parse_timestamp(last_update)
+        return last_time + timedelta(minutes=WeatherSystem.UPDATE_INTERVAL_MINUTES)
+
     @staticmethod
     def should_update_weather(last_update) -> bool:
         """Проверить, нужна ли обновление погоды.
@@ -128,26 +152,8 @@ class WeatherSystem:
         Важно: интервал обновления должен быть детерминированным,
         чтобы разные команды в один момент времени не видели разную погоду.
         """
-        # Accept either a string timestamp (ISO) or a datetime object (Postgres may return TIMESTAMP)
-        if not last_update:
-            return True
-
-        if isinstance(last_update, datetime):
-            last_time = last_update
-        else:
-            # if it's bytes or other, try to decode/convert to str first
-            if isinstance(last_update, (bytes, bytearray)):
-                try:
-                    last_update = last_update.decode()
-                except Exception:
-                    pass
-
-            last_time = datetime.fromisoformat(str(last_update))
-        # Обновляем раз в ~3 часа (несколько раз в день)
-        update_interval = 180  # в минутах
-        time_diff = (datetime.now() - last_time).total_seconds() / 60
-        
-        return time_diff > update_interval
+        expires_at = WeatherSystem.weather_expires_at(last_update)
+        return expires_at is None or datetime.now() > expires_at
     
     @staticmethod
     def get_weather_info(condition: str, temperature: int, season: str) -> str:
@@ -2,12 +2,6 @@ from __future__ import annotations
 
 
 
-import hashlib
-
-import hmac
-
-import json
-
 import logging
 
 import os
@@ -15,7 +9,6 @@ import os
 import sys
 
 import time
-from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime, timedelta
 
@@ -23,15 +16,16 @@ from pathlib import Path
 
 from typing import Optional
 
-from urllib.parse import parse_qsl
-from urllib.error import HTTPError, URLError
-from urllib.request import Request as UrlRequest, urlopen
-
 
 
 from flask import Flask, jsonify, render_template, request, send_from_directory
 
 import fish_stickers
+import update_routing
+
+from economy import calculate_sale_summary
+from webapp import telegram_auth
+from webhook_forwarder import WebhookForwarder
 from fish_stickers import FISH_STICKERS as fish_stickers_dict
 
 
@@ -39,10 +33,7 @@ from fish_stickers import FISH_STICKERS as fish_stickers_dict
 
 
 logger = logging.getLogger(__name__)
-WEBHOOK_PROXY_EXECUTOR = ThreadPoolExecutor(
-	max_workers=int(os.getenv("WEBHOOK_PROXY_WORKERS", "128")),
-	thread_name_prefix="telegram_webhook_proxy",
-)
+_webhook_forwarder: WebhookForwarder | None = None
 
 fish_db = None
 
@@ -385,93 +376,9 @@ def _captcha_error_status(error_code: str) -> int:
 
 def _verify_telegram_init_data(init_data: str) -> tuple[Optional[dict], Optional[str]]:
 
-	bot_token = (os.getenv("BOT_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN") or "").strip()
-
-	if not bot_token:
-
-		return None, "server_misconfigured"
-
-
-
-	try:
-
-		payload = dict(parse_qsl(init_data, keep_blank_values=True))
-
-	except Exception:
-
-		return None, "auth_invalid"
-
-
-
-	received_hash = str(payload.pop("hash", "")).strip()
-
-	if not received_hash:
-
-		return None, "auth_invalid"
-
-
-
-	data_check_string = "\n".join(
-
-		f"{key}={value}" for key, value in sorted(payload.items(), key=lambda item: item[0])
-
-	)
-
-	secret_key = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
-
-	expected_hash = hmac.new(secret_key, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
-
-
-
-	if not hmac.compare_digest(expected_hash, received_hash):
-
-		return None, "auth_invalid"
-
-
-
-	auth_date = _safe_int(payload.get("auth_date"))
-
-	max_age_seconds = _safe_int(os.getenv("WEBAPP_AUTH_MAX_AGE_SEC")) or 86400
-
-	if auth_date is None:
-
-		return None, "auth_invalid"
-
-	if max_age_seconds > 0 and int(time.time()) - auth_date > max_age_seconds:
-
-		return None, "auth_expired"
-
-
-
-	raw_user = payload.get("user")
-
-	if not raw_user:
-
-		return None, "auth_invalid"
-
-
-
-	try:
-
-		user_payload = json.loads(raw_user)
-
-	except (TypeError, ValueError, json.JSONDecodeError):
-
-		return None, "auth_invalid"
-
+	# Проверенные строки кэшируются на процесс: Mini App шлёт одну initData на всю сессию
 
-
-	user_id = _safe_int(user_payload.get("id"))
-
-	if not user_id:
-
-		return None, "auth_invalid"
-
-
-
-	username = user_payload.get("username") or user_payload.get("first_name") or user_payload.get("last_name")
-
-	return {"id": user_id, "username": username}, None
+	return telegram_auth.verify_init_data(init_data)
 
 
 
@@ -551,33 +458,54 @@ def ping():
 
 
 
+def _get_webhook_forwarder() -> WebhookForwarder:
+	global _webhook_forwarder
+	if _webhook_forwarder is None:
+		target_urls = update_routing.parse_target_urls(os.getenv("BOT_INTERNAL_WEBHOOK_URLS", "")) or [
+			os.getenv("BOT_INTERNAL_WEBHOOK_URL", "http://127.0.0.1:9000/telegram-webhook")
+		]
+		_webhook_forwarder = WebhookForwarder(
+			target_urls,
+			workers=int(os.getenv("WEBHOOK_PROXY_WORKERS", "8")),
+			queue_size=int(os.getenv("WEBHOOK_PROXY_QUEUE_SIZE", "5000")),
+			batch_size=int(os.getenv("WEBHOOK_PROXY_BATCH", "32")),
+			timeout=float(os.getenv("WEBHOOK_PROXY_TIMEOUT", "30")),
+		)
+	return _webhook_forwarder
+
+
 @app.post(f"/{os.getenv('WEBHOOK_PATH', 'telegram-webhook').strip('/') or 'telegram-webhook'}")
 def telegram_webhook_proxy():
-	target_url = os.getenv("BOT_INTERNAL_WEBHOOK_URL", "http://127.0.0.1:9000/telegram-webhook")
 	payload = request.get_data(cache=False)
+	forwarder = _get_webhook_forwarder()
+	# Апдейты одного пользователя всегда уходят в один шард бота и в одну полосу форвардера
+	routing_key = update_routing.payload_routing_key(payload)
+	target_index = update_routing.shard_for_key(routing_key, len(forwarder.targets))
 	headers = {
 		"Content-Type": request.headers.get("Content-Type", "application/json"),
 		"X-Telegram-Bot-Api-Secret-Token": request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""),
 	}
+	if not forwarder.submit(target_index, payload, headers, key=routing_key):
+		# Очередь полна: Telegram повторит доставку сам, а мы не копим апдейты в памяти
+		logger.warning("Telegram webhook proxy queue is full, rejecting update: %s", forwarder.stats())
+		return "", 503, {"Retry-After": "1"}
 	if os.getenv("WEBHOOK_PROXY_LOG_UPDATES", "1") == "1":
-		logger.info("Telegram webhook proxy accepted update: bytes=%s target=%s", len(payload), target_url)
-	WEBHOOK_PROXY_EXECUTOR.submit(_forward_telegram_update, target_url, payload, headers)
+		logger.info(
+			"Telegram webhook proxy accepted update: bytes=%s target=%s",
+			len(payload),
+			forwarder.targets[target_index].url,
+		)
 	return "", 200
 
 
-def _forward_telegram_update(target_url: str, payload: bytes, headers: dict) -> None:
-	try:
-		proxy_request = UrlRequest(target_url, data=payload, headers=headers, method="POST")
-		with urlopen(proxy_request, timeout=float(os.getenv("WEBHOOK_PROXY_TIMEOUT", "30"))) as response:
-			response.read(1024)
-		if os.getenv("WEBHOOK_PROXY_LOG_UPDATES", "1") == "1":
-			logger.info("Telegram webhook proxy forwarded update to bot: status=%s", getattr(response, "status", "?"))
-	except HTTPError as exc:
-		logger.warning("Telegram webhook proxy got HTTP %s from bot", exc.code)
-	except (TimeoutError, URLError) as exc:
-		logger.warning("Telegram webhook proxy could not forward update to bot: %s", exc)
-	except Exception:
-		logger.exception("Telegram webhook proxy background forward failed")
+@app.get("/api/webhook-proxy/stats")
+def telegram_webhook_proxy_stats():
+	auth_user, auth_error = _get_verified_user_from_request()
+	if auth_error:
+		return jsonify({"ok": False, "error": auth_error}), _auth_error_status(auth_error)
+	if int(auth_user["id"]) != 793216884:
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	return jsonify({"ok": True, **_get_webhook_forwarder().stats()})
 
 
 @app.get("/api/fish-image/<path:filename>")
@@ -631,38 +559,39 @@ def inventory():
 				LIMIT 1000
 			''', (user_id,))
 			rows = cursor.fetchall()
-			
-			items = []
-			for r in rows:
-				fish_name = r[1]
-				weight = r[2]
-				length = r[3]
-				image_file = r[7] or fish_stickers_dict.get(fish_name) or 'fishdef.webp'
-				
-				# Собираем данные для calculate_fish_price
-				fish_data = {
-					'name': fish_name,
-					'fish_name': fish_name,
-					'rarity': r[5],
-					'price': r[6],
-					'min_weight': r[8],
-					'max_weight': r[9],
-					'min_length': r[10],
-					'max_length': r[11]
-				}
-				calculated_price = db.calculate_fish_price(fish_data, weight, length)
-				
-				items.append({
-					"id": r[0],
-					"name": fish_name,
-					"weight": weight,
-					"length": length,
-					"location": r[4],
-					"rarity": r[5],
-					"price": calculated_price,
-					"image_url": f"/api/fish-image/{image_file}"
-				})
-			return jsonify({"ok": True, "items": items})
+
+		# Модификаторы цены считаются одним запросом на все виды сразу
+		prices = db.price_fish_items([
+			{
+				'name': r[1],
+				'fish_name': r[1],
+				'rarity': r[5],
+				'price': r[6],
+				'min_weight': r[8],
+				'max_weight': r[9],
+				'min_length': r[10],
+				'max_length': r[11],
+				'weight': r[2],
+				'length': r[3],
+			}
+			for r in rows
+		])
+
+		items = []
+		for r, calculated_price in zip(rows, prices):
+			fish_name = r[1]
+			image_file = r[7] or fish_stickers_dict.get(fish_name) or 'fishdef.webp'
+			items.append({
+				"id": r[0],
+				"name": fish_name,
+				"weight": r[2],
+				"length": r[3],
+				"location": r[4],
+				"rarity": r[5],
+				"price": calculated_price,
+				"image_url": f"/api/fish-image/{image_file}"
+			})
+		return jsonify({"ok": True, "items": items})
 	except Exception as e:
 		logger.exception("API inventory failed")
 		return jsonify({"ok": False, "error": "internal_error"}), 500
@@ -747,6 +676,27 @@ def inventory_grouped():
 			''', (user_id,))
 			rows = cursor.fetchall()
 			
+			# Цены рыбы (не мусора) считаем пачкой: модификаторы — один раз на вид
+			fish_rows = [r for r in rows if r[4]]
+			fish_prices = dict(zip(
+				(r[0] for r in fish_rows),
+				db.price_fish_items([
+					{
+						'name': r[1],
+						'fish_name': r[1],
+						'rarity': r[4],
+						'price': r[5],
+						'min_weight': r[7],
+						'max_weight': r[8],
+						'min_length': r[9],
+						'max_length': r[10],
+						'weight': r[2],
+						'length': r[3],
+					}
+					for r in fish_rows
+				]),
+			))
+			
 			# Группируем по fish_name
 			grouped_data = {}
 			for r in rows:
@@ -768,19 +718,8 @@ def inventory_grouped():
 						'count': 0
 					}
 				
-				# Для каждой рыбы вычисляем её цену
 				if rarity:  # Это рыба, а не мусор
-					fish_data = {
-						'name': fish_name,
-						'fish_name': fish_name,
-						'rarity': rarity,
-						'price': base_price,
-						'min_weight': min_w,
-						'max_weight': max_w,
-						'min_length': min_l,
-						'max_length': max_l
-					}
-					calculated_price = db.calculate_fish_price(fish_data, weight, length)
+					calculated_price = fish_prices[fish_id]
 				else:
 					# Для мусора берем базовую цену из trash таблицы
 					calculated_price = trash_price or base_price or 0
@@ -886,32 +825,39 @@ def sell_bulk():
 			fish_items = []
 			actual_ids = []
 			
+			fish_rows = [r for r in rows if r[4]]
+			fish_prices = dict(zip(
+				(r[0] for r in fish_rows),
+				db.price_fish_items([
+					{
+						'name': r[1],
+						'fish_name': r[1],
+						'rarity': r[4],
+						'price': r[5],
+						'min_weight': r[6],
+						'max_weight': r[7],
+						'min_length': r[8],
+						'max_length': r[9],
+						'weight': r[2],
+						'length': r[3],
+					}
+					for r in fish_rows
+				]),
+			))
+			
 			for r in rows:
 				fish_id, fish_name, weight, length, rarity, base_price, min_w, max_w, min_l, max_l = r
 				actual_ids.append(fish_id)
 				
 				if rarity:  # Это рыба
-					# Вычисляем цену через calculate_fish_price
-					fish_data = {
-						'name': fish_name,
-						'fish_name': fish_name,
-						'rarity': rarity,
-						'price': base_price,
-						'min_weight': min_w,
-						'max_weight': max_w,
-						'min_length': min_l,
-						'max_length': max_l
-					}
-					calculated_price = db.calculate_fish_price(fish_data, weight, length)
-					tot_price += calculated_price
-					fish_items.append({"name": fish_name, "weight": weight, "length": length, "rarity": rarity})
+					tot_price += fish_prices[fish_id]
+					fish_items.append({"name": fish_name, "weight": weight, "length": length, "rarity": rarity, "min_weight": min_w, "max_weight": max_w})
 				elif fish_name in tdict:  # Это мусор
 					tot_price += tdict[fish_name]
 					tot_xp += 1
 			
 			if fish_items:
 				try:
-					from bot import calculate_sale_summary
 					xp, _, _, _, total_weight = calculate_sale_summary(fish_items)
 					tot_xp += xp
 					# Обновляем статистику продажи
@@ -2178,6 +2124,10 @@ def tickets_draw():
 
 			"ticket_type": ticket_type,
 
+			"seed": result.get("seed"),
+
+			"pool_size": result.get("pool_size"),
+
 			"period": {
 
 				"start_date": start_date.strftime("%Y-%m-%d %H:%M:%S"),
@@ -2228,6 +2178,10 @@ def tickets_draw():
 
 		"ticket_type": ticket_type,
 
+		"seed": result.get("seed"),
+
+		"pool_size": result.get("pool_size"),
+
 		"period": {
 
 			"start_date": start_date.strftime("%Y-%m-%d %H:%M:%S"),
@@ -2343,6 +2297,10 @@ def tickets_results():
 
 		"ticket_type": ticket_type,
 
+		"seed": result.get("seed"),
+
+		"pool_size": result.get("pool_size"),
+
 		"period": period,
 
 	})
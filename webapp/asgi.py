@@ -0,0 +1,379 @@
+"""ASGI-вариант Mini App API для uvicorn (WEBAPP_SERVER=uvicorn в launcher.py).
+
+Эндпоинты чтения (/api/profile, /api/inventory, /api/guilds, /api/book,
+/api/tickets/rating|results|random) обслуживаются прямо в event loop поверх
+asyncpg-пула, поэтому один процесс держит много одновременных запросов, а не
+по одному на sync-воркер gunicorn. Все остальные маршруты уходят во Flask-приложение
+через WSGI-мост uvicorn — маршруты, авторизация и формы JSON остаются общими.
+
+Без PostgreSQL (или если пул не поднялся) нативные эндпоинты тоже отдаются Flask.
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from webapp.app import (
+	_auth_error_status,
+	_build_title,
+	_build_trophy_payload,
+	_format_trophy_id,
+	_get_fish_db,
+	_normalize_username,
+	_safe_int,
+	_verify_telegram_init_data,
+	app as flask_app,
+	fish_stickers_dict,
+)
+from webapp_repository import AsyncWebappRepository
+
+logger = logging.getLogger(__name__)
+
+# Тот же администратор, что и в проверках webapp/app.py
+_ADMIN_USER_ID = 793216884
+
+# Синхронные вызовы Database (создание профиля, цены, снимок артелей) — в своём пуле
+_sync_executor = ThreadPoolExecutor(
+	max_workers=max(1, int(os.getenv("WEBAPP_SYNC_THREADS", "8") or 8)),
+	thread_name_prefix="webapp_sync_db",
+)
+
+_wsgi_app = WSGIMiddleware(flask_app, workers=max(1, int(os.getenv("WEBAPP_WSGI_THREADS", "10") or 10)))
+
+_pool: Any = None
+_repo: Optional[AsyncWebappRepository] = None
+
+Payload = Tuple[Dict[str, Any], int]
+
+
+class _Request:
+	"""То немногое из запроса, что нужно обработчикам: query-параметры и заголовки."""
+
+	def __init__(self, scope: Dict[str, Any]):
+		self.args: Dict[str, str] = {}
+		# Как request.args.get во Flask: берётся первое значение параметра
+		for key, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True):
+			self.args.setdefault(key, value)
+		self.headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers") or []}
+
+
+async def _run_sync(func: Callable[..., Any], *args, **kwargs) -> Any:
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(_sync_executor, functools.partial(func, *args, **kwargs))
+
+
+def _verified_user(req: _Request) -> Tuple[Optional[dict], Optional[str]]:
+	init_data = (req.headers.get("x-telegram-init-data") or req.args.get("init_data") or "").strip()
+	if not init_data:
+		return None, "auth_required"
+	return _verify_telegram_init_data(init_data)
+
+
+def _ticket_type_arg(req: _Request, default: str = "normal") -> str:
+	ticket_type = str(req.args.get("ticket_type") or default).strip().lower()
+	return ticket_type if ticket_type in ("normal", "gold") else default
+
+
+def _db_unavailable() -> Payload:
+	return {"ok": False, "error": "db_unavailable"}, 500
+
+
+async def _profile(req: _Request, user: dict) -> Payload:
+	user_id = int(user["id"])
+	fallback_username = user.get("username")
+	logger.info("WebApp verified access user_id=%s username=%s", user_id, fallback_username or "")
+
+	try:
+		player = await _repo.get_profile(user_id)
+	except Exception:
+		logger.exception("WebApp profile read failed for user_id=%s", user_id)
+		player = None
+
+	if not player:
+		db = await _run_sync(_get_fish_db)
+		if db is None:
+			return _db_unavailable()
+		try:
+			await _run_sync(db.create_player, user_id, str(fallback_username or f"user_{user_id}"), -1)
+			player = await _repo.get_profile(user_id)
+		except Exception:
+			logger.exception("WebApp profile create failed for user_id=%s", user_id)
+			return {"ok": False, "error": "profile_create_failed"}, 500
+	if not player:
+		return {"ok": False, "error": "profile_not_found"}, 404
+
+	try:
+		trophy_items = await _repo.get_trophies(user_id)
+	except Exception:
+		logger.exception("WebApp trophy read failed for user_id=%s", user_id)
+		trophy_items = []
+	active_trophy = next((item for item in trophy_items if int(item.get("is_active") or 0) == 1), None)
+	if not active_trophy and trophy_items:
+		active_trophy = trophy_items[0]
+
+	active_rarity = "Обычная"
+	if active_trophy:
+		try:
+			active_rarity = str(await _repo.get_fish_rarity(str(active_trophy.get("fish_name") or "")) or "Обычная")
+		except Exception:
+			active_rarity = "Обычная"
+
+	try:
+		tickets = await _repo.get_ticket_totals(user_id)
+	except Exception:
+		tickets = {"normal": int(player.get("tickets") or 0), "gold": int(player.get("gold_tickets") or 0)}
+
+	level = int(player.get("level") or 0)
+	return {
+		"user_id": user_id,
+		"is_admin": user_id == _ADMIN_USER_ID,
+		"username": _normalize_username(player.get("username") or fallback_username),
+		"level": level,
+		"xp": int(player.get("xp") or 0),
+		"coins": int(player.get("coins") or 0),
+		"stars": int(player.get("stars") or 0),
+		"tickets": int(tickets["normal"] or 0),
+		"gold_tickets": int(tickets["gold"] or 0),
+		"title": _build_title(level),
+		"selected_trophy": _format_trophy_id(active_trophy),
+		"selected_trophy_data": _build_trophy_payload(active_trophy, fish_rarity=active_rarity),
+	}, 200
+
+
+async def _inventory(req: _Request, user: dict) -> Payload:
+	user_id = int(user["id"])
+	db = await _run_sync(_get_fish_db)
+	if db is None:
+		return _db_unavailable()
+	try:
+		rows = await _repo.get_inventory_rows(user_id)
+		# Модификаторы цены зависят от рынка дня, который Database создаёт при первом чтении
+		prices = await _run_sync(db.price_fish_items, [
+			{
+				"name": r[1],
+				"fish_name": r[1],
+				"rarity": r[5],
+				"price": r[6],
+				"min_weight": r[8],
+				"max_weight": r[9],
+				"min_length": r[10],
+				"max_length": r[11],
+				"weight": r[2],
+				"length": r[3],
+			}
+			for r in rows
+		])
+		items = []
+		for r, calculated_price in zip(rows, prices):
+			image_file = r[7] or fish_stickers_dict.get(r[1]) or "fishdef.webp"
+			items.append({
+				"id": r[0],
+				"name": r[1],
+				"weight": r[2],
+				"length": r[3],
+				"location": r[4],
+				"rarity": r[5],
+				"price": calculated_price,
+				"image_url": f"/api/fish-image/{image_file}",
+			})
+		return {"ok": True, "items": items}, 200
+	except Exception:
+		logger.exception("API inventory failed")
+		return {"ok": False, "error": "internal_error"}, 500
+
+
+async def _guilds(req: _Request, user: dict) -> Payload:
+	user_id = int(user["id"])
+	db = await _run_sync(_get_fish_db)
+	if not db:
+		return _db_unavailable()
+	try:
+		# Снимок собирается из десятка хелперов артелей с их бизнес-правилами — не дублируем их
+		snapshot = await _run_sync(db.get_webapp_guilds_snapshot, user_id=user_id)
+		return {"ok": True, "is_admin": user_id == _ADMIN_USER_ID, **snapshot}, 200
+	except Exception:
+		logger.exception("WebApp guilds snapshot failed for user_id=%s", user_id)
+		return {"ok": False, "error": "db_read_failed"}, 500
+
+
+async def _book(req: _Request, user: dict) -> Payload:
+	user_id = int(user["id"])
+	search = str(req.args.get("search") or "").strip()
+	limit = _safe_int(req.args.get("limit")) or 128
+	try:
+		items = await _repo.get_book_entries(user_id, fish_stickers_dict, search=search, limit=limit)
+		total_all = await _repo.get_book_total_count()
+	except Exception:
+		logger.exception("WebApp book read failed for user_id=%s", user_id)
+		return {"ok": False, "error": "db_read_failed"}, 500
+	return {"ok": True, "items": items, "count": len(items), "total_all": int(total_all or 0), "search": search}, 200
+
+
+async def _tickets_rating(req: _Request, user: dict) -> Payload:
+	user_id = int(user["id"])
+	limit = max(1, min(_safe_int(req.args.get("limit")) or 100, 100))
+	ticket_type = _ticket_type_arg(req)
+	try:
+		rows = await _repo.get_tickets_leaderboard(limit, ticket_type)
+		my_rank = await _repo.get_user_tickets_rank(user_id, ticket_type)
+	except Exception:
+		logger.exception("WebApp ticket rating read failed for user_id=%s", user_id)
+		return {"ok": False, "error": "db_read_failed"}, 500
+	items = [
+		{
+			"place": idx,
+			"user_id": int(row.get("user_id") or 0),
+			"username": str(row.get("username") or "Неизвестно"),
+			"tickets": int(row.get("tickets") or 0),
+		}
+		for idx, row in enumerate(rows, start=1)
+	]
+	return {"ok": True, "items": items, "my_rank": my_rank, "limit": limit, "ticket_type": ticket_type}, 200
+
+
+async def _tickets_results(req: _Request, user: dict) -> Payload:
+	ticket_type = _ticket_type_arg(req)
+	try:
+		result = await _repo.get_latest_ticket_draw_results(ticket_type)
+	except Exception:
+		logger.exception("WebApp ticket results read failed for type=%s", ticket_type)
+		return {"ok": False, "error": "db_read_failed"}, 500
+	if not result:
+		return {"ok": True, "items": [], "ticket_type": ticket_type, "period": None}, 200
+	items = [
+		{
+			"place": idx,
+			"ticket_code": row.get("ticket_code"),
+			"user_id": int(row.get("user_id") or 0),
+			"username": str(row.get("username") or "Неизвестно"),
+			"created_at": row.get("created_at"),
+			"source_type": row.get("source_type"),
+			"source_ref": row.get("source_ref"),
+		}
+		for idx, row in enumerate(result.get("items") or [], start=1)
+	]
+	period = {
+		"start_date": str(result.get("start_at") or ""),
+		"end_date": str(result.get("end_at") or ""),
+		"count": len(items),
+	}
+	return {
+		"ok": True,
+		"items": items,
+		"ticket_type": ticket_type,
+		"seed": result.get("seed"),
+		"pool_size": result.get("pool_size"),
+		"period": period,
+	}, 200
+
+
+async def _tickets_random(req: _Request, user: dict) -> Payload:
+	ticket_type = str(req.args.get("ticket_type") or "").strip().lower()
+	try:
+		row = await _repo.get_random_ticket(ticket_type if ticket_type in ("normal", "gold") else None)
+	except Exception:
+		logger.exception("WebApp random ticket draw failed for user_id=%s", user.get("id"))
+		return {"ok": False, "error": "db_read_failed"}, 500
+	if not row:
+		return {"ok": False, "error": "no_tickets"}, 404
+	return {
+		"ok": True,
+		"ticket": {
+			"ticket_code": row.get("ticket_code"),
+			"award_id": row.get("award_id"),
+			"user_id": row.get("user_id"),
+			"username": row.get("username"),
+			"source_type": row.get("source_type"),
+			"source_ref": row.get("source_ref"),
+			"created_at": row.get("created_at"),
+		},
+	}, 200
+
+
+_ROUTES: Dict[str, Callable[[_Request, dict], Awaitable[Payload]]] = {
+	"/api/profile": _profile,
+	"/api/inventory": _inventory,
+	"/api/guilds": _guilds,
+	"/api/book": _book,
+	"/api/tickets/rating": _tickets_rating,
+	"/api/tickets/results": _tickets_results,
+	"/api/tickets/random": _tickets_random,
+}
+
+
+async def _send_json(send, payload: Dict[str, Any], status: int) -> None:
+	# JSON-провайдер Flask: те же байты, что отдаёт jsonify (даты, ensure_ascii, перевод строки)
+	body = f"{flask_app.json.dumps(payload, separators=(',', ':'))}\n".encode("utf-8")
+	await send({
+		"type": "http.response.start",
+		"status": status,
+		"headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))],
+	})
+	await send({"type": "http.response.body", "body": body})
+
+
+async def _startup() -> None:
+	global _pool, _repo
+	database_url = os.getenv("DATABASE_URL", "").strip()
+	if not database_url.startswith(("postgres://", "postgresql://")):
+		logger.info("WebApp ASGI: DATABASE_URL is not PostgreSQL, all routes are served by Flask")
+		return
+	try:
+		import asyncpg
+
+		_pool = await asyncpg.create_pool(
+			dsn=database_url,
+			min_size=int(os.getenv("WEBAPP_ASYNCPG_MIN_SIZE", "1")),
+			max_size=int(os.getenv("WEBAPP_ASYNCPG_MAX_SIZE", "10")),
+			command_timeout=float(os.getenv("ASYNCPG_COMMAND_TIMEOUT", "60")),
+		)
+	except Exception:
+		logger.exception("WebApp ASGI: asyncpg pool failed, all routes are served by Flask")
+		return
+	_repo = AsyncWebappRepository(_pool)
+	# Схему и каталог готовит синхронный Database, как и при запуске через gunicorn
+	await _run_sync(_get_fish_db)
+
+
+async def _shutdown() -> None:
+	global _pool, _repo
+	_repo = None
+	if _pool is not None:
+		await _pool.close()
+	_pool = None
+	_sync_executor.shutdown(wait=False)
+
+
+async def _lifespan(receive, send) -> None:
+	while True:
+		message = await receive()
+		if message["type"] == "lifespan.startup":
+			await _startup()
+			await send({"type": "lifespan.startup.complete"})
+		elif message["type"] == "lifespan.shutdown":
+			await _shutdown()
+			await send({"type": "lifespan.shutdown.complete"})
+			return
+
+
+async def app(scope, receive, send) -> None:
+	if scope["type"] == "lifespan":
+		await _lifespan(receive, send)
+		return
+	handler = _ROUTES.get(scope.get("path", "")) if scope["type"] == "http" and scope.get("method") == "GET" else None
+	if handler is None or _repo is None:
+		await _wsgi_app(scope, receive, send)
+		return
+
+	req = _Request(scope)
+	auth_user, auth_error = _verified_user(req)
+	if auth_error:
+		await _send_json(send, {"ok": False, "error": auth_error}, _auth_error_status(auth_error))
+		return
+	payload, status = await handler(req, auth_user)
+	await _send_json(send, payload, status)
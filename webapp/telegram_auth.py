@@ -0,0 +1,120 @@
+"""Проверка Telegram WebApp initData с кэшем уже проверенных строк.
+
+Mini App шлёт один и тот же X-Telegram-Init-Data на все запросы сессии, поэтому
+HMAC, разбор query-строки и json.loads пользователя делаются один раз на строку.
+Ключ кэша — sha256 всей строки initData: совпадение ключа означает совпадение
+подписанных данных, а не только присланного hash. Срок auth_date проверяется
+и при попадании в кэш.
+"""
+import functools
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl
+
+from bounded_store import BoundedStore
+
+
+def _env_int(name: str, default: int) -> int:
+	try:
+		return int(str(os.getenv(name, "")).strip())
+	except (TypeError, ValueError):
+		return default
+
+
+# Отрицательное значение — срок initData не ограничен (0, как и раньше, значит «по умолчанию»)
+WEBAPP_AUTH_MAX_AGE_SEC = _env_int("WEBAPP_AUTH_MAX_AGE_SEC", 86400) or 86400
+WEBAPP_AUTH_CACHE_SIZE = max(1, _env_int("WEBAPP_AUTH_CACHE_SIZE", 10000))
+
+# (user, auth_date) по sha256 строки initData
+_verified = BoundedStore(
+	"webapp_init_data",
+	maxsize=WEBAPP_AUTH_CACHE_SIZE,
+	ttl=WEBAPP_AUTH_MAX_AGE_SEC if WEBAPP_AUTH_MAX_AGE_SEC > 0 else None,
+)
+
+
+def _bot_token() -> str:
+	return (os.getenv("BOT_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN") or "").strip()
+
+
+@functools.lru_cache(maxsize=4)
+def webapp_secret_key(bot_token: str) -> bytes:
+	"""Ключ HMAC для initData; выводится из токена бота один раз на процесс."""
+	return hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+
+
+if _bot_token():
+	webapp_secret_key(_bot_token())
+
+
+def _expired(auth_date: int) -> bool:
+	return WEBAPP_AUTH_MAX_AGE_SEC > 0 and int(time.time()) - auth_date > WEBAPP_AUTH_MAX_AGE_SEC
+
+
+def _parse_int(value) -> Optional[int]:
+	try:
+		return int(str(value).strip())
+	except (TypeError, ValueError):
+		return None
+
+
+def _verify_uncached(init_data: str, bot_token: str) -> Tuple[Optional[dict], Optional[int], Optional[str]]:
+	try:
+		payload = dict(parse_qsl(init_data, keep_blank_values=True))
+	except Exception:
+		return None, None, "auth_invalid"
+	received_hash = str(payload.pop("hash", "")).strip()
+	if not received_hash:
+		return None, None, "auth_invalid"
+	data_check_string = "\n".join(
+		f"{key}={value}" for key, value in sorted(payload.items(), key=lambda item: item[0])
+	)
+	expected_hash = hmac.new(webapp_secret_key(bot_token), data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+	if not hmac.compare_digest(expected_hash, received_hash):
+		return None, None, "auth_invalid"
+	auth_date = _parse_int(payload.get("auth_date"))
+	if auth_date is None:
+		return None, None, "auth_invalid"
+	raw_user = payload.get("user")
+	if not raw_user:
+		return None, None, "auth_invalid"
+	try:
+		user_payload = json.loads(raw_user)
+	except (TypeError, ValueError, json.JSONDecodeError):
+		return None, None, "auth_invalid"
+	user_id = _parse_int(user_payload.get("id"))
+	if not user_id:
+		return None, None, "auth_invalid"
+	username = user_payload.get("username") or user_payload.get("first_name") or user_payload.get("last_name")
+	return {"id": user_id, "username": username}, auth_date, None
+
+
+def verify_init_data(init_data: str) -> Tuple[Optional[dict], Optional[str]]:
+	"""Пользователь из подписанной initData или код ошибки (server_misconfigured, auth_invalid, auth_expired)."""
+	bot_token = _bot_token()
+	if not bot_token:
+		return None, "server_misconfigured"
+	cache_key = hashlib.sha256(f"{bot_token}\n{init_data}".encode("utf-8")).digest()
+	cached = _verified.get(cache_key)
+	if cached is not None:
+		user, auth_date = cached
+		if _expired(auth_date):
+			_verified.pop(cache_key, None)
+			return None, "auth_expired"
+		return dict(user), None
+
+	user, auth_date, error = _verify_uncached(init_data, bot_token)
+	if error:
+		return None, error
+	if _expired(auth_date):
+		return None, "auth_expired"
+	_verified[cache_key] = (user, auth_date)
+	return dict(user), None
+
+
+def cache_stats() -> dict:
+	return {"size": len(_verified), "evicted_lru": _verified.evicted_lru, "evicted_ttl": _verified.evicted_ttl}
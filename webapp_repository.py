@@ -0,0 +1,219 @@
+"""Асинхронные чтения для Mini App API (asyncpg-пул, без пула потоков).
+
+Запросы повторяют то, что делают синхронные методы `Database` для тех же
+эндпоинтов, а формы ответов собираются в `webapp/asgi.py` теми же хелперами,
+что и во Flask-приложении.
+"""
+import logging
+import random
+from typing import Any, Dict, List, Optional, Set
+
+from database import WEBAPP_BOOK_ORDER_SQL, webapp_book_item
+from ticket_draw import first_probe_hit, probe_ticket_ids
+
+logger = logging.getLogger(__name__)
+
+# Глобальный профиль хранится в строке с chat_id IS NULL или < 1 (см. Database.get_player)
+_SELECT_PROFILE = """
+    SELECT * FROM players
+    WHERE user_id = $1 AND (chat_id IS NULL OR chat_id < 1)
+    LIMIT 1
+"""
+_SELECT_TROPHIES = """
+    SELECT id, user_id, fish_name, weight, length, location, image_file, is_active, created_at
+    FROM player_trophies
+    WHERE user_id = $1
+    ORDER BY is_active DESC, created_at DESC, id DESC
+"""
+_SELECT_FISH_RARITY = "SELECT rarity FROM fish WHERE name = $1 LIMIT 1"
+_COUNT_USER_TICKETS = """
+    SELECT COUNT(*) FILTER (WHERE ticket_type = 'normal'),
+           COUNT(*) FILTER (WHERE ticket_type = 'gold')
+    FROM ticket_items
+    WHERE user_id = $1
+"""
+_SELECT_INVENTORY = """
+    SELECT cf.id, cf.fish_name, cf.weight, cf.length, cf.location, f.rarity, f.price, f.sticker_id,
+           f.min_weight, f.max_weight, f.min_length, f.max_length
+    FROM caught_fish cf
+    JOIN fish f ON cf.fish_name = f.name
+    WHERE cf.user_id = $1 AND cf.sold = 0
+    ORDER BY cf.caught_at DESC
+    LIMIT 1000
+"""
+_SELECT_CAUGHT_SPECIES = "SELECT fish_key FROM user_fish_species WHERE user_id = $1"
+_SELECT_BOOK = f"""
+    SELECT name, rarity, min_weight, max_weight, min_length, max_length, locations, suitable_baits, price
+    FROM fish
+    WHERE LOWER(TRIM(name)) LIKE LOWER(TRIM($1))
+    ORDER BY {WEBAPP_BOOK_ORDER_SQL}
+    LIMIT $2
+"""
+_COUNT_FISH = "SELECT COUNT(*) FROM fish"
+_SELECT_TICKETS_LEADERBOARD = """
+    SELECT user_id, COALESCE(MAX(username), 'Неизвестно') AS username, COUNT(*) AS tickets
+    FROM ticket_items
+    WHERE ticket_type = $1
+    GROUP BY user_id
+    ORDER BY tickets DESC, user_id ASC
+    LIMIT $2
+"""
+# Место считается в БД, а не перебором всего рейтинга в Python
+_SELECT_TICKETS_RANK = """
+    WITH ranked AS (
+        SELECT user_id, COUNT(*) AS tickets,
+               ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC, user_id ASC) AS rank
+        FROM ticket_items
+        WHERE ticket_type = $1
+        GROUP BY user_id
+    )
+    SELECT (SELECT COUNT(*) FROM ranked) AS total_users, r.rank, r.tickets
+    FROM (SELECT 1) AS one
+    LEFT JOIN ranked r ON r.user_id = $2
+"""
+_SELECT_LATEST_DRAW_RUN = """
+    SELECT id, start_at, end_at, requested_count, created_by, created_at, seed, pool_size
+    FROM ticket_draw_runs
+    WHERE ticket_type = $1
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+_SELECT_DRAW_ITEMS = """
+    SELECT ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
+    FROM ticket_draw_items
+    WHERE run_id = $1
+    ORDER BY id ASC
+"""
+# Случайный билет — пробами id по первичному ключу (см. ticket_draw), без ORDER BY RANDOM()
+_SELECT_TICKET_ID_RANGE = "SELECT MIN(id), MAX(id) FROM ticket_items"
+_SELECT_TICKET_ID_RANGE_BY_TYPE = "SELECT MIN(id), MAX(id) FROM ticket_items WHERE ticket_type = $1"
+_SELECT_TICKET_PROBES = """
+    SELECT id, ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
+    FROM ticket_items
+    WHERE id = ANY($1::int[]) AND ($2::text IS NULL OR ticket_type = $2)
+"""
+_COUNT_TICKETS = "SELECT COUNT(*) FROM ticket_items WHERE $1::text IS NULL OR ticket_type = $1"
+_SELECT_TICKET_AT = """
+    SELECT id, ticket_code, award_id, user_id, username, source_type, source_ref, created_at, ticket_type
+    FROM ticket_items
+    WHERE $1::text IS NULL OR ticket_type = $1
+    ORDER BY id
+    OFFSET $2 LIMIT 1
+"""
+
+
+class AsyncWebappRepository:
+    """Чтения эндпоинтов профиля, инвентаря, книги и билетов поверх asyncpg-пула.
+
+    Все запросы — константные строки: asyncpg готовит их один раз на соединение.
+    """
+
+    def __init__(self, pool: Any):
+        self.pool = pool
+
+    async def get_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(_SELECT_PROFILE, int(user_id))
+        return dict(row) if row else None
+
+    async def get_trophies(self, user_id: int) -> List[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(_SELECT_TROPHIES, int(user_id))
+        return [dict(row) for row in rows]
+
+    async def get_fish_rarity(self, fish_name: str) -> Optional[str]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(_SELECT_FISH_RARITY, str(fish_name or ''))
+
+    async def get_ticket_totals(self, user_id: int) -> Dict[str, int]:
+        """Билеты пользователя обоих типов одним запросом."""
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(_COUNT_USER_TICKETS, int(user_id))
+        return {'normal': int(row[0] or 0), 'gold': int(row[1] or 0)}
+
+    async def get_inventory_rows(self, user_id: int) -> List[Any]:
+        async with self.pool.acquire() as conn:
+            return list(await conn.fetch(_SELECT_INVENTORY, int(user_id)))
+
+    async def get_book_entries(
+        self,
+        user_id: int,
+        stickers: Dict[str, str],
+        search: str = '',
+        limit: int = 128,
+    ) -> List[Dict[str, Any]]:
+        """То же, что `Database.get_webapp_book_entries`, но обоими запросами по одному соединению."""
+        safe_limit = max(1, min(int(limit or 128), 500))
+        search_term = str(search or '').strip()
+        like_pattern = f"%{search_term}%" if search_term else "%"
+        caught_keys: Set[str] = set()
+        async with self.pool.acquire() as conn:
+            if int(user_id) > 0:
+                caught_keys = {str(row[0]) for row in await conn.fetch(_SELECT_CAUGHT_SPECIES, int(user_id))}
+            rows = await conn.fetch(_SELECT_BOOK, like_pattern, safe_limit)
+        return [webapp_book_item(idx, row, stickers, caught_keys) for idx, row in enumerate(rows, start=1)]
+
+    async def get_book_total_count(self) -> int:
+        async with self.pool.acquire() as conn:
+            return int(await conn.fetchval(_COUNT_FISH) or 0)
+
+    async def get_tickets_leaderboard(self, limit: int, ticket_type: str) -> List[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(_SELECT_TICKETS_LEADERBOARD, ticket_type, int(limit))
+        return [
+            {'user_id': int(row[0]), 'username': row[1], 'tickets': int(row[2] or 0)}
+            for row in rows
+        ]
+
+    async def get_user_tickets_rank(self, user_id: int, ticket_type: str) -> Dict[str, int]:
+        """Место в рейтинге билетов; без билетов — место после всех участников."""
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(_SELECT_TICKETS_RANK, ticket_type, int(user_id))
+        total_users = int(row['total_users'] or 0)
+        if row['rank'] is None:
+            return {'rank': total_users + 1 if total_users > 0 else 1, 'tickets': 0, 'total_users': total_users}
+        return {'rank': int(row['rank']), 'tickets': int(row['tickets'] or 0), 'total_users': total_users}
+
+    async def get_latest_ticket_draw_results(self, ticket_type: str) -> Optional[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            run_row = await conn.fetchrow(_SELECT_LATEST_DRAW_RUN, ticket_type)
+            if not run_row:
+                return None
+            rows = await conn.fetch(_SELECT_DRAW_ITEMS, int(run_row['id']))
+        return {
+            'run_id': int(run_row['id']),
+            'ticket_type': ticket_type,
+            'start_at': run_row['start_at'],
+            'end_at': run_row['end_at'],
+            'requested_count': int(run_row['requested_count'] or 0),
+            'created_by': int(run_row['created_by'] or 0),
+            'created_at': run_row['created_at'],
+            'seed': run_row['seed'],
+            'pool_size': run_row['pool_size'],
+            'items': [dict(row) for row in rows],
+        }
+
+    async def get_random_ticket(self, ticket_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            if ticket_type:
+                bounds = await conn.fetchrow(_SELECT_TICKET_ID_RANGE_BY_TYPE, ticket_type)
+            else:
+                bounds = await conn.fetchrow(_SELECT_TICKET_ID_RANGE)
+            probes = probe_ticket_ids(bounds[0], bounds[1]) if bounds else []
+            if not probes:
+                return None
+            by_id = {int(row['id']): row for row in await conn.fetch(_SELECT_TICKET_PROBES, probes, ticket_type)}
+            hit = first_probe_hit(probes, by_id)
+            if hit is not None:
+                row = by_id[hit]
+            else:
+                # Редкий тип не попался пробам — случайная позиция по COUNT(*)
+                total = int(await conn.fetchval(_COUNT_TICKETS, ticket_type) or 0)
+                if total <= 0:
+                    return None
+                row = await conn.fetchrow(_SELECT_TICKET_AT, ticket_type, random.randrange(total))
+        if not row:
+            return None
+        ticket = dict(row)
+        ticket.pop('id', None)
+        return ticket
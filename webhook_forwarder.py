@@ -0,0 +1,220 @@
+"""Пересылка апдейтов Telegram из webapp во внутренний webhook бота.
+
+Апдейты складываются в ограниченную очередь и отправляются несколькими
+потоками по постоянным (keep-alive) HTTP-соединениям. Поток забирает из
+очереди сразу пачку апдейтов и отправляет их подряд по уже открытым
+соединениям, без нового TCP-рукопожатия на каждый апдейт.
+
+Поддерживаются адреса `http://host:port/path` и `http+unix://<socket>/path`,
+где `<socket>` — путь к Unix-сокету, закодированный через `quote(path, safe="")`
+(например, `http+unix://%2Ftmp%2Ffishbot-bot-0.sock/telegram-webhook`).
+"""
+import http.client
+import logging
+import queue
+import socket
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+UNIX_SCHEME = "http+unix"
+
+
+def unix_socket_url(socket_path: str, path: str) -> str:
+    """Собрать http+unix URL для webhook-сервера бота на Unix-сокете."""
+    return f"{UNIX_SCHEME}://{quote(socket_path, safe='')}/{path.lstrip('/')}"
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        self.sock = sock
+
+
+class ForwardTarget:
+    """Разобранный адрес внутреннего webhook: как открыть соединение и какой путь запрашивать."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.url = url
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path = f"{self.path}?{parts.query}"
+        if parts.scheme == UNIX_SCHEME:
+            self.socket_path: Optional[str] = unquote(parts.netloc)
+            self.host, self.port = None, None
+        elif parts.scheme == "http":
+            self.socket_path = None
+            self.host, self.port = parts.hostname, parts.port or 80
+        else:
+            raise ValueError(f"Unsupported webhook forward URL: {url}")
+
+    def connect(self, timeout: float) -> http.client.HTTPConnection:
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+
+# (target_index, payload, headers)
+_Item = Tuple[int, bytes, Dict[str, str]]
+
+
+class WebhookForwarder:
+    """Ограниченные очереди апдейтов + потоки с keep-alive соединениями.
+
+    На каждый адрес бота заводится `workers` полос; у полосы своя очередь и свой
+    поток. Полоса выбирается по ключу маршрутизации (id пользователя), поэтому
+    апдейты одного пользователя уходят строго по порядку, а разные пользователи
+    пересылаются параллельно.
+
+    `submit()` не блокирует: если очередь полосы полна, апдейт отклоняется и учитывается
+    в `rejected` — вызывающий отвечает Telegram ошибкой, и тот пришлёт апдейт повторно.
+    """
+
+    def __init__(
+        self,
+        target_urls: List[str],
+        workers: int = 4,
+        queue_size: int = 5000,
+        batch_size: int = 32,
+        timeout: float = 30.0,
+    ):
+        if not target_urls:
+            raise ValueError("WebhookForwarder needs at least one target URL")
+        self.targets = [ForwardTarget(url) for url in target_urls]
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.timeout = float(timeout)
+        lanes = len(self.targets) * self.workers
+        lane_size = max(1, int(queue_size) // lanes)
+        self._queues: List["queue.Queue[_Item]"] = [queue.Queue(maxsize=lane_size) for _ in range(lanes)]
+        self._threads: List[threading.Thread] = []
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "forwarded": 0,
+            "failed": 0,
+            "batches": 0,
+            "connects": 0,
+        }
+
+    def _bump(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _ensure_started(self) -> None:
+        # Потоки создаём лениво: gunicorn форкает воркеры после импорта модуля
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            for lane in range(len(self._queues)):
+                thread = threading.Thread(target=self._run, args=(lane,), name=f"telegram_webhook_proxy_{lane}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._started = True
+
+    def _lane(self, target_index: int, key: Optional[int]) -> int:
+        # Соль в хэше: иначе при общем делителе числа шардов и полос часть полос пустовала бы
+        lane_in_target = zlib.crc32(f"lane:{int(key)}".encode("ascii")) % self.workers if key is not None else 0
+        return target_index * self.workers + lane_in_target
+
+    def submit(self, target_index: int, payload: bytes, headers: Dict[str, str], key: Optional[int] = None) -> bool:
+        self._ensure_started()
+        target_index = int(target_index) % len(self.targets)
+        try:
+            self._queues[self._lane(target_index, key)].put_nowait((target_index, payload, headers))
+        except queue.Full:
+            self._bump("rejected")
+            return False
+        self._bump("accepted")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            data = dict(self._stats)
+        data.update(
+            queued=sum(q.qsize() for q in self._queues),
+            capacity=sum(q.maxsize for q in self._queues),
+            lanes=len(self._queues),
+        )
+        return data
+
+    def _next_batch(self, lane_queue: "queue.Queue[_Item]") -> List[_Item]:
+        batch = [lane_queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(lane_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, lane: int) -> None:
+        lane_queue = self._queues[lane]
+        connections: Dict[int, http.client.HTTPConnection] = {}
+        while True:
+            batch = self._next_batch(lane_queue)
+            self._bump("batches")
+            for target_index, payload, headers in batch:
+                try:
+                    self._send(connections, target_index, payload, headers)
+                    self._bump("forwarded")
+                except Exception as exc:
+                    self._bump("failed")
+                    logger.warning(
+                        "Telegram webhook proxy could not forward update to %s: %s",
+                        self.targets[target_index].url,
+                        exc,
+                    )
+                finally:
+                    lane_queue.task_done()
+
+    def _send(
+        self,
+        connections: Dict[int, http.client.HTTPConnection],
+        target_index: int,
+        payload: bytes,
+        headers: Dict[str, str],
+    ) -> None:
+        target = self.targets[target_index]
+        request_headers = dict(headers)
+        request_headers["Content-Length"] = str(len(payload))
+        request_headers["Connection"] = "keep-alive"
+        while True:
+            conn = connections.get(target_index)
+            reused = conn is not None
+            if conn is None:
+                conn = target.connect(self.timeout)
+                connections[target_index] = conn
+                self._bump("connects")
+            try:
+                conn.request("POST", target.path, body=payload, headers=request_headers)
+                response = conn.getresponse()
+                # Ответ дочитываем до конца, иначе соединение нельзя переиспользовать
+                response.read()
+                if response.will_close:
+                    conn.close()
+                    connections.pop(target_index, None)
+                if response.status >= 400:
+                    logger.warning("Telegram webhook proxy got HTTP %s from bot", response.status)
+                return
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                connections.pop(target_index, None)
+                # Повторяем только на переиспользованном соединении: бот мог закрыть
+                # простаивающее keep-alive. Свежее соединение упало — ошибка настоящая.
+                if not reused:
+                    raise